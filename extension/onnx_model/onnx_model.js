@@ -700,6 +700,10 @@ onnx.Tensor = class {
                             if (Number.isInteger(offset) && Number.isInteger(length)) {
                                 this._data = context.location(external_data.location, offset, length);
                                 this._encoding = '<';
+                                if (!this._data) {
+                                    //the data is fetched when the tensor is shown, see load()
+                                    this._external = { location: external_data.location, offset: offset, length: length };
+                                }
                             }
                         }
                     }
@@ -727,6 +731,22 @@ onnx.Tensor = class {
         return this._category;
     }
 
+    /**
+     * the external data {location, offset, length} of a tensor whose data is not loaded, or null
+     */
+    get external() {
+        return this._external || null;
+    }
+
+    /**
+     * set the data of an external tensor
+     * @param {Uint8Array} data the bytes of external
+     */
+    load(data) {
+        this._data = data;
+        this._external = null;
+    }
+
     /**
      * tensor content encoding
      */
@@ -6,12 +6,20 @@ var dagre = dagre || {};
 // https://github.com/dagrejs/dagre
 // https://github.com/dagrejs/graphlib
 
-dagre.layout = (graph, layout) => {
+// progress is called with the percent done after each stage
+dagre.layout = (graph, layout, progress) => {
+    // the number of time() calls of a layout
+    const stages = 29;
+    let stage = 0;
     const time = (name, callback) => {
         // const start = Date.now();
         const result = callback();
         // const duration = Date.now() - start;
         // console.log(name + ': ' + duration + 'ms');
+        stage++;
+        if (progress) {
+            progress(Math.min(100, Math.round(stage * 100 / stages)));
+        }
         return result;
     };
 
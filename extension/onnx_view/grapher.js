@@ -134,11 +134,27 @@ grapher.Graph = class {
         edgePathGroupDefs.appendChild(marker("arrowhead"));
         edgePathGroupDefs.appendChild(marker("arrowhead-select"));
         edgePathGroupDefs.appendChild(marker("arrowhead-hover"));
+        edgePathGroupDefs.appendChild(marker("arrowhead-critical"));
+        this._document = document;
+        this._nodeGroup = nodeGroup;
+        this._edgePathGroup = edgePathGroup;
+        this._edgeLabelGroup = edgeLabelGroup;
+        this._metrics = grapher.TextMetrics.get(document, origin);
+        // the nodes and edges are built by viewport(), only the ones around the visible region are in the document
+        this._rect = null;
+        this._visible = new Set();
+        // the shown nodes in graph order, the order of their elements: a node added later is drawn over the ones before
+        this._shown = [];
+        // the nodes with elements that are not in the document, least recently shown first
+        this._detached = new Set();
+        // the elements of the edges that are not shown, reused by the next shown edges
+        this._edgeItems = [];
+        let order = 0;
         for (const nodeId of this.nodes.keys()) {
             const entry = this.node(nodeId);
             const node = entry.label;
             if (this.children(nodeId).length == 0) {
-                node.build(document, nodeGroup);
+                node.order = order++;
             } else {
                 // cluster
                 node.rectangle = document.createElementNS('http://www.w3.org/2000/svg', 'rect');
@@ -154,10 +170,6 @@ grapher.Graph = class {
                 clusterGroup.appendChild(node.element);
             }
         }
-
-        for (const edge of this.edges.values()) {
-            edge.label.build(document, edgePathGroup, edgeLabelGroup);
-        }
     }
 
     measure() {
@@ -165,13 +177,87 @@ grapher.Graph = class {
             const entry = this.node(key);
             if (this.children(key).length == 0) {
                 const node = entry.label;
-                node.measure();
+                node.measure(this._metrics);
             }
         }
+        for (const edge of this.edges.values()) {
+            edge.label.measure(this._metrics);
+        }
     }
 
     layout() {
         dagre.layout(this, this._layout);
+        this._layoutNodes();
+    }
+
+    /**
+     * @returns {Array} the layouts to compute in order, {input(), apply(layout)}: input() is called after the apply()
+     * of the previous layouts, a layout can depend on the ones before it
+     */
+    layouts() {
+        return [ { input: () => this.layoutInput(), apply: (layout) => this.applyLayout(layout) } ];
+    }
+
+    /**
+     * @returns {Object} the layout options, measured node sizes and edges, a plain object for graphlayout
+     */
+    layoutInput() {
+        const nodes = [];
+        for (const entry of this._nodes.values()) {
+            const label = entry.label;
+            nodes.push({ v: entry.v, width: label.width || 0, height: label.height || 0, parent: this.parent(entry.v) });
+        }
+        const edges = [];
+        for (const entry of this._edges.values()) {
+            const label = entry.label;
+            edges.push({
+                v: entry.v,
+                w: entry.w,
+                minlen: label.minlen || 1,
+                weight: label.weight || 1,
+                width: label.width || 0,
+                height: label.height || 0,
+                labeloffset: label.labeloffset || 10,
+                labelpos: label.labelpos || 'r'
+            });
+        }
+        return { layout: Object.assign({}, this._layout), nodes: nodes, edges: edges };
+    }
+
+    /**
+     * set the positions computed by graphlayout.run() for layoutInput(), the same as layout() does
+     */
+    applyLayout(result) {
+        let index = 0;
+        for (const entry of this._nodes.values()) {
+            const position = result.nodes[index++];
+            const label = entry.label;
+            label.x = position[0];
+            label.y = position[1];
+            if (position.length > 2) {
+                label.width = position[2];
+                label.height = position[3];
+            }
+        }
+        index = 0;
+        for (const entry of this._edges.values()) {
+            const position = result.edges[index++];
+            const label = entry.label;
+            const points = [];
+            for (let i = 0; i < position.points.length; i += 2) {
+                points.push({ x: position.points[i], y: position.points[i + 1] });
+            }
+            label.points = points;
+            if ('x' in position) {
+                label.x = position.x;
+                label.y = position.y;
+            }
+        }
+        this.state = { width: result.width, height: result.height };
+        this._layoutNodes();
+    }
+
+    _layoutNodes() {
         for (const key of this.nodes.keys()) {
             const entry = this.node(key);
             if (this.children(key).length == 0) {
@@ -183,12 +269,7 @@ grapher.Graph = class {
 
     update() {
         for (const nodeId of this.nodes.keys()) {
-            if (this.children(nodeId).length == 0) {
-                // node
-                const entry = this.node(nodeId);
-                const node = entry.label;
-                node.update();
-            } else {
+            if (this.children(nodeId).length != 0) {
                 // cluster
                 const entry = this.node(nodeId);
                 const node = entry.label;
@@ -199,10 +280,251 @@ grapher.Graph = class {
                 node.rectangle.setAttribute('height', node.height);
             }
         }
-        for (const edge of this.edges.values()) {
-            edge.label.update();
+        // the nodes and edges by the cells of a grid they intersect, viewport() looks at the cells of its region
+        const size = grapher.Graph.cell;
+        this._cells = new Map();
+        const index = (element, bounds) => {
+            for (let x = Math.floor(bounds.x / size); x <= Math.floor((bounds.x + bounds.width) / size); x++) {
+                for (let y = Math.floor(bounds.y / size); y <= Math.floor((bounds.y + bounds.height) / size); y++) {
+                    const key = x + ',' + y;
+                    const cell = this._cells.get(key);
+                    if (cell) {
+                        cell.push(element);
+                    } else {
+                        this._cells.set(key, [ element ]);
+                    }
+                }
+            }
+        };
+        for (const nodeId of this.nodes.keys()) {
+            if (this.children(nodeId).length == 0) {
+                const node = this.node(nodeId).label;
+                index(node, node.bounds);
+            }
+        }
+        for (const entry of this.edges.values()) {
+            const edge = entry.label;
+            edge.layout();
+            index(edge, edge.bounds);
+        }
+        for (const element of this._visible) {
+            element.update();
         }
     }
+
+    /**
+     * Show the nodes and edges that intersect the visible region or the margin of half its size around it, remove the
+     * others from the document. A removed node keeps its elements until grapher.Graph.cache other nodes are removed
+     * after it, the elements of a removed edge are reused by the next shown edge.
+     * @param {Object} rect the visible region {x, y, width, height} in layout coordinates, null for the whole graph
+     */
+    viewport(rect) {
+        this._rect = rect;
+        const visible = new Set();
+        if (rect) {
+            const x0 = rect.x - (rect.width / 2);
+            const y0 = rect.y - (rect.height / 2);
+            const x1 = rect.x + rect.width + (rect.width / 2);
+            const y1 = rect.y + rect.height + (rect.height / 2);
+            const size = grapher.Graph.cell;
+            for (let x = Math.floor(x0 / size); x <= Math.floor(x1 / size); x++) {
+                for (let y = Math.floor(y0 / size); y <= Math.floor(y1 / size); y++) {
+                    const cell = this._cells.get(x + ',' + y);
+                    if (cell) {
+                        for (const element of cell) {
+                            const bounds = element.bounds;
+                            if (bounds.x <= x1 && bounds.x + bounds.width >= x0 && bounds.y <= y1 && bounds.y + bounds.height >= y0) {
+                                visible.add(element);
+                            }
+                        }
+                    }
+                }
+            }
+        } else {
+            for (const cell of this._cells.values()) {
+                for (const element of cell) {
+                    visible.add(element);
+                }
+            }
+        }
+        for (const element of this._visible) {
+            if (!visible.has(element)) {
+                if (element instanceof grapher.Edge) {
+                    this._edgeItems.push(element.release());
+                } else {
+                    this._hideNode(element);
+                }
+            }
+        }
+        for (const element of visible) {
+            if (!this._visible.has(element)) {
+                if (element instanceof grapher.Edge) {
+                    const item = this._edgeItems.length > 0 ? this._edgeItems.pop() : {};
+                    element.build(this._document, this._edgePathGroup, this._edgeLabelGroup, item);
+                    element.update();
+                } else {
+                    this._showNode(element);
+                }
+            }
+        }
+        this._visible = visible;
+        for (const node of this._detached) {
+            if (this._detached.size <= grapher.Graph.cache) {
+                break;
+            }
+            this._detached.delete(node);
+            node.release();
+        }
+    }
+
+    /**
+     * build the shown nodes and edges again, after their classes or styles changed
+     */
+    refresh() {
+        for (const element of this._visible) {
+            if (element instanceof grapher.Edge) {
+                this._edgeItems.push(element.release());
+            } else {
+                element.element.remove();
+                element.release();
+            }
+        }
+        for (const node of this._detached) {
+            node.release();
+        }
+        this._detached.clear();
+        this._shown = [];
+        this._visible = new Set();
+        this.viewport(this._rect);
+    }
+
+    _showNode(node) {
+        let lo = 0;
+        let hi = this._shown.length;
+        while (lo < hi) {
+            const mid = (lo + hi) >>> 1;
+            if (this._shown[mid].order < node.order) {
+                lo = mid + 1;
+            } else {
+                hi = mid;
+            }
+        }
+        const next = lo < this._shown.length ? this._shown[lo].element : null;
+        this._shown.splice(lo, 0, node);
+        if (this._detached.delete(node)) {
+            this._nodeGroup.insertBefore(node.element, next);
+        } else {
+            node.build(this._document, this._nodeGroup);
+            this._nodeGroup.insertBefore(node.element, next);
+            node.update();
+        }
+    }
+
+    _hideNode(node) {
+        const index = this._shown.indexOf(node);
+        this._shown.splice(index, 1);
+        node.element.remove();
+        this._detached.add(node);
+    }
+};
+
+// the number of removed nodes that keep their elements
+grapher.Graph.cache = 2048;
+
+// the size of the cells of the grid of viewport()
+grapher.Graph.cell = 512;
+
+/**
+ * The sizes of the node and edge label texts without measuring their elements: the height of each kind of text is
+ * measured once on a hidden element with its style, the widths with a canvas context in the same font.
+ */
+grapher.TextMetrics = class {
+
+    constructor(document) {
+        this._document = document;
+        this._fonts = new Map();
+        this._widths = new Map();
+        const canvas = document.createElement('canvas');
+        this._context = canvas && canvas.getContext ? canvas.getContext('2d') : null;
+    }
+
+    /**
+     * @returns {grapher.TextMetrics} the metrics of document, the fonts are measured in parent
+     */
+    static get(document, parent) {
+        grapher.TextMetrics._cache = grapher.TextMetrics._cache || new WeakMap();
+        let metrics = grapher.TextMetrics._cache.get(document);
+        if (!metrics) {
+            metrics = new grapher.TextMetrics(document);
+            grapher.TextMetrics._cache.set(document, metrics);
+        }
+        metrics._parent = parent;
+        return metrics;
+    }
+
+    /**
+     * @param {string} type 'node-item' for a header entry, 'node-attribute' for a list item or 'edge-label'
+     * @returns {Object} {font, bold, height, y}, the canvas fonts and the height and top of the bounding box
+     */
+    font(type) {
+        let font = this._fonts.get(type);
+        if (!font) {
+            const createElement = (name) => this._document.createElementNS('http://www.w3.org/2000/svg', name);
+            const text = createElement('text');
+            text.setAttribute('xml:space', 'preserve');
+            text.textContent = 'Xg';
+            let element = text;
+            if (type === 'edge-label') {
+                text.setAttribute('class', type);
+            } else {
+                element = createElement('g');
+                element.setAttribute('class', type);
+                element.appendChild(text);
+            }
+            element.style.visibility = 'hidden';
+            this._parent.appendChild(element);
+            const box = text.getBBox();
+            const view = this._document.defaultView;
+            const style = view && view.getComputedStyle ? view.getComputedStyle(text) : null;
+            element.remove();
+            const size = style && style.fontSize ? style.fontSize : (type === 'node-item' ? '11px' : type === 'node-attribute' ? '9px' : '10px');
+            const family = style && style.fontFamily ? style.fontFamily : 'sans-serif';
+            const weight = style && style.fontWeight ? style.fontWeight : 'normal';
+            font = {
+                font: weight + ' ' + size + ' ' + family,
+                bold: 'bold ' + size + ' ' + family,
+                size: parseFloat(size),
+                height: box.height,
+                y: box.y
+            };
+            this._fonts.set(type, font);
+        }
+        return font;
+    }
+
+    /**
+     * @returns {number} the width of text, cached by font
+     */
+    width(type, text, bold) {
+        const font = this.font(type);
+        const name = bold ? font.bold : font.font;
+        let widths = this._widths.get(name);
+        if (!widths) {
+            widths = new Map();
+            this._widths.set(name, widths);
+        }
+        let width = widths.get(text);
+        if (width === undefined) {
+            if (this._context) {
+                this._context.font = name;
+                width = this._context.measureText(text).width;
+            } else {
+                width = text.length * font.size * 0.6;
+            }
+            widths.set(text, width);
+        }
+        return width;
+    }
 };
 
 grapher.Node = class {
@@ -235,6 +557,9 @@ grapher.Node = class {
             this.element.setAttribute('id', this.id);
         }
         this.element.setAttribute('class', this.class ? 'node ' + this.class : 'node');
+        if (this.selected) {
+            this.element.classList.add('select');
+        }
         this.element.style.opacity = 0;
         parent.appendChild(this.element);
         this.border = document.createElementNS('http://www.w3.org/2000/svg', 'path');
@@ -248,10 +573,10 @@ grapher.Node = class {
         this.element.appendChild(this.border);
     }
 
-    measure() {
+    measure(metrics) {
         this.height = 0;
         for (const block of this._blocks) {
-            block.measure();
+            block.measure(metrics);
             this.height = this.height + block.height;
         }
         this.width = Math.max(...this._blocks.map((block) => block.width));
@@ -280,15 +605,31 @@ grapher.Node = class {
         this.element.style.removeProperty('opacity');
     }
 
+    /**
+     * @returns {Object} {x, y, width, height} of the laid out node
+     */
+    get bounds() {
+        return { x: this.x - (this.width / 2), y: this.y - (this.height / 2), width: this.width, height: this.height };
+    }
+
+    /**
+     * drop the elements of the node, build() creates new ones
+     */
+    release() {
+        this.element = null;
+        this.border = null;
+    }
+
     select() {
+        this.selected = true;
         if (this.element) {
             this.element.classList.add('select');
-            return [ this.element ];
         }
-        return [];
+        return [ this ];
     }
 
     deselect() {
+        this.selected = false;
         if (this.element) {
             this.element.classList.remove('select');
         }
@@ -343,11 +684,11 @@ grapher.Node.Header = class {
         }
     }
 
-    measure() {
+    measure(metrics) {
         this.width = 0;
         this.height = 0;
         for (const entry of this._entries) {
-            entry.measure();
+            entry.measure(metrics);
             this.height = Math.max(this.height, entry.height);
             this.width += entry.width;
         }
@@ -451,14 +792,14 @@ grapher.Node.Header.Entry = class {
         this.text.textContent = this.content || '\u00A0';
     }
 
-    measure() {
+    measure(metrics) {
         const yPadding = 4;
         const xPadding = 7;
-        const boundingBox = this.text.getBBox();
-        this.width = boundingBox.width + xPadding + xPadding;
-        this.height = boundingBox.height + yPadding + yPadding;
+        const font = metrics.font('node-item');
+        this.width = metrics.width('node-item', this.content || '\u00A0') + xPadding + xPadding;
+        this.height = font.height + yPadding + yPadding;
         this.tx = xPadding;
-        this.ty = yPadding - boundingBox.y;
+        this.ty = yPadding - font.y;
     }
 
     layout() {
@@ -545,21 +886,26 @@ grapher.Node.List = class {
         }
     }
 
-    measure() {
+    measure(metrics) {
         this.width = 75;
         this.height = 3;
         const yPadding = 1;
         const xPadding = 6;
+        const font = metrics.font('node-attribute');
         for (let i = 0; i < this._items.length; i++) {
             const item = this._items[i];
-            const size = item.text.getBBox();
-            item.width = xPadding + size.width + xPadding;
-            item.height = yPadding + size.height + yPadding;
-            item.offset = size.y;
+            const colon = item.type === 'node' || item.type === 'node[]';
+            let width = metrics.width('node-attribute', colon ? item.name + ':' : item.name, item.separator.trim() !== '=' && !colon);
+            if (!colon) {
+                width += metrics.width('node-attribute', item.separator + item.value, false);
+            }
+            item.width = xPadding + width + xPadding;
+            item.height = yPadding + font.height + yPadding;
+            item.offset = font.y;
             this.height += item.height;
             if (item.type === 'node') {
                 const node = item.value;
-                node.measure();
+                node.measure(metrics);
                 this.width = Math.max(150, this.width, node.width + (2 * xPadding));
                 this.height += node.height + yPadding + yPadding + yPadding + yPadding;
                 if (i === this._items.length - 1) {
@@ -567,7 +913,7 @@ grapher.Node.List = class {
                 }
             } else if (item.type === 'node[]') {
                 for (const node of item.value) {
-                    node.measure();
+                    node.measure(metrics);
                     this.width = Math.max(150, this.width, node.width + (2 * xPadding));
                     this.height += node.height + yPadding + yPadding + yPadding + yPadding;
                 }
@@ -674,43 +1020,94 @@ grapher.Edge = class {
         this.to = to;
     }
 
-    build(document, edgePathGroupElement, edgeLabelGroupElement) {
+    measure(metrics) {
+        if (this.label) {
+            this.width = metrics.width('edge-label', this.label);
+            this.height = metrics.font('edge-label').height;
+        }
+    }
+
+    /**
+     * @param {Object} item the elements of an edge that is no longer shown, {} for new ones, see release()
+     */
+    build(document, edgePathGroupElement, edgeLabelGroupElement, item) {
         const createElement = (name) => {
             return document.createElementNS('http://www.w3.org/2000/svg', name);
         };
-        this.element = createElement('path');
+        if (!item.path) {
+            item.path = createElement('path');
+            item.hitTest = createElement('path');
+            item.hitTest.setAttribute('class', 'edge-path-hit-test');
+            item.hitTest.addEventListener('pointerover', () => item.edge.emit('pointerover'));
+            item.hitTest.addEventListener('pointerleave', () => item.edge.emit('pointerleave'));
+            item.hitTest.addEventListener('click', () => item.edge.emit('click'));
+        }
+        item.edge = this;
+        this._item = item;
+        this.element = item.path;
         if (this.id) {
             this.element.setAttribute('id', this.id);
+        } else {
+            this.element.removeAttribute('id');
+        }
+        const classList = [ 'edge-path' ];
+        if (this.class) {
+            classList.push(this.class);
         }
-        this.element.setAttribute('class', this.class ? 'edge-path ' + this.class : 'edge-path');
+        if (this.selected) {
+            classList.push('select');
+        }
+        this.element.setAttribute('class', classList.join(' '));
         edgePathGroupElement.appendChild(this.element);
-        this.hitTest = createElement('path');
-        this.hitTest.setAttribute('class', 'edge-path-hit-test');
-        this.hitTest.addEventListener('pointerover', () => this.emit('pointerover'));
-        this.hitTest.addEventListener('pointerleave', () => this.emit('pointerleave'));
-        this.hitTest.addEventListener('click', () => this.emit('click'));
+        this.hitTest = item.hitTest;
         edgePathGroupElement.appendChild(this.hitTest);
+        this.labelElement = null;
         if (this.label) {
-            const tspan = createElement('tspan');
-            tspan.setAttribute('xml:space', 'preserve');
-            tspan.setAttribute('dy', '1em');
-            tspan.setAttribute('x', '1');
-            tspan.appendChild(document.createTextNode(this.label));
-            this.labelElement = createElement('text');
-            this.labelElement.appendChild(tspan);
-            this.labelElement.style.opacity = 0;
-            this.labelElement.setAttribute('class', 'edge-label');
+            if (!item.label) {
+                const tspan = createElement('tspan');
+                tspan.setAttribute('xml:space', 'preserve');
+                tspan.setAttribute('dy', '1em');
+                tspan.setAttribute('x', '1');
+                item.label = createElement('text');
+                item.label.appendChild(tspan);
+                item.label.setAttribute('class', 'edge-label');
+            }
+            this.labelElement = item.label;
+            this.labelElement.firstChild.textContent = this.label;
             if (this.id) {
                 this.labelElement.setAttribute('id', 'edge-label-' + this.id);
+            } else {
+                this.labelElement.removeAttribute('id');
             }
             edgeLabelGroupElement.appendChild(this.labelElement);
-            const edgeBox = this.labelElement.getBBox();
-            this.width = edgeBox.width;
-            this.height = edgeBox.height;
         }
     }
 
-    update() {
+    /**
+     * remove the elements of the edge from the document
+     * @returns {Object} the elements, for the build() of another edge
+     */
+    release() {
+        const item = this._item;
+        // select() replaces the path
+        item.path = this.element;
+        item.path.remove();
+        item.hitTest.remove();
+        if (item.label) {
+            item.label.remove();
+        }
+        item.edge = null;
+        this._item = null;
+        this.element = null;
+        this.hitTest = null;
+        this.labelElement = null;
+        return item;
+    }
+
+    /**
+     * the path and the bounds of the laid out edge
+     */
+    layout() {
         const intersectRect = (node, point) => {
             const x = node.x;
             const y = node.y;
@@ -729,35 +1126,51 @@ grapher.Edge = class {
             }
             return { x: x + w, y: y + (dx === 0 ? 0 : w * dy / dx) };
         };
-        const curvePath = (edge, tail, head) => {
-            const points = edge.points.slice(1, edge.points.length - 1);
-            points.unshift(intersectRect(tail, points[0]));
-            points.push(intersectRect(head, points[points.length - 1]));
-            return new grapher.Edge.Curve(points).path.data;
-        };
-        const edgePath = curvePath(this, this.from, this.to);
-        this.element.setAttribute('d', edgePath);
-        this.hitTest.setAttribute('d', edgePath);
+        const points = this.points.slice(1, this.points.length - 1);
+        points.unshift(intersectRect(this.from, points[0]));
+        points.push(intersectRect(this.to, points[points.length - 1]));
+        this.path = new grapher.Edge.Curve(points).path.data;
+        // the curve is inside the convex hull of its points
+        let x0 = Infinity;
+        let y0 = Infinity;
+        let x1 = -Infinity;
+        let y1 = -Infinity;
+        for (const point of points) {
+            x0 = Math.min(x0, point.x);
+            y0 = Math.min(y0, point.y);
+            x1 = Math.max(x1, point.x);
+            y1 = Math.max(y1, point.y);
+        }
+        if (this.label) {
+            x0 = Math.min(x0, this.x - (this.width / 2));
+            y0 = Math.min(y0, this.y - (this.height / 2));
+            x1 = Math.max(x1, this.x + (this.width / 2));
+            y1 = Math.max(y1, this.y + (this.height / 2));
+        }
+        this.bounds = { x: x0, y: y0, width: x1 - x0, height: y1 - y0 };
+    }
+
+    update() {
+        this.element.setAttribute('d', this.path);
+        this.hitTest.setAttribute('d', this.path);
         if (this.labelElement) {
             this.labelElement.setAttribute('transform', 'translate(' + (this.x - (this.width / 2)) + ',' + (this.y - (this.height / 2)) + ')');
-            this.labelElement.style.opacity = 1;
         }
     }
 
     select() {
-        if (this.element) {
-            if (!this.element.classList.contains('select')) {
-                const path = this.element;
-                path.classList.add('select');
-                this.element = path.cloneNode(true);
-                path.parentNode.replaceChild(this.element, path);
-            }
-            return [ this.element ];
+        this.selected = true;
+        if (this.element && !this.element.classList.contains('select')) {
+            const path = this.element;
+            path.classList.add('select');
+            this.element = path.cloneNode(true);
+            path.parentNode.replaceChild(this.element, path);
         }
-        return [];
+        return [ this ];
     }
 
     deselect() {
+        this.selected = false;
         if (this.element && this.element.classList.contains('select')) {
             const path = this.element;
             path.classList.remove('select');
@@ -0,0 +1,213 @@
+// Graph layout off the main thread: dagre runs in a Web Worker on a plain copy of the graph
+var graphlayout = graphlayout || {};
+var dagre = dagre || (typeof window !== 'undefined' ? window.dagre : undefined);
+
+// the script urls the worker imports, resolved while this script is loading
+graphlayout.scripts = (() => {
+    if (typeof document !== 'undefined' && document.currentScript && document.currentScript.src) {
+        const src = document.currentScript.src;
+        return [new URL('dagre.js', src).toString(), src];
+    }
+    return null;
+})();
+
+/**
+ * The dagre input graph over the plain layout input of grapher.Graph.layoutInput()
+ */
+graphlayout.Graph = class {
+
+    constructor(input) {
+        this.state = {};
+        this.nodes = new Map();
+        this.edges = new Map();
+        this._parent = new Map();
+        for (const node of input.nodes) {
+            this.nodes.set(node.v, { v: node.v, label: { width: node.width, height: node.height } });
+            if (node.parent !== null) {
+                this._parent.set(node.v, node.parent);
+            }
+        }
+        for (const edge of input.edges) {
+            const label = Object.assign({}, edge);
+            delete label.v;
+            delete label.w;
+            this.edges.set(edge.v + ':' + edge.w, { v: edge.v, w: edge.w, label: label });
+        }
+    }
+
+    parent(key) {
+        const parent = this._parent.get(key);
+        return parent === undefined ? null : parent;
+    }
+
+    /**
+     * @returns {Object} the positions in input order, [x, y] of the nodes and [x, y, width, height] of the clusters,
+     * the flat [x0, y0, x1, y1, ...] points and the label position of the edges
+     */
+    result() {
+        const nodes = [];
+        for (const node of this.nodes.values()) {
+            const label = node.label;
+            nodes.push(this._isCluster(node.v) ? [label.x, label.y, label.width, label.height] : [label.x, label.y]);
+        }
+        const edges = [];
+        for (const edge of this.edges.values()) {
+            const label = edge.label;
+            const points = [];
+            for (const point of label.points) {
+                points.push(point.x, point.y);
+            }
+            edges.push('x' in label ? { points: points, x: label.x, y: label.y } : { points: points });
+        }
+        return { nodes: nodes, edges: edges, width: this.state.width, height: this.state.height };
+    }
+
+    _isCluster(key) {
+        if (!this._clusters) {
+            this._clusters = new Set(this._parent.values());
+        }
+        return this._clusters.has(key);
+    }
+};
+
+/**
+ * Lay out a graph on the current thread
+ * @param {Object} input grapher.Graph.layoutInput()
+ * @param {function(number)} progress called with the percent done
+ * @returns {Object} the layout, see graphlayout.Graph.result()
+ */
+graphlayout.run = (input, progress) => {
+    const graph = new graphlayout.Graph(input);
+    dagre.layout(graph, input.layout, progress);
+    return graph.result();
+};
+
+/**
+ * The cache key of a layout input, a 64-bit cyrb53 hash of its JSON. The input holds the layout options and the
+ * measured node sizes, so a change of the view options (attributes, names, direction) is a different key.
+ */
+graphlayout.key = (input) => {
+    const text = JSON.stringify(input);
+    let h1 = 0xdeadbeef;
+    let h2 = 0x41c6ce57;
+    for (let i = 0; i < text.length; i++) {
+        const c = text.charCodeAt(i);
+        h1 = Math.imul(h1 ^ c, 2654435761);
+        h2 = Math.imul(h2 ^ c, 1597334677);
+    }
+    h1 = Math.imul(h1 ^ (h1 >>> 16), 2246822507) ^ Math.imul(h2 ^ (h2 >>> 13), 3266489909);
+    h2 = Math.imul(h2 ^ (h2 >>> 16), 2246822507) ^ Math.imul(h1 ^ (h1 >>> 13), 3266489909);
+    return (h1 >>> 0).toString(16).padStart(8, '0') + (h2 >>> 0).toString(16).padStart(8, '0');
+};
+
+/**
+ * The worker side: {input} messages are answered by {progress} messages and one {layout} or {error} message
+ */
+graphlayout.serve = (scope) => {
+    scope.onmessage = (e) => {
+        try {
+            const layout = graphlayout.run(e.data.input, (percent) => scope.postMessage({ progress: percent }));
+            scope.postMessage({ layout: layout });
+        } catch (error) {
+            scope.postMessage({ error: error && error.message ? error.message : String(error) });
+        }
+    };
+};
+
+/**
+ * One layout in a Web Worker, on the main thread where workers are not available
+ */
+graphlayout.Task = class {
+
+    constructor(input) {
+        this._input = input;
+        this._worker = null;
+        this._url = null;
+        this._cancelled = false;
+        this._resolve = null;
+    }
+
+    /**
+     * @param {function(number)} progress called with the percent done
+     * @returns {Promise<Object>} the layout, null if the task was cancelled
+     */
+    run(progress) {
+        let worker = null;
+        try {
+            worker = this._create();
+        } catch (error) {
+            this._terminate();
+            worker = null;
+        }
+        if (!worker) {
+            return Promise.resolve(this._cancelled ? null : graphlayout.run(this._input, progress));
+        }
+        this._worker = worker;
+        return new Promise((resolve, reject) => {
+            this._resolve = resolve;
+            const fallback = () => {
+                this._terminate();
+                try {
+                    resolve(this._cancelled ? null : graphlayout.run(this._input, progress));
+                } catch (error) {
+                    reject(error);
+                }
+            };
+            worker.onmessage = (e) => {
+                const message = e.data;
+                if (message.progress !== undefined) {
+                    progress(message.progress);
+                } else if (message.layout) {
+                    this._terminate();
+                    resolve(message.layout);
+                } else {
+                    this._terminate();
+                    reject(new Error(message.error));
+                }
+            };
+            // the scripts could not be loaded in the worker
+            worker.onerror = (e) => {
+                e.preventDefault();
+                fallback();
+            };
+            worker.postMessage({ input: this._input });
+        });
+    }
+
+    cancel() {
+        this._cancelled = true;
+        this._terminate();
+        if (this._resolve) {
+            this._resolve(null);
+        }
+    }
+
+    _create() {
+        if (typeof Worker === 'undefined' || typeof Blob === 'undefined' || !graphlayout.scripts) {
+            return null;
+        }
+        const source = 'importScripts(' + graphlayout.scripts.map((url) => JSON.stringify(url)).join(', ') + ');\n' +
+            'graphlayout.serve(self);\n';
+        this._url = URL.createObjectURL(new Blob([source], { type: 'text/javascript' }));
+        return new Worker(this._url);
+    }
+
+    _terminate() {
+        if (this._worker) {
+            this._worker.terminate();
+            this._worker = null;
+        }
+        if (this._url) {
+            URL.revokeObjectURL(this._url);
+            this._url = null;
+        }
+    }
+};
+
+if (typeof window !== 'undefined' && typeof window === 'object') {
+    window.graphlayout = graphlayout;
+}
+
+if (typeof module !== 'undefined' && typeof module.exports === 'object') {
+    module.exports = graphlayout;
+}
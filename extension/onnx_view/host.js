@@ -12,6 +12,9 @@ host.BrowserHost = class {
             name: this._document.title,
             menu: true
         };
+        //the pending requests to the extension. key: request id, value: {resolve, reject}
+        this._requests = new Map();
+        this._requestId = 0;
     }
 
     get window() {
@@ -77,6 +80,73 @@ host.BrowserHost = class {
         })
     }
 
+    /**
+     * post a request to the extension, the extension replies with a message of the same type and requestId
+     * @param {string} type the message type
+     * @param {Object} message the request fields
+     * @returns {Promise<*>} the reply body
+     */
+    _request(type, message) {
+        const requestId = ++this._requestId;
+        return new Promise((resolve, reject) => {
+            this._requests.set(requestId, { resolve: resolve, reject: reject });
+            this._vscode.postMessage(Object.assign({ type: type, requestId: requestId }, message));
+        });
+    }
+
+    /**
+     * the reply of a _request
+     * @param {*} body {requestId, error, ...}
+     */
+    reply(body) {
+        const request = this._requests.get(body.requestId);
+        if (request) {
+            this._requests.delete(body.requestId);
+            if (body.error) {
+                request.reject(new Error(body.error));
+            } else {
+                request.resolve(body);
+            }
+        }
+    }
+
+    /**
+     * request the data of an external tensor from the extension
+     * @param {{location: string, offset: number, length: number}} external the tensor external data
+     * @returns {Promise<Uint8Array>} the tensor bytes
+     */
+    async fetchTensor(external) {
+        const body = await this._request('external_tensor', {
+            external_locations: [external.location],
+            offset: external.offset,
+            length: external.length
+        });
+        return body.tensorData;
+    }
+
+    /**
+     * the graph layout cached in the results directory of the model
+     * @param {string} key graphlayout.key() of the layout input
+     * @returns {Promise<Object>} the layout, null if it's not cached
+     */
+    async layout(key) {
+        try {
+            const body = await this._request('layout_cache_get', { key: key });
+            return body.layout || null;
+        } catch (error) {
+            return null;
+        }
+    }
+
+    /**
+     * cache a graph layout in the results directory of the model
+     * @param {string} key graphlayout.key() of the layout input
+     * @param {Object} layout graphlayout.run() result
+     */
+    storeLayout(key, layout) {
+        this._vscode.postMessage({ type: 'layout_cache_put', key: key, layout: layout });
+    }
+
     exception(error, fatal) {
         //send telemetry， do nothing
     }
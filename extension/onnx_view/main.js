@@ -5,14 +5,47 @@
 
     //the onnx proto model
     let onnxProtoModel = null;
-    //the onnx proto graphs
-    let onnxProtoGraphs = null;
     //the onnx model name
     let onnxModelName = '';
-    //the tensor external data map. key: location, value: Uint8Array
-    let externalTensorMap = new Map();
-    //the tensor external locations
-    let externalTensorLocations = [];
+    //the onnx_tool binary profile, window.profile.ProfileFile
+    let profileFile = null;
+    //the host of the opened view, it receives the external tensor data
+    let browserHost = null;
+    //the opened view, the background analysis updates its model and profile
+    let currentView = null;
+
+    function readProfile(data) {
+        if (data) {
+            try {
+                return new window.profile.ProfileFile(data);
+            } catch (err) {
+                console.log(err);
+            }
+        }
+        return null;
+    }
+
+    function readModel(data) {
+        onnxProtoModel = window.proto.onnx.ModelProto.decode(data);
+        let { graphs } = window.getExternalLocations(onnxProtoModel);
+
+        //refer to https://github.com/onnx/onnx/blob/main/docs/ExternalData.md
+        //the large tensors are sent without their data, external tensors are fetched when they are shown
+        return new window.onnx.Model(onnxProtoModel, graphs, new Map());
+    }
+
+    function openView(model) {
+        let host = new window.host.BrowserHost(vscode);
+        browserHost = host;
+        let view = new window.View(host);
+        currentView = view;
+        view.profile = profileFile;
+        view.start().then((data) => {
+            view.open(model, onnxModelName);
+        }).catch((err) => {
+            console.log(err);
+        })
+    }
 
     // Handle messages from the extension
     window.addEventListener('message', e => {
@@ -24,48 +57,42 @@
                     let onnxValue = body.modelData;
                     //the onnx file name
                     onnxModelName = body.modelName;
+                    profileFile = readProfile(body.profileData);
+                    openView(readModel(onnxValue));
+
+                    break;
+                }
+
+            case 'profile':
+                {
+                    //the binary profile of the background analysis, saved after the view opened
+                    profileFile = readProfile(body.profileData);
+                    if (currentView) {
+                        currentView.updateProfile(profileFile);
+                    }
 
-                    onnxProtoModel = window.proto.onnx.ModelProto.decode(onnxValue);
-                    let { locations, graphs } = window.getExternalLocations(onnxProtoModel);
-
-                    //refer to https://github.com/onnx/onnx/blob/main/docs/ExternalData.md
-                    if (locations.length > 0) {
-                        onnxProtoGraphs = graphs;
-                        externalTensorMap.clear();
-                        externalTensorLocations = locations;
-                        //load tensor external data
-                        vscode.postMessage({ type: 'external_tensor', external_locations: locations });
-                    } else {
-                        let model = new window.onnx.Model(onnxProtoModel, graphs, new Map());
-
-                        let host = new window.host.BrowserHost(vscode);
-                        let view = new window.View(host);
-                        view.start().then((data) => {
-                            view.open(model, onnxModelName);
-                        }).catch((err) => {
+                    break;
+                }
+
+            case 'model':
+                {
+                    //the simplified model of the background analysis, it replaces the opened one
+                    profileFile = readProfile(body.profileData);
+                    if (currentView) {
+                        currentView.profile = profileFile;
+                        currentView.open(readModel(body.modelData), onnxModelName).catch((err) => {
                             console.log(err);
-                        })
+                        });
                     }
 
                     break;
                 }
 
-            case 'external_tensor': {
-                //the external tensor data, Uint8Array
-                let tensorData = body.tensorData;
-                let loc = body.location;
-
-                externalTensorMap.set(loc, tensorData);
-                if (externalTensorMap.size == externalTensorLocations.length) {
-                    let model = new window.onnx.Model(onnxProtoModel, onnxProtoGraphs, externalTensorMap);
-
-                    let host = new window.host.BrowserHost(vscode);
-                    let view = new window.View(host);
-                    view.start().then((data) => {
-                        view.open(model, onnxModelName);
-                    }).catch((err) => {
-                        console.log(err);
-                    })
+            case 'external_tensor':
+            case 'layout_cache_get': {
+                //the replies to BrowserHost requests: the bytes of one external tensor, a cached graph layout
+                if (browserHost) {
+                    browserHost.reply(body);
                 }
 
                 break;
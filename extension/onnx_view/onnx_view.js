@@ -1,6 +1,7 @@
 var view = view || {};
 var grapher = grapher || window.grapher;
 var python = python || window.python;
+var graphlayout = graphlayout || window.graphlayout;
 
 var markdown = markdown || {};
 
@@ -13,7 +14,11 @@ view.View = class {
             attributes: false,
             names: false,
             direction: 'vertical',
-            mousewheel: 'scroll'
+            mousewheel: 'scroll',
+            // the profile column the nodes are colored by, the percentile below which they are dimmed
+            heatmap: null,
+            threshold: 0,
+            critical: false
         };
         this._options = Object.assign({}, this._defaultOptions);
         this._model = null;
@@ -21,6 +26,37 @@ view.View = class {
         this._selection = [];
         this._sidebar = new view.Sidebar(this._host);
         this._searchText = '';
+        this._profile = null;
+        // the number of renderGraph calls and the pending graphlayout.Task
+        this._render = 0;
+        this._layoutTask = null;
+        this._layouts = new Map();
+        // the name scope trees of the large graphs, key: graph, value: {root, expanded}
+        this._scopes = new WeakMap();
+        this._focusScope = null;
+        // the find indexes of the shown graphs, key: graph, value: view.SearchIndex
+        this._searchIndexes = new WeakMap();
+        // the profile values of the shown graphs, key: graph, value: view.Heatmap
+        this._heatmaps = new WeakMap();
+    }
+
+    get profile() {
+        return this._profile;
+    }
+
+    set profile(value) {
+        this._profile = value;
+        this._heatmaps = new WeakMap();
+        // the scope trees hold the sums of the profile
+        this._scopes = new WeakMap();
+    }
+
+    /**
+     * show a profile that arrived after the model was opened
+     */
+    updateProfile(value) {
+        this.profile = value;
+        this._reload();
     }
 
     async start() {
@@ -106,6 +142,18 @@ view.View = class {
                     execute: () => this.toggle('mousewheel'),
                     enabled: () => this.activeGraph
                 });
+                view.add({
+                    label: () => this.options.heatmap ? 'Hide &Heatmap' : 'Show &Heatmap',
+                    accelerator: 'CmdOrCtrl+Alt+H',
+                    execute: () => this.toggle('heatmap'),
+                    enabled: () => this.activeGraph && this._profile
+                });
+                view.add({
+                    label: () => this.options.critical ? 'Hide &Critical Path' : 'Show &Critical Path',
+                    accelerator: 'CmdOrCtrl+Alt+L',
+                    execute: () => this.toggle('critical'),
+                    enabled: () => this.activeGraph && this._profile
+                });
                 view.add({});
                 view.add({
                     label: 'Zoom &In',
@@ -188,7 +236,7 @@ view.View = class {
     find() {
         if (this._graph) {
             this._graph.select(null);
-            const content = new view.FindSidebar(this._host, this.activeGraph);
+            const content = new view.FindSidebar(this._host, this._searchIndex(this.activeGraph));
             content.on('search-text-changed', (sender, text) => {
                 this._searchText = text;
             });
@@ -206,6 +254,33 @@ view.View = class {
         }
     }
 
+    /**
+     * @returns {view.SearchIndex} the find index of graph, built on the first call
+     */
+    _searchIndex(graph) {
+        let index = this._searchIndexes.get(graph);
+        if (!index) {
+            index = new view.SearchIndex(graph);
+            this._searchIndexes.set(graph, index);
+        }
+        return index;
+    }
+
+    /**
+     * @returns {view.Heatmap} the profile values of the graph nodes, null without a profile
+     */
+    heatmap(graph) {
+        if (!this._profile || !graph || !Array.isArray(graph.nodes)) {
+            return null;
+        }
+        let heatmap = this._heatmaps.get(graph);
+        if (!heatmap) {
+            heatmap = new view.Heatmap(graph, this._profile);
+            this._heatmaps.set(graph, heatmap);
+        }
+        return heatmap;
+    }
+
     get model() {
         return this._model;
     }
@@ -229,6 +304,16 @@ view.View = class {
             case 'mousewheel':
                 this._options.mousewheel = this._options.mousewheel === 'scroll' ? 'zoom' : 'scroll';
                 break;
+            case 'heatmap': {
+                const metrics = this._profile ? view.Heatmap.metrics(this._profile) : [];
+                this._options.heatmap = this._options.heatmap || metrics.length === 0 ? null : metrics[0].column;
+                this._updateHeatmap();
+                break;
+            }
+            case 'critical':
+                this._options.critical = !this._options.critical;
+                this._updateHeatmap();
+                break;
             default:
                 throw new view.Error("Unsupported toogle '" + name + "'.");
         }
@@ -245,6 +330,104 @@ view.View = class {
         }
     }
 
+    /**
+     * color the shown graph by the heatmap options, the layout stays the same
+     */
+    _updateHeatmap() {
+        if (this._graph) {
+            this._graph.heat();
+            this._graph.refresh();
+        }
+        this._updateLegend();
+    }
+
+    /**
+     * the heatmap legend: the metric, its color scale, the threshold and the critical path
+     */
+    _updateLegend() {
+        const element = this._element('heatmap');
+        if (!element) {
+            return;
+        }
+        while (element.lastChild) {
+            element.removeChild(element.lastChild);
+        }
+        const graph = this._graph;
+        const visible = graph && this._profile && (this._options.heatmap || this._options.critical);
+        element.classList.toggle('heatmap-visible', Boolean(visible));
+        if (!visible) {
+            return;
+        }
+        const document = this._host.document;
+        const create = (tag, className, text) => {
+            const element = document.createElement(tag);
+            if (className) {
+                element.setAttribute('class', className);
+            }
+            if (text) {
+                element.textContent = text;
+            }
+            return element;
+        };
+        const format = (value) => new Intl.NumberFormat('en', { notation: 'compact', maximumSignificantDigits: 3 }).format(value);
+        const metrics = view.Heatmap.metrics(this._profile);
+        const metricRow = create('div', 'heatmap-row');
+        const select = create('select');
+        select.appendChild(create('option', null, 'None')).value = '';
+        for (const metric of metrics) {
+            const option = create('option', null, metric.label);
+            option.value = metric.column;
+            option.selected = metric.column === this._options.heatmap;
+            select.appendChild(option);
+        }
+        select.addEventListener('change', () => {
+            this._options.heatmap = select.value || null;
+            this._updateHeatmap();
+        });
+        metricRow.appendChild(create('span', null, 'Heatmap'));
+        metricRow.appendChild(select);
+        element.appendChild(metricRow);
+        const scale = graph.scale;
+        if (scale) {
+            const metric = metrics.find((metric) => metric.column === scale.column);
+            const bar = create('div', 'heatmap-bar');
+            bar.style.background = 'linear-gradient(to right, ' + [0, 0.25, 0.5, 0.75, 1].map((t) => view.Heatmap.color(t)).join(', ') + ')';
+            element.appendChild(bar);
+            const range = create('div', 'heatmap-range');
+            range.appendChild(create('span', null, format(scale.min)));
+            range.appendChild(create('span', null, format(scale.max) + (metric.unit ? ' ' + metric.unit : '')));
+            element.appendChild(range);
+            const thresholdRow = create('div', 'heatmap-row');
+            const threshold = create('input');
+            threshold.setAttribute('type', 'range');
+            threshold.setAttribute('min', '0');
+            threshold.setAttribute('max', '95');
+            threshold.setAttribute('step', '5');
+            threshold.value = this._options.threshold.toString();
+            threshold.addEventListener('change', () => {
+                this._options.threshold = Number(threshold.value);
+                this._updateHeatmap();
+            });
+            thresholdRow.appendChild(create('span', null, 'Threshold'));
+            thresholdRow.appendChild(threshold);
+            thresholdRow.appendChild(create('span', null, this._options.threshold > 0 ? '\u2265 ' + format(scale.threshold) : 'all'));
+            element.appendChild(thresholdRow);
+        }
+        const criticalRow = create('label', 'heatmap-row');
+        const critical = create('input');
+        critical.setAttribute('type', 'checkbox');
+        critical.checked = this._options.critical;
+        critical.addEventListener('change', () => this.toggle('critical'));
+        criticalRow.appendChild(critical);
+        criticalRow.appendChild(create('span', null, 'Critical path'));
+        const path = graph.path;
+        if (path) {
+            const metric = metrics.find((metric) => metric.column === path.column);
+            criticalRow.appendChild(create('span', 'heatmap-range', path.nodes.length + ' nodes, ' + format(path.total) + (metric.unit ? ' ' + metric.unit : '')));
+        }
+        element.appendChild(criticalRow);
+    }
+
     _timeout(delay) {
         return new Promise((resolve) => {
             setTimeout(resolve, delay);
@@ -273,12 +456,19 @@ view.View = class {
             this._events.scroll = (e) => this._scrollHandler(e);
             this._events.wheel = (e) => this._wheelHandler(e);
             this._events.pointerdown = (e) => this._pointerDownHandler(e);
+            const window = this._host.window;
+            if (window && window.ResizeObserver) {
+                this._events.resize = new window.ResizeObserver(() => this._updateViewport());
+            }
         }
         const graph = this._element('graph');
         graph.focus();
         graph.addEventListener('scroll', this._events.scroll);
         graph.addEventListener('wheel', this._events.wheel, { passive: false });
         graph.addEventListener('pointerdown', this._events.pointerdown);
+        if (this._events.resize) {
+            this._events.resize.observe(graph);
+        }
     }
 
     _deactivate() {
@@ -287,6 +477,9 @@ view.View = class {
             graph.removeEventListener('scroll', this._events.scroll);
             graph.removeEventListener('wheel', this._events.wheel);
             graph.removeEventListener('pointerdown', this._events.pointerdown);
+            if (this._events.resize) {
+                this._events.resize.disconnect();
+            }
         }
     }
 
@@ -311,6 +504,53 @@ view.View = class {
         container.scrollLeft = this._scrollLeft;
         container.scrollTop = this._scrollTop;
         this._zoom = zoom;
+        this._updateViewport();
+    }
+
+    /**
+     * @returns {Object} the region of the graph in the container, {x, y, width, height} in layout coordinates
+     */
+    _viewport() {
+        const container = this._element('graph').getBoundingClientRect();
+        const canvas = this._element('canvas').getBoundingClientRect();
+        return {
+            x: ((container.left - canvas.left) / this._zoom) - view.View.margin,
+            y: ((container.top - canvas.top) / this._zoom) - view.View.margin,
+            width: container.width / this._zoom,
+            height: container.height / this._zoom
+        };
+    }
+
+    /**
+     * show the nodes and edges around the visible region of the graph, at most once per frame
+     */
+    _updateViewport() {
+        const window = this._host.window;
+        if (this._graph && !this._viewportFrame) {
+            const update = () => {
+                delete this._viewportFrame;
+                if (this._graph) {
+                    this._graph.viewport(this._viewport());
+                }
+            };
+            if (window && window.requestAnimationFrame) {
+                this._viewportFrame = window.requestAnimationFrame(update);
+            } else {
+                update();
+            }
+        }
+    }
+
+    /**
+     * @param {Object} bounds {x, y, width, height} in layout coordinates
+     * @returns {Object} the center of bounds, {x, y} in client coordinates
+     */
+    _center(bounds) {
+        const canvas = this._element('canvas').getBoundingClientRect();
+        return {
+            x: canvas.left + ((view.View.margin + bounds.x + (bounds.width / 2)) * this._zoom),
+            y: canvas.top + ((view.View.margin + bounds.y + (bounds.height / 2)) * this._zoom)
+        };
     }
 
     _pointerDownHandler(e) {
@@ -370,6 +610,7 @@ view.View = class {
         if (this._scrollTop && e.target.scrollTop !== Math.floor(this._scrollTop)) {
             delete this._scrollTop;
         }
+        this._updateViewport();
     }
 
     _wheelHandler(e) {
@@ -386,9 +627,9 @@ view.View = class {
             let x = 0;
             let y = 0;
             for (const element of selection) {
-                const rect = element.getBoundingClientRect();
-                x += rect.left + (rect.width / 2);
-                y += rect.top + (rect.height / 2);
+                const center = this._center(element.bounds);
+                x += center.x;
+                y += center.y;
             }
             x = x / selection.length;
             y = y / selection.length;
@@ -513,6 +754,92 @@ view.View = class {
         }
     }
 
+    /**
+     * lay out the graph in a Web Worker, the layouts are cached in the results directory by the host
+     * @returns {Promise<boolean>} false if the layout was cancelled by a newer render
+     */
+    async _layout(viewGraph) {
+        const render = this._render;
+        for (const part of viewGraph.layouts()) {
+            const input = part.input();
+            const key = graphlayout.key(input);
+            // the layouts of this session, expanding a scope lays out only the scopes that changed
+            let layout = this._layouts.get(key);
+            if (!layout) {
+                layout = this._host.layout ? await this._host.layout(key) : null;
+                if (render !== this._render) {
+                    return false;
+                }
+            }
+            if (!layout) {
+                const task = new graphlayout.Task(input);
+                this._layoutTask = task;
+                layout = await task.run((percent) => this.progress(percent));
+                if (this._layoutTask === task) {
+                    this._layoutTask = null;
+                }
+                if (!layout) {
+                    return false;
+                }
+                if (this._host.storeLayout) {
+                    this._host.storeLayout(key, layout);
+                }
+            }
+            if (this._layouts.size >= 256) {
+                this._layouts.clear();
+            }
+            this._layouts.set(key, layout);
+            part.apply(layout);
+        }
+        return true;
+    }
+
+    /**
+     * the name scopes of a graph larger than view.Scope.budget, the expanded scopes are kept while the view is open
+     * @returns {{root: view.Scope, expanded: Array<string>}} null for a smaller graph
+     */
+    scopes(graph) {
+        if (!graph || !Array.isArray(graph.nodes) || graph.nodes.length <= view.Scope.budget) {
+            return null;
+        }
+        if (!this._scopes.has(graph)) {
+            const root = view.Scope.tree(graph.nodes, this._profile);
+            this._scopes.set(graph, { root: root, expanded: view.Scope.expand(root) });
+        }
+        return this._scopes.get(graph);
+    }
+
+    get focusScope() {
+        return this._focusScope;
+    }
+
+    expandScope(scope) {
+        const scopes = this._scopes.get(this.activeGraph);
+        if (scopes && !scopes.expanded.includes(scope.name)) {
+            scopes.expanded.push(scope.name);
+            view.Scope.limit(scopes.root, scopes.expanded, scope);
+            this._updateScopes(scope);
+        }
+    }
+
+    collapseScope(scope) {
+        const scopes = this._scopes.get(this.activeGraph);
+        if (scopes) {
+            scopes.expanded = scopes.expanded.filter((name) => !scope.contains(scopes.root.scope(name)));
+            this._updateScopes(scope);
+        }
+    }
+
+    _updateScopes(scope) {
+        this._focusScope = scope.name;
+        this._sidebar.close();
+        this._updateGraph(this._model, this._graphs).catch((error) => {
+            if (error) {
+                this.error(error, 'Graph update failed.', 'welcome');
+            }
+        });
+    }
+
     popGraph() {
         if (this._graphs.length > 1) {
             this._sidebar.close();
@@ -523,6 +850,12 @@ view.View = class {
 
     async renderGraph(model, graph, options) {
         this._graph = null;
+        // a newer render cancels the layout of the previous one
+        const render = ++this._render;
+        if (this._layoutTask) {
+            this._layoutTask.cancel();
+            this._layoutTask = null;
+        }
         const canvas = this._element('canvas');
         while (canvas.lastChild) {
             canvas.removeChild(canvas.lastChild);
@@ -550,6 +883,7 @@ view.View = class {
         }
         const viewGraph = new view.Graph(this, model, options, groups, layout);
         viewGraph.add(graph);
+        viewGraph.heatmap = this.heatmap(graph);
         // Workaround for Safari background drag/zoom issue:
         // https://stackoverflow.com/questions/40887193/d3-js-zoom-is-not-working-with-mousewheel-in-safari
         const background = this._host.document.createElementNS('http://www.w3.org/2000/svg', 'rect');
@@ -563,19 +897,23 @@ view.View = class {
         viewGraph.build(this._host.document, origin);
         await this._timeout(20);
         viewGraph.measure();
-        viewGraph.layout();
+        if (!await this._layout(viewGraph) || render !== this._render) {
+            return;
+        }
         viewGraph.update();
-        const elements = Array.from(canvas.getElementsByClassName('graph-input') || []);
+        // an expanded or collapsed scope is centered instead of the inputs
+        const labels = Array.from(viewGraph.nodes.values()).map((entry) => entry.label);
+        const elements = viewGraph.focusElement ? [viewGraph.focusElement] : labels.filter((label) => label instanceof view.Input);
+        this._focusScope = null;
         if (elements.length === 0) {
-            const nodeElements = Array.from(canvas.getElementsByClassName('graph-node') || []);
-            if (nodeElements.length > 0) {
-                elements.push(nodeElements[0]);
+            const node = labels.find((label) => label instanceof view.Node);
+            if (node) {
+                elements.push(node);
             }
         }
-        const size = canvas.getBBox();
-        const margin = 100;
-        const width = Math.ceil(margin + size.width + margin);
-        const height = Math.ceil(margin + size.height + margin);
+        const margin = view.View.margin;
+        const width = Math.ceil(margin + viewGraph.state.width + margin);
+        const height = Math.ceil(margin + viewGraph.state.height + margin);
         origin.setAttribute('transform', 'translate(' + margin.toString() + ', ' + margin.toString() + ') scale(1)');
         background.setAttribute('width', width);
         background.setAttribute('height', height);
@@ -594,10 +932,9 @@ view.View = class {
             const xs = [];
             const ys = [];
             for (let i = 0; i < elements.length; i++) {
-                const element = elements[i];
-                const rect = element.getBoundingClientRect();
-                xs.push(rect.left + (rect.width / 2));
-                ys.push(rect.top + (rect.height / 2));
+                const center = this._center(elements[i].bounds);
+                xs.push(center.x);
+                ys.push(center.y);
             }
             let [x] = xs;
             const [y] = ys;
@@ -615,7 +952,15 @@ view.View = class {
             const top = (container.scrollTop + (canvasRect.height / 2) - graphRect.top) - (graphRect.height / 2);
             container.scrollTo({ left: left, top: top, behavior: 'auto' });
         }
+        viewGraph.viewport(this._viewport());
         this._graph = viewGraph;
+        this._updateLegend();
+        // the find index is built once the graph is shown, not on the first search
+        setTimeout(() => {
+            if (this._graph === viewGraph) {
+                this._searchIndex(graph);
+            }
+        }, 0);
     }
 
     applyStyleSheet(element, name) {
@@ -643,7 +988,14 @@ view.View = class {
         const extension = (lastIndex != -1) ? file.substring(lastIndex + 1).toLowerCase() : 'png';
         if (this.activeGraph && (extension === 'png' || extension === 'svg')) {
             const canvas = this._element('canvas');
+            // the export has every node and edge, not only the ones around the visible region
+            if (this._graph) {
+                this._graph.viewport(null);
+            }
             const clone = canvas.cloneNode(true);
+            if (this._graph) {
+                this._graph.viewport(this._viewport());
+            }
             this.applyStyleSheet(clone, 'grapher.css');
             clone.setAttribute('id', 'export');
             clone.removeAttribute('viewBox');
@@ -733,7 +1085,7 @@ view.View = class {
                 if (this._menu) {
                     this._menu.close();
                 }
-                const nodeSidebar = new view.NodeSidebar(this._host, node);
+                const nodeSidebar = new view.NodeSidebar(this._host, node, this._profile);
                 nodeSidebar.on('show-documentation', (/* sender, e */) => {
                     this.showDefinition(node.type);
                 });
@@ -828,6 +1180,9 @@ view.View = class {
     }
 };
 
+// the space around the graph in the canvas
+view.View.margin = 100;
+
 view.Menu = class {
 
     constructor(host) {
@@ -1353,6 +1708,10 @@ view.Graph = class extends grapher.Graph {
         this._values = new Map();
         this._table = new Map();
         this._selection = new Set();
+        // the view.Heatmap of the graph, the color scale and the critical path of the shown elements, see heat()
+        this.heatmap = null;
+        this.scale = null;
+        this.path = null;
     }
 
     createNode(node, type) {
@@ -1397,6 +1756,11 @@ view.Graph = class extends grapher.Graph {
     }
 
     add(graph) {
+        const scopes = graph.groups ? null : this.view.scopes(graph);
+        if (scopes) {
+            this._addScopes(graph, scopes);
+            return;
+        }
         const clusters = new Set();
         const clusterParentMap = new Map();
         const groups = graph.groups;
@@ -1496,13 +1860,285 @@ view.Graph = class extends grapher.Graph {
         }
     }
 
+    /**
+     * add a graph with its name scopes: the collapsed scopes are one view.ScopeNode, the expanded ones a
+     * view.ScopeFrame around their members, the nodes of collapsed scopes have no elements
+     * @param {{root: view.Scope, expanded: Array<string>}} scopes View.scopes(graph)
+     */
+    _addScopes(graph, scopes) {
+        const expanded = new Set(scopes.expanded);
+        const indices = new Map(graph.nodes.map((node, index) => [node, index]));
+        // key: onnx node, value: the element of the node or of its collapsed scope
+        const elements = new Map();
+        this._scopeRoot = scopes.root;
+        this._frames = new Map();
+        this._members = new Map([[scopes.root, []]]);
+        const member = (scope, element, layoutId) => {
+            element.scope = scope;
+            element.layoutId = layoutId;
+            this._members.get(scope).push(element);
+            this.setNode(element);
+        };
+        graph.inputs.forEach((input, index) => {
+            const viewInput = this.createInput(input);
+            member(scopes.root, viewInput, 'i' + index);
+            for (const value of input.value) {
+                this.createValue(value).from = viewInput;
+            }
+        });
+        const visit = (scope) => {
+            for (const item of scope.members) {
+                if (item instanceof view.Scope) {
+                    const element = expanded.has(item.name) ? new view.ScopeFrame(this, item) : new view.ScopeNode(this, item);
+                    element.name = (this._nodeKey++).toString();
+                    member(scope, element, 's' + item.name);
+                    if (item.name === this.view.focusScope) {
+                        this.focusElement = element;
+                    }
+                    if (element instanceof view.ScopeFrame) {
+                        this._frames.set(item, element);
+                        this._members.set(item, []);
+                        visit(item);
+                    } else {
+                        for (const node of item.nodes()) {
+                            elements.set(node, element);
+                            this._table.set(node, element);
+                        }
+                    }
+                } else {
+                    const viewNode = this.createNode(item);
+                    member(scope, viewNode, 'n' + indices.get(item));
+                    elements.set(item, viewNode);
+                }
+            }
+        };
+        visit(scopes.root);
+        for (const node of graph.nodes) {
+            const element = elements.get(node);
+            for (const input of node.inputs) {
+                for (const value of input.value) {
+                    if (value.name != '' && !value.initializer) {
+                        const viewValue = this.createValue(value);
+                        if (!viewValue.to.includes(element)) {
+                            viewValue.to.push(element);
+                        }
+                    }
+                }
+            }
+            let outputs = node.outputs;
+            if (node.chain && node.chain.length > 0) {
+                const chainOutputs = node.chain[node.chain.length - 1].outputs;
+                if (chainOutputs.length > 0) {
+                    outputs = chainOutputs;
+                }
+            }
+            for (const output of outputs) {
+                for (const value of output.value) {
+                    if (!value) {
+                        const error = new view.Error('Invalid null argument.');
+                        error.context = this.model.identifier;
+                        throw error;
+                    }
+                    if (value.name != '') {
+                        this.createValue(value).from = element;
+                    }
+                }
+            }
+            if (node.controlDependencies && node.controlDependencies.length > 0) {
+                for (const value of node.controlDependencies) {
+                    this.createValue(value).controlDependency(element);
+                }
+            }
+        }
+        graph.outputs.forEach((output, index) => {
+            const viewOutput = this.createOutput(output);
+            member(scopes.root, viewOutput, 'o' + index);
+            for (const value of output.value) {
+                this.createValue(value).to.push(viewOutput);
+            }
+        });
+    }
+
     build(document, origin) {
         for (const value of this._values.values()) {
             value.build();
         }
+        this.heat();
         super.build(document, origin);
     }
 
+    /**
+     * color the nodes and collapsed scopes by the heatmap column of the options on a log scale, dim the ones below
+     * the threshold percentile, and mark the elements and edges of the critical path
+     */
+    heat() {
+        const options = this.options;
+        const heatmap = this.heatmap;
+        const elements = Array.from(this.nodes.values()).map((entry) => entry.label).filter((element) => element instanceof view.Node || element instanceof view.ScopeNode);
+        const column = heatmap ? options.heatmap : null;
+        const values = new Map();
+        if (column) {
+            for (const element of elements) {
+                const value = element instanceof view.ScopeNode ?
+                    (element.value.profile ? element.value.profile[column] : undefined) :
+                    heatmap.value(element.value, column);
+                if (Number.isFinite(value) && value > 0) {
+                    values.set(element, value);
+                }
+            }
+        }
+        const sorted = Array.from(values.values()).sort((a, b) => a - b);
+        this.scale = null;
+        if (sorted.length > 0) {
+            const min = sorted[0];
+            const max = sorted[sorted.length - 1];
+            const threshold = sorted[Math.min(Math.floor(options.threshold / 100 * sorted.length), sorted.length - 1)];
+            const range = Math.log(max) - Math.log(min);
+            this.scale = { column: column, min: min, max: max, threshold: threshold };
+            for (const element of elements) {
+                const value = values.get(element);
+                const heat = value !== undefined && value >= threshold;
+                element.heat = heat ? view.Heatmap.color(range > 0 ? (Math.log(value) - Math.log(min)) / range : 1) : null;
+                element.cold = !heat;
+            }
+        } else {
+            for (const element of elements) {
+                element.heat = null;
+                element.cold = false;
+            }
+        }
+        this.path = heatmap && options.critical ? heatmap.path : null;
+        // key: the elements of the path nodes, a collapsed scope is on the path when one of its nodes is
+        const critical = new Set();
+        if (this.path) {
+            for (const node of this.path.nodes) {
+                const element = this._table.get(node);
+                if (element) {
+                    critical.add(element);
+                }
+            }
+        }
+        for (const element of elements) {
+            element.critical = critical.has(element);
+        }
+        for (const entry of this.edges.values()) {
+            const edge = entry.label;
+            edge.critical = critical.has(edge.from) && this._table.get(this.path.values.get(edge.value.value.name)) === edge.to;
+        }
+    }
+
+    /**
+     * With expanded scopes every scope is laid out on its own, innermost first, with its expanded child scopes as
+     * boxes of their size. Expanding a scope lays out that scope and the scopes around it, the others are cached.
+     */
+    layouts() {
+        if (!this._scopeRoot || this._frames.size === 0) {
+            return super.layouts();
+        }
+        // the edges of each scope between its members, key: scope, value: Map of {v, w, edges} by member pair
+        const routes = new Map(Array.from(this._members.keys()).map((scope) => [scope, new Map()]));
+        for (const entry of this.edges.values()) {
+            const edge = entry.label;
+            let from = edge.from;
+            let to = edge.to;
+            while (from.scope !== to.scope) {
+                if (from.scope.depth >= to.scope.depth) {
+                    from = this._frames.get(from.scope);
+                } else {
+                    to = this._frames.get(to.scope);
+                }
+            }
+            const pairs = routes.get(from.scope);
+            const key = from.name + ':' + to.name;
+            if (!pairs.has(key)) {
+                pairs.set(key, { v: from, w: to, edges: [] });
+            }
+            pairs.get(key).edges.push(edge);
+        }
+        const layouts = new Map();
+        const padding = view.ScopeFrame.padding;
+        const input = (scope) => {
+            const nodes = this._members.get(scope).map((element) => {
+                return { v: element.layoutId, width: element.width || 0, height: element.height || 0, parent: null };
+            });
+            const edges = Array.from(routes.get(scope).values()).map((pair) => {
+                const label = pair.edges[0];
+                return {
+                    v: pair.v.layoutId,
+                    w: pair.w.layoutId,
+                    minlen: label.minlen || 1,
+                    weight: label.weight || 1,
+                    width: label.width || 0,
+                    height: label.height || 0,
+                    labeloffset: label.labeloffset || 10,
+                    labelpos: label.labelpos || 'r'
+                };
+            });
+            return { layout: Object.assign({}, this._layout), nodes: nodes, edges: edges };
+        };
+        const place = (scope, x, y) => {
+            const layout = layouts.get(scope);
+            this._members.get(scope).forEach((element, index) => {
+                const position = layout.nodes[index];
+                element.x = x + position[0];
+                element.y = y + position[1];
+                if (element instanceof view.ScopeFrame) {
+                    const inner = layouts.get(element.value);
+                    place(element.value,
+                        element.x - (element.width / 2) + ((element.width - inner.width) / 2),
+                        element.y - (element.height / 2) + element.headerHeight + padding);
+                }
+            });
+            Array.from(routes.get(scope).values()).forEach((pair, index) => {
+                const route = layout.edges[index];
+                const points = [];
+                for (let i = 0; i < route.points.length; i += 2) {
+                    points.push({ x: x + route.points[i], y: y + route.points[i + 1] });
+                }
+                for (const edge of pair.edges) {
+                    // an edge into an expanded scope continues from the border of the box to its node
+                    const inner = points.slice(1, points.length - 1);
+                    if (edge.from !== pair.v) {
+                        inner.unshift(points[0]);
+                    }
+                    if (edge.to !== pair.w) {
+                        inner.push(points[points.length - 1]);
+                    }
+                    edge.points = [points[0]].concat(inner, [points[points.length - 1]]);
+                    if ('x' in route) {
+                        edge.x = x + route.x;
+                        edge.y = y + route.y;
+                    }
+                }
+            });
+        };
+        const parts = [];
+        const visit = (scope) => {
+            for (const element of this._members.get(scope)) {
+                if (element instanceof view.ScopeFrame) {
+                    visit(element.value);
+                }
+            }
+            parts.push({
+                input: () => input(scope),
+                apply: (layout) => {
+                    layouts.set(scope, layout);
+                    const frame = this._frames.get(scope);
+                    if (frame) {
+                        frame.width = Math.max(layout.width + (2 * padding), frame.headerWidth);
+                        frame.height = layout.height + (2 * padding) + frame.headerHeight;
+                    } else {
+                        place(scope, 0, 0);
+                        this.state = { width: layout.width, height: layout.height };
+                        this._layoutNodes();
+                    }
+                }
+            });
+        };
+        visit(this._scopeRoot);
+        return parts;
+    }
+
     select(selection) {
         if (this._selection.size > 0) {
             for (const element of this._selection) {
@@ -1565,7 +2201,14 @@ view.Node = class extends grapher.Node {
     }
 
     get class() {
-        return 'graph-node';
+        return view.Heatmap.classes(this, 'graph-node');
+    }
+
+    build(document, parent) {
+        super.build(document, parent);
+        if (this.heat) {
+            this.element.style.setProperty('--heat', this.heat);
+        }
     }
 
     get inputs() {
@@ -1807,57 +2450,492 @@ view.Output = class extends grapher.Node {
     }
 };
 
-view.Value = class {
-
-    constructor(context, argument) {
-        this.context = context;
-        this.value = argument;
-        this.from = null;
-        this.to = [];
-    }
+/**
+ * A name scope of the nodes, the path of a node name without its last part: '/model/layers.0/mlp/MatMul' is in
+ * 'model/layers.0/mlp'. Names without '/' are split at '.', 'model.layers.0.mlp.down_proj' is in
+ * 'model/layers/0/mlp'.
+ */
+view.Scope = class {
 
-    controlDependency(node) {
-        this._controlDependencies = this._controlDependencies || new Set();
-        this._controlDependencies.add(this.to.length);
-        this.to.push(node);
+    constructor(parent, name, title) {
+        this.parent = parent;
+        this.name = name;
+        this.title = title;
+        this.depth = 0;
+        // onnx nodes and view.Scope in graph order
+        this.members = [];
+        // the number of nodes in the scope and its sub scopes
+        this.count = 0;
+        // the sums of the profile of the nodes, key: the view.Heatmap.metrics column
+        this.profile = null;
+    }
+
+    *nodes() {
+        for (const member of this.members) {
+            if (member instanceof view.Scope) {
+                yield* member.nodes();
+            } else {
+                yield member;
+            }
+        }
     }
 
-    build() {
-        this._edges = this._edges || [];
-        if (this.from && Array.isArray(this.to)) {
-            for (let i = 0; i < this.to.length; i++) {
-                const to = this.to[i];
-                let content = '';
-                const type = this.value.type;
-                if (type &&
-                    type.shape &&
-                    type.shape.dimensions &&
-                    type.shape.dimensions.length > 0 &&
-                    type.shape.dimensions.every((dim) => !dim || Number.isInteger(dim) || (typeof dim === 'string'))) {
-                    content = type.shape.dimensions.map((dim) => (dim !== null && dim !== undefined) ? dim : '?').join('\u00D7');
-                    content = content.length > 16 ? '' : content;
-                }
-                if (this.context.options.names) {
-                    content = this.value.name.split('\n').shift(); // custom argument id
-                }
-                const edge = new view.Edge(this, this.from, to);
-                edge.v = this.from.name;
-                edge.w = to.name;
-                if (content) {
-                    edge.label = content;
-                }
-                edge.id = 'edge-' + this.value.name;
-                if (this._controlDependencies && this._controlDependencies.has(i)) {
-                    edge.class = 'edge-path-control-dependency';
-                }
-                this.context.setEdge(edge);
-                this._edges.push(edge);
+    /**
+     * @returns {boolean} whether scope is this scope or one of its sub scopes
+     */
+    contains(scope) {
+        for (; scope; scope = scope.parent) {
+            if (scope === this) {
+                return true;
             }
         }
+        return false;
     }
 
-    select() {
-        let array = [];
+    scope(name) {
+        return this._scopes.get(name);
+    }
+
+    /**
+     * @param {Array} nodes the graph nodes
+     * @param {profile.ProfileFile} profile the onnx_tool profile, null without one
+     * @returns {view.Scope} the root scope, a scope of one node is that node, a scope of a single scope is
+     * merged with it, and the members of a scope are split in parts of at most budget / 2
+     */
+    static tree(nodes, profile) {
+        const root = new view.Scope(null, '', '');
+        const children = new Map();
+        for (const node of nodes) {
+            const name = node.name || '';
+            const path = name.split(name.indexOf('/') !== -1 ? '/' : '.').filter((part) => part);
+            path.pop();
+            let scope = root;
+            for (const part of path) {
+                const name = scope.name ? scope.name + '/' + part : part;
+                let child = children.get(name);
+                if (!child) {
+                    child = new view.Scope(scope, name, part);
+                    children.set(name, child);
+                    scope.members.push(child);
+                }
+                scope = child;
+            }
+            scope.members.push(node);
+        }
+        const limit = Math.floor(view.Scope.budget / 2);
+        const count = (scope) => {
+            scope.count = scope.members.reduce((count, member) => count + (member instanceof view.Scope ? member.count : 1), 0);
+        };
+        const normalize = (scope) => {
+            let members = [];
+            for (const member of scope.members) {
+                if (member instanceof view.Scope) {
+                    normalize(member);
+                    let child = member;
+                    while (child.members.length === 1 && child.members[0] instanceof view.Scope) {
+                        const inner = child.members[0];
+                        inner.title = child.title + '/' + inner.title;
+                        child = inner;
+                    }
+                    if (child.count < 2) {
+                        members.push(...child.members);
+                    } else {
+                        child.parent = scope;
+                        members.push(child);
+                    }
+                } else {
+                    members.push(member);
+                }
+            }
+            for (let level = 0; members.length > limit; level++) {
+                const parts = [];
+                const size = Math.ceil(members.length / limit);
+                for (let i = 0; i < members.length; i += limit) {
+                    const name = (scope.name ? scope.name + '/' : '') + '#' + level + '.' + parts.length;
+                    const part = new view.Scope(scope, name, '#' + (parts.length + 1) + '/' + size);
+                    part.members = members.slice(i, i + limit);
+                    for (const member of part.members) {
+                        if (member instanceof view.Scope) {
+                            member.parent = part;
+                        }
+                    }
+                    count(part);
+                    parts.push(part);
+                }
+                members = parts;
+            }
+            scope.members = members;
+            count(scope);
+        };
+        normalize(root);
+        root._scopes = new Map();
+        const columns = profile ? view.Heatmap.metrics(profile).map((metric) => metric.column) : [];
+        const index = (scope) => {
+            root._scopes.set(scope.name, scope);
+            for (const member of scope.members) {
+                if (member instanceof view.Scope) {
+                    member.depth = scope.depth + 1;
+                    index(member);
+                } else if (profile && member.name) {
+                    const row = profile.lookup(member.name);
+                    if (row >= 0) {
+                        const values = columns.map((column) => profile.value(column, row) || 0);
+                        for (let parent = scope; parent; parent = parent.parent) {
+                            parent.profile = parent.profile || Object.fromEntries(columns.map((column) => [column, 0]));
+                            columns.forEach((column, i) => parent.profile[column] += values[i]);
+                        }
+                    }
+                }
+            }
+        };
+        index(root);
+        return root;
+    }
+
+    /**
+     * the number of elements shown for the expanded scopes, a scope is one element and its members when expanded
+     */
+    static visible(root, expanded) {
+        return expanded.reduce((count, name) => count + root.scope(name).members.length, 0);
+    }
+
+    /**
+     * @returns {Array<string>} the scopes expanded by default, level by level while they fit in the budget
+     */
+    static expand(root) {
+        const expanded = [root.name];
+        let visible = root.members.length;
+        let level = root.members.filter((member) => member instanceof view.Scope);
+        while (level.length > 0) {
+            const count = level.reduce((count, scope) => count + scope.members.length, visible);
+            if (count > view.Scope.budget) {
+                break;
+            }
+            visible = count;
+            expanded.push(...level.map((scope) => scope.name));
+            level = level.flatMap((scope) => scope.members.filter((member) => member instanceof view.Scope));
+        }
+        return expanded;
+    }
+
+    /**
+     * collapse the least recently expanded scopes, except the ones around scope, until the expanded scopes fit in the
+     * budget
+     * @param {Array<string>} expanded the expanded scope names, in the order they were expanded
+     */
+    static limit(root, expanded, scope) {
+        while (view.Scope.visible(root, expanded) > view.Scope.budget) {
+            const index = expanded.findIndex((name) => {
+                const candidate = root.scope(name);
+                return candidate !== root && !candidate.contains(scope);
+            });
+            if (index < 0) {
+                break;
+            }
+            const collapsed = root.scope(expanded[index]);
+            expanded.splice(0, expanded.length, ...expanded.filter((name) => !collapsed.contains(root.scope(name))));
+        }
+    }
+};
+
+// the number of elements a graph shows, larger graphs are shown with collapsed scopes
+view.Scope.budget = 1000;
+
+/**
+ * The profile values of the nodes of a graph, for the heatmap, and the path through the graph with the largest
+ * latency
+ */
+view.Heatmap = class {
+
+    constructor(graph, profile) {
+        this._graph = graph;
+        this._profile = profile;
+        // key: onnx node, value: its profile row
+        this._rows = null;
+    }
+
+    /**
+     * @returns {Array<{column, label, unit}>} the profile columns a graph can be colored by
+     */
+    static metrics(profile) {
+        const columns = profile.columns;
+        return [
+            { column: 'forward', label: profile.metric, unit: profile.metric },
+            { column: 'memory', label: 'Memory', unit: 'bytes' },
+            { column: 'params', label: 'Params', unit: '' },
+            { column: 'projected_latency', label: 'Projected latency', unit: 'ms' },
+            { column: 'latency', label: 'Latency', unit: 'ms' }
+        ].filter((metric) => columns.includes(metric.column));
+    }
+
+    /**
+     * @param {number} t the position on the scale, 0 to 1
+     * @returns {string} blue to red, dark enough for the white node titles
+     */
+    static color(t) {
+        return 'hsl(' + Math.round(220 * (1 - t)).toString() + ', 75%, 42%)';
+    }
+
+    /**
+     * @returns {string} the class of a node or a collapsed scope with its heatmap classes
+     */
+    static classes(element, name) {
+        const classes = [name];
+        if (element.heat) {
+            classes.push('graph-node-heat');
+        } else if (element.cold) {
+            classes.push('graph-node-cold');
+        }
+        if (element.critical) {
+            classes.push('graph-node-critical');
+        }
+        return classes.join(' ');
+    }
+
+    /**
+     * @returns {number} the value of the profile column for node, undefined if the node is not in the profile
+     */
+    value(node, column) {
+        if (!this._rows) {
+            this._rows = new Map();
+            for (const node of this._graph.nodes) {
+                const row = node.name ? this._profile.lookup(node.name) : -1;
+                if (row >= 0) {
+                    this._rows.set(node, row);
+                }
+            }
+        }
+        const row = this._rows.get(node);
+        return row === undefined ? undefined : this._profile.value(column, row);
+    }
+
+    /**
+     * the critical path: the chain of nodes with the largest sum of the measured latencies, of the projected ones
+     * without measurements, of the forward metric without both
+     * @returns {{nodes: Array, values: Map, total: number, column: string}} the path nodes from first to last, the
+     * values between them as value name to the path node consuming it, and the sum, null for an empty graph
+     */
+    get path() {
+        if (this._path === undefined) {
+            this._path = this._critical();
+        }
+        return this._path;
+    }
+
+    _critical() {
+        const columns = this._profile.columns;
+        const column = ['latency', 'projected_latency', 'forward'].find((column) => columns.includes(column));
+        const nodes = this._graph.nodes;
+        if (!column || nodes.length === 0) {
+            return null;
+        }
+        const producers = new Map();
+        for (const node of nodes) {
+            for (const output of node.outputs) {
+                for (const value of output.value) {
+                    if (value && value.name) {
+                        producers.set(value.name, node);
+                    }
+                }
+            }
+        }
+        // the inputs of each node from other nodes, {node, name}, and the number of them not visited yet
+        const inputs = new Map();
+        const consumers = new Map(nodes.map((node) => [node, []]));
+        const pending = new Map();
+        for (const node of nodes) {
+            const edges = [];
+            for (const input of node.inputs) {
+                for (const value of input.value) {
+                    const producer = value && value.name && !value.initializer ? producers.get(value.name) : null;
+                    if (producer && producer !== node) {
+                        edges.push({ node: producer, name: value.name });
+                        consumers.get(producer).push(node);
+                    }
+                }
+            }
+            inputs.set(node, edges);
+            pending.set(node, edges.length);
+        }
+        // the longest path to each node, visited in topological order
+        const order = nodes.filter((node) => pending.get(node) === 0);
+        const totals = new Map();
+        const previous = new Map();
+        for (let i = 0; i < order.length; i++) {
+            const node = order[i];
+            let best = null;
+            for (const edge of inputs.get(node)) {
+                if (!best || totals.get(edge.node) > totals.get(best.node)) {
+                    best = edge;
+                }
+            }
+            totals.set(node, (best ? totals.get(best.node) : 0) + (this.value(node, column) || 0));
+            previous.set(node, best);
+            for (const consumer of consumers.get(node)) {
+                pending.set(consumer, pending.get(consumer) - 1);
+                if (pending.get(consumer) === 0) {
+                    order.push(consumer);
+                }
+            }
+        }
+        let end = null;
+        for (const node of order) {
+            if (!end || totals.get(node) > totals.get(end)) {
+                end = node;
+            }
+        }
+        if (!end) {
+            return null;
+        }
+        const path = [];
+        const values = new Map();
+        for (let node = end; node;) {
+            path.unshift(node);
+            const edge = previous.get(node);
+            if (edge) {
+                values.set(edge.name, node);
+            }
+            node = edge ? edge.node : null;
+        }
+        return { nodes: path, values: values, total: totals.get(end), column: column };
+    }
+};
+
+/**
+ * A collapsed scope, the expand button or a click on the title shows its members
+ */
+view.ScopeNode = class extends grapher.Node {
+
+    constructor(context, scope) {
+        super();
+        this.context = context;
+        this.value = scope;
+        this.id = 'scope-name-' + scope.name;
+        const header = this.header();
+        const styles = ['node-item-type', 'node-item-type-scope'];
+        const title = header.add(null, styles, scope.title, scope.name);
+        title.on('click', () => this.activate());
+        const expand = header.add(null, styles, '+', 'Expand');
+        expand.on('click', () => this.activate());
+        const list = this.list();
+        list.on('click', () => this.activate());
+        const format = (value) => new Intl.NumberFormat('en', { notation: 'compact', maximumFractionDigits: 2 }).format(value);
+        list.add('nodes', scope.count.toString(), '', ' = ');
+        const profile = this.context.view.profile;
+        if (scope.profile && profile) {
+            list.add(profile.metric, format(scope.profile.forward), scope.profile.forward.toLocaleString(), ' = ');
+            list.add('memory', format(scope.profile.memory), scope.profile.memory.toLocaleString() + ' bytes', ' = ');
+            list.add('params', format(scope.profile.params), scope.profile.params.toLocaleString(), ' = ');
+        }
+    }
+
+    get class() {
+        return view.Heatmap.classes(this, 'graph-node graph-scope');
+    }
+
+    build(document, parent) {
+        super.build(document, parent);
+        if (this.heat) {
+            this.element.style.setProperty('--heat', this.heat);
+        }
+    }
+
+    activate() {
+        this.context.view.expandScope(this.value);
+    }
+};
+
+/**
+ * The frame around the members of an expanded scope, sized by the layout of the members
+ */
+view.ScopeFrame = class extends grapher.Node {
+
+    constructor(context, scope) {
+        super();
+        this.context = context;
+        this.value = scope;
+        this.id = 'scope-frame-name-' + scope.name;
+        const header = this.header();
+        const styles = ['node-item-type', 'node-item-type-scope'];
+        const title = header.add(null, styles, scope.title, scope.name);
+        title.on('click', () => this.activate());
+        const collapse = header.add(null, styles, '\u2212', 'Collapse');
+        collapse.on('click', () => this.activate());
+    }
+
+    get class() {
+        return 'graph-scope-frame';
+    }
+
+    measure(metrics) {
+        super.measure(metrics);
+        this.headerWidth = this.width;
+        this.headerHeight = this.height;
+    }
+
+    activate() {
+        this.context.view.collapseScope(this.value);
+    }
+};
+
+// the space between a frame and the members of its scope
+view.ScopeFrame.padding = 20;
+
+view.Value = class {
+
+    constructor(context, argument) {
+        this.context = context;
+        this.value = argument;
+        this.from = null;
+        this.to = [];
+    }
+
+    controlDependency(node) {
+        this._controlDependencies = this._controlDependencies || new Set();
+        this._controlDependencies.add(this.to.length);
+        this.to.push(node);
+    }
+
+    build() {
+        this._edges = this._edges || [];
+        if (this.from && Array.isArray(this.to)) {
+            for (let i = 0; i < this.to.length; i++) {
+                const to = this.to[i];
+                if (to === this.from) {
+                    // a value inside a collapsed scope
+                    continue;
+                }
+                let content = '';
+                const type = this.value.type;
+                if (type &&
+                    type.shape &&
+                    type.shape.dimensions &&
+                    type.shape.dimensions.length > 0 &&
+                    type.shape.dimensions.every((dim) => !dim || Number.isInteger(dim) || (typeof dim === 'string'))) {
+                    content = type.shape.dimensions.map((dim) => (dim !== null && dim !== undefined) ? dim : '?').join('\u00D7');
+                    content = content.length > 16 ? '' : content;
+                }
+                if (this.context.options.names) {
+                    content = this.value.name.split('\n').shift(); // custom argument id
+                }
+                const edge = new view.Edge(this, this.from, to);
+                edge.v = this.from.name;
+                edge.w = to.name;
+                if (content) {
+                    edge.label = content;
+                }
+                edge.id = 'edge-' + this.value.name;
+                if (this._controlDependencies && this._controlDependencies.has(i)) {
+                    edge.controlDependency = true;
+                }
+                this.context.setEdge(edge);
+                this._edges.push(edge);
+            }
+        }
+    }
+
+    select() {
+        let array = [];
         for (const edge of this._edges) {
             array = array.concat(edge.select());
         }
@@ -1887,8 +2965,21 @@ view.Edge = class extends grapher.Edge {
         this.value = value;
     }
 
+    get class() {
+        const classes = [];
+        if (this.controlDependency) {
+            classes.push('edge-path-control-dependency');
+        }
+        if (this.critical) {
+            classes.push('edge-path-critical');
+        }
+        return classes.join(' ');
+    }
+
     get minlen() {
-        if (this.from.inputs.every((argument) => argument.value.every((value) => value.initializer))) {
+        // scopes have no inputs of their own
+        const inputs = this.from.inputs;
+        if (inputs && inputs.every((argument) => argument.value.every((value) => value.initializer))) {
             return 2;
         }
         return 1;
@@ -2054,7 +3145,7 @@ view.ObjectSidebar = class extends view.Control {
 
 view.NodeSidebar = class extends view.ObjectSidebar {
 
-    constructor(host, node) {
+    constructor(host, node, profile) {
         super(host);
         this._node = node;
         this._attributes = [];
@@ -2084,6 +3175,10 @@ view.NodeSidebar = class extends view.ObjectSidebar {
         if (node.device) {
             this.addProperty('device', node.device);
         }
+        const row = profile && node.name ? profile.node(node.name) : null;
+        if (row) {
+            this._addProfile(profile, row);
+        }
         const attributes = node.attributes;
         if (Array.isArray(attributes) && attributes.length > 0) {
             this.addHeader('Attributes');
@@ -2112,6 +3207,31 @@ view.NodeSidebar = class extends view.ObjectSidebar {
         }
     }
 
+    _addProfile(profile, row) {
+        this.addHeader('Profile');
+        const percent = (name) => {
+            const total = profile.total(name);
+            return total > 0 ? ' (' + (row[name] / total * 100).toFixed(2) + '%)' : '';
+        };
+        const metric = profile.metric;
+        this.addProperty('forward ' + metric, row.forward.toLocaleString() + percent('forward'));
+        if (row.backward !== undefined) {
+            this.addProperty('backward ' + metric, row.backward.toLocaleString() + percent('backward'));
+        }
+        this.addProperty('memory', row.memory.toLocaleString() + ' bytes' + percent('memory'));
+        this.addProperty('params', row.params.toLocaleString() + percent('params'));
+        if (row.latency !== undefined) {
+            this.addProperty('latency', row.latency.toFixed(5) + ' ms' + percent('latency'));
+        }
+        if (row.projected_latency !== undefined) {
+            this.addProperty('projected latency', row.projected_latency.toFixed(5) + ' ms' + percent('projected_latency'));
+            this.addProperty('bottleneck', row.bottleneck);
+        }
+        if (row.blocks !== undefined && row.blocks > 1) {
+            this.addProperty('blocks', 'x' + row.blocks);
+        }
+    }
+
     _addAttribute(name, attribute) {
         let value = null;
         switch (attribute.type) {
@@ -2520,6 +3640,31 @@ view.ValueView = class extends view.Control {
 
     _tensor(value) {
         const contentLine = this.createElement('pre');
+        if (value.external && this._host.fetchTensor) {
+            //the extension sends the model without the large tensors, their data is fetched once when first shown
+            contentLine.innerHTML = 'Loading tensor data...';
+            const valueLine = this.createElement('div', 'sidebar-item-value-line-border');
+            this._host.fetchTensor(value.external).then((data) => {
+                value.load(data);
+                //the value may have been collapsed while loading
+                if (valueLine.parentElement === this._element) {
+                    this._tensorContent(value, contentLine);
+                }
+            }).catch((err) => {
+                contentLine.innerHTML = err.toString();
+                this.emit('error', err);
+            });
+            valueLine.appendChild(contentLine);
+            this._element.appendChild(valueLine);
+        } else {
+            this._tensorContent(value, contentLine);
+            const valueLine = this.createElement('div', 'sidebar-item-value-line-border');
+            valueLine.appendChild(contentLine);
+            this._element.appendChild(valueLine);
+        }
+    }
+
+    _tensorContent(value, contentLine) {
         try {
             const tensor = new view.Tensor(value);
             if (Array.isArray(tensor.stride) && tensor.stride.length > 0) {
@@ -2552,15 +3697,12 @@ view.ValueView = class extends view.Control {
             contentLine.innerHTML = err.toString();
             this.emit('error', err);
         }
-        const valueLine = this.createElement('div', 'sidebar-item-value-line-border');
-        valueLine.appendChild(contentLine);
-        this._element.appendChild(valueLine);
     }
 };
 
 view.NodeView = class extends view.Control {
 
-    constructor(host, node) {
+    constructor(host, node, profile) {
         super(host);
         this._node = node;
         this._element = this.createElement('div', 'sidebar-item-value');
@@ -2848,11 +3990,289 @@ view.DocumentationSidebar = class extends view.Control {
     }
 };
 
+/**
+ * The find index of a graph, built once: the node names, op types, locations and attribute values and the value names,
+ * data types and shapes of the find sidebar entries, in one lower case text that is searched with indexOf. An entry
+ * is its names, then after '\x01' its attribute values and after '\x02' its data type, shape and dimensions, which
+ * only match a whole term. The names and values are separated by '\t', the entries by '\n'.
+ */
+view.SearchIndex = class {
+
+    constructor(graph) {
+        // the entries in graph order: the node or value selected, the node or value shown and how it is shown
+        this._values = [];
+        this._items = [];
+        this._kinds = [];
+        // the distinct data types, shapes and dimensions
+        this._tokens = new Set();
+        const texts = [];
+        // a tab in a name splits it in two, the other separators can't be part of it
+        const join = (texts) => {
+            let result = '';
+            for (const text of texts) {
+                if (text) {
+                    result = result ? result + '\t' + text : text;
+                }
+            }
+            return result.replace(/[\n\x01\x02]/g, ' ');
+        };
+        const add = (value, item, kind, names, attributes, tokens) => {
+            this._values.push(value);
+            this._items.push(item);
+            this._kinds.push(kind);
+            for (const token of tokens) {
+                this._tokens.add(token.toLowerCase());
+            }
+            texts.push((join(names) + '\x01' + join(attributes) + '\x02' + join(tokens)).toLowerCase());
+        };
+        const tokens = (value) => {
+            const tokens = [];
+            const type = value.type;
+            if (type) {
+                if (type.dataType) {
+                    tokens.push(type.dataType);
+                }
+                if (type.shape) {
+                    tokens.push(type.shape.toString());
+                    if (Array.isArray(type.shape.dimensions)) {
+                        const dimensions = type.shape.dimensions.map((dimension) => dimension ? dimension.toString() : '');
+                        tokens.push(dimensions.join(','), ...dimensions);
+                    }
+                }
+            }
+            return tokens;
+        };
+        const values = new Set();
+        const edge = (value) => {
+            if (value.name && !values.has(value.name)) {
+                add(value, value, view.SearchIndex.VALUE, [ value.name.split('\n').shift(), value.location ], [], tokens(value));
+                values.add(value.name);
+            }
+        };
+        const scalar = (value) => typeof value === 'string' || typeof value === 'number' || typeof value === 'boolean' || typeof value === 'bigint';
+        for (const input of graph.inputs) {
+            for (const value of input.value) {
+                edge(value);
+            }
+        }
+        for (const node of graph.nodes) {
+            const initializers = [];
+            for (const input of node.inputs) {
+                for (const value of input.value) {
+                    if (value.initializer) {
+                        initializers.push(value);
+                    } else {
+                        edge(value);
+                    }
+                }
+            }
+            const attributes = [];
+            for (const attribute of Array.isArray(node.attributes) ? node.attributes : []) {
+                const value = attribute.value;
+                if (scalar(value)) {
+                    attributes.push(value.toString());
+                } else if (Array.isArray(value) && value.length <= 16 && value.every(scalar)) {
+                    attributes.push(value.join(', '));
+                }
+            }
+            add(node, node, view.SearchIndex.NODE, [ node.name, node.type.name, node.location ], attributes, []);
+            for (const value of initializers) {
+                if (value.name && !values.has(value.name)) {
+                    add(node, value, view.SearchIndex.INITIALIZER, [ value.name.split('\n').shift(), value.location ], [], tokens(value));
+                }
+            }
+        }
+        for (const output of graph.outputs) {
+            for (const value of output.value) {
+                edge(value);
+            }
+        }
+        this._text = texts.join('\n');
+        // the start of each entry and the positions of its '\x01' and '\x02'
+        this._offsets = new Int32Array(texts.length + 1);
+        this._attributes = new Int32Array(texts.length);
+        this._tokenOffsets = new Int32Array(texts.length);
+        let offset = 0;
+        texts.forEach((text, index) => {
+            this._offsets[index] = offset;
+            this._attributes[index] = offset + text.indexOf('\x01');
+            this._tokenOffsets[index] = offset + text.indexOf('\x02');
+            offset += text.length + 1;
+        });
+        this._offsets[texts.length] = offset;
+        this._last = null;
+    }
+
+    get size() {
+        return this._values.length;
+    }
+
+    /**
+     * @param {string} text the search text, a quoted name or terms that all have to match
+     * @returns {Array<number>} the matching entries: exact matches, prefixes, word starts and then the other matches,
+     * a term matching an attribute value ranks lower, in graph order within a rank
+     */
+    search(text) {
+        const unquote = text.match(new RegExp(/^'(.*)'|"(.*)"$/));
+        let terms = null;
+        let exact = false;
+        if (unquote) {
+            terms = [ (unquote[1] || unquote[2]).toLowerCase() ];
+            exact = true;
+        } else {
+            terms = text.trim().toLowerCase().split(' ').map((term) => term.trim()).filter((term) => term.length > 0);
+        }
+        if (terms.length === 0) {
+            return Array.from(this._values.keys());
+        }
+        if (terms.some((term) => /[\n\t\x01\x02]/.test(term))) {
+            return [];
+        }
+        // the longest term first, the others are only ranked in the entries that match it
+        terms = Array.from(new Set(terms)).sort((a, b) => b.length - a.length);
+        let ranks = null;
+        // typing more of a term only narrows the matches of the previous search, unless a new term is a data type or
+        // a dimension: a token matches the whole term only, so the previous part of it didn't match
+        const last = this._last;
+        if (last && !exact && !last.exact &&
+            last.terms.every((previous) => terms.some((term) => term.indexOf(previous) !== -1)) &&
+            terms.every((term) => last.terms.indexOf(term) !== -1 || !this._tokens.has(term))) {
+            ranks = new Int16Array(this._values.length).fill(-1);
+            for (const index of last.matches) {
+                let sum = 0;
+                for (const term of terms) {
+                    const rank = this._rank(index, term, exact);
+                    if (rank < 0) {
+                        sum = -1;
+                        break;
+                    }
+                    sum += rank;
+                }
+                ranks[index] = sum;
+            }
+        } else {
+            for (const term of terms) {
+                ranks = this._scan(term, exact, ranks);
+            }
+        }
+        const matches = [];
+        for (let index = 0; index < ranks.length; index++) {
+            const rank = ranks[index];
+            if (rank >= 0) {
+                matches[rank] = matches[rank] || [];
+                matches[rank].push(index);
+            }
+        }
+        const result = [].concat(...matches.filter((indices) => indices));
+        this._last = { terms: terms, exact: exact, matches: result };
+        return result;
+    }
+
+    /**
+     * @returns {Object} {value, content} of an entry: the node or value to select and the text shown for it
+     */
+    entry(index) {
+        const item = this._items[index];
+        let content = '';
+        switch (this._kinds[index]) {
+            case view.SearchIndex.NODE:
+                content = '\u25A2 ' + (item.name || '[' + item.type.name + ']');
+                break;
+            case view.SearchIndex.INITIALIZER:
+                content = '\u25A0 ' + item.name.split('\n').shift(); // split custom argument id
+                break;
+            default:
+                content = '\u2192 ' + item.name.split('\n').shift(); // split custom argument id
+                break;
+        }
+        return { value: this._values[index], content: content };
+    }
+
+    /**
+     * @returns {number} the rank of the occurrence of term at position of the text in the entry index: 0 for a whole
+     * name, data type, shape or dimension, 1 for the start of a name, 2 for the start of a word in a name, 3 for a name
+     * containing it, 4 to 7 for the same in an attribute value, -1 for a part of a token
+     */
+    _occurrence(index, position, term, exact) {
+        const text = this._text;
+        const separator = (c) => c === '\t' || c === '\n' || c === '\x01' || c === '\x02' || c === undefined;
+        const before = separator(text[position - 1]);
+        const whole = before && separator(text[position + term.length]);
+        if (position > this._tokenOffsets[index]) {
+            return whole ? 0 : -1;
+        }
+        if (exact) {
+            return whole && position < this._attributes[index] ? 0 : -1;
+        }
+        const rank = whole ? 0 : before ? 1 : '/.:_- '.indexOf(text[position - 1]) !== -1 ? 2 : 3;
+        return position > this._attributes[index] ? rank + 4 : rank;
+    }
+
+    /**
+     * @returns {number} the best rank of term in the entry index, -1 if it doesn't match
+     */
+    _rank(index, term, exact) {
+        const start = this._offsets[index];
+        // searched on its own, indexOf on the whole text would look past the entry
+        const text = this._text.substring(start, this._offsets[index + 1] - 1);
+        let best = -1;
+        for (let position = text.indexOf(term); position !== -1 && best !== 0; position = text.indexOf(term, position + 1)) {
+            const rank = this._occurrence(index, start + position, term, exact);
+            if (rank !== -1 && (best === -1 || rank < best)) {
+                best = rank;
+            }
+        }
+        return best;
+    }
+
+    /**
+     * rank the occurrences of term in one pass over the text
+     * @param {Int16Array} ranks the sums of the ranks of the previous terms, -1 for the entries they don't match, null
+     * for the first term
+     * @returns {Int16Array} the sums of the ranks with term, -1 for the entries that don't match
+     */
+    _scan(term, exact, ranks) {
+        const text = this._text;
+        const offsets = this._offsets;
+        const count = this._values.length;
+        const best = new Int16Array(count).fill(-1);
+        let index = 0;
+        for (let position = text.indexOf(term); position !== -1; position = text.indexOf(term, position + 1)) {
+            while (offsets[index + 1] <= position) {
+                index++;
+            }
+            if (ranks && ranks[index] < 0) {
+                // not a match of the previous terms
+                position = offsets[index + 1] - 1;
+                continue;
+            }
+            const rank = this._occurrence(index, position, term, exact);
+            if (rank !== -1 && (best[index] === -1 || rank < best[index])) {
+                best[index] = rank;
+                if (rank === 0) {
+                    // nothing ranks better, on to the next entry
+                    position = offsets[index + 1] - 1;
+                }
+            }
+        }
+        if (ranks) {
+            for (let i = 0; i < count; i++) {
+                best[i] = ranks[i] < 0 || best[i] < 0 ? -1 : ranks[i] + best[i];
+            }
+        }
+        return best;
+    }
+};
+
+view.SearchIndex.VALUE = 0;
+view.SearchIndex.NODE = 1;
+view.SearchIndex.INITIALIZER = 2;
+
 view.FindSidebar = class extends view.Control {
 
-    constructor(host, graph) {
+    constructor(host, index) {
         super(host);
-        this._graph = graph;
+        this._index = index;
         this._table = new Map();
         this._searchElement = this.createElement('input', 'sidebar-find-search');
         this._searchElement.setAttribute('id', 'search');
@@ -2860,13 +4280,24 @@ view.FindSidebar = class extends view.Control {
         this._searchElement.setAttribute('spellcheck', 'false');
         this._searchElement.setAttribute('placeholder', 'Search');
         this._searchElement.addEventListener('input', (e) => {
-            this.update(e.target.value);
+            // the search runs after the typed text is shown, keys typed meanwhile are one search
+            if (!this._update) {
+                this._update = setTimeout(() => {
+                    delete this._update;
+                    this.update(this._searchElement.value);
+                }, 0);
+            }
             this.emit('search-text-changed', e.target.value);
         });
         this._searchElement.addEventListener('keydown', (e) => {
             if (e.keyCode === 0x08 && !e.altKey && !e.ctrlKey && !e.shiftKey && !e.metaKey) {
                 e.stopPropagation();
             }
+            // enter jumps to the best match
+            if (e.keyCode === 0x0D && this._table.has('0')) {
+                e.preventDefault();
+                this.emit('select', this._table.get('0'));
+            }
         });
         this._contentElement = this.createElement('ol', 'sidebar-find-content');
         this._contentElement.addEventListener('click', (e) => {
@@ -2925,93 +4356,15 @@ view.FindSidebar = class extends view.Control {
             });
             this._contentElement.appendChild(element);
         };
-        let terms = null;
-        let match = null;
-        const unquote = searchText.match(new RegExp(/^'(.*)'|"(.*)"$/));
-        if (unquote) {
-            const term = unquote[1] || unquote[2];
-            terms = [term];
-            match = (name) => {
-                return term === name;
-            };
-        } else {
-            terms = searchText.trim().toLowerCase().split(' ').map((term) => term.trim()).filter((term) => term.length > 0);
-            match = (name) => {
-                return terms.every((term) => name.toLowerCase().indexOf(term) !== -1);
-            };
-        }
-        const edges = new Set();
-        const matchValue = (value) => {
-            if (terms.length === 0) {
-                return true;
-            }
-            if (value.name && match(value.name.split('\n').shift())) {
-                return true;
-            }
-            if (value.location && match(value.location)) {
-                return true;
-            }
-            if (value.type) {
-                for (const term of terms) {
-                    if (value.type.dataType && term === value.type.dataType.toLowerCase()) {
-                        return true;
-                    }
-                    if (value.type.shape) {
-                        if (term === value.type.shape.toString().toLowerCase()) {
-                            return true;
-                        }
-                        if (value.type.shape && Array.isArray(value.type.shape.dimensions)) {
-                            const dimensions = value.type.shape.dimensions.map((dimension) => dimension ? dimension.toString().toLowerCase() : '');
-                            if (term === dimensions.join(',')) {
-                                return true;
-                            }
-                            if (dimensions.some((dimension) => term === dimension)) {
-                                return true;
-                            }
-                        }
-                    }
-                }
-            }
-            return false;
-        };
-        const edge = (value) => {
-            if (value.name && !edges.has(value.name) && matchValue(value)) {
-                add(value, '\u2192 ' + value.name.split('\n').shift()); // split custom argument id
-                edges.add(value.name);
-            }
-        };
-        for (const input of this._graph.inputs) {
-            for (const value of input.value) {
-                edge(value);
-            }
+        const entries = this._index.search(searchText);
+        for (const index of entries.slice(0, view.FindSidebar.limit)) {
+            const entry = this._index.entry(index);
+            add(entry.value, entry.content);
         }
-        for (const node of this._graph.nodes) {
-            const initializers = [];
-            for (const input of node.inputs) {
-                for (const value of input.value) {
-                    if (value.initializer) {
-                        initializers.push(value);
-                    } else {
-                        edge(value);
-                    }
-                }
-            }
-            const name = node.name;
-            const type = node.type.name;
-            const location = node.location;
-            if ((name && match(name)) || (type && match(type)) || (location && match(location))) {
-                add(node, '\u25A2 ' + (name || '[' + type + ']'));
-            }
-            for (const value of initializers) {
-                if (value.name && !edges.has(value.name) && matchValue(value)) {
-                    add(node, '\u25A0 ' + value.name.split('\n').shift()); // split custom argument id
-                }
-            }
-        }
-        for (const output of this._graph.outputs) {
-            for (const value of output.value) {
-                edge(value);
-            }
+        if (entries.length > view.FindSidebar.limit) {
+            const element = this.createElement('li');
+            element.innerText = '\u2026 ' + (entries.length - view.FindSidebar.limit).toLocaleString() + ' more';
+            this._contentElement.appendChild(element);
         }
         this._contentElement.style.display = this._contentElement.childNodes.length != 0 ? 'block' : 'none';
     }
@@ -3021,6 +4374,9 @@ view.FindSidebar = class extends view.Control {
     }
 };
 
+// the number of matches listed, a more specific search shows the others
+view.FindSidebar.limit = 1000;
+
 view.Tensor = class {
 
     constructor(tensor) {
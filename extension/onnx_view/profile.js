@@ -0,0 +1,178 @@
+// Reader of the QPROF binary profile written by onnx_tool (scripts/onnx-tool-experiment/onnx_tool/qprof.py)
+var profile = profile || {};
+
+profile.DTYPE_F64 = 1;
+profile.DTYPE_I64 = 2;
+profile.DTYPE_STR = 3;
+
+profile.ProfileFile = class {
+
+    /**
+     * @param {Uint8Array} data the QPROF file content, columns are typed array views of it
+     */
+    constructor(data) {
+        // typed array views need 8-byte aligned offsets
+        if (data.byteOffset % 8 !== 0) {
+            data = data.slice();
+        }
+        this._data = data;
+        this._view = new DataView(data.buffer, data.byteOffset, data.byteLength);
+        const magic = String.fromCharCode(data[0], data[1], data[2], data[3]);
+        if (magic !== 'QPRF') {
+            throw new profile.Error('Invalid QPROF signature.');
+        }
+        const version = this._view.getUint16(4, true);
+        if (version > 1) {
+            throw new profile.Error("Unsupported QPROF version '" + version + "'.");
+        }
+        this._rows = this._view.getUint32(8, true);
+        const columns = this._view.getUint32(12, true);
+        const strings = this._view.getUint32(16, true);
+        const metric = this._view.getUint32(20, true);
+        const stringsOffset = this._offset(24);
+        const columnsOffset = this._offset(32);
+        const indexOffset = this._offset(40);
+        const totalsOffset = this._offset(48);
+        if (this._offset(56) !== data.byteLength) {
+            throw new profile.Error('Truncated QPROF file.');
+        }
+        this._stringOffsets = new Uint32Array(data.buffer, data.byteOffset + stringsOffset, strings + 1);
+        this._blobOffset = stringsOffset + 4 * (strings + 1);
+        this._decoder = new TextDecoder('utf-8');
+        this._metric = this.string(metric);
+        this._columns = new Map();
+        this._totals = new Map();
+        const totals = new Float64Array(data.buffer, data.byteOffset + totalsOffset, columns);
+        for (let i = 0; i < columns; i++) {
+            const position = columnsOffset + i * 16;
+            const name = this.string(this._view.getUint32(position, true));
+            const dtype = this._view.getUint8(position + 4);
+            const offset = data.byteOffset + this._offset(position + 8);
+            let values = null;
+            switch (dtype) {
+                case profile.DTYPE_F64: values = new Float64Array(data.buffer, offset, this._rows); break;
+                case profile.DTYPE_I64: values = new BigInt64Array(data.buffer, offset, this._rows); break;
+                case profile.DTYPE_STR: values = new Uint32Array(data.buffer, offset, this._rows); break;
+                default: continue;
+            }
+            this._columns.set(name, { dtype: dtype, values: values });
+            if (dtype !== profile.DTYPE_STR) {
+                this._totals.set(name, totals[i]);
+            }
+        }
+        this._index = new Uint32Array(data.buffer, data.byteOffset + indexOffset, this._rows);
+    }
+
+    get rows() {
+        return this._rows;
+    }
+
+    get metric() {
+        return this._metric;
+    }
+
+    get columns() {
+        return Array.from(this._columns.keys());
+    }
+
+    total(name) {
+        return this._totals.get(name);
+    }
+
+    _offset(position) {
+        return Number(this._view.getBigUint64(position, true));
+    }
+
+    _bytes(id) {
+        const start = this._blobOffset + this._stringOffsets[id];
+        const end = this._blobOffset + this._stringOffsets[id + 1];
+        return this._data.subarray(start, end);
+    }
+
+    string(id) {
+        return this._decoder.decode(this._bytes(id));
+    }
+
+    /**
+     * @param {string} name the node name
+     * @returns {number} the row of the node, -1 if it's not in the profile
+     */
+    lookup(name) {
+        const key = new TextEncoder().encode(name);
+        const compare = (bytes) => {
+            const length = Math.min(bytes.length, key.length);
+            for (let i = 0; i < length; i++) {
+                if (bytes[i] !== key[i]) {
+                    return bytes[i] - key[i];
+                }
+            }
+            return bytes.length - key.length;
+        };
+        const names = this._columns.get('name').values;
+        let lo = 0;
+        let hi = this._rows;
+        while (lo < hi) {
+            const mid = (lo + hi) >>> 1;
+            if (compare(this._bytes(names[this._index[mid]])) < 0) {
+                lo = mid + 1;
+            } else {
+                hi = mid;
+            }
+        }
+        if (lo < this._rows && compare(this._bytes(names[this._index[lo]])) === 0) {
+            return this._index[lo];
+        }
+        return -1;
+    }
+
+    /**
+     * @param {number} row
+     * @returns {Object} column name to value, 64-bit integers are converted to Number
+     */
+    row(row) {
+        const values = {};
+        for (const [name, column] of this._columns) {
+            const value = column.values[row];
+            switch (column.dtype) {
+                case profile.DTYPE_STR: values[name] = this.string(value); break;
+                case profile.DTYPE_I64: values[name] = Number(value); break;
+                default: values[name] = value; break;
+            }
+        }
+        return values;
+    }
+
+    /**
+     * @param {string} name a numeric column
+     * @param {number} row
+     * @returns {number} the value as Number, undefined for a string or missing column
+     */
+    value(name, row) {
+        const column = this._columns.get(name);
+        if (!column || column.dtype === profile.DTYPE_STR) {
+            return undefined;
+        }
+        return Number(column.values[row]);
+    }
+
+    node(name) {
+        const row = this.lookup(name);
+        return row < 0 ? null : this.row(row);
+    }
+};
+
+profile.Error = class extends Error {
+
+    constructor(message) {
+        super(message);
+        this.name = 'Error loading QPROF profile.';
+    }
+};
+
+if (typeof window !== 'undefined' && typeof window === 'object') {
+    window.profile = profile;
+}
+
+if (typeof module !== 'undefined' && typeof module.exports === 'object') {
+    module.exports = profile;
+}
@@ -0,0 +1,228 @@
+'''
+Scaling benchmark of the onnx_tool core stages on synthetic graphs, no model files are required.
+
+Cases are generated CNN stacks(Conv-Relu-Conv-Add-Relu residual blocks) and llm.Builder decoder stacks with tiny
+hidden sizes, the layer count is chosen to reach the requested node count. Every stage is timed in one pass and its
+tracemalloc peak is recorded in a second pass, since tracemalloc slows down Python code a lot.
+
+    python benchmark/scaling_benchmark.py --sizes 1000 10000 --save scaling_baseline.json
+    python benchmark/scaling_benchmark.py --sizes 1000 10000 --baseline scaling_baseline.json
+
+The second command exits with 1 if any stage is slower or uses more memory than the baseline beyond the tolerances.
+'''
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy
+import onnx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import onnx_tool  # noqa: E402
+from onnx_tool.tracing import Tracer  # noqa: E402
+from onnx_tool.utils import print_table  # noqa: E402
+
+BASELINE_VERSION = 1
+DefaultSizes = (1000, 5000, 20000)
+Stages = ('load', 'reorder_nodes', 'shape_infer', 'profile', 'compress_memory', 'print_node_map', 'save_model')
+
+CNN_CHANNELS = 4
+CNN_NODES_PER_BLOCK = 5
+LLM_SEQ_LEN = 16
+
+
+def make_cnn(nodes: int, path: str):
+    blocks = max(1, nodes // CNN_NODES_PER_BLOCK)
+    c = CNN_CHANNELS
+    weight = numpy.random.rand(c, c, 3, 3).astype(numpy.float32)
+    bias = numpy.zeros(c, dtype=numpy.float32)
+    graph_nodes = []
+    initializers = []
+    cur = 'input'
+    for i in range(blocks):
+        p = f'/block{i}'
+        for j in range(2):
+            initializers.append(onnx.numpy_helper.from_array(weight, f'{p}/conv{j}.weight'))
+            initializers.append(onnx.numpy_helper.from_array(bias, f'{p}/conv{j}.bias'))
+        graph_nodes.append(onnx.helper.make_node('Conv', [cur, f'{p}/conv0.weight', f'{p}/conv0.bias'], [f'{p}/conv0'],
+                                           name=f'{p}/conv0/Conv', pads=[1, 1, 1, 1]))
+        graph_nodes.append(onnx.helper.make_node('Relu', [f'{p}/conv0'], [f'{p}/relu0'], name=f'{p}/relu0/Relu'))
+        graph_nodes.append(onnx.helper.make_node('Conv', [f'{p}/relu0', f'{p}/conv1.weight', f'{p}/conv1.bias'],
+                                           [f'{p}/conv1'], name=f'{p}/conv1/Conv', pads=[1, 1, 1, 1]))
+        graph_nodes.append(onnx.helper.make_node('Add', [cur, f'{p}/conv1'], [f'{p}/add'], name=f'{p}/add/Add'))
+        graph_nodes.append(onnx.helper.make_node('Relu', [f'{p}/add'], [f'{p}/out'], name=f'{p}/relu1/Relu'))
+        cur = f'{p}/out'
+    inp = onnx.helper.make_tensor_value_info('input', onnx.TensorProto.FLOAT, [1, c, 16, 16])
+    out = onnx.helper.make_tensor_value_info(cur, onnx.TensorProto.FLOAT, [1, c, 16, 16])
+    graph = onnx.helper.make_graph(graph_nodes, 'cnn_stack', [inp], [out], initializers)
+    model = onnx.helper.make_model(graph, opset_imports=[onnx.helper.make_opsetid('', 13)])
+    onnx.save_model(model, path)
+    return len(graph_nodes), {'input': numpy.zeros((1, c, 16, 16), dtype=numpy.float32)}
+
+
+def make_llm(nodes: int, path: str):
+    from onnx_tool.llm import Builder, llama2_7b
+    cfg = dict(llama2_7b)
+    cfg.update(name='scaling-llm', hidden_size=16, intermediate_size=32, num_attention_heads=2,
+               num_key_value_heads=2, vocab_size=64, num_hidden_layers=1)
+    builder = Builder(**cfg)
+    builder.build_graph([1, LLM_SEQ_LEN])
+    per_layer = len(builder.graph.nodemap) - 2  # embedding and lm_head are not repeated
+    cfg['num_hidden_layers'] = max(1, nodes // per_layer)
+    builder = Builder(**cfg)
+    builder.build_graph([1, LLM_SEQ_LEN])
+    for name in builder.graph.initials:
+        tensor = builder.graph.tensormap[name]
+        if tensor.numpy is None:
+            tensor.update_tensor(numpy.zeros(tensor.get_shape(), dtype=numpy.float32))
+    builder.graph.graph_reorder_nodes()
+    builder.graph.save_model(path, shape_only=False)
+    return len(builder.graph.nodemap), {'ids': numpy.zeros((1, LLM_SEQ_LEN), dtype=numpy.int64)}
+
+
+Generators = {
+    'cnn': make_cnn,
+    'llm': make_llm,
+}
+
+
+def run_stages(path: str, inputs: {}, outdir: str, memory: bool):
+    tracer = Tracer(memory=memory, node_events=False)
+    try:
+        with tracer.span('load', 'benchmark'):
+            model = onnx_tool.Model(path)
+        g = model.graph
+        with tracer.span('reorder_nodes', 'benchmark'):
+            g.graph_reorder_nodes()
+        with tracer.span('shape_infer', 'benchmark'):
+            g.shape_infer(inputs)
+        with tracer.span('profile', 'benchmark'):
+            g.profile()
+        with tracer.span('compress_memory', 'benchmark'):
+            g.compress_memory()
+        with tracer.span('print_node_map', 'benchmark'):
+            g.print_node_map(os.path.join(outdir, 'profile.txt'))
+        with tracer.span('save_model', 'benchmark'):
+            model.save_model(os.path.join(outdir, 'shapes.onnx'), shape_only=True)
+    finally:
+        tracer.close()
+    results = {}
+    for event in tracer.events:
+        if event.get('cat') == 'benchmark':
+            results[event['name']] = {'seconds': event['dur'] / 1e6, 'peak_mb': event['args'].get('mem_peak')}
+    return results
+
+
+def run_case(kind: str, size: int, repeat: int, memory: bool, verbose: bool = True):
+    with tempfile.TemporaryDirectory(prefix='onnx_tool_scaling_') as tmpdir:
+        path = os.path.join(tmpdir, f'{kind}_{size}.onnx')
+        nodes, inputs = Generators[kind](size, path)
+        if verbose:
+            print(f'{kind}-{size}: {nodes} nodes, {os.path.getsize(path) / 1e6:.1f} MB')
+        stages = {}
+        for i in range(repeat):
+            timed = run_stages(path, inputs, tmpdir, memory=False)
+            for name in timed:
+                if name not in stages or timed[name]['seconds'] < stages[name]['seconds']:
+                    stages[name] = {'seconds': timed[name]['seconds'], 'peak_mb': None}
+        if memory:
+            traced = run_stages(path, inputs, tmpdir, memory=True)
+            for name in traced:
+                stages[name]['peak_mb'] = traced[name]['peak_mb']
+        if verbose:
+            for name in Stages:
+                peak = stages[name]['peak_mb']
+                peak = '' if peak is None else f', peak {peak:.1f} MB'
+                print(f'    {name}: {stages[name]["seconds"]:.3f} s{peak}')
+    return {'kind': kind, 'size': size, 'nodes': nodes, 'stages': stages}
+
+
+def run_suite(kinds=tuple(Generators.keys()), sizes=DefaultSizes, repeat: int = 1, memory: bool = True,
+              verbose: bool = True):
+    cases = {}
+    for kind in kinds:
+        for size in sizes:
+            cases[f'{kind}-{size}'] = run_case(kind, size, repeat, memory, verbose)
+    return {
+        'version': BASELINE_VERSION,
+        'onnx_tool': onnx_tool.VERSION,
+        'host': platform.node(),
+        'python': platform.python_version(),
+        'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'cases': cases,
+    }
+
+
+def compare(result: {}, baseline: {}, time_tolerance: float = 0.2, memory_tolerance: float = 0.1,
+            min_seconds: float = 0.05, min_mb: float = 1.0):
+    '''
+        Returns:
+            rows of the comparison table, number of regressions
+        A stage regresses if it's slower than the baseline by more than time_tolerance(ratio) and min_seconds, or its
+        tracemalloc peak is higher by more than memory_tolerance and min_mb.
+    '''
+    rows = []
+    regressions = 0
+    for case in result['cases']:
+        if case not in baseline['cases']:
+            continue
+        cur_stages = result['cases'][case]['stages']
+        base_stages = baseline['cases'][case]['stages']
+        for name in Stages:
+            if name not in cur_stages or name not in base_stages:
+                continue
+            cur = cur_stages[name]
+            base = base_stages[name]
+            status = []
+            ratio = cur['seconds'] / max(base['seconds'], 1e-9)
+            if ratio > 1 + time_tolerance and cur['seconds'] - base['seconds'] > min_seconds:
+                status.append('SLOWER')
+            peak, base_peak = cur.get('peak_mb'), base.get('peak_mb')
+            if peak is not None and base_peak is not None:
+                if peak > base_peak * (1 + memory_tolerance) and peak - base_peak > min_mb:
+                    status.append('MEMORY')
+            if len(status) > 0:
+                regressions += 1
+            rows.append([case, name, '{:.3f}'.format(cur['seconds']), '{:.3f}'.format(base['seconds']),
+                         '{:.2f}'.format(ratio), '_' if peak is None else '{:.1f}'.format(peak),
+                         '_' if base_peak is None else '{:.1f}'.format(base_peak),
+                         ','.join(status) if len(status) > 0 else 'OK'])
+    return rows, regressions
+
+
+def get_parser():
+    parser = argparse.ArgumentParser('scaling_benchmark', description='Scaling benchmark of the onnx_tool core')
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(DefaultSizes),
+                        help='node counts of the generated graphs, up to 200000')
+    parser.add_argument('--kinds', nargs='+', choices=list(Generators.keys()), default=list(Generators.keys()))
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs of each case, the fastest is kept')
+    parser.add_argument('--no_memory', action='store_true', help='skip the tracemalloc pass')
+    parser.add_argument('--save', default=None, help='save the results as a baseline JSON')
+    parser.add_argument('--baseline', default=None, help='compare with this baseline JSON')
+    parser.add_argument('--time_tolerance', type=float, default=0.2)
+    parser.add_argument('--memory_tolerance', type=float, default=0.1)
+    parser.add_argument('-f', '--file', default=None, help='file to store the comparison table. None: console')
+    return parser
+
+
+if __name__ == '__main__':
+    args = get_parser().parse_args()
+    result = run_suite(args.kinds, args.sizes, args.repeat, not args.no_memory)
+    if args.save is not None:
+        with open(args.save, 'w') as fp:
+            json.dump(result, fp, indent=1)
+        print(f'Results saved to {args.save}')
+    if args.baseline is not None:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+        rows, regressions = compare(result, baseline, args.time_tolerance, args.memory_tolerance)
+        print_table(rows, ['Case', 'Stage', 'Seconds', 'Baseline', 'Ratio', 'Peak(MB)', 'Baseline Peak(MB)',
+                           'Status'], args.file)
+        if regressions > 0:
+            print(f'{regressions} stage(s) regressed against {args.baseline}')
+            sys.exit(1)
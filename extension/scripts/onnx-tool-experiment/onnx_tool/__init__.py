@@ -1,18 +1,39 @@
+from __future__ import annotations
+
+import importlib
 import os
 import warnings
 
-import numpy
-import onnx
+from .utils import timer, NODE_REGISTRY, VERSION
+
+# numpy, onnx and the graph classes are imported by the first use of these names and NODE_REGISTRY imports the node
+# classes when it is first used, so `import onnx_tool` stays cheap for callers that only need a few modules
+_LAZY_ATTRS = {
+    'Graph': '.graph',
+    'Model': '.model',
+    'Node': '.node',
+    'serialize_shape_engine': '.serialization',
+    'serialize_graph': '.serialization',
+    'create_ndarray_f32': '.tensor',
+    'create_ndarray_int64': '.tensor',
+    'TensorSpec': '.tensor',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRS:
+        value = getattr(importlib.import_module(_LAZY_ATTRS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-from .graph import Graph
-from .model import Model
-from .node import NODE_REGISTRY, Node
-from .serialization import serialize_shape_engine, serialize_graph
-from .tensor import create_ndarray_f32, create_ndarray_int64
-from .utils import timer, VERSION
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(_LAZY_ATTRS.keys()))
 
 
 def loadmodel(f, mcfg={}):
+    from .model import Model
     model = Model(f, mcfg)
     if model.valid is False:
         warnings.warn(f'Invalid onnx model file:{f}')
@@ -27,6 +48,8 @@ def __remove_initilisers(graph: onnx.GraphProto):
 def model_export_tensors_numpy(m, tensornames: [str] = None, savefolder: str = None, fp16: bool = False) -> None:
     model = loadmodel(m)
 
+    import numpy
+
     def save_numpy(arr: numpy.ndarray, fp16: bool, filename):
         if fp16 and arr.dtype in [numpy.float32, numpy.float64]:
             arr = arr.astype(numpy.float16)
@@ -75,7 +98,14 @@ NoMacsOps = (
 
 def model_profile(m, dynamic_shapes: {str: tuple} = None,
                   hidden_ops: [str] = NoMacsOps, mcfg={'verbose': False}, save_profile: str = None,
-                  save_model: str = None, shape_only:bool=False, no_shape:bool=False) -> None:
+                  save_model: str = None, shape_only:bool=False, no_shape:bool=False, device=None,
+                  latency_table=None, rollup_blocks: bool = False, rollup: bool = False, save_rollup: str = None,
+                  rollup_depth: int = 3, rollup_groups: {str: str} = None) -> None:
+    '''
+        Args:
+            rollup: also print the profile aggregated by name scope(up to rollup_depth), op type and the
+                rollup_groups regexes({group name: regex}), save_rollup saves it instead(.json, .csv or .txt)
+    '''
     model = loadmodel(m, mcfg)
     g = model.graph
     gtmr = timer()
@@ -84,13 +114,90 @@ def model_profile(m, dynamic_shapes: {str: tuple} = None,
     g.shape_infer(dynamic_shapes)
     g.log(f'infered all tensor shapes, time cost {gtmr.stop():.3f} s')
     gtmr.start()
-    g.profile()
+    g.profile(latency_table)
     g.log(f'profile all nodes, time cost {gtmr.stop():.3f} s')
-    g.print_node_map(save_profile, exclude_ops=hidden_ops)
+    if device is not None:
+        g.roofline(device)
+    g.print_node_map(save_profile, exclude_ops=hidden_ops, rollup_blocks=rollup_blocks)
+    if rollup or save_rollup is not None:
+        from .rollup import ProfileRollup
+        ProfileRollup(g, rollup_groups, exclude_ops=hidden_ops).print_rollup(save_rollup, rollup_depth)
     if save_model is not None:
         model.save_model(save_model, shape_only=shape_only, no_shape=no_shape)
 
 
+def model_measure(m, dynamic_shapes: {str: numpy.ndarray} = None, hidden_ops: [str] = NoMacsOps,
+                  mcfg={'verbose': False}, save_profile: str = None, device=None, runs: int = 10,
+                  opt_level: str = 'all') -> None:
+    '''
+        Profile the model, run it with onnxruntime and print the estimated MACs and memory of each node next to
+        its measured latency and achieved GFLOP/s.
+        Args:
+            dynamic_shapes: input arrays, they are also the inputs of the measured runs, TensorSpec inputs are run
+                with generated arrays of their shapes
+            device: add the roofline projection of this device for comparison
+            opt_level: onnxruntime graph optimization level: disable, basic, extended or all
+    '''
+    from .measure import measure_profile, print_measured_profile
+    model = loadmodel(m, mcfg)
+    g = model.graph
+    g.graph_reorder_nodes()
+    g.shape_infer(dynamic_shapes)
+    g.profile()
+    if device is not None:
+        g.roofline(device)
+    gtmr = timer()
+    gtmr.start()
+    measure_profile(g, model.mproto, dynamic_shapes, runs=runs, opt_level=opt_level)
+    g.log(f'measured with onnxruntime, time cost {gtmr.stop():.3f} s')
+    print_measured_profile(g, save_profile, exclude_ops=hidden_ops)
+
+
+def model_batch_profile(folder: str, outdir: str, dynamic_shapes: {str: numpy.ndarray} = None, workers: int = None,
+                        timeout: float = 600, memory_limit: float = None, mcfg={}, retry_failed: bool = False,
+                        save_summary: str = None):
+    '''
+        Profile all ONNX models under folder in parallel, tables and a resumable manifest.json are saved to outdir.
+        Run it again with the same outdir to resume an interrupted run.
+    '''
+    from .batch import BatchProfiler, print_manifest
+    profiler = BatchProfiler(folder, outdir, workers=workers, timeout=timeout, memory_limit=memory_limit,
+                             dynamic_shapes=dynamic_shapes, mcfg=mcfg, retry_failed=retry_failed)
+    manifest = profiler.run()
+    print_manifest(manifest, save_summary)
+    return manifest
+
+
+def model_profile_diff(m0, m1, dynamic_shapes: {str: numpy.ndarray} = None, device=None, thresholds: {} = None,
+                       save_diff: str = None, changed_only: bool = True, mcfg={'verbose': False}):
+    '''
+        Profile two versions of a model and print the per-node and per-op-type deltas of MACs, memory, params and
+        projected latency(with device).
+        Args:
+            m0: the old model, onnx.ModelProto or file path
+            m1: the new model
+            thresholds: {metric: max relative increase}, metric: MACs, Memory, Params or Latency
+        Returns:
+            the onnx_tool.diff.ProfileDiff and the threshold violations
+    '''
+    from .diff import ProfileDiff
+    graphs = []
+    for m in (m0, m1):
+        g = loadmodel(m, mcfg).graph
+        g.graph_reorder_nodes()
+        g.shape_infer(dynamic_shapes)
+        g.profile()
+        if device is not None:
+            g.roofline(device)
+        graphs.append(g)
+    diff = ProfileDiff(graphs[0], graphs[1])
+    diff.print_diff(save_diff, changed_only)
+    violations = diff.check(thresholds) if thresholds is not None else []
+    for v in violations:
+        print(f'Threshold violated: {v}')
+    return diff, violations
+
+
 def model_shape_regress(m, input_desc: {}, input_range: {}):
     model = loadmodel(m)
     graph = model.graph
@@ -154,6 +261,7 @@ def model_io_modify(m, save_model: str, custom_io):
                         if nb.HasField('dim_value'):
                             nb.ClearField('dim_value')
                         nb.dim_param = shapeval
+    from .graph import Graph
     graph = Graph(graph,utils.ModelConfig({'verbose':True}))
     graph.save_model(save_model, rawmodel=model.mproto)
 
@@ -168,6 +276,7 @@ def model_subgraph(m, in_tensor_names: [str] = None, out_tensor_names: [str] = N
         graph_lvl1.save_model(os.path.join(save_folder, model.modelname + '_level1.onnx'), rawmodel=model.mproto)
         graph_lvl2.save_model(os.path.join(save_folder, model.modelname + '_level2.onnx'), rawmodel=model.mproto)
     if nodenames is not None:
+        from .graph import Graph
         rawgraph = graph.get_onnxgraph_by_nodenames(nodenames)
         subgraph = Graph(rawgraph)
         subgraph.save_model(os.path.join(save_folder, model.modelname + '_subgraph.onnx'), rawmodel=model.mproto)
@@ -1,8 +1,7 @@
 import argparse
 
-import numpy
-
 import onnx_tool
+from onnx_tool.device import Devices
 
 
 def get_parser():
@@ -12,12 +11,13 @@ def get_parser():
     )
     parser.add_argument(
         "-m", "--mode",
-        choices=['profile', 'export_tensors', 'constant_folding', 'io_modify'],
+        choices=['profile', 'export_tensors', 'constant_folding', 'io_modify', 'calibrate', 'op_benchmark',
+                 'measure', 'batch', 'diff'],
         default='profile',
         help="rm_iden: remove Identity layers")
     parser.add_argument(
-        "-i", "--in", dest='in_', required=True,
-        help="path of input ONNX model")
+        "-i", "--in", dest='in_', default=None,
+        help="path of input ONNX model, required by all modes except calibrate and op_benchmark. batch: model folder")
     parser.add_argument(
         "-o", "--out",
         help="path to save the ONNX model with shapes")
@@ -40,15 +40,75 @@ def get_parser():
         help="path to save the ONNX model with shapes")
     parser.add_argument(
         "-f", "--file", default=None,
-        help="file to store the MACs result for each node. None: print to console.")
+        help="file to store the MACs result for each node(.txt, .csv or .json). None: print to console.")
+    parser.add_argument(
+        "--device", default=None,
+        help=f"project per-node latency with the roofline model of this device: {', '.join(Devices.keys())} "
+             f"or a calibrated device. calibrate mode: the name to save this host as")
+    parser.add_argument(
+        "--latency_table", default=None,
+        help="op latency table file created by op_benchmark mode, adds a measured Latency column to the profile")
+    parser.add_argument(
+        "--dedup_blocks", action='store_true',
+        help="infer and profile repeated blocks(e.g. transformer layers) once, the profile rolls them up into one "
+             "row per node of each block class")
+    parser.add_argument(
+        "--expand_blocks", action='store_true',
+        help="with --dedup_blocks, print every node instead of the block rollup")
+    parser.add_argument(
+        "--rollup", nargs='?', const='', default=None,
+        help="also print the profile aggregated by name scope, op type and --groups, or save it to this file"
+             "(.json, .csv or .txt)")
+    parser.add_argument(
+        "--rollup_depth", type=int, default=3,
+        help="deepest name scope level of the rollup")
+    parser.add_argument(
+        "--groups", nargs='+', default=None,
+        help="regex groups of the rollup as: --groups attention=self_attn mlp='mlp|ffn', a node is in the first "
+             "group whose regex matches its name")
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="batch mode: number of worker processes, default: cpu count")
+    parser.add_argument(
+        "--timeout", type=float, default=600,
+        help="batch mode: seconds per model before its worker is killed")
+    parser.add_argument(
+        "--memory_limit", type=float, default=None,
+        help="batch mode: memory limit(MB) of each worker")
+    parser.add_argument(
+        "--retry_failed", action='store_true',
+        help="batch mode: profile the failed models of the manifest again")
+    parser.add_argument(
+        "--compare", default=None,
+        help="diff mode: the new model, -i is the old one")
+    parser.add_argument(
+        "--threshold", nargs='+', default=None,
+        help="diff mode: max relative increase of the total and every op type as: --threshold MACs=0.01 Latency=0.05, "
+             "exit with 1 if exceeded. Metrics: MACs, Memory, Params, Latency(needs --device)")
+    parser.add_argument(
+        "--trace", default=None,
+        help="save a Chrome trace-event JSON of all stages(time and tracemalloc peak) to this file")
+    parser.add_argument(
+        "--runs", type=int, default=10,
+        help="measure mode: number of timed onnxruntime runs")
+    parser.add_argument(
+        "--opt_level", choices=['disable', 'basic', 'extended', 'all'], default='all',
+        help="measure mode: onnxruntime graph optimization level")
     return parser
 
 
 parser = get_parser()
 args = parser.parse_args()
+if args.in_ is None and args.mode not in ('calibrate', 'op_benchmark'):
+    parser.error(f'the following arguments are required for {args.mode} mode: -i/--in')
+if args.trace is not None:
+    from onnx_tool.tracing import enable_tracing
+
+    tracer = enable_tracing()
 
 
 def __str2numpytype__(strtype):
+    import numpy
     if strtype == 'f32':
         return numpy.float32
     if strtype == 'int32':
@@ -64,6 +124,8 @@ def __str2list__(strshape, type):
 
 
 def __args2dynamicshapes__(args: [str]):
+    import numpy
+    from .tensor import TensorSpec
     dic = {}
     for arg in args:
         strs = arg.split(':')
@@ -72,7 +134,8 @@ def __args2dynamicshapes__(args: [str]):
         if len(strs) > 3:
             arr = numpy.array(__str2list__(strs[3], dtype), dtype=dtype).reshape(shape)
         else:
-            arr = numpy.zeros(shape, dtype=dtype)
+            # shape inference needs no data
+            arr = TensorSpec(shape, dtype)
         dic[strs[0]] = arr
     return dic
 
@@ -90,7 +153,53 @@ if args.mode == 'profile':
         dynamic = __args2dynamicshapes__(args.dynamic_shapes)
     else:
         dynamic = None
-    onnx_tool.model_profile(args.in_, dynamic, save_profile=args.file, save_model=args.out)
+    groups = None
+    if args.groups is not None:
+        groups = {}
+        for item in args.groups:
+            key, value = item.split('=', 1)
+            groups[key] = value
+    onnx_tool.model_profile(args.in_, dynamic, save_profile=args.file, save_model=args.out, device=args.device,
+                            latency_table=args.latency_table, mcfg={'verbose': False, 'dedup_blocks': args.dedup_blocks},
+                            rollup_blocks=args.dedup_blocks and not args.expand_blocks,
+                            rollup=args.rollup is not None, save_rollup=args.rollup if args.rollup else None,
+                            rollup_depth=args.rollup_depth, rollup_groups=groups)
+elif args.mode == 'measure':
+    if args.dynamic_shapes is not None:
+        dynamic = __args2dynamicshapes__(args.dynamic_shapes)
+    else:
+        dynamic = None
+    onnx_tool.model_measure(args.in_, dynamic, save_profile=args.file, device=args.device, runs=args.runs,
+                            opt_level=args.opt_level)
+elif args.mode == 'batch':
+    if args.out is None:
+        parser.error('batch mode requires -o/--out: the results folder')
+    if args.dynamic_shapes is not None:
+        dynamic = __args2dynamicshapes__(args.dynamic_shapes)
+    else:
+        dynamic = None
+    manifest = onnx_tool.model_batch_profile(args.in_, args.out, dynamic, workers=args.workers, timeout=args.timeout,
+                                             memory_limit=args.memory_limit, retry_failed=args.retry_failed,
+                                             save_summary=args.file)
+    if manifest['summary'].get('ok', 0) != manifest['summary']['models']:
+        exit(1)
+elif args.mode == 'diff':
+    if args.compare is None:
+        parser.error('diff mode requires --compare: the new model')
+    if args.dynamic_shapes is not None:
+        dynamic = __args2dynamicshapes__(args.dynamic_shapes)
+    else:
+        dynamic = None
+    thresholds = None
+    if args.threshold is not None:
+        thresholds = {}
+        for item in args.threshold:
+            key, value = item.split('=')
+            thresholds[key] = float(value)
+    _, violations = onnx_tool.model_profile_diff(args.in_, args.compare, dynamic, device=args.device,
+                                                 thresholds=thresholds, save_diff=args.file)
+    if len(violations) > 0:
+        exit(1)
 elif args.mode == 'export_tensors':
     onnx_tool.model_export_tensors_numpy(args.in_, tensornames=args.names, savefolder=args.out, fp16=args.fp16)
 elif args.mode == 'constant_folding':
@@ -99,3 +208,18 @@ elif args.mode == 'io_modify':
     if args.dynamic_shapes is not None:
         shapedic = __args2strshapes__(args.dynamic_shapes)
         onnx_tool.model_io_modify(args.in_, args.out, shapedic)
+elif args.mode == 'calibrate':
+    from onnx_tool.calibration import calibrate_device
+
+    name, _ = calibrate_device(args.device, args.out)
+    print(f'Device {name} is saved')
+elif args.mode == 'op_benchmark':
+    from onnx_tool.oplatency import run_benchmarks
+
+    table = run_benchmarks()
+    table.save(args.out)
+
+if args.trace is not None:
+    tracer.save(args.trace)
+    for name, seconds, mem_peak in tracer.stages():
+        print(f'{name}: {seconds:.3f} s, peak {mem_peak:.1f} MB')
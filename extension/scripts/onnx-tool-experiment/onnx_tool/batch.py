@@ -0,0 +1,268 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+import traceback
+import warnings
+from multiprocessing.connection import wait
+
+from .utils import VERSION
+
+'''
+Profile every ONNX model of a directory tree in a pool of worker processes.
+Each model runs in its own process with a timeout and an address space limit, so a bad model can't abort the run.
+A manifest(JSON) records the hash, status, stage timings and totals of every model. It's rewritten after every model,
+an interrupted run started again with the same manifest skips the models that are already finished.
+'''
+
+MANIFEST_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+# statuses of finished models, 'ok' models are skipped when resuming, failed ones too unless retry_failed is set
+STATUS_OK = 'ok'
+FAILED_STATUS = ('error', 'timeout', 'memory', 'crashed')
+
+
+def file_sha256(path: str, chunk: int = 1 << 20):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as fp:
+        while True:
+            data = fp.read(chunk)
+            if len(data) == 0:
+                break
+            sha.update(data)
+    return sha.hexdigest()
+
+
+def find_models(folder: str):
+    models = []
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        for f in sorted(files):
+            if f.endswith('.onnx') and not f.endswith('_shapes_only.onnx'):
+                models.append(os.path.relpath(os.path.join(root, f), folder))
+    return models
+
+
+def load_manifest(path: str):
+    if not os.path.exists(path):
+        return {'version': MANIFEST_VERSION, 'models': {}}
+    with open(path) as fp:
+        manifest = json.load(fp)
+    if manifest.get('version') != MANIFEST_VERSION:
+        warnings.warn(f'Manifest {path} has version {manifest.get("version")}, all models will be profiled again.')
+        return {'version': MANIFEST_VERSION, 'models': {}}
+    return manifest
+
+
+def save_manifest(manifest: {}, path: str):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as fp:
+        json.dump(manifest, fp, indent=1)
+    os.replace(tmp, path)
+
+
+def _limit_memory(limit_mb):
+    if limit_mb is None:
+        return
+    try:
+        import resource
+    except ImportError:
+        warnings.warn('Memory limits need the resource module(POSIX), running without a limit.')
+        return
+    nbytes = int(limit_mb * 1024 * 1024)
+    resource.setrlimit(resource.RLIMIT_AS, (nbytes, nbytes))
+
+
+def profile_one(path: str, profile_path: str, dynamic_shapes: {} = None, mcfg: {} = None,
+                hidden_ops=None):
+    '''
+        Profile one model and save its table, raises on failures.
+        Returns:
+            seconds of each stage, totals of the profile
+    '''
+    from . import Model, NoMacsOps
+    hidden_ops = NoMacsOps if hidden_ops is None else hidden_ops
+    seconds = {}
+    startt = time.perf_counter()
+    model = Model(path, {} if mcfg is None else mcfg)
+    if not model.valid:
+        raise ValueError(f'Invalid onnx model file: {path}')
+    g = model.graph
+    seconds['load'] = time.perf_counter() - startt
+    tm = time.perf_counter()
+    g.graph_reorder_nodes()
+    inputs = None
+    if dynamic_shapes is not None:
+        inputs = {k: v for k, v in dynamic_shapes.items() if k in g.input}
+    g.shape_infer(inputs)
+    seconds['shape_infer'] = time.perf_counter() - tm
+    tm = time.perf_counter()
+    g.profile()
+    seconds['profile'] = time.perf_counter() - tm
+    tm = time.perf_counter()
+    os.makedirs(os.path.dirname(profile_path), exist_ok=True)
+    g.print_node_map(profile_path, exclude_ops=hidden_ops)
+    seconds['print_node_map'] = time.perf_counter() - tm
+    seconds['total'] = time.perf_counter() - startt
+    totals = {
+        'nodes': len(g.nodemap),
+        'macs': int(round(g.macs[0])),
+        'memory': int(g.memory),
+        'params': int(g.params),
+    }
+    return seconds, totals
+
+
+def _worker(conn, path, profile_path, dynamic_shapes, mcfg, memory_limit):
+    try:
+        _limit_memory(memory_limit)
+        seconds, totals = profile_one(path, profile_path, dynamic_shapes, mcfg)
+        conn.send({'status': STATUS_OK, 'seconds': seconds, 'totals': totals})
+    except MemoryError:
+        conn.send({'status': 'memory', 'error': f'exceeded the memory limit of {memory_limit} MB'})
+    except BaseException as e:
+        conn.send({'status': 'error', 'error': f'{type(e).__name__}: {e}',
+                   'traceback': traceback.format_exc(limit=-4)})
+    finally:
+        conn.close()
+
+
+class BatchProfiler():
+    def __init__(self, folder: str, outdir: str, workers: int = None, timeout: float = 600,
+                 memory_limit: float = None, dynamic_shapes: {} = None, mcfg: {} = None,
+                 profile_format: str = 'csv', manifest: str = None, retry_failed: bool = False,
+                 verbose: bool = True):
+        '''
+            Args:
+                folder: directory searched recursively for *.onnx
+                outdir: profile tables are saved here with the same relative paths
+                workers: number of worker processes, None: cpu count
+                timeout: seconds of each model before its worker is killed
+                memory_limit: address space limit of each worker in MB, None: no limit
+                dynamic_shapes: input arrays used by models that have these inputs
+                profile_format: 'csv' or 'txt'
+                manifest: manifest file, None: outdir/manifest.json
+                retry_failed: profile the failed models of the manifest again
+        '''
+        self.folder = folder
+        self.outdir = outdir
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.dynamic_shapes = dynamic_shapes
+        self.mcfg = mcfg
+        self.profile_format = profile_format
+        self.manifest_path = manifest if manifest is not None else os.path.join(outdir, MANIFEST_NAME)
+        self.retry_failed = retry_failed
+        self.verbose = verbose
+
+    def log(self, s):
+        if self.verbose:
+            print(s, flush=True)
+
+    def _file_hash(self, relpath, entry):
+        path = os.path.join(self.folder, relpath)
+        stat = os.stat(path)
+        # reuse the recorded hash of an unchanged file, hashing hundreds of large models is slow
+        if entry is not None and entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime:
+            return entry['sha256'], stat
+        return file_sha256(path), stat
+
+    def _is_done(self, entry, sha256):
+        if entry is None or entry.get('sha256') != sha256 or entry.get('onnx_tool') != VERSION:
+            return False
+        if entry.get('status') == STATUS_OK:
+            return True
+        return entry.get('status') in FAILED_STATUS and not self.retry_failed
+
+    def _profile_path(self, relpath):
+        return os.path.join(self.outdir, os.path.splitext(relpath)[0] + '.' + self.profile_format)
+
+    def run(self):
+        '''
+            Returns:
+                the manifest dict
+        '''
+        os.makedirs(self.outdir, exist_ok=True)
+        manifest = load_manifest(self.manifest_path)
+        manifest['root'] = os.path.abspath(self.folder)
+        entries = manifest['models']
+        pending = []
+        for relpath in find_models(self.folder):
+            sha256, stat = self._file_hash(relpath, entries.get(relpath))
+            if self._is_done(entries.get(relpath), sha256):
+                continue
+            entries[relpath] = {'sha256': sha256, 'size': stat.st_size, 'mtime': stat.st_mtime,
+                                'onnx_tool': VERSION, 'status': 'pending'}
+            pending.append(relpath)
+        save_manifest(manifest, self.manifest_path)
+        self.log(f'{len(pending)} models to profile, {len(entries) - len(pending)} already in {self.manifest_path}')
+
+        running = {}
+        total = len(pending)
+        finished = 0
+        pending.reverse()
+        while len(pending) > 0 or len(running) > 0:
+            while len(pending) > 0 and len(running) < self.workers:
+                relpath = pending.pop()
+                recv, send = multiprocessing.Pipe(duplex=False)
+                proc = multiprocessing.Process(target=_worker, args=(
+                    send, os.path.join(self.folder, relpath), self._profile_path(relpath), self.dynamic_shapes,
+                    self.mcfg, self.memory_limit), daemon=True)
+                proc.start()
+                send.close()
+                running[recv] = (proc, relpath, time.time())
+
+            ready = wait(list(running.keys()), timeout=0.5)
+            now = time.time()
+            for conn in list(running.keys()):
+                proc, relpath, startt = running[conn]
+                result = None
+                if conn in ready:
+                    try:
+                        result = conn.recv()
+                    except EOFError:
+                        proc.join()
+                        result = {'status': 'crashed', 'error': f'worker exited with code {proc.exitcode}'}
+                elif now - startt > self.timeout:
+                    proc.terminate()
+                    result = {'status': 'timeout', 'error': f'killed after {self.timeout} s'}
+                if result is None:
+                    continue
+                conn.close()
+                proc.join()
+                running.pop(conn)
+                finished += 1
+                result['wall_seconds'] = round(now - startt, 3)
+                if result['status'] == STATUS_OK:
+                    result['profile'] = os.path.relpath(self._profile_path(relpath), self.outdir)
+                entries[relpath].update(result)
+                save_manifest(manifest, self.manifest_path)
+                self.log(f'[{finished}/{total}] {relpath}: {result["status"]} {result["wall_seconds"]:.1f} s'
+                         + ('' if result['status'] == STATUS_OK else f' {result.get("error", "")}'))
+
+        manifest['summary'] = self.summary(manifest)
+        save_manifest(manifest, self.manifest_path)
+        return manifest
+
+    @staticmethod
+    def summary(manifest: {}):
+        summary = {'models': len(manifest['models'])}
+        for entry in manifest['models'].values():
+            summary[entry['status']] = summary.get(entry['status'], 0) + 1
+        return summary
+
+
+def print_manifest(manifest: {}, f: str = None):
+    from .utils import num2str, print_table
+    csvformat = f is not None and '.csv' in f
+    ptable = []
+    for relpath, entry in manifest['models'].items():
+        totals = entry.get('totals', {})
+        row = [relpath, entry['status'], '{:.2f}'.format(entry.get('wall_seconds', 0))]
+        for key in ('nodes', 'macs', 'memory', 'params'):
+            row.append(num2str(totals[key], csvformat) if key in totals else '_')
+        row.append(entry.get('error', '_').replace(',', ';') if csvformat else entry.get('error', '_')[:80])
+        ptable.append(row)
+    print_table(ptable, ['Model', 'Status', 'Seconds', 'Nodes', 'Forward_MACs', 'Memory', 'Params', 'Error'], f)
@@ -0,0 +1,173 @@
+import hashlib
+import re
+
+import numpy
+
+from .tensor import STATIC_TENSOR, volume
+
+'''
+Repeated block detection, e.g. the decoder layers of a transformer export.
+Nodes are grouped into blocks by the first number of their names('model.layers.12.mlp.up_proj',
+'/model/layers.12/self_attn/MatMul', 'transformer.h.3.attn'), blocks with the same name template are hashed by their
+structure: op types, attributes, internal edges, and the shapes(values of shape-like ones) of static inputs. Blocks with the
+same hash are isomorphic, the first one is the representative of its class.
+Graph.shape_infer copies the output tensors of the representative to a clone block if their external inputs match,
+and Graph.profile copies the MACs of the representative nodes, so each class is evaluated once.
+'''
+
+_BLOCK_NAME = re.compile(r'^(\D*?)(\d+)')
+# values of integer tensors and tiny float tensors(e.g. Resize scales) take part in the hash and the input check,
+# they may decide shapes. Other tensors are compared by shape and data type.
+SMALL_TENSOR_SIZE = 1024
+TINY_TENSOR_SIZE = 8
+MIN_BLOCK_NODES = 2
+# attributes that only number the layer(llm.Builder attention ops), they don't change shapes or MACs
+INDEX_ATTRS = ('layer_i',)
+
+
+def _value_key(value):
+    if isinstance(value, numpy.ndarray):
+        return ('ndarray', value.shape, str(value.dtype), hashlib.md5(value.tobytes()).hexdigest())
+    if hasattr(value, 'SerializeToString'):
+        return ('proto', hashlib.md5(value.SerializeToString()).hexdigest())
+    if isinstance(value, (list, tuple)):
+        return tuple(_value_key(v) for v in value)
+    if isinstance(value, bytes):
+        return value
+    return repr(value)
+
+
+def _value_matters(tensor):
+    size = volume(tensor.get_shape())
+    if numpy.issubdtype(numpy.dtype(tensor.dtype), numpy.integer):
+        return size <= SMALL_TENSOR_SIZE
+    return size <= TINY_TENSOR_SIZE
+
+
+def _static_key(tensor):
+    shape = tuple(tensor.get_shape())
+    if tensor.numpy is not None and _value_matters(tensor):
+        return ('w', shape, _value_key(tensor.numpy))
+    return ('w', shape, str(numpy.dtype(tensor.dtype)))
+
+
+def _same_tensor(t0, t1):
+    if t0.get_shape() != t1.get_shape() or numpy.dtype(t0.dtype) != numpy.dtype(t1.dtype):
+        return False
+    if _value_matters(t0) and (t0.numpy is not None or t1.numpy is not None):
+        if t0.numpy is None or t1.numpy is None:
+            return False
+        return numpy.array_equal(t0.numpy, t1.numpy)
+    return True
+
+
+class BlockIndex():
+    def __init__(self, graph):
+        '''
+            Args:
+                graph: a Graph in topological order(graph_reorder_nodes())
+        '''
+        names = list(graph.nodemap.keys())
+        self.order = {name: i for i, name in enumerate(names)}
+        blocks = {}
+        templates = {}
+        for name in names:
+            m = _BLOCK_NAME.match(name)
+            if m is None:
+                continue
+            key = m.group(0)
+            if key not in blocks:
+                blocks[key] = []
+                templates.setdefault(m.group(1), []).append(key)
+            blocks[key].append(name)
+
+        self.blocks = {}
+        self.external = {}
+        self.classes = []
+        self.rep_of = {}
+        self.node_block = {}
+        for template, keys in templates.items():
+            keys = [k for k in keys if len(blocks[k]) >= MIN_BLOCK_NODES]
+            if len(keys) < 2:
+                continue
+            hashes = {}
+            for key in keys:
+                signature, external = self._signature(graph, blocks[key])
+                if signature is None:
+                    continue
+                self.blocks[key] = blocks[key]
+                self.external[key] = external
+                hashes.setdefault(hashlib.md5(repr(signature).encode()).hexdigest(), []).append(key)
+            for members in hashes.values():
+                if len(members) < 2:
+                    continue
+                members.sort(key=lambda k: self.order[self.blocks[k][0]])
+                rep = members[0]
+                rep_last = self.order[self.blocks[rep][-1]]
+                clones = []
+                for key in members[1:]:
+                    first = self.order[self.blocks[key][0]]
+                    if rep_last > first:
+                        continue
+                    clones.append(key)
+                    self.rep_of[key] = rep
+                    for name in self.blocks[key]:
+                        self.node_block[name] = key
+                if len(clones) > 0:
+                    self.classes.append([rep] + clones)
+
+    def _signature(self, graph, names):
+        '''
+            Returns:
+                the structural signature of the block and its external dynamic inputs in canonical order,
+                None if the block's external inputs aren't all produced before its first node
+        '''
+        local = {}
+        for i, name in enumerate(names):
+            for j, output in enumerate(graph.nodemap[name].output):
+                local[output] = (i, j)
+        first = self.order[names[0]]
+        external = []
+        external_index = {}
+        signature = []
+        for name in names:
+            node = graph.nodemap[name]
+            inputs = []
+            for input in node.input:
+                if input == '':
+                    inputs.append(('',))
+                elif input in local:
+                    inputs.append(('n',) + local[input])
+                elif graph.tensormap[input].type == STATIC_TENSOR and input not in graph.producedby:
+                    inputs.append(_static_key(graph.tensormap[input]))
+                else:
+                    for producer in graph.producedby.get(input, []):
+                        if self.order[producer] > first:
+                            return None, None
+                    if input not in external_index:
+                        external_index[input] = len(external)
+                        external.append(input)
+                    inputs.append(('x', external_index[input]))
+            attrs = tuple(sorted((k, _value_key(v)) for k, v in node.attr.items() if k not in INDEX_ATTRS))
+            signature.append((node.op_type, attrs, tuple(inputs), len(node.output)))
+        return tuple(signature), external
+
+    def copy_block(self, graph, key):
+        '''
+            Copy the inferred output tensors of the representative to the clone block key, the clone gets its own
+            arrays, a later in-place update of one block's values does not change the other's.
+            Returns:
+                False if the external inputs differ from the representative's, nothing is changed then
+        '''
+        rep = self.rep_of[key]
+        for t0, t1 in zip(self.external[rep], self.external[key]):
+            if not _same_tensor(graph.tensormap[t0], graph.tensormap[t1]):
+                return False
+        for src, dst in zip(self.blocks[rep], self.blocks[key]):
+            for o0, o1 in zip(graph.nodemap[src].output, graph.nodemap[dst].output):
+                t0 = graph.tensormap[o0]
+                t1 = graph.tensormap[o1]
+                t1.update_shape(list(t0.shape))
+                t1.update_dtype(t0.dtype)
+                t1.numpy = t0.numpy.copy() if isinstance(t0.numpy, numpy.ndarray) else t0.numpy
+        return True
@@ -0,0 +1,202 @@
+import os
+import platform
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+
+from .device import save_device
+from .utils import timer
+
+'''
+Measure the sustained peaks of the host CPU, so that roofline and LLM profiles can use this machine as a device.
+MatMul throughput is measured with NumPy(BLAS) kernels and with onnxruntime's CPU provider if it's installed,
+the best result of all sizes and thread counts is kept as the peak of each data type. NumPy has no FP16 and INT8
+kernels, it emulates them far below the hardware peak, so these results are kept for reference but never become a
+peak: without an onnxruntime measurement the device has no FP16 or INT8 peak and roofline uses its FP32 peak.
+Memory bandwidth is measured with a large copy split over each thread count, one core can not saturate the memory
+of most hosts, the best result is kept.
+'''
+
+DefaultSizes = (256, 512, 1024, 2048)
+# NumPy has no BLAS kernel for FP16 and INT8, larger sizes only waste time
+NumpyLowPrecisionMaxSize = 512
+# the data types NumPy emulates, see the module docstring
+NumpyEmulatedTypes = ('FP16', 'INT8')
+# the bytes of the memory bandwidth copy, far larger than the caches
+BandwidthBytes = 256 * 1024 * 1024
+
+
+def _best_time(func, repeat):
+    func()  # warm up
+    tm = timer()
+    best = None
+    for i in range(repeat):
+        tm.start()
+        func()
+        t = tm.stop()
+        best = t if best is None else min(best, t)
+    return max(best, 1e-9)
+
+
+def _thread_counts():
+    ncpu = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 < ncpu:
+        counts.append(counts[-1] * 2)
+    if ncpu > 1:
+        counts.append(ncpu)
+    return counts
+
+
+def numpy_matmul_gflops(n, dtype, repeat=5):
+    if dtype in (numpy.int8, numpy.uint8):
+        a = numpy.ones((n, n), dtype=dtype)
+        b = numpy.ones((n, n), dtype=dtype)
+        func = lambda: numpy.matmul(a, b, dtype=numpy.int32)
+    else:
+        a = numpy.random.rand(n, n).astype(dtype)
+        b = numpy.random.rand(n, n).astype(dtype)
+        func = lambda: numpy.matmul(a, b)
+    t = _best_time(func, repeat)
+    return 2 * n * n * n / t / 1e9
+
+
+def _ort_matmul_model(dtype):
+    import onnx
+    from .tensor import npdtype2onnxdtype
+    if dtype == numpy.int8:
+        ta = onnx.helper.make_tensor_value_info('A', onnx.TensorProto.UINT8, ['M', 'K'])
+        tb = onnx.helper.make_tensor_value_info('B', onnx.TensorProto.INT8, ['K', 'N'])
+        to = onnx.helper.make_tensor_value_info('C', onnx.TensorProto.INT32, ['M', 'N'])
+        node = onnx.helper.make_node('MatMulInteger', ['A', 'B'], ['C'])
+    else:
+        onnxtype = npdtype2onnxdtype(dtype)
+        ta = onnx.helper.make_tensor_value_info('A', onnxtype, ['M', 'K'])
+        tb = onnx.helper.make_tensor_value_info('B', onnxtype, ['K', 'N'])
+        to = onnx.helper.make_tensor_value_info('C', onnxtype, ['M', 'N'])
+        node = onnx.helper.make_node('MatMul', ['A', 'B'], ['C'])
+    graph = onnx.helper.make_graph([node], 'calibration', [ta, tb], [to])
+    model = onnx.helper.make_model(graph, opset_imports=[onnx.helper.make_opsetid('', 13)])
+    model.ir_version = 8
+    return model.SerializeToString()
+
+
+def ort_matmul_gflops(n, dtype, threads, repeat=5):
+    import onnxruntime as ort
+    opts = ort.SessionOptions()
+    opts.intra_op_num_threads = threads
+    opts.inter_op_num_threads = 1
+    sess = ort.InferenceSession(_ort_matmul_model(dtype), opts, providers=['CPUExecutionProvider'])
+    if dtype == numpy.int8:
+        a = numpy.ones((n, n), dtype=numpy.uint8)
+        b = numpy.ones((n, n), dtype=numpy.int8)
+    else:
+        a = numpy.random.rand(n, n).astype(dtype)
+        b = numpy.random.rand(n, n).astype(dtype)
+    feeds = {'A': a, 'B': b}
+    t = _best_time(lambda: sess.run(None, feeds), repeat)
+    return 2 * n * n * n / t / 1e9
+
+
+def memory_bandwidth_gbs(nbytes=BandwidthBytes, threads=1, repeat=5):
+    src = numpy.ones(nbytes // 4, dtype=numpy.float32)
+    dst = numpy.empty_like(src)
+    if threads <= 1:
+        t = _best_time(lambda: numpy.copyto(dst, src), repeat)
+    else:
+        # copyto releases the GIL, each thread copies one contiguous chunk
+        bounds = numpy.linspace(0, src.size, threads + 1).astype(numpy.int64)
+        chunks = [(dst[b:e], src[b:e]) for b, e in zip(bounds[:-1], bounds[1:])]
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            t = _best_time(lambda: list(pool.map(lambda c: numpy.copyto(*c), chunks)), repeat)
+    # one read and one write of every byte
+    return 2 * src.nbytes / t / 1e9
+
+
+def calibrate(sizes=DefaultSizes, threads=None, repeat=5, use_ort=True, verbose=True):
+    '''
+        Args:
+            sizes: square MatMul sizes to measure
+            threads: onnxruntime intra-op and memory copy thread counts, None: 1, 2, 4, ... up to all cores
+            repeat: timed runs of each case, the fastest one is used
+            use_ort: also measure onnxruntime's CPU provider if it's installed
+        Returns:
+            device dict with the same keys as onnx_tool.device.Devices, GFLOPS and GB/s. Data types that only
+            NumPy measured have no peak, they are listed in ['Calibration']['Emulated']
+    '''
+    threads = _thread_counts() if threads is None else threads
+    ort_valid = False
+    if use_ort:
+        try:
+            import onnxruntime  # noqa: F401
+            ort_valid = True
+        except ImportError:
+            warnings.warn('onnxruntime is not installed, calibrate with NumPy kernels only.')
+
+    def log(s):
+        if verbose:
+            print(s)
+
+    results = []
+    peaks = {}
+    emulated = []
+    for key, dtype in (('FP32', numpy.float32), ('FP16', numpy.float16), ('INT8', numpy.int8)):
+        best = 0
+        for n in sizes:
+            if dtype == numpy.float32 or n <= NumpyLowPrecisionMaxSize:
+                gflops = numpy_matmul_gflops(n, dtype, repeat)
+                result = {'Type': key, 'Backend': 'numpy', 'Size': n, 'Threads': 0, 'GFLOPS': gflops}
+                if key in NumpyEmulatedTypes:
+                    result['Emulated'] = True
+                    log(f'{key} numpy MatMul {n}x{n}x{n}: {gflops:.1f} GFLOPS(emulated, not a peak)')
+                else:
+                    log(f'{key} numpy MatMul {n}x{n}x{n}: {gflops:.1f} GFLOPS')
+                    best = max(best, gflops)
+                results.append(result)
+            if not ort_valid:
+                continue
+            for t in threads:
+                try:
+                    gflops = ort_matmul_gflops(n, dtype, t, repeat)
+                except Exception as e:
+                    # e.g. no FP16 MatMul kernel of this CPU
+                    log(f'{key} onnxruntime MatMul is not available: {str(e)[:100]}')
+                    break
+                results.append({'Type': key, 'Backend': 'onnxruntime', 'Size': n, 'Threads': t, 'GFLOPS': gflops})
+                log(f'{key} onnxruntime MatMul {n}x{n}x{n} threads={t}: {gflops:.1f} GFLOPS')
+                best = max(best, gflops)
+        if best > 0:
+            peaks[key] = round(best, 1)
+        else:
+            emulated.append(key)
+            log(f'{key} has no measured peak, roofline uses the FP32 peak for it')
+    bandwidth = 0
+    for t in threads:
+        gbs = memory_bandwidth_gbs(BandwidthBytes, t, repeat)
+        results.append({'Type': 'Bandwidth', 'Backend': 'numpy', 'Size': BandwidthBytes, 'Threads': t, 'GB/s': gbs})
+        log(f'Memory bandwidth threads={t}: {gbs:.1f} GB/s')
+        bandwidth = max(bandwidth, gbs)
+    device = dict(peaks)
+    device['Bandwidth'] = round(bandwidth, 1)
+    device['Calibration'] = {
+        'Host': platform.node(),
+        'Processor': platform.processor(),
+        'Cores': os.cpu_count(),
+        'Date': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'Emulated': emulated,
+        'Results': results,
+    }
+    return device
+
+
+def calibrate_device(name: str = None, path: str = None, **kwargs):
+    '''
+        Calibrate this host and save it to the local device registry(onnx_tool.device.DEVICE_REGISTRY by default),
+        then the device can be used by name, e.g. Graph.roofline(name) or Builder.profile(cfg, name).
+    '''
+    name = 'Host-' + platform.node() if name is None else name
+    device = calibrate(**kwargs)
+    save_device(name, device, path)
+    return name, device
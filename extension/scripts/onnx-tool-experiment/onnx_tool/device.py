@@ -1,3 +1,9 @@
+import json
+import os
+
+# local registry of measured devices, see onnx_tool.calibration
+DEVICE_REGISTRY = os.environ.get('ONNX_TOOL_DEVICES', os.path.join(os.path.expanduser('~'), '.onnx_tool', 'devices.json'))
+
 Devices = {
     'Core-13900':
         {
@@ -66,3 +72,58 @@ Devices = {
         'Bandwidth': 900,
     },
 }
+
+
+def load_devices(path: str = None):
+    path = DEVICE_REGISTRY if path is None else path
+    if not os.path.exists(path):
+        return {}
+    with open(path) as fp:
+        return json.load(fp)
+
+
+def save_device(name: str, device: {}, path: str = None):
+    path = DEVICE_REGISTRY if path is None else path
+    devices = load_devices(path)
+    devices[name] = device
+    folder = os.path.dirname(path)
+    if folder != '':
+        os.makedirs(folder, exist_ok=True)
+    with open(path, 'w') as fp:
+        json.dump(devices, fp, indent=2)
+
+
+def _measured_peaks(device: {}):
+    '''
+        Returns:
+            a calibrated device without the peaks that only NumPy emulation measured, older calibrate() versions
+            saved them as peaks
+    '''
+    calibration = device.get('Calibration')
+    if calibration is None:
+        return device
+    emulated = set(calibration.get('Emulated', []))
+    results = calibration.get('Results', [])
+    for key in ('FP16', 'INT8'):
+        typed = [r for r in results if r.get('Type') == key]
+        if len(typed) > 0 and all(r.get('Backend') == 'numpy' for r in typed):
+            emulated.add(key)
+    return {k: v for k, v in device.items() if k not in emulated}
+
+
+def get_device(device):
+    '''
+        Args:
+            device: a device name of Devices or the local registry, or a dict with the same keys,
+                e.g. {'FP32': 1000, 'Bandwidth': 50}
+        Returns:
+            device dict, peak compute in GFLOPS and bandwidth in GB/s
+    '''
+    if isinstance(device, dict):
+        return device
+    local = load_devices()
+    if device in local:
+        return _measured_peaks(local[device])
+    if device in Devices:
+        return Devices[device]
+    raise KeyError(f"No device named '{device}', available devices: {list(Devices.keys()) + list(local.keys())}")
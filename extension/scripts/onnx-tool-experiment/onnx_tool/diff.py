@@ -0,0 +1,258 @@
+import bisect
+import os
+import warnings
+
+from .utils import num2str, print_table
+
+'''
+Per-layer profile diff of two versions of a model.
+Nodes are aligned by name first. The remaining nodes are aligned by their structural signature(op type and input
+shapes), a node is paired with the unmatched node of the same signature at the closest relative position in the
+topological order. Nodes left over are reported as added or removed.
+'''
+
+Metrics = ('MACs', 'Memory', 'Params', 'Latency')
+
+
+def _node_metrics(graph, node):
+    return {
+        'MACs': node.macs[0],
+        'Memory': node.memory,
+        'Params': node.params,
+        'Latency': node.roofline['latency'][2] if graph.valid_roofline else 0,
+    }
+
+
+def _signature(graph, node):
+    shapes = []
+    for input in node.input:
+        if input == '' or input not in graph.tensormap:
+            shapes.append(())
+        else:
+            shapes.append(tuple(graph.tensormap[input].get_shape()))
+    return (node.op_type, tuple(shapes))
+
+
+def _find(links, i):
+    root = i
+    while links[root] != root:
+        root = links[root]
+    while links[i] != root:
+        links[i], i = root, links[i]
+    return root
+
+
+class _Candidates():
+    '''
+        The unmatched nodes of one signature of the old graph, in topological order. take() pairs the node closest to
+        a relative position with a bisect, taken nodes are skipped by path-compressed links to the next free node on
+        either side.
+    '''
+
+    def __init__(self):
+        self.names = []
+        self.positions = []
+        self.right = None
+        self.left = None
+        self.free = 0
+
+    def append(self, name, position):
+        self.names.append(name)
+        self.positions.append(position)
+        self.free += 1
+
+    def take(self, position):
+        n = len(self.names)
+        if self.right is None:
+            # right[i]: the first free node from i, n when none. left[i]: the first free node before i plus one, 0
+            # when none
+            self.right = list(range(n + 1))
+            self.left = list(range(n + 1))
+        i = bisect.bisect_left(self.positions, position)
+        after = _find(self.right, i)
+        before = _find(self.left, i) - 1
+        # the earlier node wins a tie
+        if before >= 0 and (after == n or position - self.positions[before] <= self.positions[after] - position):
+            best = before
+        else:
+            best = after
+        self.right[best] = best + 1
+        self.left[best + 1] = best
+        self.free -= 1
+        return self.names[best]
+
+
+def align_nodes(g0, g1):
+    '''
+        Returns:
+            [(name0 or None, name1 or None, match)], match: 'name', 'signature', 'removed' or 'added'.
+            Pairs are in the topological order of g1, removed nodes follow their position in g0.
+    '''
+    names0 = list(g0.nodemap.keys())
+    names1 = list(g1.nodemap.keys())
+    index0 = {name: i for i, name in enumerate(names0)}
+    pos0 = {name: i / max(len(names0) - 1, 1) for i, name in enumerate(names0)}
+    pos1 = {name: i / max(len(names1) - 1, 1) for i, name in enumerate(names1)}
+    pair0 = {}
+    match = {}
+    for name in names1:
+        if name in g0.nodemap:
+            pair0[name] = name
+            match[name] = 'name'
+
+    unmatched0 = {}
+    for name in names0:
+        if name not in g1.nodemap:
+            sig = _signature(g0, g0.nodemap[name])
+            unmatched0.setdefault(sig, _Candidates()).append(name, pos0[name])
+    for name in names1:
+        if name in pair0:
+            continue
+        candidates = unmatched0.get(_signature(g1, g1.nodemap[name]))
+        if candidates is None or candidates.free == 0:
+            continue
+        pair0[name] = candidates.take(pos1[name])
+        match[name] = 'signature'
+
+    paired0 = set(pair0.values())
+    pairs = []
+    i0 = 0
+    for name in names1:
+        if name in pair0:
+            # emit the removed nodes that come before this node's partner in g0
+            target = index0[pair0[name]]
+            while i0 < target:
+                if names0[i0] not in paired0:
+                    pairs.append((names0[i0], None, 'removed'))
+                i0 += 1
+            pairs.append((pair0[name], name, match[name]))
+        else:
+            pairs.append((None, name, 'added'))
+    for name in names0[i0:]:
+        if name not in paired0:
+            pairs.append((name, None, 'removed'))
+    return pairs
+
+
+class ProfileDiff():
+    def __init__(self, g0, g1):
+        '''
+            Args:
+                g0: the profiled Graph of the old model
+                g1: the profiled Graph of the new model, both after shape_infer() and profile(), roofline() is
+                    optional and adds latency deltas
+        '''
+        self.g0 = g0
+        self.g1 = g1
+        self.has_latency = g0.valid_roofline and g1.valid_roofline
+        self.nodes = []
+        self.op_types = {}
+        self.totals = [{key: 0 for key in Metrics}, {key: 0 for key in Metrics}]
+        for name0, name1, match in align_nodes(g0, g1):
+            m0 = _node_metrics(g0, g0.nodemap[name0]) if name0 is not None else None
+            m1 = _node_metrics(g1, g1.nodemap[name1]) if name1 is not None else None
+            op_type = g1.nodemap[name1].op_type if name1 is not None else g0.nodemap[name0].op_type
+            self.nodes.append({'name0': name0, 'name1': name1, 'op_type': op_type, 'match': match,
+                               'old': m0, 'new': m1})
+        for graph, side in ((g0, 0), (g1, 1)):
+            for key in graph.nodemap:
+                node = graph.nodemap[key]
+                metrics = _node_metrics(graph, node)
+                if node.op_type not in self.op_types:
+                    self.op_types[node.op_type] = [{k: 0 for k in Metrics}, {k: 0 for k in Metrics}, [0, 0]]
+                entry = self.op_types[node.op_type]
+                entry[2][side] += 1
+                for k in Metrics:
+                    entry[side][k] += metrics[k]
+                    self.totals[side][k] += metrics[k]
+
+    def metrics(self):
+        return Metrics if self.has_latency else Metrics[:-1]
+
+    def check(self, thresholds: {}):
+        '''
+            Args:
+                thresholds: {metric: max relative increase}, e.g. {'MACs': 0.01, 'Latency': 0.05}. The total and
+                    every op type are checked, an op type that didn't exist in the old model violates any threshold
+                    of a metric it has.
+            Returns:
+                violation messages, empty if the new model passes
+        '''
+        violations = []
+        for key, limit in thresholds.items():
+            if key not in Metrics:
+                raise ValueError(f'Unknown metric {key}, valid metrics: {Metrics}')
+            if key == 'Latency' and not self.has_latency:
+                warnings.warn('Latency threshold is ignored, profile both models with a device to check it.')
+                continue
+            groups = [('Total', self.totals[0][key], self.totals[1][key])]
+            for op_type, entry in self.op_types.items():
+                groups.append((op_type, entry[0][key], entry[1][key]))
+            for name, old, new in groups:
+                if new <= old:
+                    continue
+                if old == 0:
+                    violations.append(f'{name} {key}: new {new:.6g}, not in the old model')
+                elif (new - old) / old > limit:
+                    violations.append(f'{name} {key}: {old:.6g} -> {new:.6g} (+{(new - old) / old:.2%} > {limit:.2%})')
+        return violations
+
+    def _delta_cells(self, old, new, csvformat):
+        cells = []
+        for k in self.metrics():
+            o = old[k] if old is not None else 0
+            n = new[k] if new is not None else 0
+            if k == 'Latency':
+                cells.extend(['{:.5f}'.format(o), '{:.5f}'.format(n), '{:+.5f}'.format(n - o)])
+            else:
+                cells.extend([num2str(int(o), csvformat), num2str(int(n), csvformat),
+                              ('+' if n - o > 0 else '') + num2str(int(n - o), csvformat)])
+            cells.append('{:+.2%}'.format((n - o) / o) if o != 0 else ('_' if n == 0 else 'new'))
+        return cells
+
+    def _header(self, first):
+        header = list(first)
+        for k in self.metrics():
+            unit = '(ms)' if k == 'Latency' else ''
+            header.extend([f'Old {k}{unit}', f'New {k}{unit}', f'Delta {k}{unit}', f'{k} Change'])
+        return header
+
+    def print_nodes(self, f: str = None, changed_only: bool = True):
+        csvformat = f is not None and '.csv' in f
+        ptable = []
+        for n in self.nodes:
+            if changed_only and n['match'] == 'name' and all([n['old'][k] == n['new'][k] for k in self.metrics()]):
+                continue
+            row = [n['name0'] if n['name0'] is not None else '_', n['name1'] if n['name1'] is not None else '_',
+                   n['op_type'], n['match']]
+            row.extend(self._delta_cells(n['old'], n['new'], csvformat))
+            ptable.append(row)
+        row = ['Total', '_', '_', '_']
+        row.extend(self._delta_cells(self.totals[0], self.totals[1], csvformat))
+        ptable.append(row)
+        print_table(ptable, self._header(['Old Name', 'New Name', 'Type', 'Match']), f)
+
+    def print_op_types(self, f: str = None):
+        csvformat = f is not None and '.csv' in f
+        ptable = []
+        for op_type in sorted(self.op_types.keys()):
+            entry = self.op_types[op_type]
+            row = [op_type, str(entry[2][0]), str(entry[2][1])]
+            row.extend(self._delta_cells(entry[0], entry[1], csvformat))
+            ptable.append(row)
+        row = ['Total', str(len(self.g0.nodemap)), str(len(self.g1.nodemap))]
+        row.extend(self._delta_cells(self.totals[0], self.totals[1], csvformat))
+        ptable.append(row)
+        print_table(ptable, self._header(['Type', 'Old Count', 'New Count']), f)
+
+    def print_diff(self, f: str = None, changed_only: bool = True):
+        '''
+            Print the node table and the op type table, or save them to f and <f name>_op_types<f ext>.
+        '''
+        self.print_nodes(f, changed_only)
+        if f is None:
+            print()
+            self.print_op_types()
+        else:
+            base, ext = os.path.splitext(f)
+            self.print_op_types(base + '_op_types' + ext)
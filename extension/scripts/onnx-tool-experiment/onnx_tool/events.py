@@ -0,0 +1,110 @@
+import json
+import os
+import sys
+import time
+
+'''
+Machine-readable progress of the profiling workflow, read by the QTron extension.
+With the QTRON_EVENTS environment variable set(to anything but 0) the stages, the node progress of shape inference
+and profile, and the files the workflow writes are printed to stdout as JSON lines, between the log lines. Every
+event line starts with PREFIX:
+
+    {"event": "stage", "stage": name, "phase": "start", "t": s}
+    {"event": "stage", "stage": name, "phase": "end", "seconds": s, ["error": message,] "t": s}
+    {"event": "progress", "stage": name, "done": nodes, "total": nodes, "percent": 0-100, "t": s}
+    {"event": "artifact", "kind": kind, "path": absolute path, "t": s}
+
+t is the time since the events were enabled. The stages are the stage spans of onnx_tool.tracing, they are reported
+whether tracing is enabled or not. Artifact kinds: results(the results directory), simplified(the simplified model,
+written to the output path of the script, or over the input without one), profile(the QPROF binary profile), report, rollup, shapes_only, trace, model(the output
+model of simplify_onnx.py).
+Without QTRON_EVENTS every function here is a no-op.
+'''
+
+PREFIX = '@qtron '
+
+_ENABLED = os.environ.get('QTRON_EVENTS', '0') not in ('', '0')
+_ORIGIN = time.perf_counter()
+
+
+def enabled():
+    return _ENABLED
+
+
+def enable(on: bool = True):
+    global _ENABLED, _ORIGIN
+    _ENABLED = on
+    _ORIGIN = time.perf_counter()
+
+
+def emit(event: str, **fields):
+    if not _ENABLED:
+        return
+    record = {'event': event}
+    record.update(fields)
+    record['t'] = round(time.perf_counter() - _ORIGIN, 3)
+    # a single write, the line is never split by other output
+    sys.stdout.write(PREFIX + json.dumps(record) + '\n')
+    sys.stdout.flush()
+
+
+def artifact(kind: str, path: str):
+    emit('artifact', kind=kind, path=os.path.abspath(path))
+
+
+def stage_start(name: str):
+    emit('stage', stage=name, phase='start')
+
+
+def stage_end(name: str, seconds: float, error: str = None):
+    if error is None:
+        emit('stage', stage=name, phase='end', seconds=round(seconds, 6))
+    else:
+        emit('stage', stage=name, phase='end', seconds=round(seconds, 6), error=error)
+
+
+class StageSpan():
+    '''
+        Span of a stage when tracing is off, it reports the stage start and end only.
+    '''
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        stage_start(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        error = None if exc_type is None else f'{exc_type.__name__}: {exc_val}'
+        stage_end(self.name, time.perf_counter() - self.start, error)
+        return False
+
+    def set(self, **kwargs):
+        pass
+
+
+class Progress():
+    '''
+        Node progress of a stage, an event is printed when the percentage changes.
+    '''
+
+    def __init__(self, stage: str, total: int):
+        self.stage = stage
+        self.total = total
+        self.percent = -1
+
+    def update(self, done: int):
+        percent = done * 100 // self.total if self.total > 0 else 100
+        if percent != self.percent:
+            self.percent = percent
+            emit('progress', stage=self.stage, done=done, total=self.total, percent=percent)
+
+
+def progress(stage: str, total: int):
+    '''
+        Returns:
+            a Progress of the stage, None when the events are off
+    '''
+    return Progress(stage, total) if _ENABLED else None
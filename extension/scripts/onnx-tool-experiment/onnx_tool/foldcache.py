@@ -0,0 +1,115 @@
+import hashlib
+import os
+
+import numpy
+
+'''
+Disk cache of constant folding results.
+Every folded node gets a key: the sha256 of its op type, its attributes and the keys of its inputs. The key of a
+static input without producer(an initializer) is the hash of its dtype, shape and data, the key of a folded output is
+derived from the key of its node. A key thus names the whole constant subgraph that produces a tensor and the
+constant data it starts from, an export of the same model gives the same keys whatever its node and tensor names.
+The outputs of a node are stored as <key>.npz in the cache directory. Results smaller than MIN_BYTES are not
+stored, recomputing them is cheaper than reading a file.
+'''
+
+# folded outputs smaller than this are recomputed rather than cached
+MIN_BYTES = 64 * 1024
+
+
+def _hash_array(h, arr: numpy.ndarray):
+    arr = numpy.ascontiguousarray(arr)
+    h.update(str(arr.dtype).encode())
+    h.update(str(arr.shape).encode())
+    if arr.dtype.kind == 'O':
+        h.update(repr(arr.tolist()).encode())
+    else:
+        h.update(arr.data)
+
+
+def _hash_value(h, value):
+    if hasattr(value, 'SerializeToString'):
+        h.update(value.SerializeToString(deterministic=True))
+    elif isinstance(value, numpy.ndarray):
+        _hash_array(h, value)
+    else:
+        h.update(repr(value).encode())
+
+
+class FoldCache():
+    def __init__(self, folder: str):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        # listed once, one stat per folded node would cost more than most of the nodes take to fold
+        self.files = set(name for name in os.listdir(folder) if name.endswith('.npz'))
+        self.keys = {}
+        self.hits = 0
+        self.stores = 0
+
+    def tensor_key(self, tensor):
+        '''
+            Returns:
+                the key of a tensor without producer, from its data
+        '''
+        if tensor.name in self.keys:
+            return self.keys[tensor.name]
+        h = hashlib.sha256()
+        if tensor.numpy is None:
+            h.update(f'shape:{tensor.get_shape()}'.encode())
+        else:
+            _hash_array(h, numpy.asarray(tensor.numpy))
+        key = h.hexdigest()
+        self.keys[tensor.name] = key
+        return key
+
+    def node_key(self, node, itensors):
+        '''
+            Returns:
+                the key of a constant node, the keys of its outputs are set too
+        '''
+        h = hashlib.sha256()
+        h.update(node.op_type.encode())
+        for name in sorted(node.attr.keys()):
+            h.update(name.encode())
+            _hash_value(h, node.attr[name])
+        for input, tensor in zip(node.input, itensors):
+            h.update(b'|' if input == '' else self.tensor_key(tensor).encode())
+        key = h.hexdigest()
+        for i, output in enumerate(node.output):
+            self.keys[output] = f'{key}:{i}'
+        return key
+
+    def load(self, key: str):
+        '''
+            Returns:
+                the cached outputs of a node, None when they are not cached
+        '''
+        if key + '.npz' not in self.files:
+            return None
+        try:
+            with numpy.load(os.path.join(self.folder, key + '.npz'), allow_pickle=False) as data:
+                arrays = [data[f'arr_{i}'] for i in range(len(data.files))]
+        except (OSError, ValueError, KeyError):
+            # a damaged file, the node is folded again and overwrites it
+            return None
+        self.hits += 1
+        return arrays
+
+    def store(self, key: str, arrays):
+        if any(not isinstance(arr, numpy.ndarray) or arr.dtype.kind == 'O' for arr in arrays):
+            return
+        if sum(arr.nbytes for arr in arrays) < MIN_BYTES:
+            return
+        path = os.path.join(self.folder, key + '.npz')
+        # written under another name then renamed, a concurrent load never reads half a file
+        temp = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(temp, 'wb') as f:
+                numpy.savez(f, *arrays)
+            os.replace(temp, path)
+        except OSError:
+            if os.path.exists(temp):
+                os.remove(temp)
+            return
+        self.files.add(key + '.npz')
+        self.stores += 1
@@ -1,14 +1,19 @@
 import copy
 import math
+import time
 import warnings
+from collections import deque
 
 import numpy
 import onnx
 
 from .node import create_node
 from .tensor import STATIC_TENSOR, DYNAMIC_TENSOR
-from .tensor import get_attribute_data, Tensor, volume
-from .utils import VERSION, tuple2str, ModelConfig, print_table, num2str
+from .tensor import get_attribute_data, Tensor, TensorSpec, volume
+from . import events
+from .foldcache import FoldCache
+from .tracing import get_tracer, traced
+from .utils import VERSION, ModelConfig
 
 
 def __shape_of_initializer__(initial):
@@ -19,6 +24,30 @@ def __shape_of_initializer__(initial):
     return shape
 
 
+def __expanded_bytes__(node, itensors):
+    '''
+        Size of the output of a node that can be much larger than its inputs, from the values of its shape inputs.
+        Returns:
+            the bytes of the output of a ConstantOfShape, Expand or Tile node, None for other nodes or unknown values
+    '''
+    try:
+        if node.op_type == 'ConstantOfShape':
+            shape = itensors[0].numpy.tolist()
+            itemsize = 4 if node.value is None else node.value.dtype.itemsize
+        elif node.op_type == 'Expand':
+            shape = numpy.broadcast_shapes(tuple(itensors[0].get_shape()), tuple(itensors[1].numpy.tolist()))
+            itemsize = itensors[0].numpy.dtype.itemsize
+        elif node.op_type == 'Tile':
+            shape = [int(d) * int(r) for d, r in zip(itensors[0].get_shape(), itensors[1].numpy.tolist())]
+            itemsize = itensors[0].numpy.dtype.itemsize
+        else:
+            return None
+    except (AttributeError, TypeError, ValueError):
+        return None
+    # python ints, a numpy product overflows on the shapes this guards against
+    return math.prod(int(d) for d in shape) * itemsize
+
+
 _SHAPE_TENSORS = {
     'Reshape': ('1of2',),
     'Resize': ('2of3', '3of4', '1of2'),
@@ -40,6 +69,20 @@ _SHAPE_TENSORS = {
 }
 
 
+# These ops only rewrite tensor metadata, runtimes don't move any data for them
+_ZERO_COPY_OPS = ('Identity', 'Constant', 'Shape', 'Reshape', 'Squeeze', 'Unsqueeze', 'Flatten', 'Dropout')
+
+
+def _compute_type(dtypes):
+    for dtype in dtypes:
+        if dtype in (numpy.int8, numpy.uint8):
+            return 'INT8'
+    for dtype in dtypes:
+        if dtype == numpy.float16:
+            return 'FP16'
+    return 'FP32'
+
+
 def _contains_shape_tensor(n):
     nodeset = _SHAPE_TENSORS.keys()
     shape_tensors = []
@@ -156,7 +199,7 @@ class ShapeEngine():
         tmp_input = {}
         for key in self.input_desc:
             shape = self.get_tensorshape(key)
-            tmp_input[key] = numpy.zeros(shape)
+            tmp_input[key] = TensorSpec(shape)
         return tmp_input
 
 
@@ -174,7 +217,12 @@ class Graph():
         self.output = []
         self.valid_shape = False
         self.valid_profile = False
+        self.valid_roofline = False
+        self.valid_latency = False
         self.sparse_model = False
+        # repeated block copies found by shape_infer with dedup_blocks, {clone node: representative node}
+        self.dedup_nodes = {}
+        self.dedup_classes = {}
 
         if g is not None:
             self.__init_graph_from_onnxproto__(g, self.cfg.node_rename)
@@ -199,6 +247,7 @@ class Graph():
         if self.cfg.verbose:
             print(str)
 
+    @traced('update_nodes_tensors')
     def __update_nodes_tensors__(self, constant_folding):
         from .utils import timer
         tm = timer()
@@ -273,9 +322,13 @@ class Graph():
                 break
         return constant_node
 
+    @traced('constant_search')
     def __constant_search__(self, constant_folding):
         from .utils import timer
         tm = timer()
+        self.fold_cache = None
+        if constant_folding and self.cfg.fold_cache_dir is not None:
+            self.fold_cache = FoldCache(self.cfg.fold_cache_dir)
         for name in self.nodemap.keys():
             node = self.nodemap[name]
             if hasattr(node, 'constant'):
@@ -283,23 +336,12 @@ class Graph():
             constant_node = self.__is_node_constant__(node)
             node.constant = constant_node
             if constant_node:
-                search_nodes = [name]
+                search_nodes = deque([name])
                 while len(search_nodes) > 0:
-                    this_node = self.nodemap[search_nodes[0]]
-                    search_nodes.pop(0)
+                    this_node = self.nodemap[search_nodes.popleft()]
                     if constant_folding:
-                        itensors = []
-                        for input in this_node.input:
-                            itensors.append(self.tensormap[input])
-                            if self.tensormap[input].numpy is None and input != '':
-                                warnings.warn(f'Tensor {input} has shape only, {name} may has wrong value infer result')
-                        otensors = []
-                        for output in this_node.output:
-                            otensors.append(self.tensormap[output])
-                        this_node.value_infer(itensors, otensors)
-                        if len(otensors) > 0:
-                            for i, output in enumerate(this_node.output):
-                                self.tensormap[output].type = STATIC_TENSOR
+                        if not self.__fold_node__(this_node, name):
+                            continue
                     else:
                         for i, output in enumerate(this_node.output):
                             self.tensormap[output].type = STATIC_TENSOR
@@ -310,8 +352,68 @@ class Graph():
                                 if self.__is_node_constant__(cnode):
                                     cnode.constant = True
                                     search_nodes.append(consumer)
+        if self.fold_cache is not None:
+            self.log(f'Fold Cache {self.fold_cache.hits} Hits {self.fold_cache.stores} Stores')
         self.log(f'Constant Search Time Elapsed {tm.stop()}')
 
+    def __fold_node__(self, node, name):
+        '''
+            Evaluate a constant node with value_infer for constant folding, its outputs become static tensors.
+            A node without value_infer, with an output larger than cfg.fold_max_bytes, or producing a graph output,
+            is not folded: it stays in the graph, its outputs stay dynamic and its consumers are not constant. The
+            output size of ConstantOfShape, Expand and Tile is checked before they are evaluated.
+            With cfg.fold_cache_dir the outputs are read from and written to a FoldCache.
+            Returns:
+                whether the node was folded
+        '''
+        if any(output in self.output for output in node.output):
+            # a folded graph output would have no producer and be dropped with the node
+            node.constant = False
+            return False
+        itensors = []
+        for input in node.input:
+            itensors.append(self.tensormap[input])
+            if self.tensormap[input].numpy is None and input != '':
+                warnings.warn(f'Tensor {input} has shape only, {name} may has wrong value infer result')
+        otensors = []
+        for output in node.output:
+            otensors.append(self.tensormap[output])
+        folded = True
+        if self.cfg.fold_max_bytes is not None:
+            size = __expanded_bytes__(node, itensors)
+            folded = size is None or size <= self.cfg.fold_max_bytes
+        key = None
+        cached = None
+        if folded and self.fold_cache is not None:
+            key = self.fold_cache.node_key(node, itensors)
+            cached = self.fold_cache.load(key)
+            if cached is not None and len(cached) != len(otensors):
+                cached = None
+        if cached is not None:
+            for tensor, arr in zip(otensors, cached):
+                tensor.update_tensor(arr)
+        elif folded:
+            try:
+                node.value_infer(itensors, otensors)
+            except NotImplementedError:
+                folded = False
+        if folded and self.cfg.fold_max_bytes is not None:
+            for tensor in otensors:
+                if isinstance(tensor.numpy, numpy.ndarray) and tensor.numpy.nbytes > self.cfg.fold_max_bytes:
+                    folded = False
+                    break
+        if not folded:
+            node.constant = False
+            for tensor in otensors:
+                tensor.type = DYNAMIC_TENSOR
+                tensor.numpy = None
+            return False
+        if key is not None and cached is None:
+            self.fold_cache.store(key, [tensor.numpy for tensor in otensors])
+        for tensor in otensors:
+            tensor.type = STATIC_TENSOR
+        return True
+
     def __update_consumer_producer__(self):
         self.producedby = {}
         self.consumedby = {}
@@ -505,6 +607,7 @@ class Graph():
                 self.sparse_model = True
                 break
 
+    @traced('find_shape_tensors')
     def __find_shape_tensors__(self):
         self.shape_tensors = []
         for n in self.nodemap.keys():
@@ -832,6 +935,7 @@ class Graph():
             return subgraph
         return None
 
+    @traced('save_model')
     def save_model(self, f: str, shape_only: bool = False, no_shape: bool = False, rawmodel: onnx.ModelProto = None):
         if len(self.nodemap.keys()) == 0:
             warnings.warn(f'Empty graph {f} to save')
@@ -936,6 +1040,7 @@ class Graph():
             queue.clear()
         return ordered_nodes
 
+    @traced('reorder_nodes')
     def graph_reorder_nodes(self):
         ordered_nodes = self.topsort_nodes(self.nodemap.keys(), self.input)
         new_map = {}
@@ -983,9 +1088,16 @@ class Graph():
         return intensors, outtensors
 
     def update_input_by_map(self, inputs: {}):
+        '''
+            Args:
+                inputs: {input name: numpy.ndarray or TensorSpec}, a TensorSpec sets the shape without data
+        '''
         for key in inputs.keys():
             if key in self.tensormap.keys():
-                self.tensormap[key].update_tensor(inputs[key])
+                if isinstance(inputs[key], TensorSpec):
+                    self.tensormap[key].update_spec(inputs[key])
+                else:
+                    self.tensormap[key].update_tensor(inputs[key])
 
     def get_dynamic_tensors(self):
         dtensors = {}
@@ -1004,6 +1116,7 @@ class Graph():
                     return False, name
         return True, None
 
+    @traced('shape_infer')
     def shape_infer(self, inputs: {} = None):
         self.valid_shape = False
         if inputs is not None:
@@ -1013,10 +1126,31 @@ class Graph():
             raise ValueError(
                 f"The input tensor {tname}'s shape {self.tensormap[tname].shape2str()} is not valid, Please set it to a valid shape.")
         self.shapeinfer_optime_map = {}
-        from .utils import timer
-        tm = timer()
-        for key in self.nodemap.keys():
-            tm.start()
+        tracer = get_tracer()
+        node_events = tracer is not None and tracer.node_events
+        progress = events.progress('shape_infer', len(self.nodemap))
+        blocks = None
+        self.dedup_nodes = {}
+        self.dedup_classes = {}
+        if self.cfg.dedup_blocks:
+            from .blocks import BlockIndex
+            blocks = BlockIndex(self)
+            copied = set()
+        for i, key in enumerate(self.nodemap.keys()):
+            if progress is not None:
+                progress.update(i)
+            if blocks is not None and key in blocks.node_block:
+                bkey = blocks.node_block[key]
+                if bkey in copied:
+                    continue
+                if key == blocks.blocks[bkey][0] and blocks.copy_block(self, bkey):
+                    copied.add(bkey)
+                    rep = blocks.rep_of[bkey]
+                    self.dedup_classes.setdefault(rep, [rep]).append(bkey)
+                    for src, dst in zip(blocks.blocks[rep], blocks.blocks[bkey]):
+                        self.dedup_nodes[dst] = src
+                    continue
+            startt = time.perf_counter()
             node = self.nodemap[key]
             itensors = []
             for input in node.input:
@@ -1030,10 +1164,21 @@ class Graph():
             else:
                 node.shape_infer(itensors, otensors)
 
+            cost = time.perf_counter() - startt
             if node.op_type in self.shapeinfer_optime_map.keys():
-                self.shapeinfer_optime_map[node.op_type] += tm.stop()
+                self.shapeinfer_optime_map[node.op_type] += cost
             else:
-                self.shapeinfer_optime_map[node.op_type] = tm.stop()
+                self.shapeinfer_optime_map[node.op_type] = cost
+            if node_events:
+                tracer.complete(key, 'node', startt, cost, {'op_type': node.op_type})
+        if progress is not None:
+            progress.update(len(self.nodemap))
+        if tracer is not None and len(tracer.stack) > 0:
+            tracer.stack[-1].set(op_types={k: round(v, 6) for k, v in self.shapeinfer_optime_map.items()},
+                                 nodes=len(self.nodemap))
+        if blocks is not None:
+            self.log(f'{len(self.dedup_nodes)} nodes of {len(self.dedup_classes)} repeated block classes are copied '
+                     f'from their representatives')
         self.log(self.shapeinfer_optime_map)
         self.valid_shape = True
 
@@ -1359,11 +1504,23 @@ class Graph():
 
         return cg
 
-    def profile(self):
+    @traced('profile')
+    def profile(self, latency_table=None):
+        '''
+            Args:
+                latency_table: None, or an onnx_tool.oplatency.LatencyTable(or its file path) to add measured
+                    per-node latencies
+        '''
         self.valid_profile = False
+        self.valid_roofline = False
+        self.valid_latency = False
         if not self.valid_shape:
             warnings.warn('Please perform a valid shape_infer() before profile().')
             return
+        if latency_table is not None:
+            from .oplatency import load_latency_table
+            latency_table = load_latency_table(latency_table)
+            self.lut_latency = 0
         params_flag_map = {}
         for key in self.initials:
             params_flag_map[key] = 0
@@ -1371,7 +1528,10 @@ class Graph():
         self.macs = [0.0, 0.0]
         self.params = 0
         self.memory = 0
-        for key in self.nodemap.keys():
+        progress = events.progress('profile', len(self.nodemap))
+        for i, key in enumerate(self.nodemap.keys()):
+            if progress is not None:
+                progress.update(i)
             node = self.nodemap[key]
             itensors = []
             _params = 0
@@ -1398,7 +1558,15 @@ class Graph():
                     # Constant's output tensors are already counted as weight tensors
                     continue
                 _memory += self.tensormap[output].get_memsize()
-            macs = node.profile(itensors, otensors)
+            if key in self.dedup_nodes:
+                rep = self.nodemap[self.dedup_nodes[key]]
+                macs = list(rep.macs)
+                # results profile() keeps on the node, e.g. MHA kv_size
+                for k, v in rep.__dict__.items():
+                    if k not in node.__dict__:
+                        setattr(node, k, v)
+            else:
+                macs = node.profile(itensors, otensors)
             outshape = (0,)
             if len(node.output) > 0:
                 outshape = self.tensormap[node.output[0]].get_shape()
@@ -1413,121 +1581,93 @@ class Graph():
             node.params = _params
             node.memory = _memory
             node.sparsity = block_sparsity
+            if latency_table is not None:
+                node.latency = latency_table.node_latency(node, itensors, otensors, macs[0])
+                self.lut_latency += node.latency
             self.macs[0] += macs[0]
             self.macs[1] += macs[1]
             self.params += _params
             self.memory += _memory
+        if progress is not None:
+            progress.update(len(self.nodemap))
 
         self.valid_profile = True
+        self.valid_latency = latency_table is not None
         # Store summary profile results for metadata
         self.profile_result = {
             'Forward_MACs': int(round(self.macs[0])),
             'Memory': int(self.memory),
             'Params': int(self.params)
         }
-
-    def print_node_map(self, f: str = None, metric='MACs', exclude_ops=None):
+        if self.valid_latency:
+            self.profile_result['LUT_Latency'] = self.lut_latency
+
+    @traced('roofline')
+    def roofline(self, device, compute_type: str = None):
+        '''
+            Projects each node's latency on a device with the roofline model: the node is bounded either by its
+            FLOPs over the device's peak throughput of the node's data type, or by the bytes it reads and writes
+            over the device's memory bandwidth.
+            Args:
+                device: a name of onnx_tool.device.Devices or a device dict
+                compute_type: force one of 'FP32', 'FP16', 'INT8' for all nodes, None: infer from input dtypes
+        '''
+        from .device import get_device
+        self.valid_roofline = False
         if not self.valid_profile:
-            warnings.warn('Please perform a valid profile() before print_node_map().')
+            warnings.warn('Please perform a valid profile() before roofline().')
             return
-        assert (metric in ['MACs', 'FLOPs'])
-        print_sparse_table = self.sparse_model
-        splitch = 'x'
-
-        if f is not None and '.csv' in f:
-            csvformat = True
-        else:
-            csvformat = False
-
-        ptable = []
-
-        forward_macs = int(round(self.macs[0]))
-        backward_macs = int(round(self.macs[1]))
-        backward_valid = backward_macs > 0
-        params = int(self.params)
-        memory = int(self.memory)
-
-        shared_size = 0
-        for key in self.tensormap.keys():
-            if key in self.initials:
-                if key in self.consumedby.keys() and len(self.consumedby[key]) > 1:
-                    tensor = self.tensormap[key]
-                    shared_size += volume(tensor.get_shape())
-
-        if shared_size > 1024:
-            print()
-            print('*' * 64)
-            print(f'Please note that Weight Tensors Sharing is detected:')
-            for key in self.tensormap.keys():
-                if key in self.initials:
-                    if key in self.consumedby.keys() and len(self.consumedby[key]) > 1:
-                        print(f'Tensor:{key} ')
-                        print('Shared by: ')
-                        for node in self.consumedby[key]:
-                            print('           ', node)
-                        print()
-            print('*' * 64)
-
-        factor = 1
-        if metric == 'FLOPs':
-            factor = 2
-
-        params += 1e-18
-        forward_macs += 1e-18
-        backward_macs += 1e-18
+        device = get_device(device)
+        bandwidth = device['Bandwidth'] * 1e6
+        self.latency = 0
         for key in self.nodemap.keys():
             node = self.nodemap[key]
-            if exclude_ops is not None and node.op_type in exclude_ops:
-                continue
-            row = [key, self.nodemap[key].op_type]
-            if print_sparse_table:
-                sparsity = node.sparsity
-                row.append(tuple2str(sparsity['blocksize'], splitch))
-                row.append('{:.2%}'.format(sparsity['blockratio']))
-                row.append('{:.2%}'.format(sparsity['ratio']))
-            row.append(num2str(int(node.macs[0]) * factor, csvformat))
-            row.append('{:.2%}'.format(node.macs[0] / forward_macs))
-            if backward_valid:
-                row.append(num2str(int(node.macs[1]) * factor, csvformat))
-                row.append('{:.2%}'.format(node.macs[1] / backward_macs))
-            row.append(num2str(int(node.memory), csvformat))
-            row.append('{:.2%}'.format(node.memory / memory))
-            row.append(num2str(int(node.params), csvformat))
-            row.append('{:.2%}'.format(node.params / params))
-            row.append(tuple2str(node.inshape, splitch))
-            row.append(tuple2str(node.outshape, splitch))
-
-            ptable.append(row)
-        row = ['Total', '_']
-        if print_sparse_table:
-            row.append('_')
-            row.append('_')
-            row.append('_')
-        row.append(num2str(int(forward_macs * factor), csvformat))
-        row.append('100%')
-        if backward_valid:
-            row.append(num2str(int(backward_macs * factor), csvformat))
-            row.append('100%')
-        row.append(num2str(int(memory), csvformat))
-        row.append('100%')
-        row.append(num2str(int(params), csvformat))
-        row.append('100%')
-        row.append('_')
-        row.append('_')
-
-        ptable.append(row)
-        header = ['Name', 'Type']
-        if print_sparse_table:
-            header.append('Sparse Pattern')
-            header.append('Sparse Block Ratio')
-            header.append('Sparse Ratio')
-        header.extend(
-            ['Forward_' + metric, 'FPercent'])
-        if backward_valid:
-            header.extend(
-                ['Backward_' + metric, 'BPercent'])
-        header.extend(
-            ['Memory', 'MPercent', 'Params',
-             'PPercent', 'InShape',
-             'OutShape'])
-        print_table(ptable,header,f)
+            flops = node.macs[0] * 2
+            mem = 0
+            if node.op_type not in _ZERO_COPY_OPS:
+                if node.op_type == 'Gather':
+                    # only the gathered rows of the data tensor are read
+                    mem += self.tensormap[node.output[0]].get_memsize()
+                    mem += sum([self.tensormap[i].get_memsize() for i in node.input[1:] if i != ''])
+                else:
+                    mem += sum([self.tensormap[i].get_memsize() for i in node.input if i != ''])
+                mem += sum([self.tensormap[o].get_memsize() for o in node.output if o != ''])
+            ctype = compute_type
+            if ctype is None:
+                ctype = _compute_type([self.tensormap[i].dtype for i in node.input if i != ''])
+            peak = device.get(ctype, device['FP32']) * 1e6
+            c_latency = flops / peak
+            l_latency = mem / bandwidth
+            n_latency = max(c_latency, l_latency)
+            if n_latency == 0:
+                bottle = '_'
+            else:
+                bottle = 'Compute' if c_latency > l_latency else 'Memory'
+            node.roofline = {'FLOPs': flops, 'Bytes': mem, 'Compute': ctype,
+                             'latency': [c_latency, l_latency, n_latency], 'Bottleneck': bottle}
+            self.latency += n_latency
+        self.valid_roofline = True
+        self.profile_result['Latency'] = self.latency
+
+    def profile_report(self, metric='MACs', exclude_ops=None, rollup_blocks: bool = False):
+        '''
+            Returns:
+                the onnx_tool.report.ProfileReport of the profiled nodes, save() it to as many files as needed
+        '''
+        from .report import ProfileReport
+        report = ProfileReport(self, metric, exclude_ops, rollup_blocks)
+        report.warn_shared_weights(self)
+        return report
+
+    @traced('write_table')
+    def print_node_map(self, f: str = None, metric='MACs', exclude_ops=None, rollup_blocks: bool = False):
+        '''
+            Args:
+                f: None prints the table, a .csv, .json or other(txt) file saves it
+                rollup_blocks: with ModelConfig dedup_blocks, print one row per node of each repeated block class,
+                    scaled by the number of blocks, instead of every copy
+        '''
+        if not self.valid_profile:
+            warnings.warn('Please perform a valid profile() before print_node_map().')
+            return
+        self.profile_report(metric, exclude_ops, rollup_blocks).save(f)
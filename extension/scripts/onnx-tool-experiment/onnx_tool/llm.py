@@ -343,6 +343,8 @@ class Builder():
         self.graph.profile()
         cfg = Config if Config is not None else self.DefaultCfg
         if Device is not None:
+            from .device import get_device
+            Device = get_device(Device)
             link_bw = Device.get('LinkBandwidth', 0) * 1e6
             d_num = 1 if link_bw == 0 else Device.get('Number', 1)
             c_mm = Device.get(cfg['Compute']['MM'], Device['FP32']) * 1e6
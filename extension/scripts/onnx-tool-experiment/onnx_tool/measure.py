@@ -0,0 +1,246 @@
+import json
+import os
+import re
+import tempfile
+
+import numpy
+import onnx
+
+from .tensor import TensorSpec
+from .utils import num2str, print_table, tuple2str
+
+'''
+Join onnxruntime's measured kernel times with the estimated profile of a Graph.
+onnxruntime optimizes the model before it runs, so one kernel may execute several ONNX nodes(e.g. Conv+Relu) and
+kernels are renamed by the transformers(e.g. '/layer0/relu/out_nchwc'). Every kernel of the optimized model is mapped to
+an anchor node of the original graph by name, by the name of a tensor it produces, or by its output tensors. The
+anchor's unclaimed producers are treated as fused into the same kernel.
+'''
+
+KERNEL_SUFFIX = '_kernel_time'
+# name decorations added by onnxruntime's graph transformers
+_RENAME_PATTERNS = (re.compile(r'_nchwc$'), re.compile(r'_token_\d+$'), re.compile(r'_fused$'))
+
+OptLevels = {
+    'disable': 'ORT_DISABLE_ALL',
+    'basic': 'ORT_ENABLE_BASIC',
+    'extended': 'ORT_ENABLE_EXTENDED',
+    'all': 'ORT_ENABLE_ALL',
+}
+
+
+def _random_feeds(graph, feeds):
+    '''
+        Returns:
+            input arrays for onnxruntime, the inputs without data(missing or TensorSpec) are generated from their
+            shapes and dtypes
+    '''
+    feeds = {} if feeds is None else dict(feeds)
+    for name in graph.input:
+        spec = feeds.get(name)
+        if spec is not None and not isinstance(spec, TensorSpec):
+            continue
+        tensor = graph.tensormap[name]
+        shape = tensor.get_shape() if spec is None else spec.shape
+        dtype = tensor.dtype if spec is None or spec.dtype is None else spec.dtype
+        dtype = numpy.dtype(dtype)
+        if dtype.kind == 'f':
+            feeds[name] = numpy.random.rand(*shape).astype(dtype)
+        else:
+            feeds[name] = numpy.zeros(shape, dtype=dtype)
+    return feeds
+
+
+def ort_kernel_times(m, feeds: {}, runs: int = 10, warmup: int = 2, threads: int = 0, opt_level: str = 'all'):
+    '''
+        Run the model with onnxruntime's CPU provider and profiling enabled.
+        Args:
+            m: ONNX file path or onnx.ModelProto
+            feeds: input arrays
+        Returns:
+            kernels: {optimized node name: {'op': op_type, 'latency': mean ms per run}} in execution order
+            optimized: the onnx.ModelProto that onnxruntime executed
+    '''
+    import onnxruntime as ort
+    with tempfile.TemporaryDirectory(prefix='onnx_tool_measure_') as tmpdir:
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = threads
+        opts.log_severity_level = 3
+        opts.graph_optimization_level = getattr(ort.GraphOptimizationLevel, OptLevels[opt_level])
+        opts.optimized_model_filepath = os.path.join(tmpdir, 'optimized.onnx')
+        if isinstance(m, onnx.ModelProto):
+            m = m.SerializeToString()
+        sess = ort.InferenceSession(m, opts, providers=['CPUExecutionProvider'])
+        for i in range(warmup):
+            sess.run(None, feeds)
+
+        opts.enable_profiling = True
+        opts.profile_file_prefix = os.path.join(tmpdir, 'profile')
+        opts.optimized_model_filepath = ''
+        sess = ort.InferenceSession(m, opts, providers=['CPUExecutionProvider'])
+        for i in range(runs):
+            sess.run(None, feeds)
+        trace = sess.end_profiling()
+        with open(trace) as fp:
+            events = json.load(fp)
+
+        kernels = {}
+        for event in events:
+            if event.get('cat') != 'Node' or not event['name'].endswith(KERNEL_SUFFIX):
+                continue
+            name = event['name'][:-len(KERNEL_SUFFIX)]
+            if name not in kernels:
+                kernels[name] = {'op': event.get('args', {}).get('op_name', ''), 'latency': 0}
+            kernels[name]['latency'] += event['dur'] / 1000
+        for name in kernels:
+            kernels[name]['latency'] /= runs
+        optimized = onnx.load_model(os.path.join(tmpdir, 'optimized.onnx'))
+    return kernels, optimized
+
+
+def _strip_name(name):
+    for pattern in _RENAME_PATTERNS:
+        name = pattern.sub('', name)
+    return name
+
+
+def _anchor_nodes(graph, optnode):
+    if optnode.name in graph.nodemap:
+        return [optnode.name]
+    stripped = _strip_name(optnode.name)
+    if stripped in graph.nodemap:
+        return [stripped]
+    if stripped in graph.producedby:
+        return list(graph.producedby[stripped])
+    anchors = []
+    for output in optnode.output:
+        if output in graph.producedby:
+            anchors.extend(graph.producedby[output])
+    return anchors
+
+
+def join_kernel_times(graph, kernels: {}, optimized: onnx.ModelProto):
+    '''
+        Map kernel times to graph nodes, set node.measured = {'latency': ms, 'fused_into': name or None}.
+        Returns:
+            runtime-only kernels like layout reorders and copies: [(name, op_type, latency)]
+    '''
+    for key in graph.nodemap:
+        graph.nodemap[key].measured = {'latency': 0, 'fused_into': None}
+    optnodes = [n for n in optimized.graph.node if n.name in kernels]
+    anchors = {}
+    for optnode in optnodes:
+        anchors[optnode.name] = _anchor_nodes(graph, optnode)
+    anchored = set()
+    for names in anchors.values():
+        anchored.update(names)
+
+    claimed = set()
+    unmapped = []
+    for optnode in optnodes:
+        latency = kernels[optnode.name]['latency']
+        group = [n for n in anchors[optnode.name] if n not in claimed]
+        if len(group) == 0:
+            unmapped.append((optnode.name, kernels[optnode.name]['op'], latency))
+            continue
+        claimed.update(group)
+        search = list(group)
+        while len(search) > 0:
+            node = graph.nodemap[search.pop()]
+            for input in node.input:
+                for producer in graph.producedby.get(input, []):
+                    if producer in claimed or producer in anchored:
+                        continue
+                    claimed.add(producer)
+                    group.append(producer)
+                    search.append(producer)
+        # the kernel's time goes to the node with most MACs, e.g. Conv of a fused Conv+Relu
+        main = max(group, key=lambda n: graph.nodemap[n].macs[0])
+        for name in group:
+            measured = graph.nodemap[name].measured
+            if name == main:
+                measured['latency'] += latency
+            else:
+                measured['fused_into'] = main
+    return unmapped
+
+
+def measure_profile(graph, m, feeds: {} = None, runs: int = 10, warmup: int = 2, threads: int = 0,
+                    opt_level: str = 'all'):
+    '''
+        Measure a profiled graph with onnxruntime and join the kernel times to its nodes.
+        Args:
+            graph: the Graph of m after shape_infer() and profile()
+            m: ONNX file path or onnx.ModelProto to run
+            feeds: input arrays or TensorSpecs, TensorSpecs and missing inputs are generated from the inferred
+                input shapes
+    '''
+    feeds = _random_feeds(graph, feeds)
+    kernels, optimized = ort_kernel_times(m, feeds, runs, warmup, threads, opt_level)
+    graph.runtime_kernels = join_kernel_times(graph, kernels, optimized)
+    graph.measured_latency = sum([k['latency'] for k in kernels.values()])
+    graph.valid_measure = True
+
+
+def print_measured_profile(graph, f: str = None, exclude_ops=None):
+    if not getattr(graph, 'valid_measure', False):
+        import warnings
+        warnings.warn('Please perform a valid measure_profile() before print_measured_profile().')
+        return
+    csvformat = f is not None and '.csv' in f
+    splitch = 'x'
+    total = graph.measured_latency + 1e-18
+    roofline = graph.valid_roofline
+    group_macs = {}
+    group_projected = {}
+    for key in graph.nodemap:
+        node = graph.nodemap[key]
+        main = key if node.measured['fused_into'] is None else node.measured['fused_into']
+        group_macs[main] = group_macs.get(main, 0) + node.macs[0]
+        if roofline:
+            group_projected[main] = group_projected.get(main, 0) + node.roofline['latency'][2]
+
+    ptable = []
+    for key in graph.nodemap:
+        node = graph.nodemap[key]
+        if exclude_ops is not None and node.op_type in exclude_ops:
+            continue
+        latency = node.measured['latency']
+        row = [key, node.op_type, num2str(int(node.macs[0]), csvformat), num2str(int(node.memory), csvformat)]
+        row.append('{:.5f}'.format(latency))
+        row.append('{:.2%}'.format(latency / total))
+        if latency > 0:
+            row.append('{:.2f}'.format(group_macs.get(key, 0) * 2 / (latency * 1e6)))
+        else:
+            row.append('_')
+        if roofline:
+            row.append('{:.5f}'.format(node.roofline['latency'][2]))
+            if latency > 0:
+                row.append('{:.2%}'.format(group_projected.get(key, 0) / latency))
+            else:
+                row.append('_')
+        fused = node.measured['fused_into']
+        row.append(fused if fused is not None else '_')
+        row.append(tuple2str(node.inshape, splitch))
+        row.append(tuple2str(node.outshape, splitch))
+        ptable.append(row)
+    for name, op, latency in graph.runtime_kernels:
+        row = [name, op, '_', '_', '{:.5f}'.format(latency), '{:.2%}'.format(latency / total), '_']
+        if roofline:
+            row.extend(['_', '_'])
+        row.extend(['_', '_', '_'])
+        ptable.append(row)
+
+    row = ['Total', '_', num2str(int(round(graph.macs[0])), csvformat), num2str(int(graph.memory), csvformat),
+           '{:.5f}'.format(graph.measured_latency), '100%',
+           '{:.2f}'.format(graph.macs[0] * 2 / (total * 1e6))]
+    if roofline:
+        row.append('{:.5f}'.format(graph.latency))
+        row.append('{:.2%}'.format(graph.latency / total))
+    row.extend(['_', '_', '_'])
+    ptable.append(row)
+    header = ['Name', 'Type', 'Forward_MACs', 'Memory', 'Measured Latency(ms)', 'TPercent', 'GFLOP/s']
+    if roofline:
+        header.extend(['Projected Latency(ms)', 'Roofline Efficiency'])
+    header.extend(['Fused Into', 'InShape', 'OutShape'])
+    print_table(ptable, header, f)
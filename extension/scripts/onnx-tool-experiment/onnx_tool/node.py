@@ -854,6 +854,11 @@ class MatMulNode(GemmNode):
 
 @NODE_REGISTRY.register()
 class TileNode(Node):
+    def shape_infer(self, intensors: List[Tensor], outtensors: List[Tensor]):
+        repeats = intensors[1].get_numpy().tolist()
+        outtensors[0].update_shape([int(d) * int(r) for d, r in zip(intensors[0].get_shape(), repeats)])
+        outtensors[0].update_dtype(intensors[0].dtype)
+
     def value_infer(self, intensors: List[Tensor], outtensors: List[Tensor]):
         input = intensors[0].get_numpy()
         repeats = intensors[1].get_numpy()
@@ -1450,6 +1455,12 @@ class FlattenNode(Node):
         super().__init__(node)
         self.add_default_value('axis', None)
 
+    def shape_infer(self, intensors: List[Tensor], outtensors: List[Tensor]):
+        xshape = intensors[0].get_shape()
+        axis = 1 if self.axis is None else _axes_neg2pos(len(xshape), [self.axis])[0]
+        outtensors[0].update_shape([math.prod(xshape[:axis]), math.prod(xshape[axis:])])
+        outtensors[0].update_dtype(intensors[0].dtype)
+
     def value_infer(self, intensors: List[Tensor], outtensors: List[Tensor]):
         x = intensors[0].get_numpy()
         if self.axis is None:
@@ -1477,6 +1488,13 @@ class ArgMaxNode(Node):
         self.add_default_value('axis', 0)
         self.add_default_value('keepdims', 1)
 
+    def shape_infer(self, intensors: List[Tensor], outtensors: List[Tensor]):
+        xshape = intensors[0].get_shape()
+        axis = _axes_neg2pos(len(xshape), [self.axis])[0]
+        yshape = xshape[:axis] + ([1] if self.keepdims == 1 else []) + xshape[axis + 1:]
+        outtensors[0].update_shape(yshape)
+        outtensors[0].update_dtype(numpy.int64)
+
     def value_infer(self, intensors: List[Tensor], outtensors: List[Tensor]):
         data = intensors[0].get_numpy()
         out = argmax_use_numpy(data, self.axis, self.keepdims)
@@ -1943,6 +1961,19 @@ class ReduceL2Node(Node):
         self.add_default_value('keepdims', 1)
         self.axes = tuple(self.axes) if self.axes is not None else None
 
+    def shape_infer(self, intensors: List[Tensor], outtensors: List[Tensor]):
+        xshape = intensors[0].get_shape()
+        axes = range(len(xshape)) if self.axes is None else _axes_neg2pos(len(xshape), self.axes)
+        yshape = []
+        for i in range(len(xshape)):
+            if i in axes:
+                if self.keepdims == 1:
+                    yshape.append(1)
+            else:
+                yshape.append(xshape[i])
+        outtensors[0].update_shape(yshape)
+        outtensors[0].update_dtype(intensors[0].dtype)
+
     def value_infer(self, intensors: List[Tensor], outtensors: List[Tensor]):
         reduced = numpy.sqrt(
             numpy.sum(intensors[0].get_numpy() * intensors[0].get_numpy(), axis=self.axes, keepdims=self.keepdims == 1))
@@ -1986,6 +2017,10 @@ class NonZeroNode(Node):
 
 @NODE_REGISTRY.register()
 class EqualNode(Node):
+    def shape_infer(self, intensors: List[Tensor], outtensors: List[Tensor]):
+        outtensors[0].update_shape(_broadcast_shape([tensor.get_shape() for tensor in intensors]))
+        outtensors[0].update_dtype(numpy.bool_)
+
     def value_infer(self, intensors: List[Tensor], outtensors: List[Tensor]):
         result = numpy.equal(intensors[0].get_numpy(), intensors[1].get_numpy())
         outtensors[0].update_tensor(result)
@@ -2189,6 +2224,10 @@ class RandomNormalLikeNode(RandomUniformLikeNode):
 
 @NODE_REGISTRY.register()
 class GreaterNode(Node):
+    def shape_infer(self, intensors: List[Tensor], outtensors: List[Tensor]):
+        outtensors[0].update_shape(_broadcast_shape([tensor.get_shape() for tensor in intensors]))
+        outtensors[0].update_dtype(numpy.bool_)
+
     def value_infer(self, intensors: List[Tensor], outtensors: List[Tensor]):
         result = numpy.greater(intensors[0].get_numpy(), intensors[1].get_numpy())
         outtensors[0].update_tensor(result)
@@ -2553,7 +2592,8 @@ class ConstantOfShapeNode(Node):
             outtensors[0].update_dtype(self.value.dtype)
 
     def value_infer(self, intensors: List[Tensor], outtensors: List[Tensor]):
-        arr = numpy.zeros(intensors[0].get_numpy(), dtype=self.value.dtype)
+        dtype = numpy.float32 if self.value is None else self.value.dtype
+        arr = numpy.zeros(intensors[0].get_numpy(), dtype=dtype)
         if self.value is not None and len(self.value) == 1:
             arr.fill(self.value[0])
         outtensors[0].update_tensor(arr)
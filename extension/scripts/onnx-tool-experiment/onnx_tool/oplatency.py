@@ -0,0 +1,326 @@
+import json
+import math
+import os
+
+import numpy
+import onnx
+import onnx.numpy_helper
+
+from .tensor import npdtype2onnxdtype, volume
+from .utils import timer
+
+'''
+Per-operator latency lookup table measured with onnxruntime's CPU provider.
+MACs are a poor latency proxy for data movement ops like Transpose, Gather, Resize and Softmax. Each benchmark below
+builds a single-node ONNX model for a grid of tensor sizes and data types, the measured latencies are saved as curves
+of latency over the op's work size, and Graph.profile(latency_table) interpolates them for every node.
+The work size is the MACs for compute ops, the output element count for Gather, and the larger element count of the
+first input and the output for all other ops.
+'''
+
+# local lookup table, see onnx_tool.device.DEVICE_REGISTRY
+OP_LATENCY_TABLE = os.environ.get('ONNX_TOOL_OPLATENCY',
+                                  os.path.join(os.path.expanduser('~'), '.onnx_tool', 'oplatency.json'))
+TABLE_VERSION = 1
+
+MACS_FEATURE_OPS = ('MatMul', 'Gemm', 'Conv')
+
+DefaultSizes = (1 << 12, 1 << 15, 1 << 18, 1 << 20, 1 << 22)
+DefaultMacsSizes = (1 << 18, 1 << 22, 1 << 25, 1 << 28)
+DefaultTypes = ('float32',)
+
+OpBenchmarks = {}
+
+
+def register_benchmark(key):
+    '''
+        Register a benchmark builder under a lookup key, the builder returns a single-node model case for a work size:
+        builder(size: int, dtype: numpy.dtype) -> (node: onnx.NodeProto, feeds: {str: ndarray}, initializers: [])
+    '''
+
+    def deco(func):
+        OpBenchmarks[key] = func
+        return func
+
+    return deco
+
+
+def _rand(shape, dtype):
+    return numpy.random.rand(*shape).astype(dtype)
+
+
+def _rows_cols(size, cols=1024):
+    cols = min(cols, size)
+    return [max(1, size // cols), cols]
+
+
+def _nchw(size, channels=64):
+    hw = max(1, int(math.sqrt(max(1, size // channels))))
+    return [1, channels, hw, hw]
+
+
+def _unary_benchmark(op_type, **attrs):
+    def builder(size, dtype):
+        node = onnx.helper.make_node(op_type, ['X'], ['Y'], **attrs)
+        return node, {'X': _rand(_rows_cols(size), dtype)}, []
+
+    return builder
+
+
+def _binary_benchmark(op_type):
+    def builder(size, dtype):
+        shape = _rows_cols(size)
+        node = onnx.helper.make_node(op_type, ['A', 'B'], ['Y'])
+        return node, {'A': _rand(shape, dtype), 'B': _rand(shape, dtype) + 1}, []
+
+    return builder
+
+
+for _op in ('Relu', 'Sigmoid', 'Tanh', 'Exp', 'Erf', 'Sqrt', 'Neg', 'Abs', 'Reciprocal'):
+    register_benchmark(_op)(_unary_benchmark(_op))
+for _op in ('Add', 'Sub', 'Mul', 'Div', 'Pow'):
+    register_benchmark(_op)(_binary_benchmark(_op))
+register_benchmark('Softmax')(_unary_benchmark('Softmax', axis=-1))
+register_benchmark('ReduceMean')(_unary_benchmark('ReduceMean', axes=[-1]))
+
+
+@register_benchmark('Transpose')
+def _transpose_benchmark(size, dtype):
+    node = onnx.helper.make_node('Transpose', ['X'], ['Y'], perm=[0, 2, 3, 1])
+    return node, {'X': _rand(_nchw(size), dtype)}, []
+
+
+@register_benchmark('Gather')
+def _gather_benchmark(size, dtype):
+    rows = 4096
+    cols = min(256, size)
+    indices = numpy.random.randint(0, rows, size=(max(1, size // cols),)).astype(numpy.int64)
+    data = onnx.numpy_helper.from_array(_rand([rows, cols], dtype), 'data')
+    node = onnx.helper.make_node('Gather', ['data', 'indices'], ['Y'], axis=0)
+    return node, {'indices': indices}, [data]
+
+
+def _resize_benchmark(mode):
+    def builder(size, dtype):
+        # the work size is the output element count
+        scales = onnx.numpy_helper.from_array(numpy.array([1, 1, 2, 2], dtype=numpy.float32), 'scales')
+        node = onnx.helper.make_node('Resize', ['X', '', 'scales'], ['Y'], mode=mode)
+        return node, {'X': _rand(_nchw(size // 4), dtype)}, [scales]
+
+    return builder
+
+
+register_benchmark('Resize.nearest')(_resize_benchmark('nearest'))
+register_benchmark('Resize.linear')(_resize_benchmark('linear'))
+
+
+@register_benchmark('Concat')
+def _concat_benchmark(size, dtype):
+    shape = _rows_cols(max(2, size // 2))
+    node = onnx.helper.make_node('Concat', ['A', 'B'], ['Y'], axis=0)
+    return node, {'A': _rand(shape, dtype), 'B': _rand(shape, dtype)}, []
+
+
+@register_benchmark('LayerNormalization')
+def _layernorm_benchmark(size, dtype):
+    shape = _rows_cols(size)
+    scale = onnx.numpy_helper.from_array(_rand(shape[-1:], dtype), 'scale')
+    node = onnx.helper.make_node('LayerNormalization', ['X', 'scale'], ['Y'], axis=-1)
+    return node, {'X': _rand(shape, dtype)}, [scale]
+
+
+@register_benchmark('MatMul')
+def _matmul_benchmark(macs, dtype):
+    n = max(1, round(macs ** (1 / 3)))
+    w = onnx.numpy_helper.from_array(_rand([n, n], dtype), 'W')
+    node = onnx.helper.make_node('MatMul', ['X', 'W'], ['Y'])
+    return node, {'X': _rand([n, n], dtype)}, [w]
+
+
+@register_benchmark('Conv')
+def _conv_benchmark(macs, dtype):
+    channels = 64
+    hw = max(1, int(math.sqrt(macs / (channels * channels * 9))))
+    w = onnx.numpy_helper.from_array(_rand([channels, channels, 3, 3], dtype), 'W')
+    node = onnx.helper.make_node('Conv', ['X', 'W'], ['Y'], pads=[1, 1, 1, 1])
+    return node, {'X': _rand([1, channels, hw, hw], dtype)}, [w]
+
+
+def lut_key(node):
+    if node.op_type in ('Resize', 'Upsample'):
+        mode = getattr(node, 'mode', b'nearest')
+        mode = mode.decode() if isinstance(mode, bytes) else mode
+        return 'Resize.' + mode
+    return node.op_type
+
+
+def _make_model(node, feeds, initializers, dtype):
+    inputs = [onnx.helper.make_tensor_value_info(k, npdtype2onnxdtype(v.dtype), v.shape) for k, v in feeds.items()]
+    output = onnx.helper.make_tensor_value_info('Y', npdtype2onnxdtype(dtype), None)
+    graph = onnx.helper.make_graph([node], 'op_benchmark', inputs, [output], initializer=initializers)
+    model = onnx.helper.make_model(graph, opset_imports=[onnx.helper.make_opsetid('', 17)])
+    model.ir_version = 8
+    return model
+
+
+def work_size(key, inshape, outshape, macs):
+    if key in MACS_FEATURE_OPS:
+        return macs
+    if key == 'Gather':
+        return volume(outshape)
+    return max(volume(inshape), volume(outshape))
+
+
+def _case_feature(key, sess, feeds, node, initializers):
+    # the real work size of a case, sizes are rounded to valid shapes by the builders
+    outshape = list(sess.run(None, feeds)[0].shape)
+    shapes = {k: list(v.shape) for k, v in feeds.items()}
+    for init in initializers:
+        shapes[init.name] = list(init.dims)
+    inshape = shapes[node.input[0]]
+    macs = 0
+    if key == 'MatMul':
+        macs = volume(outshape) * inshape[-1]
+    elif key == 'Conv':
+        macs = volume(outshape) * inshape[1] * 9
+    return work_size(key, inshape, outshape, macs)
+
+
+def benchmark_op(key, size, dtype, threads=0, repeat=10):
+    import onnxruntime as ort
+    dtype = numpy.dtype(dtype).type
+    node, feeds, initializers = OpBenchmarks[key](size, dtype)
+    model = _make_model(node, feeds, initializers, dtype)
+    opts = ort.SessionOptions()
+    opts.intra_op_num_threads = threads
+    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+    sess = ort.InferenceSession(model.SerializeToString(), opts, providers=['CPUExecutionProvider'])
+    feature = _case_feature(key, sess, feeds, node, initializers)
+    tm = timer()
+    times = []
+    for i in range(repeat):
+        tm.start()
+        sess.run(None, feeds)
+        times.append(tm.stop())
+    return feature, float(numpy.median(times)) * 1000
+
+
+def run_benchmarks(ops=None, dtypes=DefaultTypes, sizes=DefaultSizes, macs_sizes=DefaultMacsSizes, threads=0,
+                   repeat=10, verbose=True):
+    '''
+        Args:
+            ops: lookup keys of OpBenchmarks, None: all registered benchmarks
+            dtypes: numpy data type names to measure, e.g. ('float32', 'float16')
+            sizes: output element counts of data movement ops
+            macs_sizes: MACs of MatMul and Conv
+            threads: onnxruntime intra-op threads, 0: onnxruntime's default
+        Returns:
+            LatencyTable
+    '''
+    ops = list(OpBenchmarks.keys()) if ops is None else ops
+    table = LatencyTable()
+    table.threads = threads
+    for key in ops:
+        for dtype in dtypes:
+            grid = macs_sizes if key in MACS_FEATURE_OPS else sizes
+            for size in grid:
+                try:
+                    feature, latency = benchmark_op(key, size, dtype, threads, repeat)
+                except Exception as e:
+                    # onnxruntime doesn't implement every op for every data type
+                    if verbose:
+                        print(f'{key} {dtype} is skipped: {str(e)[:100]}')
+                    break
+                table.add(key, dtype, feature, latency)
+                if verbose:
+                    print(f'{key} {dtype} size:{feature} latency:{latency:.5f} ms')
+    return table
+
+
+class LatencyTable():
+    def __init__(self, path: str = None):
+        self.threads = 0
+        self.ops = {}
+        if path is not None:
+            self.load(path)
+
+    def add(self, key, dtype, feature, latency):
+        curves = self.ops.setdefault(key, {})
+        points = curves.setdefault(dtype, [])
+        points.append([int(feature), float(latency)])
+        points.sort(key=lambda p: p[0])
+
+    def load(self, path):
+        with open(path) as fp:
+            obj = json.load(fp)
+        if obj.get('version') != TABLE_VERSION:
+            raise ValueError(f'Latency table {path} version {obj.get("version")} is not supported, please run the op '
+                             f'benchmarks again.')
+        self.threads = obj.get('threads', 0)
+        self.ops = obj['ops']
+
+    def save(self, path: str = None):
+        path = OP_LATENCY_TABLE if path is None else path
+        folder = os.path.dirname(path)
+        if folder != '':
+            os.makedirs(folder, exist_ok=True)
+        with open(path, 'w') as fp:
+            json.dump({'version': TABLE_VERSION, 'provider': 'CPUExecutionProvider', 'threads': self.threads,
+                       'ops': self.ops}, fp, indent=1)
+
+    def query(self, key, dtype, feature):
+        if key not in self.ops:
+            return None
+        curves = self.ops[key]
+        points = curves.get(dtype, curves.get('float32'))
+        if points is None or len(points) == 0:
+            return None
+        x = [p[0] for p in points]
+        y = [p[1] for p in points]
+        if feature <= x[0]:
+            # fixed kernel overhead dominates small tensors
+            return y[0]
+        if feature >= x[-1]:
+            return y[-1] * feature / x[-1]
+        return float(numpy.interp(feature, x, y))
+
+    def macs_rate(self, dtype):
+        # MACs per ms of the largest measured MatMul, used by the ops without a curve
+        if 'MatMul' not in self.ops:
+            return None
+        curves = self.ops['MatMul']
+        points = curves.get(dtype, curves.get('float32'))
+        if points is None or len(points) == 0:
+            return None
+        return points[-1][0] / max(points[-1][1], 1e-9)
+
+    def node_latency(self, node, intensors, outtensors, macs):
+        if len(intensors) > 0:
+            dtype = numpy.dtype(intensors[0].dtype).name
+        else:
+            dtype = 'float32'
+        key = lut_key(node)
+        inshape = intensors[0].get_shape() if len(intensors) > 0 else []
+        outshape = outtensors[0].get_shape() if len(outtensors) > 0 else []
+        feature = work_size(key, inshape, outshape, macs)
+        latency = self.query(key, dtype, feature)
+        if latency is not None:
+            return latency
+        if macs > 0:
+            rate = self.macs_rate(dtype)
+            if rate is not None:
+                return macs / rate
+        return 0
+
+
+def load_latency_table(table=None):
+    '''
+        Args:
+            table: LatencyTable, a table file path or None for the local table OP_LATENCY_TABLE
+    '''
+    if isinstance(table, LatencyTable):
+        return table
+    path = OP_LATENCY_TABLE if table is None else table
+    if not os.path.exists(path):
+        raise FileNotFoundError(f'Latency table {path} is not found, please run the op benchmarks first.')
+    return LatencyTable(path)
@@ -0,0 +1,200 @@
+import struct
+
+import numpy
+
+'''
+QPROF: compact binary profile file, read by the viewer(onnx_view/profile.js) without parsing the ONNX model.
+All values are little-endian, every section starts at a multiple of 8 bytes so columns can be mapped as typed arrays.
+
+    header(64 bytes)
+        magic b'QPRF', version u16, reserved u16, rows u32, columns u32, strings u32, metric string id u32,
+        strings offset u64, columns offset u64, index offset u64, totals offset u64, file size u64
+    strings: (strings + 1) u32 byte offsets into the UTF-8 blob that follows them
+    columns: per column 16 bytes, name string id u32, dtype u8, 3 reserved bytes, data offset u64
+        data: rows values of the dtype, string columns hold string ids
+    index: rows u32 row numbers sorted by the UTF-8 bytes of the node names, for binary search by name
+    totals: per column f64, NaN for string columns
+
+Version 1 columns: name, type, forward, [backward], memory, params, [latency], [projected_latency, bottleneck],
+[blocks], inshape, outshape. Readers look columns up by name and must skip unknown ones.
+'''
+
+MAGIC = b'QPRF'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIIIIQQQQQ')
+COLUMN = struct.Struct('<IB3xQ')
+DTYPE_F64 = 1
+DTYPE_I64 = 2
+DTYPE_STR = 3
+DTYPES = {
+    DTYPE_F64: numpy.dtype('<f8'),
+    DTYPE_I64: numpy.dtype('<i8'),
+    DTYPE_STR: numpy.dtype('<u4'),
+}
+
+
+def _align(n):
+    return (n + 7) // 8 * 8
+
+
+class _Strings():
+    def __init__(self):
+        self.ids = {}
+        self.blobs = []
+
+    def add(self, s: str):
+        if s not in self.ids:
+            self.ids[s] = len(self.blobs)
+            self.blobs.append(s.encode('utf-8'))
+        return self.ids[s]
+
+    def tobytes(self):
+        offsets = numpy.zeros(len(self.blobs) + 1, dtype='<u4')
+        offsets[1:] = numpy.cumsum([len(b) for b in self.blobs])
+        return offsets.tobytes() + b''.join(self.blobs)
+
+
+def write_profile(report, f: str):
+    '''
+        Save an onnx_tool.report.ProfileReport as a QPROF file.
+    '''
+    from .utils import tuple2str
+    strings = _Strings()
+    metric_id = strings.add(report.metric)
+    columns = [('name', DTYPE_STR, report.names, numpy.nan), ('type', DTYPE_STR, report.op_types, numpy.nan),
+               ('forward', DTYPE_I64, report.forward_macs, report.total_forward_macs * report.factor)]
+    if report.has_backward:
+        columns.append(('backward', DTYPE_I64, report.backward_macs, report.total_backward_macs * report.factor))
+    columns.append(('memory', DTYPE_I64, report.memory, report.total_memory))
+    columns.append(('params', DTYPE_I64, report.params, report.total_params))
+    if report.has_latency:
+        columns.append(('latency', DTYPE_F64, report.latency, report.total_latency))
+    if report.has_roofline:
+        columns.append(('projected_latency', DTYPE_F64, report.projected_latency, report.total_projected_latency))
+        columns.append(('bottleneck', DTYPE_STR, report.bottlenecks, numpy.nan))
+    if report.has_blocks:
+        columns.append(('blocks', DTYPE_I64, report.scales, numpy.nan))
+    columns.append(('inshape', DTYPE_STR, [tuple2str(s, 'x') for s in report.inshapes], numpy.nan))
+    columns.append(('outshape', DTYPE_STR, [tuple2str(s, 'x') for s in report.outshapes], numpy.nan))
+
+    rows = len(report.names)
+    datas = []
+    for name, dtype, values, _ in columns:
+        strings.add(name)
+        if dtype == DTYPE_STR:
+            data = numpy.array([strings.add(v) for v in values], dtype=DTYPES[dtype])
+        else:
+            data = numpy.asarray(values).astype(DTYPES[dtype])
+        datas.append(data.tobytes())
+    encoded = [s.encode('utf-8') for s in report.names]
+    index = numpy.array(sorted(range(rows), key=encoded.__getitem__), dtype='<u4').tobytes()
+    totals = numpy.array([t for _, _, _, t in columns], dtype='<f8').tobytes()
+    string_bytes = strings.tobytes()
+
+    strings_offset = HEADER.size
+    columns_offset = _align(strings_offset + len(string_bytes))
+    offset = _align(columns_offset + COLUMN.size * len(columns))
+    descriptors = b''
+    data_offsets = []
+    for (name, dtype, _, _), data in zip(columns, datas):
+        descriptors += COLUMN.pack(strings.ids[name], dtype, offset)
+        data_offsets.append(offset)
+        offset = _align(offset + len(data))
+    index_offset = offset
+    totals_offset = _align(index_offset + len(index))
+    file_size = totals_offset + len(totals)
+
+    with open(f, 'wb') as fp:
+        def write_at(pos, data):
+            fp.write(b'\0' * (pos - fp.tell()))
+            fp.write(data)
+
+        fp.write(HEADER.pack(MAGIC, VERSION, 0, rows, len(columns), len(strings.blobs), metric_id, strings_offset,
+                             columns_offset, index_offset, totals_offset, file_size))
+        write_at(strings_offset, string_bytes)
+        write_at(columns_offset, descriptors)
+        for pos, data in zip(data_offsets, datas):
+            write_at(pos, data)
+        write_at(index_offset, index)
+        write_at(totals_offset, totals)
+
+
+class ProfileFile():
+    def __init__(self, f: str):
+        '''
+            Memory-map a QPROF file, columns are numpy views of the file.
+        '''
+        self.data = numpy.memmap(f, dtype=numpy.uint8, mode='r')
+        (magic, version, _, self.rows, ncolumns, nstrings, metric_id, strings_offset, columns_offset,
+         self.index_offset, totals_offset, file_size) = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{f} is not a QPROF file')
+        if version > VERSION:
+            raise ValueError(f'{f} has QPROF version {version}, this onnx_tool reads up to {VERSION}')
+        if file_size != len(self.data):
+            raise ValueError(f'{f} is truncated: {len(self.data)} of {file_size} bytes')
+        self.string_offsets = numpy.frombuffer(self.data, '<u4', nstrings + 1, strings_offset)
+        self.blob_offset = strings_offset + 4 * (nstrings + 1)
+        self.metric = self.string(metric_id)
+        totals = numpy.frombuffer(self.data, '<f8', ncolumns, totals_offset)
+        self.columns = {}
+        self.totals = {}
+        for i in range(ncolumns):
+            name_id, dtype, offset = COLUMN.unpack_from(self.data, columns_offset + i * COLUMN.size)
+            if dtype not in DTYPES:
+                continue
+            name = self.string(name_id)
+            self.columns[name] = (dtype, numpy.frombuffer(self.data, DTYPES[dtype], self.rows, offset))
+            if dtype != DTYPE_STR:
+                self.totals[name] = float(totals[i])
+        self.index = numpy.frombuffer(self.data, '<u4', self.rows, self.index_offset)
+
+    def _string_bytes(self, i):
+        start = self.blob_offset + int(self.string_offsets[i])
+        return self.data[start:self.blob_offset + int(self.string_offsets[i + 1])].tobytes()
+
+    def string(self, i):
+        return self._string_bytes(i).decode('utf-8')
+
+    def column(self, name: str):
+        '''
+            Returns:
+                numpy array of the column, decoded strings for string columns
+        '''
+        dtype, values = self.columns[name]
+        if dtype == DTYPE_STR:
+            return [self.string(int(i)) for i in values]
+        return values
+
+    def lookup(self, name: str):
+        '''
+            Returns:
+                the row of the node name, None if it's not in the profile
+        '''
+        key = name.encode('utf-8')
+        names = self.columns['name'][1]
+        lo, hi = 0, self.rows
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._string_bytes(int(names[self.index[mid]])) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.rows and self._string_bytes(int(names[self.index[lo]])) == key:
+            return int(self.index[lo])
+        return None
+
+    def row(self, i: int):
+        values = {}
+        for name, (dtype, column) in self.columns.items():
+            if dtype == DTYPE_STR:
+                values[name] = self.string(int(column[i]))
+            elif dtype == DTYPE_I64:
+                values[name] = int(column[i])
+            else:
+                values[name] = float(column[i])
+        return values
+
+    def node(self, name: str):
+        i = self.lookup(name)
+        return None if i is None else self.row(i)
@@ -0,0 +1,277 @@
+import json
+import sys
+
+import numpy
+
+from .tensor import volume
+from .utils import tuple2str
+
+'''
+Columnar profile report of a Graph, the table printed by Graph.print_node_map.
+The per-node values are gathered once into NumPy columns. The txt and csv writers format them column by column into
+lists of strings, which are formatted once and shared by both formats, only the integer columns differ(txt has
+thousands separators). The rows are streamed to the file, no table of row lists is built, and the JSON writer writes
+the values without formatting them. The txt layout follows tabulate's 'simple' format: numeric columns are
+right-aligned, the others left-aligned.
+'''
+
+ROW_CHUNK = 4096
+SHARED_WEIGHT_WARN_SIZE = 1024
+
+
+def _percent(values, total):
+    return ['{:.2%}'.format(v) for v in (values / total).tolist()]
+
+
+def _integers(values, csvformat):
+    if csvformat:
+        return [str(v) for v in values.tolist()]
+    return ['{:,}'.format(v) for v in values.tolist()]
+
+
+def _floats(values):
+    return ['{:.5f}'.format(v) for v in values.tolist()]
+
+
+class ProfileReport():
+    def __init__(self, graph, metric='MACs', exclude_ops=None, rollup_blocks: bool = False):
+        '''
+            Args:
+                graph: a Graph after profile()
+                metric: 'MACs' or 'FLOPs'(2 x MACs)
+                exclude_ops: op types left out of the rows, they still count in the totals
+                rollup_blocks: with ModelConfig dedup_blocks, one row per node of each repeated block class, scaled
+                    by the number of blocks, instead of every copy
+        '''
+        assert (metric in ['MACs', 'FLOPs'])
+        self.metric = metric
+        self.factor = 2 if metric == 'FLOPs' else 1
+        self.sparse = graph.sparse_model
+        self.has_latency = graph.valid_latency
+        self.has_roofline = graph.valid_roofline
+
+        rollup = {}
+        if rollup_blocks and len(graph.dedup_nodes) > 0:
+            for src in graph.dedup_nodes.values():
+                rollup[src] = rollup.get(src, 1) + 1
+        self.has_blocks = len(rollup) > 0
+
+        self.names = []
+        self.op_types = []
+        self.inshapes = []
+        self.outshapes = []
+        self.bottlenecks = []
+        self.sparsity = []
+        scales = []
+        values = []
+        for key in graph.nodemap.keys():
+            node = graph.nodemap[key]
+            if exclude_ops is not None and node.op_type in exclude_ops:
+                continue
+            if self.has_blocks and key in graph.dedup_nodes:
+                continue
+            self.names.append(key)
+            self.op_types.append(node.op_type)
+            self.inshapes.append(node.inshape)
+            self.outshapes.append(node.outshape)
+            scales.append(rollup.get(key, 1))
+            values.append((int(node.macs[0]), int(node.macs[1]), int(node.memory), int(node.params),
+                           node.latency if self.has_latency else 0,
+                           node.roofline['latency'][2] if self.has_roofline else 0))
+            if self.has_roofline:
+                self.bottlenecks.append(node.roofline['Bottleneck'])
+            if self.sparse:
+                self.sparsity.append(node.sparsity)
+
+        self.scales = numpy.array(scales, dtype=numpy.int64)
+        columns = numpy.array(values, dtype=numpy.float64).reshape(-1, 6)
+        ints = columns[:, :4].astype(numpy.int64) * self.scales[:, None]
+        self.forward_macs = ints[:, 0] * self.factor
+        self.backward_macs = ints[:, 1] * self.factor
+        self.memory = ints[:, 2]
+        self.params = ints[:, 3]
+        self.latency = columns[:, 4] * self.scales
+        self.projected_latency = columns[:, 5] * self.scales
+
+        self.total_forward_macs = int(round(graph.macs[0]))
+        self.total_backward_macs = int(round(graph.macs[1]))
+        self.has_backward = self.total_backward_macs > 0
+        self.total_memory = int(graph.memory)
+        self.total_params = int(graph.params)
+        self.total_latency = graph.lut_latency if self.has_latency else 0
+        self.total_projected_latency = graph.latency if self.has_roofline else 0
+
+        # the string columns shared by the txt and csv formats, see format_columns
+        self.text_columns = None
+
+        self.shared_weights = {}
+        for key in graph.initials:
+            if len(graph.consumedby.get(key, [])) > 1:
+                self.shared_weights[key] = graph.consumedby[key]
+
+    def warn_shared_weights(self, graph):
+        shared_size = 0
+        for key in self.shared_weights:
+            shared_size += volume(graph.tensormap[key].get_shape())
+        if shared_size <= SHARED_WEIGHT_WARN_SIZE:
+            return
+        print()
+        print('*' * 64)
+        print(f'Please note that Weight Tensors Sharing is detected:')
+        for key, nodes in self.shared_weights.items():
+            print(f'Tensor:{key} ')
+            print('Shared by: ')
+            for node in nodes:
+                print('           ', node)
+            print()
+        print('*' * 64)
+
+    def header(self):
+        '''
+            Returns:
+                column names, whether each column is numeric(right-aligned)
+        '''
+        header = [('Name', False), ('Type', False)]
+        if self.sparse:
+            header.extend([('Sparse Pattern', False), ('Sparse Block Ratio', False), ('Sparse Ratio', False)])
+        header.extend([('Forward_' + self.metric, True), ('FPercent', False)])
+        if self.has_backward:
+            header.extend([('Backward_' + self.metric, True), ('BPercent', False)])
+        header.extend([('Memory', True), ('MPercent', False), ('Params', True), ('PPercent', False)])
+        if self.has_latency:
+            header.extend([('Latency(ms)', True), ('TPercent', False)])
+        if self.has_roofline:
+            header.extend([('Projected Latency(ms)', True), ('LPercent', False), ('Bottleneck', False)])
+        if self.has_blocks:
+            header.append(('Blocks', False))
+        header.extend([('InShape', False), ('OutShape', False)])
+        return header
+
+    def format_columns(self, csvformat: bool):
+        '''
+            Returns:
+                the string columns of all node rows followed by the Total row, in header() order
+        '''
+        if self.text_columns is None:
+            self.text_columns = self._text_columns()
+        # only the integer columns depend on the format, they are kept as arrays until here
+        return [_integers(c, csvformat) if isinstance(c, numpy.ndarray) else c for c in self.text_columns]
+
+    def _text_columns(self):
+        splitch = 'x'
+        # percentages divide by totals + 1e-18 as the original table did, empty totals print 0.00%
+        columns = [self.names + ['Total'], self.op_types + ['_']]
+        if self.sparse:
+            columns.append([tuple2str(s['blocksize'], splitch) for s in self.sparsity] + ['_'])
+            columns.append(['{:.2%}'.format(s['blockratio']) for s in self.sparsity] + ['_'])
+            columns.append(['{:.2%}'.format(s['ratio']) for s in self.sparsity] + ['_'])
+        columns.append(numpy.append(self.forward_macs, self.total_forward_macs * self.factor))
+        columns.append(_percent(self.forward_macs / self.factor, self.total_forward_macs + 1e-18) + ['100%'])
+        if self.has_backward:
+            columns.append(numpy.append(self.backward_macs, self.total_backward_macs * self.factor))
+            columns.append(_percent(self.backward_macs / self.factor, self.total_backward_macs + 1e-18) + ['100%'])
+        columns.append(numpy.append(self.memory, self.total_memory))
+        columns.append(_percent(self.memory, self.total_memory + 1e-18) + ['100%'])
+        columns.append(numpy.append(self.params, self.total_params))
+        columns.append(_percent(self.params, self.total_params + 1e-18) + ['100%'])
+        if self.has_latency:
+            columns.append(_floats(self.latency) + ['{:.5f}'.format(self.total_latency)])
+            columns.append(_percent(self.latency, self.total_latency + 1e-18) + ['100%'])
+        if self.has_roofline:
+            columns.append(_floats(self.projected_latency) + ['{:.5f}'.format(self.total_projected_latency)])
+            columns.append(_percent(self.projected_latency, self.total_projected_latency + 1e-18) + ['100%'])
+            columns.append(self.bottlenecks + ['_'])
+        if self.has_blocks:
+            columns.append(['x' + str(s) if s > 1 else '_' for s in self.scales.tolist()] + ['_'])
+        columns.append([tuple2str(s, splitch) for s in self.inshapes] + ['_'])
+        columns.append([tuple2str(s, splitch) for s in self.outshapes] + ['_'])
+        return columns
+
+    @staticmethod
+    def _write_rows(fp, columns, line):
+        rows = len(columns[0])
+        for start in range(0, rows, ROW_CHUNK):
+            chunk = zip(*[c[start:start + ROW_CHUNK] for c in columns])
+            fp.write(''.join(line(row) for row in chunk))
+
+    def write_csv(self, fp):
+        header = self.header()
+        fp.write(','.join(h for h, _ in header) + '\n')
+        self._write_rows(fp, self.format_columns(True), lambda row: ','.join(row) + '\n')
+
+    def write_txt(self, fp):
+        header = self.header()
+        columns = self.format_columns(False)
+        # headers are padded by 2 like tabulate
+        widths = [max(len(h) + 2, max(len(v) for v in c)) for (h, _), c in zip(header, columns)]
+        aligns = [str.rjust if numeric else str.ljust for _, numeric in header]
+
+        def line(row):
+            return '  '.join([align(v, w) for v, w, align in zip(row, widths, aligns)]).rstrip() + '\n'
+
+        fp.write(line([h for h, _ in header]))
+        fp.write('  '.join('-' * w for w in widths) + '\n')
+        self._write_rows(fp, columns, line)
+
+    def write_json(self, fp):
+        '''
+            {"metric", "columns", "total", "nodes": [{column: value}]}, numbers stay numbers, shapes are lists
+        '''
+        keys = ['name', 'type', 'forward', 'memory', 'params']
+        node_columns = [self.names, self.op_types, self.forward_macs.tolist(), self.memory.tolist(),
+                        self.params.tolist()]
+        total = {'forward': self.total_forward_macs * self.factor, 'memory': self.total_memory,
+                 'params': self.total_params}
+        if self.has_backward:
+            keys.append('backward')
+            node_columns.append(self.backward_macs.tolist())
+            total['backward'] = self.total_backward_macs * self.factor
+        if self.has_latency:
+            keys.append('latency')
+            node_columns.append(self.latency.tolist())
+            total['latency'] = self.total_latency
+        if self.has_roofline:
+            keys.extend(['projected_latency', 'bottleneck'])
+            node_columns.extend([self.projected_latency.tolist(), self.bottlenecks])
+            total['projected_latency'] = self.total_projected_latency
+        if self.has_blocks:
+            keys.append('blocks')
+            node_columns.append(self.scales.tolist())
+        if self.sparse:
+            keys.append('sparsity')
+            node_columns.append([{'blocksize': list(s['blocksize']), 'blockratio': float(s['blockratio']),
+                                  'ratio': float(s['ratio'])} for s in self.sparsity])
+        keys.extend(['inshape', 'outshape'])
+        node_columns.extend([[list(s) for s in self.inshapes], [list(s) for s in self.outshapes]])
+
+        fp.write('{"metric": %s, "columns": %s, "total": %s, "nodes": [' % (
+            json.dumps(self.metric), json.dumps(keys), json.dumps(total)))
+        encoder = json.JSONEncoder(default=int)
+        first = True
+        rows = len(self.names)
+        for start in range(0, rows, ROW_CHUNK):
+            chunk = zip(*[c[start:start + ROW_CHUNK] for c in node_columns])
+            text = ',\n'.join(encoder.encode(dict(zip(keys, row))) for row in chunk)
+            fp.write(('\n' if first else ',\n') + text)
+            first = False
+        fp.write('\n]}\n')
+
+    def save(self, f: str = None):
+        '''
+            Write the report to f by its extension: .csv, .json, .qprof(binary, see onnx_tool.qprof), otherwise txt.
+            None prints the txt table.
+        '''
+        if f is None:
+            self.write_txt(sys.stdout)
+            return
+        if f.endswith('.qprof'):
+            from .qprof import write_profile
+            write_profile(self, f)
+            return
+        with open(f, 'w') as fp:
+            if f.endswith('.json'):
+                self.write_json(fp)
+            elif '.csv' in f:
+                self.write_csv(fp)
+            else:
+                self.write_txt(fp)
@@ -0,0 +1,266 @@
+import json
+import os
+import re
+
+from .utils import num2str, print_table
+
+'''
+Aggregation of the per-node profile by name scope, op type and user-defined regex groups.
+Scopes come from the node names: '/model/layers.12/self_attn/MatMul' and 'model.layers.12.self_attn.q_proj' are both
+in model > layers.12 > self_attn. A scope's metrics include all nodes below it. Op type and regex group tables are
+sorted by MACs with cumulative percentages, so the few groups that make up most of the model come first, sibling
+scopes accumulate the same way.
+'''
+
+Metrics = ('MACs', 'Memory', 'Params', 'Latency')
+OTHER_GROUP = 'Other'
+
+
+def scope_path(name: str):
+    '''
+        Returns:
+            the scope components of a node name, the last component(the node itself) is dropped, e.g.
+            '/model/layers.12/self_attn/MatMul' -> ['model', 'layers.12', 'self_attn']
+    '''
+    if '/' in name:
+        parts = [p for p in name.split('/') if p != '']
+    else:
+        parts = []
+        for p in name.split('.'):
+            # keep indices with their container: 'layers.12' is one scope
+            if p.isdigit() and len(parts) > 0:
+                parts[-1] = parts[-1] + '.' + p
+            else:
+                parts.append(p)
+    return parts[:-1]
+
+
+def _zero():
+    return {key: 0 for key in Metrics}
+
+
+class ProfileRollup():
+    def __init__(self, graph, groups: {str: str} = None, exclude_ops=None):
+        '''
+            Args:
+                graph: a Graph after profile(), roofline() is optional and adds projected latency
+                groups: {group name: regex}, a node is in the first group whose regex matches its name(re.search),
+                    nodes that match no group are in 'Other'
+                exclude_ops: op types without a row in the op type table, their nodes still count in the totals,
+                    scopes and groups
+        '''
+        self.has_latency = graph.valid_roofline
+        self.exclude_ops = set(exclude_ops) if exclude_ops is not None else set()
+        self.total = _zero()
+        self.nodes = 0
+        self.root = {'name': '', 'path': '', 'nodes': 0, 'metrics': _zero(), 'children': {}}
+        self.op_types = {}
+        self.groups = {}
+        patterns = [(k, re.compile(v)) for k, v in groups.items()] if groups is not None else []
+        for key in graph.nodemap:
+            node = graph.nodemap[key]
+            metrics = {
+                'MACs': float(node.macs[0]),
+                'Memory': int(node.memory),
+                'Params': int(node.params),
+                'Latency': float(node.roofline['latency'][2]) if self.has_latency else 0,
+            }
+            self.nodes += 1
+            self._add(self.total, metrics)
+            scope = self.root
+            for part in scope_path(key):
+                if part not in scope['children']:
+                    path = part if scope['path'] == '' else scope['path'] + '/' + part
+                    scope['children'][part] = {'name': part, 'path': path, 'nodes': 0, 'metrics': _zero(),
+                                               'children': {}}
+                scope = scope['children'][part]
+                scope['nodes'] += 1
+                self._add(scope['metrics'], metrics)
+            self._add_flat(self.op_types, node.op_type, metrics)
+            if len(patterns) > 0:
+                group = OTHER_GROUP
+                for name, pattern in patterns:
+                    if pattern.search(key) is not None:
+                        group = name
+                        break
+                self._add_flat(self.groups, group, metrics)
+        self.root['nodes'] = self.nodes
+        self.root['metrics'] = self.total
+
+    @staticmethod
+    def _add(dst, metrics):
+        for k in Metrics:
+            dst[k] += metrics[k]
+
+    def _add_flat(self, table, key, metrics):
+        if key not in table:
+            table[key] = {'nodes': 0, 'metrics': _zero()}
+        table[key]['nodes'] += 1
+        self._add(table[key]['metrics'], metrics)
+
+    def metrics(self):
+        return Metrics if self.has_latency else Metrics[:-1]
+
+    def _percent(self, value, key):
+        return value / self.total[key] if self.total[key] != 0 else 0
+
+    def sorted_children(self, scope):
+        '''
+            Returns:
+                [(child, cumulative {metric: percent})] sorted by MACs, cumulative over the preceding siblings
+        '''
+        rows = []
+        cumulative = _zero()
+        for child in sorted(scope['children'].values(), key=lambda s: -s['metrics']['MACs']):
+            self._add(cumulative, child['metrics'])
+            rows.append((child, {k: self._percent(cumulative[k], k) for k in Metrics}))
+        return rows
+
+    def scopes(self, max_depth: int = None):
+        '''
+            Returns:
+                [(depth, scope, cumulative {metric: percent})] in depth-first order, siblings sorted by MACs
+        '''
+        rows = []
+
+        def visit(scope, depth):
+            if max_depth is not None and depth > max_depth:
+                return
+            for child, cumulative in self.sorted_children(scope):
+                rows.append((depth, child, cumulative))
+                visit(child, depth + 1)
+
+        visit(self.root, 1)
+        return rows
+
+    def sorted_flat(self, table: {}):
+        '''
+            Returns:
+                [(key, entry, cumulative {metric: percent})] sorted by MACs, then memory
+        '''
+        rows = []
+        cumulative = _zero()
+        for key, entry in sorted(table.items(), key=lambda kv: (-kv[1]['metrics']['MACs'],
+                                                                -kv[1]['metrics']['Memory'])):
+            self._add(cumulative, entry['metrics'])
+            rows.append((key, entry, {k: self._percent(cumulative[k], k) for k in Metrics}))
+        return rows
+
+    def _metric_cells(self, metrics, csvformat, cumulative=None):
+        cells = []
+        for k in self.metrics():
+            if k == 'Latency':
+                cells.append('{:.5f}'.format(metrics[k]))
+            else:
+                cells.append(num2str(int(metrics[k]), csvformat))
+            cells.append('{:.2%}'.format(self._percent(metrics[k], k)))
+            if cumulative is not None:
+                cells.append('{:.2%}'.format(cumulative[k]))
+        return cells
+
+    def _header(self, first, cumulative=False):
+        header = list(first)
+        for k in self.metrics():
+            header.extend([k + '(ms)' if k == 'Latency' else k, k + ' Percent'])
+            if cumulative:
+                header.append(k + ' Cumulative')
+        return header
+
+    def _total_row(self, width, csvformat, cumulative=False):
+        row = ['Total'] + ['_'] * (width - 2) + [str(self.nodes)]
+        row.extend(self._metric_cells(self.total, csvformat, {k: 1.0 for k in Metrics} if cumulative else None))
+        return row
+
+    def print_scopes(self, f: str = None, max_depth: int = 3):
+        csvformat = f is not None and '.csv' in f
+        ptable = []
+        for depth, scope, cumulative in self.scopes(max_depth):
+            row = [scope['path'], str(depth), str(scope['nodes'])]
+            row.extend(self._metric_cells(scope['metrics'], csvformat, cumulative))
+            ptable.append(row)
+        ptable.append(self._total_row(3, csvformat, True))
+        print_table(ptable, self._header(['Scope', 'Depth', 'Nodes'], True), f)
+
+    def shown_op_types(self):
+        '''
+            Returns:
+                the op type table without the rows of exclude_ops
+        '''
+        return {k: v for k, v in self.op_types.items() if k not in self.exclude_ops}
+
+    def print_op_types(self, f: str = None):
+        self._print_flat(self.shown_op_types(), 'Type', f)
+
+    def print_groups(self, f: str = None):
+        self._print_flat(self.groups, 'Group', f)
+
+    def _print_flat(self, table, title, f):
+        csvformat = f is not None and '.csv' in f
+        ptable = []
+        for key, entry, cumulative in self.sorted_flat(table):
+            row = [key, str(entry['nodes'])]
+            row.extend(self._metric_cells(entry['metrics'], csvformat, cumulative))
+            ptable.append(row)
+        ptable.append(self._total_row(2, csvformat, True))
+        print_table(ptable, self._header([title, 'Nodes'], True), f)
+
+    def print_rollup(self, f: str = None, max_depth: int = 3):
+        '''
+            Print the scope, op type and group tables, or save them to f, <f name>_op_types<f ext> and
+            <f name>_groups<f ext>. A .json f saves to_dict() instead.
+        '''
+        if f is not None and f.endswith('.json'):
+            self.save_json(f, max_depth)
+            return
+        tables = [('_op_types', self.print_op_types)]
+        if len(self.groups) > 0:
+            tables.append(('_groups', self.print_groups))
+        self.print_scopes(f, max_depth)
+        for suffix, printer in tables:
+            if f is None:
+                print()
+                printer()
+            else:
+                base, ext = os.path.splitext(f)
+                printer(base + suffix + ext)
+
+    def to_dict(self, max_depth: int = None):
+        '''
+            Returns:
+                a JSON-serializable dict: totals, the scope tree(children sorted by MACs), op types and groups,
+                all sorted by MACs with cumulative percentages
+        '''
+        keys = self.metrics()
+
+        def scope_dict(scope, depth, cumulative):
+            d = {'name': scope['name'], 'path': scope['path'], 'nodes': scope['nodes']}
+            d.update({k: scope['metrics'][k] for k in keys})
+            d['percent'] = {k: self._percent(scope['metrics'][k], k) for k in keys}
+            d['cumulative'] = {k: cumulative[k] for k in keys}
+            if max_depth is None or depth < max_depth:
+                d['children'] = [scope_dict(c, depth + 1, cum) for c, cum in self.sorted_children(scope)]
+            else:
+                d['children'] = []
+            return d
+
+        def flat_list(table):
+            items = []
+            for key, entry, cumulative in self.sorted_flat(table):
+                item = {'name': key, 'nodes': entry['nodes']}
+                item.update({k: entry['metrics'][k] for k in keys})
+                item['percent'] = {k: self._percent(entry['metrics'][k], k) for k in keys}
+                item['cumulative'] = {k: cumulative[k] for k in keys}
+                items.append(item)
+            return items
+
+        return {
+            'metrics': list(keys),
+            'total': dict({'nodes': self.nodes}, **{k: self.total[k] for k in keys}),
+            'scopes': scope_dict(self.root, 0, {k: 1.0 for k in Metrics})['children'],
+            'op_types': flat_list(self.shown_op_types()),
+            'groups': flat_list(self.groups),
+        }
+
+    def save_json(self, f: str, max_depth: int = None):
+        with open(f, 'w') as fp:
+            json.dump(self.to_dict(max_depth), fp, indent=1)
@@ -0,0 +1,282 @@
+import importlib.util
+import os
+
+import onnx
+
+from .graph import Graph
+from .model import Model
+from .tensor import STATIC_TENSOR
+from .tracing import span
+from .utils import FOLD_MAX_BYTES
+
+'''
+Lightweight simplification with onnx_tool's own graph passes, for models too large for onnxsim.
+onnxsim folds constants with onnxruntime and checks the result over the whole weighted model, which is the slowest
+step of the workflow and runs out of memory on multi-GB models. simplify() loads the model as an onnx_tool Graph
+with constant folding and rewrites it in place:
+    constants: every node whose inputs are all static is evaluated with value_infer and replaced by its outputs as
+        initializers. A node with an output larger than max_fold_bytes, or without value_infer, is kept. With a
+        fold_cache_dir the folded tensors are cached on disk(onnx_tool.foldcache) for the next exports of the model.
+    identities: Identity and Dropout(the identity at inference) nodes are removed.
+    transposes: a Transpose followed by a Transpose that restores the axis order is removed with it.
+    reshapes: a Reshape, Flatten, Squeeze or Unsqueeze whose only consumer is a Reshape to a static shape is removed,
+        the Reshape gets its input.
+    dead nodes: the nodes no graph output depends on are removed.
+The result is not checked with onnxruntime. choose_simplifier() picks between onnxsim and this simplifier by the
+size of the weights of a model.
+'''
+
+# the largest tensor constant folding materializes, larger constants stay nodes
+DEFAULT_FOLD_MAX_BYTES = FOLD_MAX_BYTES
+
+# one protobuf can not hold more than 2GB, larger models keep their weights in an external data file
+_PROTOBUF_LIMIT = 2 ** 31 - 1
+
+# in 'auto' mode models with more weights than this are simplified here instead of with onnxsim
+LARGE_MODEL_MB = 1024
+
+SIMPLIFIERS = ('auto', 'onnxsim', 'onnx_tool')
+
+_IDENTITY_OPS = ('Identity', 'Dropout')
+_SHAPE_OPS = ('Reshape', 'Flatten', 'Squeeze', 'Unsqueeze')
+
+
+def weights_bytes(m: onnx.ModelProto):
+    '''
+        Returns:
+            the size of the initializers of a model, from their shapes, the tensor data is not read
+    '''
+    size = 0
+    for tensor in m.graph.initializer:
+        count = 1
+        for dim in tensor.dims:
+            count *= dim
+        size += count * onnx.helper.tensor_dtype_to_np_dtype(tensor.data_type).itemsize
+    return size
+
+
+def choose_simplifier(m: onnx.ModelProto, simplifier: str = 'auto', threshold_mb: float = LARGE_MODEL_MB):
+    '''
+        Args:
+            simplifier: 'auto', 'onnxsim' or 'onnx_tool'
+            threshold_mb: 'auto' takes onnx_tool for models with more MB of weights
+        Returns:
+            'onnxsim' or 'onnx_tool', 'auto' takes onnx_tool when onnxsim is not installed too
+    '''
+    if simplifier not in SIMPLIFIERS:
+        raise ValueError(f'Unknown simplifier {simplifier}, expected one of {SIMPLIFIERS}')
+    if simplifier != 'auto':
+        return simplifier
+    if weights_bytes(m) > threshold_mb * 1024 * 1024:
+        return 'onnx_tool'
+    if importlib.util.find_spec('onnxsim') is None:
+        return 'onnx_tool'
+    return 'onnxsim'
+
+
+def _consumers(g: Graph, tensor: str):
+    return g.consumedby.get(tensor, [])
+
+
+def _bypass(g: Graph, nodename: str, source: str):
+    '''
+        Remove a single-output node, the consumers of its output read source instead.
+    '''
+    node = g.nodemap.pop(nodename)
+    output = node.output[0]
+    for input in node.input:
+        if nodename in g.consumedby.get(input, []):
+            g.consumedby[input].remove(nodename)
+            if len(g.consumedby[input]) == 0:
+                g.consumedby.pop(input)
+    for consumer in g.consumedby.pop(output, []):
+        cnode = g.nodemap[consumer]
+        for i, input in enumerate(cnode.input):
+            if input == output:
+                cnode.input[i] = source
+        g.consumedby.setdefault(source, []).append(consumer)
+    g.producedby.pop(output, None)
+
+
+def eliminate_identities(g: Graph):
+    '''
+        Returns:
+            the number of removed Identity and Dropout nodes
+    '''
+    count = 0
+    for name in list(g.nodemap.keys()):
+        node = g.nodemap[name]
+        if node.op_type not in _IDENTITY_OPS or len(node.input) == 0 or node.output[0] in g.output:
+            continue
+        # the Dropout mask is not the identity
+        if any(o != '' and (o in g.consumedby or o in g.output) for o in node.output[1:]):
+            continue
+        _bypass(g, name, node.input[0])
+        count += 1
+    return count
+
+
+def _is_identity_perm(first, second):
+    if first is None or second is None:
+        # the default perm reverses the axes, twice is the identity
+        return first is None and second is None
+    return len(first) == len(second) and all(first[second[i]] == i for i in range(len(second)))
+
+
+def cancel_transposes(g: Graph):
+    '''
+        Returns:
+            the number of removed Transpose pairs
+    '''
+    count = 0
+    for name in list(g.nodemap.keys()):
+        node = g.nodemap.get(name)
+        if node is None or node.op_type != 'Transpose' or node.output[0] in g.output:
+            continue
+        consumers = _consumers(g, node.output[0])
+        if len(consumers) != 1:
+            continue
+        next_node = g.nodemap[consumers[0]]
+        if next_node.op_type != 'Transpose' or next_node.output[0] in g.output:
+            continue
+        if not _is_identity_perm(node.perm, next_node.perm):
+            continue
+        _bypass(g, next_node.name, node.output[0])
+        _bypass(g, name, node.input[0])
+        count += 1
+    return count
+
+
+def collapse_reshapes(g: Graph):
+    '''
+        Returns:
+            the number of removed shape ops
+    '''
+    count = 0
+    for name in list(g.nodemap.keys()):
+        node = g.nodemap.get(name)
+        if node is None or node.op_type not in _SHAPE_OPS or node.output[0] in g.output:
+            continue
+        consumers = _consumers(g, node.output[0])
+        if len(consumers) != 1:
+            continue
+        next_node = g.nodemap[consumers[0]]
+        if next_node.op_type != 'Reshape' or next_node.input[0] != node.output[0] or len(next_node.input) < 2:
+            continue
+        shape = g.tensormap.get(next_node.input[1])
+        if shape is None or shape.type != STATIC_TENSOR or shape.numpy is None:
+            continue
+        # a 0 copies the dimension of the input, unless allowzero is set
+        if (shape.numpy == 0).any() and not getattr(next_node, 'allowzero', 0):
+            continue
+        _bypass(g, name, node.input[0])
+        count += 1
+    return count
+
+
+def remove_dead_nodes(g: Graph):
+    '''
+        Returns:
+            the number of removed nodes no graph output depends on
+    '''
+    live = set()
+    stack = list(g.output)
+    visited = set(stack)
+    while len(stack) > 0:
+        tensor = stack.pop()
+        for producer in g.producedby.get(tensor, []):
+            if producer in live or producer not in g.nodemap:
+                continue
+            live.add(producer)
+            for input in g.nodemap[producer].input:
+                if input not in visited:
+                    visited.add(input)
+                    stack.append(input)
+    dead = [name for name in g.nodemap.keys() if name not in live]
+    for name in dead:
+        g.nodemap.pop(name)
+    if len(dead) > 0:
+        g.__update_consumer_producer__()
+    return len(dead)
+
+
+def simplify_graph(g: Graph):
+    '''
+        Run the rewrite passes until none changes the graph.
+        Returns:
+            {pass name: removed count}
+    '''
+    stats = {'identities': 0, 'transposes': 0, 'reshapes': 0, 'dead_nodes': 0}
+    changed = True
+    while changed:
+        counts = {
+            'identities': eliminate_identities(g),
+            'transposes': cancel_transposes(g),
+            'reshapes': collapse_reshapes(g),
+            'dead_nodes': remove_dead_nodes(g),
+        }
+        for key, value in counts.items():
+            stats[key] += value
+        changed = sum(counts.values()) > 0
+    # drop the tensors of the removed nodes
+    used = set(g.input) | set(g.output)
+    for node in g.nodemap.values():
+        used.update(node.input)
+        used.update(node.output)
+    g.dynamics = [t for t in g.dynamics if t in used]
+    g.initials = [t for t in g.initials if t in used]
+    return stats
+
+
+def save_model(model: Model, f: str):
+    '''
+        Save the simplified model, its initializers go to <f>.data when they do not fit in one protobuf. The model is
+        written under another name then renamed to f, a process killed while saving leaves no partial f.
+        Returns:
+            the saved onnx.ModelProto
+    '''
+    g = model.graph
+    # no value_info, the tensors were not shape inferred and their dtypes are guesses
+    graph = g.make_graph_onnx(g.nodemap.keys(), model.mproto.graph.name or 'graph', g.input, g.output,
+                              with_shape_info=False)
+    proto = onnx.helper.make_model(graph, producer_name=model.mproto.producer_name,
+                                   producer_version=model.mproto.producer_version)
+    proto.ir_version = model.mproto.ir_version
+    del proto.opset_import[:]
+    proto.opset_import.extend(model.mproto.opset_import)
+    proto.metadata_props.extend(model.mproto.metadata_props)
+    temp = f + '.tmp'
+    if proto.ByteSize() > _PROTOBUF_LIMIT:
+        # the data file is named after f, the temporary model in the same folder finds it
+        onnx.save_model(proto, temp, save_as_external_data=True, all_tensors_to_one_file=True,
+                        location=os.path.basename(f) + '.data')
+    else:
+        onnx.save_model(proto, temp)
+    os.replace(temp, f)
+    return proto
+
+
+def simplify(m, f: str = None, max_fold_bytes: int = DEFAULT_FOLD_MAX_BYTES, fold_cache_dir: str = None):
+    '''
+        Args:
+            m: a model path or onnx.ModelProto
+            f: the file the simplified model is saved to, None to not save it
+            max_fold_bytes: the largest output of a folded constant node, None for no limit
+            fold_cache_dir: the directory of the disk cache of folded tensors, None for no cache
+        Returns:
+            (the saved onnx.ModelProto or None, {'nodes': (before, after), pass name: removed count})
+    '''
+    nodes = len(m.graph.node) if isinstance(m, onnx.ModelProto) else None
+    with span('fold_constants'):
+        model = Model(m, {'constant_folding': True, 'fold_max_bytes': max_fold_bytes,
+                          'fold_cache_dir': fold_cache_dir})
+    if nodes is None:
+        nodes = len(model.mproto.graph.node)
+    with span('rewrite_graph'):
+        stats = simplify_graph(model.graph)
+    stats['nodes'] = (nodes, len(model.graph.nodemap))
+    proto = None
+    if f is not None:
+        with span('save_simplified'):
+            proto = save_model(model, f)
+    return proto, stats
@@ -364,6 +364,21 @@ STATIC_TENSOR = 0
 DYNAMIC_TENSOR = 1
 
 
+class TensorSpec():
+    '''
+        Shape and dtype of a graph input without data, for Graph.shape_infer and Graph.shape_regress.
+        Shape inference needs the shapes of the inputs only, a zero array of a large image or video input costs
+        gigabytes for nothing. dtype None keeps the dtype the model declares.
+    '''
+
+    def __init__(self, shape, dtype=None):
+        self.shape = [int(v) for v in shape]
+        self.dtype = dtype
+
+    def __repr__(self):
+        return f'TensorSpec({self.shape}, {self.dtype})'
+
+
 class Tensor():
 
     def __init__(self, t):
@@ -401,6 +416,13 @@ class Tensor():
         self.update_shape(data.shape)
         self.update_dtype(self.numpy.dtype.type)
 
+    def update_spec(self, spec: TensorSpec):
+        # the data is dropped, a node that reads it gets zeros from get_numpy
+        self.numpy = None
+        self.update_shape(list(spec.shape))
+        if spec.dtype is not None:
+            self.update_dtype(numpy.dtype(spec.dtype).type)
+
     def update_proto(self, data: numpy.ndarray):
         self.update_tensor(data)
         self.proto = self.make_tensor_proto()
@@ -493,7 +515,8 @@ class Tensor():
             tproto = onnx.helper.make_tensor(self.name, npdtype2onnxdtype(self.numpy.dtype)
                                              , [], [self.numpy.item()])
         else:
-            if self.numpy.dtype not in [numpy.float32, numpy.int32]:
+            if self.numpy.dtype.kind not in 'OSU':
+                # raw bytes, building the proto from a list of values is many times slower for large weights
                 raw = True
                 data = self.numpy.tobytes()
             else:
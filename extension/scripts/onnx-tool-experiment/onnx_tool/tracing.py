@@ -0,0 +1,194 @@
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+from . import events
+
+'''
+Stage tracing of the profiling workflow.
+Spans record wall time and the tracemalloc peak of every stage(load, constant search, shape inference, profile, ...),
+shape inference also records one event per node. The trace is exported as Chrome trace-event JSON, open it with
+chrome://tracing or https://ui.perfetto.dev.
+Tracing is off by default, span() costs one global lookup until enable_tracing() is called.
+The stage spans are also reported as onnx_tool.events progress events when those are enabled, traced or not.
+'''
+
+_TRACER = None
+
+
+def _reset_peak():
+    # tracemalloc.reset_peak is new in Python 3.9, older versions report the peak since tracing started
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+
+
+class _NullSpan():
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+    def set(self, **kwargs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span():
+    def __init__(self, tracer, name: str, cat: str, args: {}):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.peak = 0
+
+    def set(self, **kwargs):
+        self.args.update(kwargs)
+
+    def __enter__(self):
+        if self.cat == 'stage':
+            events.stage_start(self.name)
+        self.tracer._push(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        dur = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.args['error'] = f'{exc_type.__name__}: {exc_val}'
+        self.tracer._pop(self, dur)
+        if self.cat == 'stage':
+            events.stage_end(self.name, dur, self.args.get('error'))
+        return False
+
+
+class Tracer():
+    def __init__(self, memory: bool = True, node_events: bool = True):
+        '''
+            Args:
+                memory: trace memory allocations with tracemalloc, adds mem_peak(MB) and mem_delta(MB) to every span
+                node_events: record one event per node in shape inference
+        '''
+        self.memory = memory
+        self.node_events = node_events
+        self.events = []
+        self.stack = []
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+        self.started_tracemalloc = False
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracemalloc = True
+
+    def close(self):
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+            self.started_tracemalloc = False
+
+    def span(self, name: str, cat: str = 'stage', **args):
+        return Span(self, name, cat, args)
+
+    def _push(self, span: Span):
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if len(self.stack) > 0:
+                # keep the parent's peak before resetting it for the child
+                parent = self.stack[-1]
+                parent.peak = max(parent.peak, peak)
+            span.mem_start = current
+            _reset_peak()
+        self.stack.append(span)
+
+    def _pop(self, span: Span, dur: float):
+        self.stack.pop()
+        event = self.complete(span.name, span.cat, span.start, dur, span.args)
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            span.peak = max(span.peak, peak)
+            event['args']['mem_peak'] = round(span.peak / 1e6, 3)
+            event['args']['mem_delta'] = round((current - span.mem_start) / 1e6, 3)
+            self.events.append({'name': 'traced memory', 'ph': 'C', 'ts': event['ts'] + event['dur'],
+                                'pid': self.pid, 'args': {'MB': round(current / 1e6, 3)}})
+            if len(self.stack) > 0:
+                parent = self.stack[-1]
+                parent.peak = max(parent.peak, span.peak)
+            _reset_peak()
+
+    def complete(self, name: str, cat: str, start: float, dur: float, args: {} = None):
+        '''
+            Add a finished event, start is a time.perf_counter() value, dur is in seconds.
+        '''
+        event = {'name': name, 'cat': cat, 'ph': 'X', 'ts': round((start - self.origin) * 1e6, 3),
+                 'dur': round(dur * 1e6, 3), 'pid': self.pid, 'tid': threading.get_ident(),
+                 'args': {} if args is None else args}
+        self.events.append(event)
+        return event
+
+    def stages(self):
+        '''
+            Returns:
+                [(name, seconds, mem_peak MB)] of all spans except node events, in start order
+        '''
+        spans = [e for e in self.events if e['ph'] == 'X' and e['cat'] != 'node']
+        spans.sort(key=lambda e: e['ts'])
+        return [(e['name'], e['dur'] / 1e6, e['args'].get('mem_peak', 0)) for e in spans]
+
+    def save(self, f: str):
+        trace = {'traceEvents': self.events, 'displayTimeUnit': 'ms'}
+        with open(f, 'w') as fp:
+            json.dump(trace, fp)
+
+
+def enable_tracing(memory: bool = True, node_events: bool = True):
+    global _TRACER
+    if _TRACER is not None:
+        _TRACER.close()
+    _TRACER = Tracer(memory, node_events)
+    return _TRACER
+
+
+def disable_tracing():
+    global _TRACER
+    tracer = _TRACER
+    if tracer is not None:
+        tracer.close()
+    _TRACER = None
+    return tracer
+
+
+def get_tracer():
+    return _TRACER
+
+
+def span(name: str, cat: str = 'stage', **args):
+    if _TRACER is None:
+        if cat == 'stage' and events.enabled():
+            return events.StageSpan(name)
+        return _NULL_SPAN
+    return _TRACER.span(name, cat, **args)
+
+
+def traced(name: str, cat: str = 'stage'):
+    '''
+        Decorator, record every call of the function as a span when tracing is enabled.
+    '''
+
+    def deco(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _TRACER is None:
+                if cat != 'stage' or not events.enabled():
+                    return func(*args, **kwargs)
+                with events.StageSpan(name):
+                    return func(*args, **kwargs)
+            with _TRACER.span(name, cat):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return deco
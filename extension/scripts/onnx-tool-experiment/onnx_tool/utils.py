@@ -1,9 +1,12 @@
+import importlib
 import time
 import warnings
-from tabulate import tabulate
 
 VERSION = "0.9.0"
 
+# the default largest tensor constant folding materializes
+FOLD_MAX_BYTES = 64 * 1024 * 1024
+
 class ModelConfig():
     def __init__(self, mcfg={}):
         self.cfg = mcfg
@@ -13,6 +16,11 @@ class ModelConfig():
         self.__add_attr__('fixed_topk',0)
         self.__add_attr__('verbose',False)
         self.__add_attr__('remove_dangling',True)
+        self.__add_attr__('dedup_blocks',False)
+        # constant folding keeps a node whose output is larger than this many bytes, None: no limit
+        self.__add_attr__('fold_max_bytes',FOLD_MAX_BYTES)
+        # directory of the disk cache of constant folding results, None: no cache
+        self.__add_attr__('fold_cache_dir',None)
 
     def __add_attr__(self, attr_name, defaultV):
         self.__setattr__(attr_name, defaultV if not self.cfg.__contains__(attr_name) else self.cfg[attr_name])
@@ -49,6 +57,7 @@ def print_table(ptable, header, f):
     if f is not None and '.csv' in f:
         saveformat = 'csv'
 
+    from tabulate import tabulate
     if f is None:
         print(tabulate(ptable, headers=header))
     else:
@@ -107,8 +116,31 @@ class Registry():
         """
         self._name = name
         self._obj_map = {}
+        self._lazy_modules = []
+        self._loading = False
+
+    def add_lazy_module(self, module):
+        """
+        Import `module` the first time the registry is used, the module registers its objects on import.
+        """
+        self._lazy_modules.append(module)
+
+    def _load(self):
+        # the module registers its objects while it is imported, those calls must not import it again
+        if self._loading:
+            return
+        self._loading = True
+        try:
+            while len(self._lazy_modules) > 0:
+                importlib.import_module(self._lazy_modules[0])
+                # removed once imported, after a failed import the next use raises the import error again
+                self._lazy_modules.pop(0)
+        finally:
+            self._loading = False
 
     def __setitem__(self, name, obj):
+        # the built-in objects come first, so they can be overridden
+        self._load()
         # assert (name not in self._obj_map), (f"An object named '{name}' was already registered "
         #                                      f"in '{self._name}' registry!")
         if name in self._obj_map:
@@ -137,28 +169,35 @@ class Registry():
         self.__setitem__(name, obj)
 
     def get(self, name):
+        self._load()
         ret = self._obj_map.get(name)
         # if ret is None:
         # raise KeyError(f"No object named '{name}' found in '{self._name}' registry!")
         return ret
 
     def __getitem__(self, item):
+        self._load()
         if self._obj_map.__contains__(item) is False:
             raise KeyError(f"No object named '{item}' found in '{self._name}' registry!")
         return self._obj_map[item]
 
     def __contains__(self, name):
+        self._load()
         return name in self._obj_map
 
     def __iter__(self):
+        self._load()
         return iter(self._obj_map.items())
 
     def keys(self):
+        self._load()
         return self._obj_map.keys()
 
 
 NODEPROFILER_REGISTRY = Registry('nodeprofiler')
 NODE_REGISTRY = Registry('NODE')
+# the node classes(and numpy, onnx) are imported when a node is first created
+NODE_REGISTRY.add_lazy_module(__package__ + '.node')
 
 
 class GlobalVars():
@@ -1,19 +1,20 @@
 from typing import List, Optional
 import onnx_tool
 import numpy
-from onnx_tool.tensor import Tensor
-from onnxsim import simplify
+from onnx_tool.tensor import Tensor, TensorSpec
 import onnx
 import os
 import tempfile
 
-def profile_model(modelpath: str, results_base_dir: Optional[str] = None):
+def profile_model(modelpath: str, results_base_dir: Optional[str] = None, output_path: Optional[str] = None):
     """
     Profile an ONNX model using onnx_tool
     
     Args:
         modelpath: Path to the ONNX model file
         results_base_dir: Base directory for saving results. If None, uses a default location.
+        output_path: Save the simplified model here, the model file is not written. If None, the model file is
+            overwritten with the simplified model.
     """
     
     # Use a more appropriate default results directory
@@ -43,20 +44,22 @@ def profile_model(modelpath: str, results_base_dir: Optional[str] = None):
         os.makedirs(results_dir)
     print(f"Profiling ONNX model: {modelpath}")
     onnx_model = onnx.load(modelpath)
+    from onnxsim import simplify
     onnx_model = simplify(onnx_model)[0]  # optional simplification step
-    onnx.save(onnx_model, modelpath)  # overwrite with simplified model
+    simplified_path = modelpath if output_path is None else output_path
+    onnx.save(onnx_model, simplified_path)
     input_proto = onnx_model.graph.input[0]
     input_name = input_proto.name
     input_shape_dims = input_proto.type.tensor_type.shape.dim
     input_shape = tuple(d.dim_value if (d.dim_value > 0) else 1 for d in input_shape_dims)
 
-    m = onnx_tool.Model(modelpath)
-    m.graph.shape_infer({input_name: numpy.zeros(input_shape)})  # update tensor shapes with new input tensor
+    m = onnx_tool.Model(simplified_path)
+    m.graph.shape_infer({input_name: TensorSpec(input_shape)})  # update tensor shapes with new input shape
     m.graph.profile()
     # m.graph.print_node_map()  # console print
     m.graph.print_node_map(results_dir+ os.path.basename(modelpath.replace('.onnx','.txt')))  # save file
 
-    m.graph.shape_infer({input_name: numpy.zeros(input_shape)})  # update new resolution
+    m.graph.shape_infer({input_name: TensorSpec(input_shape)})  # update new resolution
     m.graph.profile()
     m.graph.print_node_map(results_dir+ os.path.basename(modelpath.replace('.onnx','.csv')))  # csv file
 
@@ -1,8 +1,11 @@
 from typing import List, Dict, Tuple, Optional
 import onnx_tool
 import numpy
-from onnx_tool.tensor import Tensor
-from onnxsim import simplify
+from onnx_tool.tensor import Tensor, TensorSpec
+from onnx_tool.rollup import ProfileRollup
+from onnx_tool.tracing import enable_tracing, disable_tracing, span
+from onnx_tool import events
+from onnx_tool.simplify import LARGE_MODEL_MB, choose_simplifier
 import onnx
 import os
 import sys
@@ -80,7 +83,7 @@ def try_multiple_shapes(model_path: str, input_name: str, input_proto) -> Option
                 
                 # Quick test with onnx_tool
                 m = onnx_tool.Model(model_path)
-                m.graph.shape_infer({input_name: numpy.zeros(test_shape)})
+                m.graph.shape_infer({input_name: TensorSpec(test_shape)})
                 
                 print(f"[SUCCESS] Shape {test_shape} works for input '{input_name}'")
                 return test_shape
@@ -102,7 +105,8 @@ def try_multiple_shapes(model_path: str, input_name: str, input_proto) -> Option
     return None
 
 def profile_model(modelpath: str, results_base_dir: str = None, skip_simplification: bool = False, 
-                 enable_dynamic_shape_handling: bool = True):
+                 enable_dynamic_shape_handling: bool = True, enable_tracing_output: bool = False,
+                 simplifier: str = 'auto', large_model_mb: float = LARGE_MODEL_MB, output_path: str = None):
     """
     Profile an ONNX model using onnx_tool with enhanced dynamic shape handling
     
@@ -111,8 +115,39 @@ def profile_model(modelpath: str, results_base_dir: str = None, skip_simplificat
         results_base_dir: Base directory for saving results (optional)
         skip_simplification: Skip the internal simplification step if already simplified
         enable_dynamic_shape_handling: Enable intelligent dynamic shape handling
+        enable_tracing_output: Save a Chrome trace of all stages (<model>_trace.json) to the results directory
+        simplifier: 'onnxsim', 'onnx_tool'(onnx_tool.simplify, for models too large for onnxsim) or 'auto'
+        large_model_mb: 'auto' simplifies models with more MB of weights with onnx_tool
+        output_path: Save the simplified model here and profile it, the model file is not written. None
+            overwrites the model file with the simplified model
+    """
+    if not enable_tracing_output:
+        return _profile_model(modelpath, results_base_dir, skip_simplification, enable_dynamic_shape_handling,
+                              simplifier, large_model_mb, output_path)
+
+    tracer = enable_tracing()
+    results_dir = None
+    try:
+        with span('profile_model', model=os.path.basename(modelpath)):
+            results_dir = _profile_model(modelpath, results_base_dir, skip_simplification,
+                                         enable_dynamic_shape_handling, simplifier, large_model_mb, output_path)
+        return results_dir
+    finally:
+        disable_tracing()
+        if results_dir is None:
+            results_dir = get_results_dir(modelpath, results_base_dir)
+        trace_path = results_dir + os.path.basename(modelpath.replace('.onnx', '_trace.json'))
+        tracer.save(trace_path)
+        events.artifact('trace', trace_path)
+        for name, seconds, mem_peak in tracer.stages():
+            print(f"[TRACE] {name}: {seconds:.3f} s, peak {mem_peak:.1f} MB")
+        print(f"[INFO] Stage trace saved to: {trace_path}")
+
+
+def get_results_dir(modelpath: str, results_base_dir: str = None) -> str:
+    """
+    Resolve and create the results directory of a model: <results_base_dir>/<model name>/
     """
-    
     # Use intelligent default results directory if not provided
     if results_base_dir is None:
         # Try to use a directory relative to the model location first
@@ -138,9 +173,21 @@ def profile_model(modelpath: str, results_base_dir: str = None, skip_simplificat
     print(f"Results directory: {results_dir}")
     if not os.path.exists(results_dir):
         os.makedirs(results_dir)
+    events.artifact('results', results_dir)
+    return results_dir
+
+
+def _profile_model(modelpath: str, results_base_dir: str = None, skip_simplification: bool = False,
+                   enable_dynamic_shape_handling: bool = True, simplifier: str = 'auto',
+                   large_model_mb: float = LARGE_MODEL_MB, output_path: str = None):
+    results_dir = get_results_dir(modelpath, results_base_dir)
+    # the model that is profiled, the simplified one once it is saved. The results keep the name of modelpath
+    analyzed_path = modelpath
+    simplified_path = modelpath if output_path is None else output_path
     
     print(f"Profiling ONNX model: {modelpath}")
-    onnx_model = onnx.load(modelpath)
+    with span('load', file=modelpath):
+        onnx_model = onnx.load(modelpath)
     
     # Detect dynamic shapes
     dynamic_info = detect_dynamic_shapes(onnx_model)
@@ -152,8 +199,26 @@ def profile_model(modelpath: str, results_base_dir: str = None, skip_simplificat
     # Skip simplification if requested (model is already simplified)
     if not skip_simplification:
         try:
-            onnx_model = simplify(onnx_model)[0]  # optional simplification step
-            onnx.save(onnx_model, modelpath)  # overwrite with simplified model
+            if choose_simplifier(onnx_model, simplifier, large_model_mb) == 'onnx_tool':
+                print("[INFO] Simplifying with onnx_tool")
+                from onnx_tool.simplify import simplify
+                with span('simplify'):
+                    # saved by simplify, with an external data file when it does not fit in 2GB, the folded
+                    # constants are cached for the next exports of the model
+                    onnx_model, stats = simplify(onnx_model, simplified_path,
+                                                 fold_cache_dir=os.path.join(results_dir, 'fold_cache'))
+                print(f"[INFO] Simplified nodes: {stats['nodes'][0]} -> {stats['nodes'][1]}")
+            else:
+                from onnxsim import simplify  # imported only when simplifying, it is slow to import
+                with span('simplify'):
+                    onnx_model = simplify(onnx_model)[0]  # optional simplification step
+                with span('save_simplified'):
+                    # written under another name then renamed, a stopped job never leaves half a model
+                    temp_path = simplified_path + '.tmp'
+                    onnx.save(onnx_model, temp_path)
+                    os.replace(temp_path, simplified_path)
+            analyzed_path = simplified_path
+            events.artifact('simplified', simplified_path)
         except Exception as e:
             print(f"[WARNING] Simplification failed: {e}")
             # Continue with original model
@@ -164,7 +229,8 @@ def profile_model(modelpath: str, results_base_dir: str = None, skip_simplificat
     
     if has_dynamic_inputs and enable_dynamic_shape_handling:
         # Try multiple shape configurations
-        shape_result = try_multiple_shapes(modelpath, input_name, input_proto)
+        with span('dynamic_shape_search'):
+            shape_result = try_multiple_shapes(analyzed_path, input_name, input_proto)
         
         if shape_result == "SKIP_SHAPE_INFERENCE":
             # Skip shape inference entirely
@@ -190,7 +256,7 @@ def profile_model(modelpath: str, results_base_dir: str = None, skip_simplificat
         print(f"[INFO] Using input shape {input_shape} for profiling")
     
     try:
-        m = onnx_tool.Model(modelpath)
+        m = onnx_tool.Model(analyzed_path)
         shape_inference_successful = False
         
         # Strategy 1: For dynamic models, try coordinated shapes for ALL inputs
@@ -203,7 +269,7 @@ def profile_model(modelpath: str, results_base_dir: str = None, skip_simplificat
                     all_input_shapes = {}
                     for input_proto in onnx_model.graph.input:
                         safe_shape = get_safe_input_shape(input_proto, batch_size, 128)
-                        all_input_shapes[input_proto.name] = numpy.zeros(safe_shape)
+                        all_input_shapes[input_proto.name] = TensorSpec(safe_shape)
                         print(f"[DEBUG] Using coordinated shape {safe_shape} for input '{input_proto.name}'")
                     
                     # Test coordinated shapes
@@ -220,7 +286,7 @@ def profile_model(modelpath: str, results_base_dir: str = None, skip_simplificat
         if not shape_inference_successful and input_shape is not None:
             try:
                 print(f"[INFO] Attempting shape inference with computed shape: {input_shape}")
-                m.graph.shape_infer({input_name: numpy.zeros(input_shape)})
+                m.graph.shape_infer({input_name: TensorSpec(input_shape)})
                 shape_inference_successful = True
                 print("[SUCCESS] Original computed shape successful")
             except Exception as e:
@@ -252,20 +318,35 @@ def profile_model(modelpath: str, results_base_dir: str = None, skip_simplificat
             txt_path = results_dir + os.path.basename(modelpath.replace('.onnx','.txt'))
             csv_path = results_dir + os.path.basename(modelpath.replace('.onnx','.csv'))
             shapes_path = results_dir + os.path.basename(modelpath.replace('.onnx','_shapes_only.onnx'))
+            rollup_path = results_dir + os.path.basename(modelpath.replace('.onnx','_rollup.json'))
+            qprof_path = results_dir + os.path.basename(modelpath.replace('.onnx','.qprof'))
             
-            m.graph.print_node_map(txt_path)  # save file
-            m.graph.print_node_map(csv_path)  # csv file
+            with span('write_table'):
+                report = m.graph.profile_report()  # computed once for both tables
+                report.save(txt_path)  # save file
+                report.save(csv_path)  # csv file
+                report.save(qprof_path)  # binary profile for the viewer
+                ProfileRollup(m.graph).save_json(rollup_path)  # name scope/op type rollup for the viewer
+            print(f"[INFO] Binary profile saved to: {qprof_path}")
+            events.artifact('profile', qprof_path)
+            events.artifact('report', txt_path)
+            events.artifact('report', csv_path)
+            events.artifact('rollup', rollup_path)
             m.save_model(shapes_path, shape_only=True)   # save model with updated shapes
             
             # Apply simplification on the _shapes_only.onnx model
             try:
-                simplified_model = simplify(onnx.load(shapes_path))[0]
-                onnx.save(simplified_model, shapes_path)
+                from onnxsim import simplify
+                with span('simplify_shapes_only'):
+                    simplified_model = simplify(onnx.load(shapes_path))[0]
+                    onnx.save(simplified_model, shapes_path)
                 print("[INFO] Shape-only model simplified successfully")
             except Exception as e:
                 print(f"[WARNING] Shape-only model simplification failed: {e}")
+            events.artifact('shapes_only', shapes_path)
             
             print(f"[SUCCESS] Profiling completed. Results saved to: {results_dir}")
+            return results_dir
         else:
             raise Exception("All shape inference strategies failed")
         
@@ -277,7 +358,7 @@ def profile_model(modelpath: str, results_base_dir: str = None, skip_simplificat
             print("[INFO] Generating partial analysis...")
             
             # Create basic model analysis without shape inference
-            m_basic = onnx_tool.Model(modelpath)
+            m_basic = onnx_tool.Model(analyzed_path)
             
             # Generate basic model information
             info_path = results_dir + os.path.basename(modelpath.replace('.onnx','_info.txt'))
@@ -315,7 +396,7 @@ def profile_model(modelpath: str, results_base_dir: str = None, skip_simplificat
                 structure_path = results_dir + os.path.basename(modelpath.replace('.onnx','_structure.onnx'))
                 # Save a copy of the original model for structure analysis
                 import shutil
-                shutil.copy2(modelpath, structure_path)
+                shutil.copy2(analyzed_path, structure_path)
                 print(f"[INFO] Model structure saved to: {structure_path}")
             except Exception as copy_error:
                 print(f"[WARNING] Could not save model structure: {copy_error}")
@@ -329,11 +410,16 @@ def profile_model(modelpath: str, results_base_dir: str = None, skip_simplificat
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        print("Usage: python onnx_prof_configurable.py <model_path> [results_base_dir] [skip_simplification]")
+        print("Usage: python onnx_prof_configurable.py <model_path> [results_base_dir] [skip_simplification] [enable_tracing]"
+              " [simplifier] [large_model_mb]")
         sys.exit(1)
     
     model_path = sys.argv[1]
     results_base_dir = sys.argv[2] if len(sys.argv) > 2 else None
     skip_simplification = len(sys.argv) > 3 and sys.argv[3].lower() == 'true'
+    enable_tracing_output = len(sys.argv) > 4 and sys.argv[4].lower() == 'true'
+    simplifier = sys.argv[5] if len(sys.argv) > 5 else 'auto'
+    large_model_mb = float(sys.argv[6]) if len(sys.argv) > 6 else LARGE_MODEL_MB
     
-    profile_model(model_path, results_base_dir, skip_simplification)
+    profile_model(model_path, results_base_dir, skip_simplification, enable_tracing_output=enable_tracing_output,
+                  simplifier=simplifier, large_model_mb=large_model_mb)
@@ -12,16 +12,18 @@ if sys.version_info < (3, 6):
     print("Please install Python 3.6+ or update your qtron.pythonPath setting in VS Code.")
     sys.exit(1)
 
-import onnx
-from onnxsim import simplify
 import shutil
 import os
 
 # Ensure UTF-8 encoding for output
 if sys.stdout.encoding != 'utf-8':
-    import io
-    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
-    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+    if hasattr(sys.stdout, 'reconfigure'):
+        sys.stdout.reconfigure(encoding='utf-8')
+        sys.stderr.reconfigure(encoding='utf-8')
+    else:
+        import io
+        sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+        sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 
 def ensure_directory_exists(directory_path):
     """Ensure a directory exists, create it if it doesn't."""
@@ -37,23 +39,26 @@ def ensure_directory_exists(directory_path):
 # Add the onnx-tool-experiment directory to Python path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'onnx-tool-experiment'))
 
-# Try to import the configurable profiling function
-try:
-    from workflow.onnx_prof_configurable import profile_model
-    ONNX_TOOL_AVAILABLE = True
-    print("[OK] onnx_tool configurable version loaded")
-except ImportError:
+def _load_profile_model():
+    """Import the profiling function, only when profiling is enabled: onnx_tool, numpy and onnx take
+    most of the startup time. Returns None when onnx_tool is not available."""
     try:
-        from workflow.onnx_prof import profile_model
-        ONNX_TOOL_AVAILABLE = True
-        print("[OK] onnx_tool standard version loaded")
-    except ImportError as e:
-        ONNX_TOOL_AVAILABLE = False
-        print(f"Warning: onnx_tool not available ({e}), profiling will be skipped")
+        from workflow.onnx_prof_configurable import profile_model
+        print("[OK] onnx_tool configurable version loaded")
+        return profile_model
+    except ImportError:
+        try:
+            from workflow.onnx_prof import profile_model
+            print("[OK] onnx_tool standard version loaded")
+            return profile_model
+        except ImportError as e:
+            print(f"Warning: onnx_tool not available ({e}), profiling will be skipped")
+            return None
 
 def main():
     if len(sys.argv) < 3:
-        print("Usage: python simplify_onnx.py <input.onnx> <output.onnx> [enable_profiling] [results_dir] [enable_dynamic_shapes]")
+        print("Usage: python simplify_onnx.py <input.onnx> <output.onnx> [enable_profiling] [results_dir] [enable_dynamic_shapes] [enable_tracing]"
+              " [simplifier: auto|onnxsim|onnx_tool] [large_model_mb]")
         sys.exit(1)
 
     input_path = sys.argv[1]
@@ -61,6 +66,9 @@ def main():
     enable_profiling = len(sys.argv) > 3 and sys.argv[3].lower() == 'true'
     results_dir = sys.argv[4] if len(sys.argv) > 4 and sys.argv[4] not in ['', 'DEFAULT'] else None
     enable_dynamic_shapes = len(sys.argv) > 5 and sys.argv[5].lower() == 'true'
+    enable_tracing = len(sys.argv) > 6 and sys.argv[6].lower() == 'true'
+    simplifier = sys.argv[7] if len(sys.argv) > 7 and sys.argv[7] else 'auto'
+    large_model_mb = float(sys.argv[8]) if len(sys.argv) > 8 and sys.argv[8] else None
 
     print(f"Loading ONNX model: {input_path}")
     if enable_profiling:
@@ -75,6 +83,8 @@ def main():
     print(f"[DEBUG] enable_profiling: {enable_profiling}")
     print(f"[DEBUG] results_dir: {results_dir}")
     print(f"[DEBUG] enable_dynamic_shapes: {enable_dynamic_shapes}")
+    print(f"[DEBUG] enable_tracing: {enable_tracing}")
+    print(f"[DEBUG] simplifier: {simplifier}")
     
     # Ensure output directory exists
     output_dir = os.path.dirname(output_path)
@@ -82,26 +92,40 @@ def main():
         print(f"[ERROR] Cannot create output directory: {output_dir}")
         sys.exit(1)
     
+    profile_model = _load_profile_model() if enable_profiling else None
+    ONNX_TOOL_AVAILABLE = profile_model is not None
+
     # Optimized workflow: Use profile_model which includes simplification + profiling
     if enable_profiling and ONNX_TOOL_AVAILABLE:
         try:
             print("Starting integrated onnx_tool analysis (includes simplification)...")
             
             # Use profile_model directly - it handles both simplification and profiling
-            if 'onnx_prof_configurable' in sys.modules:
+            # The simplified model is written to output_path only, the input model is never modified
+            # A simplified model of an earlier run must not pass for the output of this one
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            if 'workflow.onnx_prof_configurable' in sys.modules:
                 # Use configurable version with custom results directory and dynamic shape handling
+                options = {'simplifier': simplifier}
+                if large_model_mb is not None:
+                    options['large_model_mb'] = large_model_mb
                 profile_model(input_path, results_dir if results_dir else None, 
-                            skip_simplification=False, enable_dynamic_shape_handling=enable_dynamic_shapes)
+                            skip_simplification=False, enable_dynamic_shape_handling=enable_dynamic_shapes,
+                            enable_tracing_output=enable_tracing, output_path=output_path, **options)
             else:
                 # Use original version with results directory
                 if results_dir:
                     # If we have a custom results dir, we need to use the configurable version
                     print("Warning: Custom results directory specified but configurable version not available")
-                profile_model(input_path, results_dir if results_dir else None)
+                profile_model(input_path, results_dir if results_dir else None, output_path=output_path)
             
-            # Copy the processed model to output location
-            # profile_model modifies the input file, so we need to copy it to the expected output
-            shutil.copy2(input_path, output_path)
+            # Simplification failed inside profile_model, the output is the original model
+            if not os.path.exists(output_path):
+                temp_path = output_path + '.tmp'
+                shutil.copy2(input_path, temp_path)
+                os.replace(temp_path, output_path)
+            _artifact('model', output_path)
             
             # Determine where results were actually saved
             if results_dir:
@@ -119,26 +143,94 @@ def main():
         except Exception as e:
             print(f"Warning: onnx_tool analysis failed, falling back to simplification only: {e}")
             # Fallback to simplification-only workflow
-            _run_simplification_only(input_path, output_path)
+            _run_simplification_only(input_path, output_path, enable_tracing, results_dir, simplifier, large_model_mb)
     else:
         # Simplification-only workflow (when profiling disabled or onnx_tool unavailable)
         if enable_profiling and not ONNX_TOOL_AVAILABLE:
             print("Warning: onnx_tool profiling requested but onnx_tool is not available")
         print("Running simplification only...")
-        _run_simplification_only(input_path, output_path)
+        _run_simplification_only(input_path, output_path, enable_tracing, results_dir, simplifier, large_model_mb)
 
-def _run_simplification_only(input_path, output_path):
-    """Run only ONNX simplification without profiling"""
-    model = onnx.load(input_path)
-    
-    print("Simplifying ONNX model...")
-    model_simp, check = simplify(model)
-    if not check:
-        print("Simplified ONNX model could not be validated")
-        sys.exit(2)
-    
-    onnx.save(model_simp, output_path)
-    print(f"Simplified model saved to {output_path}")
+def _run_simplification_only(input_path, output_path, enable_tracing=False, results_dir=None, simplifier='auto',
+                             large_model_mb=None):
+    """Run only ONNX simplification without profiling. simplifier picks onnxsim or onnx_tool's lightweight
+    simplifier, 'auto' takes onnx_tool for models with more than large_model_mb MB of weights."""
+    import onnx
+    tracer = None
+    if enable_tracing:
+        try:
+            from onnx_tool.tracing import enable_tracing as start_tracing
+            tracer = start_tracing(node_events=False)
+        except ImportError as e:
+            print(f"Warning: stage tracing not available ({e})")
+    try:
+        with _span('load', file=input_path):
+            model = onnx.load(input_path)
+        
+        if _choose_simplifier(model, simplifier, large_model_mb) == 'onnx_tool':
+            from onnx_tool.simplify import simplify as simplify_lightweight
+            from workflow.onnx_prof_configurable import get_results_dir
+            fold_cache_dir = os.path.join(get_results_dir(input_path, results_dir), 'fold_cache')
+            print("Simplifying ONNX model with onnx_tool...")
+            with _span('simplify'):
+                # saved by simplify, with an external data file when the model does not fit in 2GB
+                simplify_lightweight(model, output_path, fold_cache_dir=fold_cache_dir)
+        else:
+            from onnxsim import simplify
+            print("Simplifying ONNX model...")
+            with _span('simplify'):
+                model_simp, check = simplify(model)
+            if not check:
+                print("Simplified ONNX model could not be validated")
+                sys.exit(2)
+            
+            with _span('save_model'):
+                # written under another name then renamed, a stopped job never leaves half a model
+                onnx.save(model_simp, output_path + '.tmp')
+                os.replace(output_path + '.tmp', output_path)
+        print(f"Simplified model saved to {output_path}")
+        _artifact('model', output_path)
+    finally:
+        if tracer is not None:
+            from onnx_tool.tracing import disable_tracing
+            disable_tracing()
+            _save_trace(tracer, input_path, results_dir)
+
+def _choose_simplifier(model, simplifier, large_model_mb):
+    """'onnxsim' or 'onnx_tool', onnxsim when onnx_tool is not importable"""
+    try:
+        from onnx_tool.simplify import choose_simplifier
+    except ImportError:
+        return 'onnxsim'
+    if large_model_mb is None:
+        return choose_simplifier(model, simplifier)
+    return choose_simplifier(model, simplifier, large_model_mb)
+
+def _span(name, **args):
+    """Stage span of onnx_tool's tracer, a no-op when onnx_tool is not importable"""
+    try:
+        from onnx_tool.tracing import span
+    except ImportError:
+        import contextlib
+        return contextlib.nullcontext()
+    return span(name, **args)
+
+def _artifact(kind, path):
+    """Report a written file as an onnx_tool progress event, a no-op when onnx_tool is not importable"""
+    try:
+        from onnx_tool import events
+    except ImportError:
+        return
+    events.artifact(kind, path)
+
+def _save_trace(tracer, input_path, results_dir):
+    """Save the Chrome trace next to the profiling results of the model"""
+    from workflow.onnx_prof_configurable import get_results_dir
+    trace_path = os.path.join(get_results_dir(input_path, results_dir),
+                              os.path.basename(input_path).replace('.onnx', '_trace.json'))
+    tracer.save(trace_path)
+    print(f"[INFO] Stage trace saved to: {trace_path}")
+    _artifact('trace', trace_path)
 
 if __name__ == "__main__":
     main()
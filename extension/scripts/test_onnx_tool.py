@@ -0,0 +1,675 @@
+#!/usr/bin/env python3
+"""
+Regression tests of the onnx_tool features used by QTron, on small models built in memory
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'onnx-tool-experiment'))
+
+import numpy as np
+import onnx
+from onnx import TensorProto, helper
+
+import onnx_tool
+from onnx_tool.tensor import TensorSpec
+
+
+def make_conv_model(batch='n', size='h'):
+    """Conv+Relu+Add on a float input with symbolic batch and spatial dims"""
+    rng = np.random.default_rng(0)
+    weight = rng.standard_normal((8, 3, 3, 3)).astype(np.float32)
+    bias = rng.standard_normal((8,)).astype(np.float32)
+    nodes = [
+        helper.make_node('Conv', ['x', 'w', 'b'], ['conv'], name='conv', pads=[1, 1, 1, 1]),
+        helper.make_node('Relu', ['conv'], ['relu'], name='relu'),
+        helper.make_node('Add', ['relu', 'conv'], ['y'], name='add'),
+    ]
+    graph = helper.make_graph(
+        nodes, 'conv',
+        [helper.make_tensor_value_info('x', TensorProto.FLOAT, [batch, 3, size, size])],
+        [helper.make_tensor_value_info('y', TensorProto.FLOAT, None)],
+        [onnx.numpy_helper.from_array(weight, 'w'), onnx.numpy_helper.from_array(bias, 'b')])
+    return helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)], ir_version=8)
+
+
+def test_tensorspec_update_input_by_map():
+    """A TensorSpec input gets its shape and dtype, without data"""
+    model = onnx_tool.Model(make_conv_model(), {'verbose': False})
+    g = model.graph
+    g.update_input_by_map({'x': TensorSpec([2, 3, 16, 16], np.float16)})
+    tensor = g.tensormap['x']
+    assert tensor.numpy is None
+    assert tensor.get_shape() == [2, 3, 16, 16]
+    assert np.dtype(tensor.dtype) == np.float16
+
+
+def test_tensorspec_shape_infer():
+    """Shape inference with a TensorSpec matches the one with a zero array"""
+    m = make_conv_model()
+    spec = onnx_tool.Model(m, {'verbose': False}).graph
+    spec.shape_infer({'x': TensorSpec([2, 3, 16, 16])})
+    spec.profile()
+    array = onnx_tool.Model(m, {'verbose': False}).graph
+    array.shape_infer({'x': np.zeros((2, 3, 16, 16), dtype=np.float32)})
+    array.profile()
+    assert spec.tensormap['y'].get_shape() == [2, 8, 16, 16]
+    for name in ('conv', 'relu', 'y'):
+        assert spec.tensormap[name].get_shape() == array.tensormap[name].get_shape()
+    assert spec.macs == array.macs
+
+
+def test_tensorspec_measure_feeds():
+    """measure feeds are arrays of the TensorSpec shape and dtype, onnxruntime runs them"""
+    from onnx_tool.measure import _random_feeds
+    m = make_conv_model()
+    g = onnx_tool.Model(m, {'verbose': False}).graph
+    inputs = {'x': TensorSpec([1, 3, 8, 8])}
+    g.shape_infer(inputs)
+    g.profile()
+    feeds = _random_feeds(g, inputs)
+    assert isinstance(feeds['x'], np.ndarray)
+    assert feeds['x'].shape == (1, 3, 8, 8)
+    assert feeds['x'].dtype == np.float32
+    # arrays are passed through, missing inputs are generated
+    array = np.ones((1, 3, 8, 8), dtype=np.float32)
+    assert _random_feeds(g, {'x': array})['x'] is array
+    assert _random_feeds(g, None)['x'].shape == (1, 3, 8, 8)
+    try:
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        return
+    from onnx_tool.measure import measure_profile
+    measure_profile(g, m, inputs, runs=1, warmup=0)
+    assert g.valid_measure
+    assert g.measured_latency > 0
+
+
+def test_measure_roofline_efficiency():
+    """Roofline efficiency is the projected latency of a fused kernel group over its measured latency"""
+    try:
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        return
+    import glob
+    import tempfile
+    from onnx_tool.measure import measure_profile, print_measured_profile
+    m = make_conv_model()
+    g = onnx_tool.Model(m, {'verbose': False}).graph
+    inputs = {'x': TensorSpec([1, 3, 32, 32])}
+    g.shape_infer(inputs)
+    g.profile()
+    g.roofline({'FP32': 1000, 'Bandwidth': 50})
+    before = set(glob.glob(os.path.join(tempfile.gettempdir(), 'onnx_tool_measure_*')))
+    measure_profile(g, m, inputs, runs=2, warmup=1)
+    # the optimized model and the profiles are removed
+    assert set(glob.glob(os.path.join(tempfile.gettempdir(), 'onnx_tool_measure_*'))) == before
+    with tempfile.TemporaryDirectory() as tmpdir:
+        f = os.path.join(tmpdir, 'measured.csv')
+        print_measured_profile(g, f)
+        with open(f) as fp:
+            rows = [line.rstrip('\n').split(',') for line in fp]
+    header = rows[0]
+    rows = {row[0]: row for row in rows[1:]}
+    efficiency = header.index('Roofline Efficiency')
+    measured = [key for key, node in g.nodemap.items() if node.measured['latency'] > 0]
+    assert len(measured) > 0
+    for key in measured:
+        latency = g.nodemap[key].measured['latency']
+        projected = sum(n.roofline['latency'][2] for name, n in g.nodemap.items()
+                        if name == key or n.measured['fused_into'] == key)
+        assert rows[key][efficiency] == '{:.2%}'.format(projected / latency)
+
+
+def test_report_txt_csv_share_columns():
+    """The txt and csv reports format the columns once, only the integers differ"""
+    import tempfile
+    g = onnx_tool.Model(make_conv_model(), {'verbose': False}).graph
+    g.shape_infer({'x': TensorSpec([1, 3, 64, 64])})
+    g.profile()
+    report = g.profile_report()
+    csv_columns = report.format_columns(True)
+    txt_columns = report.format_columns(False)
+    for (name, numeric), csv, txt in zip(report.header(), csv_columns, txt_columns):
+        if name.startswith('Forward_') or name in ('Memory', 'Params'):
+            assert [v.replace(',', '') for v in txt] == csv
+        else:
+            assert txt is csv
+    with tempfile.TemporaryDirectory() as tmpdir:
+        report.save(os.path.join(tmpdir, 'p.txt'))
+        report.save(os.path.join(tmpdir, 'p.csv'))
+        with open(os.path.join(tmpdir, 'p.csv')) as fp:
+            rows = [line.rstrip('\n').split(',') for line in fp]
+    assert rows[-1][0] == 'Total'
+    assert rows[-1][2] == str(int(round(g.macs[0])))
+
+
+class _Node():
+    def __init__(self, op_type, input):
+        self.op_type = op_type
+        self.input = input
+
+
+class _Tensor():
+    def __init__(self, shape):
+        self.shape = shape
+
+    def get_shape(self):
+        return self.shape
+
+
+class _Graph():
+    """The nodemap and tensormap of a graph, all align_nodes reads"""
+
+    def __init__(self, nodes):
+        self.nodemap = {}
+        self.tensormap = {}
+        for name, op_type, shape in nodes:
+            self.nodemap[name] = _Node(op_type, [name + '_in'])
+            self.tensormap[name + '_in'] = _Tensor(shape)
+
+
+def _align_nodes_reference(g0, g1):
+    """Pairs by name, then the closest unmatched node of the same signature by scanning all candidates"""
+    from onnx_tool.diff import _signature
+    names0 = list(g0.nodemap.keys())
+    names1 = list(g1.nodemap.keys())
+    pos0 = {name: i / max(len(names0) - 1, 1) for i, name in enumerate(names0)}
+    pos1 = {name: i / max(len(names1) - 1, 1) for i, name in enumerate(names1)}
+    unmatched0 = {}
+    for name in names0:
+        if name not in g1.nodemap:
+            unmatched0.setdefault(_signature(g0, g0.nodemap[name]), []).append(name)
+    pairs = {}
+    for name in names1:
+        if name in g0.nodemap:
+            pairs[name] = name
+            continue
+        candidates = unmatched0.get(_signature(g1, g1.nodemap[name]), [])
+        if len(candidates) > 0:
+            best = min(candidates, key=lambda n: abs(pos0[n] - pos1[name]))
+            candidates.remove(best)
+            pairs[name] = best
+    return pairs
+
+
+def test_align_nodes():
+    """Renamed nodes pair with the closest node of the same op type and input shapes"""
+    from onnx_tool.diff import align_nodes
+    g0 = _Graph([('a', 'Conv', [1, 3]), ('b', 'Relu', [1, 8]), ('c', 'Conv', [1, 8]), ('d', 'Relu', [1, 8]),
+                 ('e', 'Add', [1, 8])])
+    g1 = _Graph([('a', 'Conv', [1, 3]), ('x', 'Relu', [1, 8]), ('c', 'Conv', [1, 8]), ('y', 'Relu', [1, 8]),
+                 ('z', 'Mul', [1, 8])])
+    assert align_nodes(g0, g1) == [
+        ('a', 'a', 'name'), ('b', 'x', 'signature'), ('c', 'c', 'name'), ('d', 'y', 'signature'),
+        (None, 'z', 'added'), ('e', None, 'removed')]
+
+    # random graphs with few signatures, many candidates per signature
+    rng = np.random.default_rng(0)
+    for trial in range(50):
+        nodes0 = [(f'n{i}', str(rng.integers(3)), [int(rng.integers(2))]) for i in range(int(rng.integers(1, 60)))]
+        nodes1 = [(f'n{i}' if rng.random() < 0.3 else f'm{i}', str(rng.integers(3)), [int(rng.integers(2))])
+                  for i in range(int(rng.integers(1, 60)))]
+        nodes1 = list({n[0]: n for n in nodes1}.values())
+        g0 = _Graph(nodes0)
+        g1 = _Graph(nodes1)
+        pairs = align_nodes(g0, g1)
+        expected = _align_nodes_reference(g0, g1)
+        assert {name1: name0 for name0, name1, _ in pairs if name0 is not None and name1 is not None} == expected
+        assert sorted(n for n, _, _ in pairs if n is not None) == sorted(g0.nodemap)
+        assert [n for _, n, _ in pairs if n is not None] == list(g1.nodemap)
+
+
+def make_scoped_model():
+    """Two name scopes, the Reshape is one of the hidden NoMacsOps"""
+    rng = np.random.default_rng(0)
+    weight = rng.standard_normal((8, 3, 3, 3)).astype(np.float32)
+    nodes = [
+        helper.make_node('Conv', ['x', 'w'], ['conv'], name='/enc/conv', pads=[1, 1, 1, 1]),
+        helper.make_node('Relu', ['conv'], ['relu'], name='/enc/relu'),
+        helper.make_node('Reshape', ['relu', 'shape'], ['flat'], name='/dec/reshape'),
+        helper.make_node('Add', ['flat', 'flat'], ['y'], name='/dec/add'),
+    ]
+    graph = helper.make_graph(
+        nodes, 'scoped',
+        [helper.make_tensor_value_info('x', TensorProto.FLOAT, [1, 3, 8, 8])],
+        [helper.make_tensor_value_info('y', TensorProto.FLOAT, None)],
+        [onnx.numpy_helper.from_array(weight, 'w'),
+         onnx.numpy_helper.from_array(np.array([1, -1], dtype=np.int64), 'shape')])
+    return helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)], ir_version=8)
+
+
+def test_rollup_hidden_ops_count_in_totals():
+    """Hidden op types lose their op type row only, totals and percentages are over all nodes"""
+    import tempfile
+    from onnx_tool.rollup import ProfileRollup
+    g = onnx_tool.Model(make_scoped_model(), {'verbose': False}).graph
+    g.shape_infer()
+    g.profile()
+    rollup = ProfileRollup(g, exclude_ops=onnx_tool.NoMacsOps)
+    assert rollup.nodes == len(g.nodemap)
+    assert rollup.total['MACs'] == g.macs[0]
+    assert rollup.total['Memory'] == g.memory
+    assert 'Reshape' in rollup.op_types and 'Reshape' not in rollup.shown_op_types()
+    d = rollup.to_dict()
+    assert [t['name'] for t in d['op_types']] == [k for k, _, _ in rollup.sorted_flat(rollup.shown_op_types())]
+    assert 'Reshape' not in [t['name'] for t in d['op_types']]
+    scopes = {s['path']: s for s in d['scopes']}
+    assert scopes['dec']['nodes'] == 2
+    assert abs(sum(s['percent']['Memory'] for s in d['scopes']) - 1) < 1e-9
+    assert abs(d['scopes'][-1]['cumulative']['Memory'] - 1) < 1e-9
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        f = os.path.join(tmpdir, 'scopes.csv')
+        rollup.print_scopes(f)
+        with open(f) as fp:
+            rows = [line.rstrip('\n').split(',') for line in fp]
+    header = rows[0]
+    assert 'MACs Cumulative' in header and 'Memory Cumulative' in header
+    cumulative = header.index('Memory Cumulative')
+    assert rows[2][cumulative] == '100.00%'
+    assert rows[-1][0] == 'Total' and rows[-1][header.index('Memory')] == str(int(g.memory))
+
+
+def make_layered_model(layers=4, hidden=16):
+    """Repeated MatMul+Add+Relu+Shape+Reshape decoder-like layers"""
+    rng = np.random.default_rng(0)
+    nodes = []
+    initializers = []
+    h = 'x'
+    for i in range(layers):
+        prefix = f'/model/layers.{i}'
+        initializers.append(onnx.numpy_helper.from_array(
+            rng.standard_normal((hidden, hidden)).astype(np.float32), f'w{i}'))
+        initializers.append(onnx.numpy_helper.from_array(rng.standard_normal((hidden,)).astype(np.float32), f'b{i}'))
+        nodes.extend([
+            helper.make_node('MatMul', [h, f'w{i}'], [f'mm{i}'], name=f'{prefix}/mm'),
+            helper.make_node('Add', [f'mm{i}', f'b{i}'], [f'add{i}'], name=f'{prefix}/add'),
+            helper.make_node('Relu', [f'add{i}'], [f'relu{i}'], name=f'{prefix}/relu'),
+            helper.make_node('Shape', [f'relu{i}'], [f'shape{i}'], name=f'{prefix}/shape'),
+            helper.make_node('Reshape', [f'relu{i}', f'shape{i}'], [f'h{i}'], name=f'{prefix}/reshape'),
+        ])
+        h = f'h{i}'
+    graph = helper.make_graph(
+        nodes, 'layered',
+        [helper.make_tensor_value_info('x', TensorProto.FLOAT, ['n', 'seq', hidden])],
+        [helper.make_tensor_value_info(h, TensorProto.FLOAT, None)],
+        initializers)
+    return helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)], ir_version=8)
+
+
+def test_dedup_profile_equivalence():
+    """Profiling with dedup_blocks gives the same nodes, shapes and totals as without"""
+    m = make_layered_model()
+    inputs = {'x': TensorSpec([2, 7, 16])}
+    graphs = []
+    for dedup in (False, True):
+        g = onnx_tool.Model(m, {'verbose': False, 'dedup_blocks': dedup}).graph
+        g.shape_infer(inputs)
+        g.profile()
+        graphs.append(g)
+    g0, g1 = graphs
+    assert len(g1.dedup_nodes) > 0
+    assert list(g0.nodemap) == list(g1.nodemap)
+    for key in g0.nodemap:
+        n0, n1 = g0.nodemap[key], g1.nodemap[key]
+        assert n0.macs == n1.macs, key
+        assert n0.memory == n1.memory, key
+        assert n0.params == n1.params, key
+        assert list(n0.inshape) == list(n1.inshape) and list(n0.outshape) == list(n1.outshape), key
+    assert g0.macs == g1.macs and g0.memory == g1.memory and g0.params == g1.params
+
+    # copied blocks own their arrays
+    for dst, src in g1.dedup_nodes.items():
+        for o0, o1 in zip(g1.nodemap[src].output, g1.nodemap[dst].output):
+            a0, a1 = g1.tensormap[o0].numpy, g1.tensormap[o1].numpy
+            if isinstance(a0, np.ndarray):
+                assert np.array_equal(a0, a1)
+                assert not np.shares_memory(a0, a1)
+
+
+def test_registry_failed_lazy_module_is_kept():
+    """A lazy module that fails to import raises on every use, it is not dropped by the first attempt"""
+    import tempfile
+    from onnx_tool.utils import Registry
+    registry = Registry('test')
+    with tempfile.TemporaryDirectory() as tmpdir:
+        module = 'onnx_tool_lazy_test_module'
+        path = os.path.join(tmpdir, module + '.py')
+        with open(path, 'w') as fp:
+            fp.write('raise ImportError("missing dependency")\n')
+        sys.path.insert(0, tmpdir)
+        try:
+            registry.add_lazy_module(module)
+            for attempt in range(2):
+                try:
+                    registry.get('Missing')
+                    assert False, 'the import error was swallowed'
+                except ImportError as e:
+                    assert 'missing dependency' in str(e)
+            # fixed, the next use imports it
+            with open(path, 'w') as fp:
+                fp.write('LOADED = True\n')
+            assert registry.get('Missing') is None
+            assert sys.modules[module].LOADED
+            assert registry._lazy_modules == []
+        finally:
+            sys.path.remove(tmpdir)
+            sys.modules.pop(module, None)
+
+
+def test_calibration_skips_emulated_peaks():
+    """FP16 and INT8 measured by NumPy emulation only are not saved as peaks, roofline uses FP32 for them"""
+    import tempfile
+    from onnx_tool import device as devices
+    from onnx_tool.calibration import calibrate
+    device = calibrate(sizes=(32,), threads=[1, 2], repeat=1, use_ort=False, verbose=False)
+    assert device['FP32'] > 0
+    assert 'FP16' not in device and 'INT8' not in device
+    assert device['Calibration']['Emulated'] == ['FP16', 'INT8']
+    results = device['Calibration']['Results']
+    assert all(r['Emulated'] for r in results if r['Type'] in ('FP16', 'INT8'))
+    # the bandwidth is the best copy of all thread counts
+    bandwidth = [r for r in results if r['Type'] == 'Bandwidth']
+    assert [r['Threads'] for r in bandwidth] == [1, 2]
+    assert device['Bandwidth'] == round(max(r['GB/s'] for r in bandwidth), 1)
+
+    # an entry saved before emulated peaks were left out
+    old = {'FP32': 100.0, 'FP16': 0.5, 'INT8': 0.5, 'Bandwidth': 10.0,
+           'Calibration': {'Results': [
+               {'Type': 'FP32', 'Backend': 'numpy', 'Size': 32, 'Threads': 0, 'GFLOPS': 100.0},
+               {'Type': 'FP16', 'Backend': 'numpy', 'Size': 32, 'Threads': 0, 'GFLOPS': 0.5},
+               {'Type': 'INT8', 'Backend': 'numpy', 'Size': 32, 'Threads': 0, 'GFLOPS': 0.5},
+               {'Type': 'INT8', 'Backend': 'onnxruntime', 'Size': 32, 'Threads': 1, 'GFLOPS': 0.5}]}}
+    registry = devices.DEVICE_REGISTRY
+    with tempfile.TemporaryDirectory() as tmpdir:
+        devices.DEVICE_REGISTRY = os.path.join(tmpdir, 'devices.json')
+        try:
+            devices.save_device('old-host', old)
+            loaded = devices.get_device('old-host')
+        finally:
+            devices.DEVICE_REGISTRY = registry
+    assert 'FP16' not in loaded
+    assert loaded['INT8'] == 0.5
+
+    g = onnx_tool.Model(make_conv_model(), {'verbose': False}).graph
+    g.shape_infer({'x': TensorSpec([1, 3, 16, 16])})
+    g.profile()
+    g.roofline(loaded, compute_type='FP16')
+    conv = g.nodemap['conv']
+    assert conv.roofline['latency'][0] == conv.macs[0] * 2 / (old['FP32'] * 1e6)
+
+
+def test_qprof_round_trip():
+    """A QPROF file reads back the columns, totals and name index of the report it was saved from"""
+    import tempfile
+    from onnx_tool.qprof import ProfileFile
+    from onnx_tool.utils import tuple2str
+    g = onnx_tool.Model(make_layered_model(), {'verbose': False, 'dedup_blocks': True}).graph
+    g.shape_infer({'x': TensorSpec([2, 7, 16])})
+    g.profile()
+    g.roofline({'FP32': 1000, 'Bandwidth': 50})
+    for metric in ('MACs', 'FLOPs'):
+        report = g.profile_report(metric, rollup_blocks=True)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            f = os.path.join(tmpdir, 'p.qprof')
+            report.save(f)
+            profile = ProfileFile(f)
+            assert profile.metric == metric
+            assert profile.rows == len(report.names)
+            assert profile.column('name') == report.names
+            assert profile.column('type') == report.op_types
+            assert np.array_equal(profile.column('forward'), report.forward_macs)
+            assert np.array_equal(profile.column('memory'), report.memory)
+            assert np.array_equal(profile.column('params'), report.params)
+            assert np.allclose(profile.column('projected_latency'), report.projected_latency)
+            assert profile.column('bottleneck') == report.bottlenecks
+            assert np.array_equal(profile.column('blocks'), report.scales)
+            assert profile.column('inshape') == [tuple2str(s, 'x') for s in report.inshapes]
+            assert profile.totals['forward'] == report.total_forward_macs * report.factor
+            assert profile.totals['memory'] == report.total_memory
+            assert 'name' not in profile.totals
+            for i, name in enumerate(report.names):
+                assert profile.lookup(name) == i
+                assert profile.node(name)['forward'] == int(report.forward_macs[i])
+            assert profile.lookup('/model/layers.9/missing') is None
+            del profile
+
+
+
+def test_profile_model_keeps_the_input():
+    """The workflow writes the simplified model to the output path, the model file stays as it is"""
+    import hashlib
+    import tempfile
+    from workflow.onnx_prof_configurable import profile_model
+    with tempfile.TemporaryDirectory() as tmpdir:
+        model_path = os.path.join(tmpdir, 'conv.onnx')
+        onnx.save(make_conv_model(batch=1, size=16), model_path)
+        with open(model_path, 'rb') as fp:
+            before = hashlib.sha256(fp.read()).hexdigest()
+        output_path = os.path.join(tmpdir, 'results', 'conv', 'conv_simplified.onnx')
+        results_dir = profile_model(model_path, os.path.join(tmpdir, 'results'), simplifier='onnx_tool',
+                                    output_path=output_path)
+        with open(model_path, 'rb') as fp:
+            assert hashlib.sha256(fp.read()).hexdigest() == before
+        assert sorted(os.listdir(tmpdir)) == ['conv.onnx', 'results']
+        assert os.path.exists(output_path) and not os.path.exists(output_path + '.tmp')
+        assert len(onnx.load(output_path).graph.node) > 0
+        assert os.path.exists(os.path.join(results_dir, 'conv.qprof'))
+
+
+
+def test_profile_latency_table():
+    """Graph.profile adds the interpolated table latencies, a table of another version is refused"""
+    import json
+    import tempfile
+    import pytest
+    from onnx_tool.oplatency import LatencyTable, TABLE_VERSION
+    table = LatencyTable()
+    table.add('Conv', 'float32', 1, 1.0)
+    table.add('Conv', 'float32', 1 << 30, 1.0)
+    # Relu and Add work on 8x8x8 elements
+    table.add('Relu', 'float32', 256, 0.1)
+    table.add('Relu', 'float32', 1024, 0.4)
+    table.add('Add', 'float32', 512, 0.3)
+    g = onnx_tool.Model(make_conv_model(), {'verbose': False}).graph
+    g.shape_infer({'x': TensorSpec([1, 3, 8, 8])})
+    g.profile(table)
+    assert g.valid_latency
+    latencies = {key: g.nodemap[key].latency for key in g.nodemap}
+    assert np.allclose([latencies['conv'], latencies['relu'], latencies['add']], [1.0, 0.2, 0.3])
+    assert np.isclose(g.lut_latency, 1.5)
+    report = g.profile_report()
+    assert ('Latency(ms)', True) in report.header()
+    assert np.allclose(report.latency, [1.0, 0.2, 0.3])
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        f = os.path.join(tmpdir, 'oplatency.json')
+        table.save(f)
+        g.profile(f)
+        assert g.valid_latency and np.isclose(g.lut_latency, 1.5)
+        with open(f) as fp:
+            obj = json.load(fp)
+        obj['version'] = TABLE_VERSION + 1
+        with open(f, 'w') as fp:
+            json.dump(obj, fp)
+        with pytest.raises(ValueError):
+            g.profile(f)
+        assert not g.valid_latency
+        assert 'Latency(ms)' not in [name for name, _ in g.profile_report().header()]
+
+
+
+def _simplify_outputs(model):
+    """The onnxruntime outputs of a model and of its simplified model"""
+    import tempfile
+    import onnxruntime
+    from onnx_tool.simplify import simplify
+    feeds = {'x': np.random.default_rng(0).standard_normal((1, 4, 6, 8)).astype(np.float32)}
+    session = onnxruntime.InferenceSession(model.SerializeToString(), providers=['CPUExecutionProvider'])
+    expected = session.run(None, feeds)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        proto, stats = simplify(model, os.path.join(tmpdir, 'simplified.onnx'))
+    session = onnxruntime.InferenceSession(proto.SerializeToString(), providers=['CPUExecutionProvider'])
+    assert [o.name for o in session.get_outputs()] == [o.name for o in model.graph.output]
+    return expected, session.run(None, feeds), proto, stats
+
+
+def _make_simplify_model(nodes, outputs, initializers):
+    graph = helper.make_graph(
+        nodes, 'simplify',
+        [helper.make_tensor_value_info('x', TensorProto.FLOAT, [1, 4, 6, 8])],
+        [helper.make_tensor_value_info(o, TensorProto.FLOAT, None) for o in outputs],
+        initializer=initializers)
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 17)])
+    model.ir_version = 8
+    return model
+
+
+def test_simplify_keeps_outputs():
+    """The rewrite passes remove an Identity, a cancelling Transpose pair, a Flatten before a Reshape and a dead node"""
+    try:
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        return
+    from onnx import numpy_helper
+    model = _make_simplify_model([
+        helper.make_node('Identity', ['x'], ['id'], name='id'),
+        helper.make_node('Transpose', ['id'], ['t1'], name='t1', perm=[0, 2, 3, 1]),
+        helper.make_node('Transpose', ['t1'], ['t2'], name='t2', perm=[0, 3, 1, 2]),
+        helper.make_node('Flatten', ['t2'], ['flat'], name='flat', axis=1),
+        helper.make_node('Reshape', ['flat', 'shape'], ['r'], name='r'),
+        helper.make_node('Relu', ['r'], ['y'], name='relu'),
+        helper.make_node('Sigmoid', ['x'], ['dead'], name='dead'),
+    ], ['y'], [numpy_helper.from_array(np.array([1, 4, 48], dtype=np.int64), 'shape')])
+    expected, actual, proto, stats = _simplify_outputs(model)
+    assert stats['identities'] == 1 and stats['transposes'] == 1 and stats['reshapes'] == 1
+    assert stats['dead_nodes'] == 1
+    assert [n.op_type for n in proto.graph.node] == ['Reshape', 'Relu']
+    assert proto.graph.node[0].input[0] == 'x'
+    for e, a in zip(expected, actual):
+        assert e.shape == a.shape and np.allclose(e, a)
+
+
+def test_simplify_keeps_graph_outputs_and_zero_shapes():
+    """A Transpose or Dropout of a graph output and a Reshape copying a dimension with 0 are kept"""
+    try:
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        return
+    from onnx import numpy_helper
+    model = _make_simplify_model([
+        helper.make_node('Transpose', ['x'], ['ta'], name='ta', perm=[0, 2, 3, 1]),
+        helper.make_node('Transpose', ['ta'], ['tb'], name='tb', perm=[0, 3, 1, 2]),
+        helper.make_node('Relu', ['tb'], ['relu'], name='relu'),
+        helper.make_node('Dropout', ['x'], ['drop'], name='drop'),
+        # dimension 0 of the Flatten output is 4, dimension 0 of x is 1
+        helper.make_node('Flatten', ['x'], ['flat'], name='flat', axis=2),
+        helper.make_node('Reshape', ['flat', 'shape'], ['rz'], name='rz'),
+    ], ['ta', 'relu', 'drop', 'rz'], [numpy_helper.from_array(np.array([0, -1], dtype=np.int64), 'shape')])
+    expected, actual, proto, stats = _simplify_outputs(model)
+    assert stats['identities'] == 0 and stats['transposes'] == 0 and stats['reshapes'] == 0
+    assert stats['nodes'] == (6, 6)
+    assert [n.name for n in proto.graph.node] == [n.name for n in model.graph.node]
+    for e, a in zip(expected, actual):
+        assert e.shape == a.shape and np.allclose(e, a)
+
+
+
+def _make_fold_model(nodes, outputs, initializers):
+    graph = helper.make_graph(
+        nodes, 'fold',
+        [helper.make_tensor_value_info('x', TensorProto.FLOAT, [1, 128])],
+        [helper.make_tensor_value_info(o, TensorProto.FLOAT, None) for o in outputs],
+        initializer=initializers)
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 17)])
+    model.ir_version = 8
+    return model
+
+
+def test_fold_budget():
+    """Constants over fold_max_bytes stay dynamic with their shapes, expanding ops over it are never evaluated"""
+    from onnx import numpy_helper
+    from onnx_tool import node as nodes
+    from onnx_tool.tensor import DYNAMIC_TENSOR, STATIC_TENSOR
+    a = np.random.default_rng(0).standard_normal((256, 128)).astype(np.float32)
+    model = _make_fold_model([
+        helper.make_node('Relu', ['a'], ['big'], name='big'),
+        helper.make_node('Add', ['big', 'x'], ['y'], name='add'),
+        helper.make_node('Slice', ['a', 'starts', 'ends'], ['small'], name='small'),
+        helper.make_node('Add', ['small', 'x'], ['z'], name='add_small'),
+    ], ['y', 'z'], [numpy_helper.from_array(a, 'a'),
+                    numpy_helper.from_array(np.array([0], dtype=np.int64), 'starts'),
+                    numpy_helper.from_array(np.array([1], dtype=np.int64), 'ends')])
+    g = onnx_tool.Model(model, {'verbose': False, 'constant_folding': True, 'fold_max_bytes': 1024}).graph
+    big = g.tensormap['big']
+    assert big.type == DYNAMIC_TENSOR and big.numpy is None and big.get_shape() == [256, 128]
+    assert not g.nodemap['big'].constant
+    small = g.tensormap['small']
+    assert small.type == STATIC_TENSOR and np.array_equal(small.numpy, a[:1])
+    g.shape_infer({'x': TensorSpec([1, 128])})
+    assert g.tensormap['y'].get_shape() == [256, 128]
+
+    model = _make_fold_model([
+        helper.make_node('ConstantOfShape', ['shape'], ['c'], name='c'),
+        helper.make_node('Add', ['c', 'x'], ['y1'], name='add1'),
+        helper.make_node('Expand', ['one', 'shape'], ['e'], name='e'),
+        helper.make_node('Add', ['e', 'x'], ['y2'], name='add2'),
+        helper.make_node('Tile', ['one', 'shape'], ['t'], name='t'),
+        helper.make_node('Add', ['t', 'x'], ['y3'], name='add3'),
+    ], ['y1', 'y2', 'y3'], [numpy_helper.from_array(np.array([4096, 128], dtype=np.int64), 'shape'),
+                            numpy_helper.from_array(np.ones((1, 1), dtype=np.float32), 'one')])
+    evaluated = []
+
+    def value_infer(self, intensors, outtensors):
+        evaluated.append(self.op_type)
+        raise AssertionError(f'{self.op_type} over the fold budget was evaluated')
+
+    classes = (nodes.ConstantOfShapeNode, nodes.ExpandNode, nodes.TileNode)
+    originals = [cls.value_infer for cls in classes]
+    try:
+        for cls in classes:
+            cls.value_infer = value_infer
+        g = onnx_tool.Model(model, {'verbose': False, 'constant_folding': True, 'fold_max_bytes': 1 << 20}).graph
+    finally:
+        for cls, original in zip(classes, originals):
+            cls.value_infer = original
+    assert evaluated == []
+    for name in ('c', 'e', 't'):
+        assert g.tensormap[name].type == DYNAMIC_TENSOR and g.tensormap[name].numpy is None
+        assert not g.nodemap[name].constant
+
+
+def test_fold_cache_hits():
+    """A second load with the same fold_cache_dir reads the folded tensors from the cache"""
+    import tempfile
+    from onnx import numpy_helper
+    a = np.random.default_rng(0).standard_normal((256, 128)).astype(np.float32)
+    model = _make_fold_model([
+        helper.make_node('Relu', ['a'], ['r'], name='relu'),
+        helper.make_node('Transpose', ['r'], ['t'], name='transpose', perm=[1, 0]),
+        helper.make_node('MatMul', ['x', 't'], ['y'], name='matmul'),
+    ], ['y'], [numpy_helper.from_array(a, 'a')])
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cfg = {'verbose': False, 'constant_folding': True, 'fold_cache_dir': tmpdir}
+        first = onnx_tool.Model(model, cfg).graph
+        assert first.fold_cache.hits == 0 and first.fold_cache.stores == 2
+        second = onnx_tool.Model(model, cfg).graph
+        assert second.fold_cache.hits == 2 and second.fold_cache.stores == 0
+        # the Relu output is folded into the Transpose output, which the MatMul reads
+        cached = second.tensormap['t'].numpy
+        assert cached.dtype == first.tensormap['t'].numpy.dtype
+        assert np.array_equal(cached, first.tensormap['t'].numpy)
+        assert np.array_equal(cached, np.maximum(a, 0).T)
+
+
+if __name__ == '__main__':
+    failed = 0
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            try:
+                test()
+                print(f'✅ {name}')
+            except Exception as e:
+                failed += 1
+                print(f'❌ {name}: {e!r}')
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,173 @@
+/**
+ * Outputs of finished analyses, persisted in the results directory of a model.
+ *
+ * A completed simplify_onnx.py job leaves the simplified model and the binary profile in the results directory, the
+ * model itself is never written. The manifest next to them names the model content they belong to, the content the
+ * job started from. Opening a model with that content takes the outputs from the cache and runs no job. A new job of
+ * the model drops the manifest first.
+ */
+import * as crypto from 'crypto';
+import * as fs from 'fs';
+import * as path from 'path';
+
+const ANALYSIS_CACHE_VERSION = 1;
+
+interface AnalysisCacheFile {
+    version: number;
+    // the sha256 of the model content the outputs belong to
+    sources: string[];
+    // the size and modification time of the model file when the job ended, a file that still has them is not hashed
+    stamp: { size: number; mtimeMs: number };
+    // the simplified model and the binary profile, relative to the results directory
+    model?: string;
+    modelHash?: string;
+    profile?: string;
+}
+
+export interface CachedAnalysis {
+    // the simplified model, undefined if the job did not write it
+    modelPath?: string;
+    // the sha256 of the simplified model
+    modelHash?: string;
+    // the QPROF binary profile, undefined if profiling was disabled
+    profilePath?: string;
+}
+
+/**
+ * The results directory of a model when onnx_tool did not report one, as simplify_onnx.py picks it
+ */
+export function defaultResultsDir(inputPath: string, onnxToolResultsPath: string): string {
+    const modelName = path.basename(inputPath).replace('.onnx', '');
+    const base = onnxToolResultsPath && onnxToolResultsPath.trim()
+        ? onnxToolResultsPath
+        : path.join(path.dirname(path.resolve(inputPath)), 'onnx_analysis_results');
+    return path.join(base, modelName);
+}
+
+export class AnalysisCache {
+
+    readonly manifestPath: string;
+    // the simplified model the jobs of the model write
+    readonly modelPath: string;
+
+    /**
+     * @param resultsDir the results directory of the model
+     * @param modelName the model file name without the extension
+     */
+    constructor(readonly resultsDir: string, modelName: string) {
+        this.manifestPath = path.join(resultsDir, `${modelName}_analysis.json`);
+        this.modelPath = path.join(resultsDir, `${modelName}_simplified.onnx`);
+    }
+
+    /**
+     * @param filePath a model file
+     * @returns the sha256 of the file content, read in chunks so a large model is never held in memory
+     */
+    static hashFile(filePath: string): Promise<string> {
+        return new Promise<string>((resolve, reject) => {
+            const hash = crypto.createHash('sha256');
+            fs.createReadStream(filePath)
+                .on('data', (chunk) => hash.update(chunk))
+                .on('end', () => resolve(hash.digest('hex')))
+                .on('error', reject);
+        });
+    }
+
+    private async load(): Promise<AnalysisCacheFile | null> {
+        try {
+            const content = JSON.parse(await fs.promises.readFile(this.manifestPath, 'utf8'));
+            if (content.version === ANALYSIS_CACHE_VERSION && Array.isArray(content.sources) && content.stamp) {
+                return content;
+            }
+        } catch (err) {
+            // no analysis yet or an unreadable manifest
+        }
+        return null;
+    }
+
+    private async outputs(file: AnalysisCacheFile): Promise<CachedAnalysis | null> {
+        const result: CachedAnalysis = {};
+        for (const [key, name] of [['modelPath', file.model], ['profilePath', file.profile]] as const) {
+            if (name) {
+                const filePath = path.join(this.resultsDir, name);
+                try {
+                    await fs.promises.access(filePath);
+                } catch (err) {
+                    // an output was deleted, the model is analyzed again
+                    return null;
+                }
+                result[key] = filePath;
+            }
+        }
+        result.modelHash = file.modelHash;
+        return result;
+    }
+
+    /**
+     * @param hash the sha256 of the model content
+     * @returns the outputs of the analysis of that content, null if it's not cached
+     */
+    async get(hash: string): Promise<CachedAnalysis | null> {
+        const file = await this.load();
+        return file && file.sources.includes(hash) ? this.outputs(file) : null;
+    }
+
+    /**
+     * @param filePath the model file
+     * @returns whether the file is unchanged since a cached analysis, compared by size and modification time only
+     */
+    async stamped(filePath: string): Promise<boolean> {
+        const file = await this.load();
+        if (!file) {
+            return false;
+        }
+        try {
+            const stat = await fs.promises.stat(filePath);
+            if (stat.size !== file.stamp.size || stat.mtimeMs !== file.stamp.mtimeMs) {
+                return false;
+            }
+        } catch (err) {
+            return false;
+        }
+        return (await this.outputs(file)) !== null;
+    }
+
+    /**
+     * drop the manifest, called before a job of the model writes its outputs over the cached ones
+     */
+    async clear(): Promise<void> {
+        await fs.promises.rm(this.manifestPath, { force: true });
+    }
+
+    /**
+     * store the outputs of a completed job, nothing is stored if the model changed while the job ran
+     * @param inputPath the model file the job analyzed
+     * @param inputHash the sha256 of the model content the job started from
+     * @param outputs the simplified model and the binary profile the job wrote
+     */
+    async put(inputPath: string, inputHash: string,
+        outputs: { modelPath?: string; profilePath?: string }): Promise<void> {
+        const stat = await fs.promises.stat(inputPath);
+        // the stamp must name the content the outputs belong to
+        if (await AnalysisCache.hashFile(inputPath) !== inputHash) {
+            return;
+        }
+        const file: AnalysisCacheFile = {
+            version: ANALYSIS_CACHE_VERSION,
+            sources: [inputHash],
+            stamp: { size: stat.size, mtimeMs: stat.mtimeMs },
+        };
+        if (outputs.modelPath) {
+            file.model = path.relative(this.resultsDir, outputs.modelPath);
+            file.modelHash = await AnalysisCache.hashFile(outputs.modelPath);
+        }
+        if (outputs.profilePath) {
+            file.profile = path.relative(this.resultsDir, outputs.profilePath);
+        }
+        await fs.promises.mkdir(this.resultsDir, { recursive: true });
+        // written next to the manifest then renamed, a reader never sees half a file
+        const tempPath = `${this.manifestPath}.${process.pid}.tmp`;
+        await fs.promises.writeFile(tempPath, JSON.stringify(file), 'utf8');
+        await fs.promises.rename(tempPath, this.manifestPath);
+    }
+}
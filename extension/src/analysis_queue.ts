@@ -0,0 +1,476 @@
+/**
+ * Background analyses of the opened models.
+ *
+ * Opening a model runs simplify_onnx.py (onnxsim simplification and onnx_tool profiling) as a job of an
+ * AnalysisQueue, which runs at most a few jobs at once and starts the others as they finish. The script reports its
+ * stages, the node progress of shape inference and profiling, and the files it writes as JSON lines (see
+ * onnx_tool/events.py). The editor does not wait for the job: the viewer opens on the original model and the job
+ * hands over the outputs as the events announce them, the simplified model before profiling starts and the binary
+ * profile as soon as onnx_tool saved it. Every job shows its stage and progress in a notification with a cancel
+ * button. A job that times out or is cancelled keeps the outputs written
+ * so far. A completed job stores its outputs in the AnalysisCache of the model, the next open takes them from there.
+ *
+ * Pre-warming adds background jobs for the models of the workspace. They run after the jobs of the opened models, at
+ * a low CPU priority with few threads, and show their stage in the status bar only. Opening a model that has a job
+ * already takes over that job.
+ */
+import * as fs from 'fs';
+import * as os from 'os';
+import * as readline from 'readline';
+import { ChildProcess, spawn } from 'child_process';
+import * as vscode from 'vscode';
+import { AnalysisCache } from './analysis_cache';
+
+export type AnalysisStatus = 'completed' | 'failed' | 'cancelled' | 'timeout';
+
+export interface AnalysisOptions {
+    pythonPath: string;
+    // the arguments of the python interpreter, the script first, built by scriptArgs
+    args: string[];
+    // the model the script analyzes, there is one job per model
+    inputPath: string;
+    // the sha256 of the model content when the job was added
+    inputHash: string;
+    // the cache of the model, the script writes the simplified model to its modelPath
+    cache: AnalysisCache;
+    // the time the script may run in milliseconds, 0 for no limit
+    timeout: number;
+    // a pre-warming job
+    background?: boolean;
+    // the threads of the numeric libraries of a background job
+    threads?: number;
+}
+
+export interface AnalysisResult {
+    status: AnalysisStatus;
+    // the simplified model, undefined if the script did not write it
+    modelPath?: string;
+    // the QPROF binary profile, undefined if profiling did not get to it
+    profilePath?: string;
+    // the onnx_tool results directory of the model, undefined if the script did not report it
+    resultsDir?: string;
+    // the end of the script output for a failed job
+    error?: string;
+}
+
+export interface AnalysisListener {
+    // a line the script printed, or the time a stage took
+    log?(line: string): void;
+    // the simplified model was written, the job goes on with profiling
+    model?(modelPath: string): void;
+    // the binary profile was saved, the job goes on with the shape-only model
+    profile?(profilePath: string): void;
+}
+
+// the event lines of the script start with it, the JSON event follows
+const EVENT_PREFIX = '@qtron ';
+
+interface AnalysisEvent {
+    event: 'stage' | 'progress' | 'artifact';
+    stage?: string;
+    phase?: 'start' | 'end';
+    seconds?: number;
+    error?: string;
+    done?: number;
+    total?: number;
+    kind?: string;
+    path?: string;
+}
+
+// the stages shown in the progress, with the percentages of the job they start and end at. The stages of onnx_tool
+// nest, the outermost one listed here is shown
+const STAGES: { [stage: string]: [string, number, number] } = {
+    load: ['Loading the model', 0, 5],
+    simplify: ['Simplifying', 5, 30],
+    save_simplified: ['Saving the simplified model', 30, 35],
+    dynamic_shape_search: ['Searching input shapes', 35, 45],
+    shape_infer: ['Inferring shapes', 45, 70],
+    profile: ['Profiling', 70, 85],
+    write_table: ['Writing the reports', 85, 90],
+    save_model: ['Saving the model', 90, 95],
+    simplify_shapes_only: ['Simplifying the shape-only model', 95, 100],
+};
+
+// the characters of the script output kept for the error message of a failed job
+const OUTPUT_TAIL = 4096;
+
+/**
+ * @param script simplify_onnx.py
+ * @param inputPath the model
+ * @param outputPath the simplified model
+ * @returns the arguments of the python interpreter, read from the qtron settings
+ */
+export function scriptArgs(script: string, inputPath: string, outputPath: string): string[] {
+    const config = vscode.workspace.getConfiguration('qtron');
+    const enableOnnxToolProfiling = config.get<boolean>('enableOnnxToolProfiling') ?? true;
+    const onnxToolResultsPath = config.get<string>('onnxToolResultsPath') || '';
+    const enableDynamicShapeHandling = config.get<boolean>('enableDynamicShapeHandling') ?? true;
+    const enableStageTracing = config.get<boolean>('enableStageTracing') ?? false;
+    const simplifier = config.get<string>('simplifier') || 'auto';
+    const largeModelThresholdMB = config.get<number>('largeModelThresholdMB') ?? 1024;
+    const args = [script, inputPath, outputPath];
+    if (enableOnnxToolProfiling) {
+        args.push('true'); // enable_profiling
+        // Ensure we always pass a valid results_dir - use "DEFAULT" if empty
+        args.push(onnxToolResultsPath && onnxToolResultsPath.trim() ? onnxToolResultsPath : 'DEFAULT'); // results_dir
+        args.push(enableDynamicShapeHandling ? 'true' : 'false'); // enable_dynamic_shapes
+    } else {
+        args.push('false'); // disable profiling
+        // Even when profiling is disabled, we need to maintain argument positions
+        args.push('DEFAULT'); // results_dir placeholder
+        args.push('false'); // disable dynamic shapes
+    }
+    args.push(enableStageTracing ? 'true' : 'false'); // enable_tracing
+    args.push(simplifier); // simplifier
+    args.push(String(largeModelThresholdMB)); // large_model_mb
+    return args;
+}
+
+/**
+ * One run of simplify_onnx.py, created by AnalysisQueue.add
+ */
+export class AnalysisJob {
+
+    private _child: ChildProcess | undefined;
+    private _stage = 'Queued';
+    private _percent = 0;
+    // the running stages of the script, innermost last
+    private readonly _stages: string[] = [];
+    private _status: AnalysisStatus | undefined;
+    private _profilePath: string | undefined;
+    private _resultsDir: string | undefined;
+    private _output = '';
+    private _finished = false;
+    private _resolve!: (result: AnalysisResult) => void;
+    private readonly _listeners: AnalysisListener[];
+    private readonly _stageEmitter = new vscode.EventEmitter<string>();
+
+    // the outcome of the job, it resolves after cancel() too and never rejects
+    readonly result: Promise<AnalysisResult>;
+    // resolves after the result, once a completed job stored its outputs in the cache
+    readonly done: Promise<void>;
+    readonly onDidChangeStage = this._stageEmitter.event;
+
+    constructor(readonly name: string, private readonly _options: AnalysisOptions, listener: AnalysisListener) {
+        this._listeners = [listener];
+        this.result = new Promise<AnalysisResult>((resolve) => this._resolve = resolve);
+        this.done = this.result.then(async (result) => {
+            if (result.status === 'completed') {
+                await _options.cache.put(_options.inputPath, _options.inputHash, result).catch(() => undefined);
+            }
+        });
+    }
+
+    get stage(): string { return this._stage; }
+    // the estimated progress of the job in percent
+    get percent(): number { return this._percent; }
+    get options(): AnalysisOptions { return this._options; }
+    get queued(): boolean { return !this._status && this._stage === 'Queued'; }
+
+    /**
+     * share the job with another listener, it gets the lines and the profile from now on
+     */
+    listen(listener: AnalysisListener): void {
+        this._listeners.push(listener);
+    }
+
+    /**
+     * stop the job, a running script is killed and its outputs so far are kept
+     */
+    cancel(): void {
+        if (this.queued) {
+            this._status = 'cancelled';
+            this._finish();
+            return;
+        }
+        this._stop('cancelled');
+    }
+
+    /**
+     * run the script, called by the queue
+     */
+    run(): Promise<AnalysisResult> {
+        if (this._status) {
+            // cancelled while queued
+            return this.result;
+        }
+        this._setStage('Starting');
+        // the script writes over the cached outputs
+        this._options.cache.clear().catch(() => undefined).then(() => {
+            if (this._status) {
+                // cancelled while starting
+                this._finish();
+                return;
+            }
+            this._spawn();
+        });
+        return this.result;
+    }
+
+    private _spawn(): void {
+        let env: NodeJS.ProcessEnv = { ...process.env, QTRON_EVENTS: '1' };
+        if (this._options.background && this._options.threads) {
+            const threads = String(this._options.threads);
+            env = { ...env, OMP_NUM_THREADS: threads, OPENBLAS_NUM_THREADS: threads, MKL_NUM_THREADS: threads };
+        }
+        const child = spawn(this._options.pythonPath, this._options.args, { windowsHide: true, env: env });
+        this._child = child;
+        if (this._options.background && child.pid !== undefined) {
+            try {
+                os.setPriority(child.pid, os.constants.priority.PRIORITY_LOW);
+            } catch (err) {
+                // not permitted on this platform, the job runs at the normal priority
+            }
+        }
+        let timer: NodeJS.Timeout | undefined;
+        if (this._options.timeout > 0) {
+            timer = setTimeout(() => this._stop('timeout'), this._options.timeout);
+        }
+        readline.createInterface({ input: child.stdout! }).on('line', (line) => this._line(line));
+        readline.createInterface({ input: child.stderr! }).on('line', (line) => this._log(line));
+        const exit = (code: number | null, error?: Error) => {
+            if (timer) {
+                clearTimeout(timer);
+            }
+            if (this._finished) {
+                return;
+            }
+            if (!this._status) {
+                this._status = code === 0 ? 'completed' : 'failed';
+            }
+            if (error) {
+                this._append(error.message);
+            }
+            this._child = undefined;
+            this._finish();
+        };
+        child.on('error', (error) => exit(null, error));
+        child.on('close', (code) => exit(code));
+    }
+
+    private _stop(status: AnalysisStatus): void {
+        if (this._status) {
+            return;
+        }
+        this._status = status;
+        if (this._child) {
+            this._child.kill('SIGTERM');
+        }
+    }
+
+    private _setStage(stage: string, percent?: number): void {
+        this._stage = stage;
+        if (percent !== undefined) {
+            // nested and retried stages would move the progress back
+            this._percent = Math.max(this._percent, Math.min(percent, 100));
+        }
+        this._stageEmitter.fire(stage);
+    }
+
+    private _append(text: string): void {
+        this._output = (this._output + text).slice(-OUTPUT_TAIL);
+    }
+
+    private _log(line: string): void {
+        this._append(line + '\n');
+        for (const listener of this._listeners) {
+            if (listener.log) {
+                listener.log(line);
+            }
+        }
+    }
+
+    private _line(line: string): void {
+        if (!line.startsWith(EVENT_PREFIX)) {
+            this._log(line);
+            return;
+        }
+        let event: AnalysisEvent;
+        try {
+            event = JSON.parse(line.slice(EVENT_PREFIX.length));
+        } catch (err) {
+            this._log(line);
+            return;
+        }
+        switch (event.event) {
+            case 'stage':
+                this._stageEvent(event);
+                break;
+            case 'progress': {
+                // only the progress of the stage shown counts
+                const stage = this._stages.find((name) => STAGES[name]);
+                if (stage && stage === event.stage && event.total) {
+                    const [label, start, end] = STAGES[stage];
+                    this._setStage(`${label}, ${event.done} of ${event.total} nodes`,
+                        start + (end - start) * (event.done ?? 0) / event.total);
+                }
+                break;
+            }
+            case 'artifact':
+                this._artifact(event.kind ?? '', event.path ?? '');
+                break;
+        }
+    }
+
+    private _stageEvent(event: AnalysisEvent): void {
+        const name = event.stage ?? '';
+        if (event.phase === 'start') {
+            this._stages.push(name);
+        } else {
+            const index = this._stages.lastIndexOf(name);
+            if (index >= 0) {
+                this._stages.splice(index);
+            }
+            if (STAGES[name]) {
+                const seconds = (event.seconds ?? 0).toFixed(3);
+                this._log(`[TIMING] ${name}: ${seconds} s${event.error ? ` (${event.error})` : ''}`);
+            }
+        }
+        const stage = this._stages.find((running) => STAGES[running]);
+        if (stage) {
+            const [label, start] = STAGES[stage];
+            this._setStage(label, start);
+        } else if (STAGES[name] && event.phase === 'end') {
+            this._setStage(this._stage, STAGES[name][2]);
+        }
+    }
+
+    private _artifact(kind: string, filePath: string): void {
+        const notify = (callback: (listener: AnalysisListener) => void) => this._listeners.forEach(callback);
+        switch (kind) {
+            case 'results':
+                this._resultsDir = filePath;
+                break;
+            case 'simplified':
+                notify((listener) => listener.model && listener.model(filePath));
+                break;
+            case 'profile':
+                this._profilePath = filePath;
+                notify((listener) => listener.profile && listener.profile(filePath));
+                break;
+        }
+    }
+
+    private _finish(): void {
+        this._finished = true;
+        const exists = (file: string | undefined) => {
+            try {
+                return file !== undefined && fs.statSync(file).size > 0;
+            } catch (err) {
+                return false;
+            }
+        };
+        const result: AnalysisResult = {
+            status: this._status!,
+            modelPath: exists(this._options.cache.modelPath) ? this._options.cache.modelPath : undefined,
+            profilePath: exists(this._profilePath) ? this._profilePath : undefined,
+            resultsDir: this._resultsDir,
+        };
+        if (result.status === 'failed') {
+            result.error = this._output.trim();
+        }
+        this._setStage(result.status);
+        this._stageEmitter.dispose();
+        this._resolve(result);
+    }
+}
+
+/**
+ * The analysis jobs of the opened models and the pre-warming jobs. At most concurrency of each kind run at once, the
+ * others wait in the order they were added. A background job only starts while no job of an opened model waits.
+ */
+export class AnalysisQueue {
+
+    private readonly _pending: AnalysisJob[] = [];
+    private readonly _background: AnalysisJob[] = [];
+    private _running = 0;
+    private _runningBackground = 0;
+    // the jobs by model path, until they stored their outputs
+    private readonly _jobs = new Map<string, AnalysisJob>();
+
+    /**
+     * @param _concurrency the number of jobs of a kind that run at once, read when a job starts
+     */
+    constructor(private readonly _concurrency: (background: boolean) => number) { }
+
+    /**
+     * @param inputPath a model
+     * @returns the job of the model, undefined if it has none or the job stored its outputs
+     */
+    get(inputPath: string): AnalysisJob | undefined {
+        return this._jobs.get(inputPath);
+    }
+
+    /**
+     * queue a job and show its progress, a model that has a job already shares it
+     * @param name the model name shown in the progress
+     */
+    add(name: string, options: AnalysisOptions, listener: AnalysisListener): AnalysisJob {
+        const existing = this._jobs.get(options.inputPath);
+        if (existing) {
+            existing.listen(listener);
+            if (!options.background && existing.options.background) {
+                // opening the model takes over the pre-warming job
+                existing.options.background = false;
+                const index = this._background.indexOf(existing);
+                if (index >= 0) {
+                    this._background.splice(index, 1);
+                    this._pending.push(existing);
+                }
+                this._progress(existing);
+                this._next();
+            }
+            return existing;
+        }
+        const job = new AnalysisJob(name, options, listener);
+        this._jobs.set(options.inputPath, job);
+        job.done.then(() => {
+            if (this._jobs.get(options.inputPath) === job) {
+                this._jobs.delete(options.inputPath);
+            }
+        });
+        this._progress(job);
+        (options.background ? this._background : this._pending).push(job);
+        this._next();
+        return job;
+    }
+
+    private _progress(job: AnalysisJob): void {
+        const background = job.options.background;
+        vscode.window.withProgress({
+            location: background ? vscode.ProgressLocation.Window : vscode.ProgressLocation.Notification,
+            title: background ? `QTron pre-warming ${job.name}` : `QTron: ${job.name}`,
+            cancellable: !background,
+        }, (progress, token) => {
+            token.onCancellationRequested(() => job.cancel());
+            // the increments add up to the progress of the job
+            let reported = job.percent;
+            progress.report({ message: job.stage, increment: reported });
+            job.onDidChangeStage((stage) => {
+                progress.report({ message: stage, increment: job.percent - reported });
+                reported = job.percent;
+            });
+            return job.result;
+        });
+    }
+
+    private _next(): void {
+        while (this._pending.length > 0 && this._running < Math.max(this._concurrency(false), 1)) {
+            const job = this._pending.shift()!;
+            this._running++;
+            job.run().then(() => {
+                this._running--;
+                this._next();
+            });
+        }
+        while (this._pending.length === 0 && this._background.length > 0 &&
+            this._runningBackground < Math.max(this._concurrency(true), 1)) {
+            const job = this._background.shift()!;
+            this._runningBackground++;
+            job.run().then(() => {
+                this._runningBackground--;
+                this._next();
+            });
+        }
+    }
+}
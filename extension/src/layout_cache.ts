@@ -0,0 +1,91 @@
+/**
+ * Graph layouts of a model, persisted in its results directory.
+ *
+ * The webview computes the layout of a graph in a Web Worker and keys it by a hash of the layout input (the layout
+ * options, the measured node sizes and the edges). The cache file holds the layouts of one model content, keyed by
+ * that hash, so re-opening the same model skips the layout. A different model content starts a new file.
+ */
+import * as crypto from 'crypto';
+import * as fs from 'fs';
+import * as path from 'path';
+
+const LAYOUT_CACHE_VERSION = 1;
+
+// the layouts kept per model, one per graph and view options, the least recently stored are dropped
+export const LAYOUT_CACHE_SIZE = 8;
+
+interface LayoutCacheFile {
+    version: number;
+    hash: string;
+    layouts: { [key: string]: any };
+}
+
+export class LayoutCache {
+
+    private _file: LayoutCacheFile | undefined;
+    // the writes are chained so the file is never written twice at once
+    private _writing: Promise<void> = Promise.resolve();
+
+    /**
+     * @param filePath the cache file
+     * @param modelHash the hash of the model content the layouts belong to
+     */
+    constructor(readonly filePath: string, readonly modelHash: string) { }
+
+    /**
+     * @param data the model content
+     * @returns the sha256 of the model content
+     */
+    static hash(data: Uint8Array): string {
+        return crypto.createHash('sha256').update(data).digest('hex');
+    }
+
+    private async load(): Promise<LayoutCacheFile> {
+        if (!this._file) {
+            let file: LayoutCacheFile | undefined;
+            try {
+                const content = JSON.parse(await fs.promises.readFile(this.filePath, 'utf8'));
+                if (content.version === LAYOUT_CACHE_VERSION && content.hash === this.modelHash && content.layouts) {
+                    file = content;
+                }
+            } catch (err) {
+                // no cache yet or an unreadable one, it's rewritten on the next put
+            }
+            this._file = file ?? { version: LAYOUT_CACHE_VERSION, hash: this.modelHash, layouts: {} };
+        }
+        return this._file;
+    }
+
+    /**
+     * @param key the hash of the layout input
+     * @returns the layout, null if it's not cached
+     */
+    async get(key: string): Promise<any> {
+        const file = await this.load();
+        return Object.prototype.hasOwnProperty.call(file.layouts, key) ? file.layouts[key] : null;
+    }
+
+    /**
+     * store a layout and write the cache file
+     * @param key the hash of the layout input
+     * @param layout the layout computed by the webview
+     */
+    async put(key: string, layout: any): Promise<void> {
+        const file = await this.load();
+        delete file.layouts[key];
+        file.layouts[key] = layout;
+        const keys = Object.keys(file.layouts);
+        for (const old of keys.slice(0, Math.max(keys.length - LAYOUT_CACHE_SIZE, 0))) {
+            delete file.layouts[old];
+        }
+        const content = JSON.stringify(file);
+        this._writing = this._writing.catch(() => undefined).then(async () => {
+            await fs.promises.mkdir(path.dirname(this.filePath), { recursive: true });
+            // written next to the cache file then renamed, a reader never sees half a file
+            const tempPath = `${this.filePath}.${process.pid}.tmp`;
+            await fs.promises.writeFile(tempPath, content, 'utf8');
+            await fs.promises.rename(tempPath, this.filePath);
+        });
+        return this._writing;
+    }
+}
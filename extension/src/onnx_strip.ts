@@ -0,0 +1,263 @@
+/**
+ * Weight stripping of ONNX models for the webview.
+ *
+ * The webview parses the whole model it receives, but only needs tensor values when a tensor is opened in the
+ * sidebar. stripModelWeights rewrites the protobuf so that every large tensor becomes an external tensor
+ * (https://github.com/onnx/onnx/blob/main/docs/ExternalData.md) whose location is STRIPPED_LOCATION and whose offset
+ * and length are the byte range of its values in the original model. raw_data and the packed float_data and
+ * double_data fields are stripped, their bytes are the little-endian values the external data format expects.
+ * The webview requests that range with an 'external_tensor' message when it needs the values.
+ */
+
+// the external data location of stripped tensors, the bytes are in the model itself
+export const STRIPPED_LOCATION = 'qtron:model';
+
+// values smaller than this stay in the model, scalars and shapes are shown in the graph
+export const STRIP_THRESHOLD = 1024;
+
+const WIRE_VARINT = 0;
+const WIRE_FIXED64 = 1;
+const WIRE_BYTES = 2;
+const WIRE_FIXED32 = 5;
+
+// field numbers of onnx.proto3, only the messages on the way to a TensorProto are visited
+const MODEL_GRAPH = 7;
+const GRAPH_NODE = 1;
+const GRAPH_INITIALIZER = 5;
+const NODE_ATTRIBUTE = 5;
+const ATTRIBUTE_T = 5;
+const ATTRIBUTE_G = 6;
+const ATTRIBUTE_TENSORS = 10;
+const ATTRIBUTE_GRAPHS = 11;
+const TENSOR_FLOAT_DATA = 4;
+const TENSOR_RAW_DATA = 9;
+const TENSOR_DOUBLE_DATA = 10;
+const TENSOR_EXTERNAL_DATA = 13;
+const TENSOR_DATA_LOCATION = 14;
+const DATA_LOCATION_EXTERNAL = 1;
+const TENSOR_DATA_FIELDS = [TENSOR_RAW_DATA, TENSOR_FLOAT_DATA, TENSOR_DOUBLE_DATA];
+
+type MessageKind = 'model' | 'graph' | 'node' | 'attribute' | 'tensor';
+
+const CHILDREN: { [kind: string]: { [field: number]: MessageKind } } = {
+    model: { [MODEL_GRAPH]: 'graph' },
+    graph: { [GRAPH_NODE]: 'node', [GRAPH_INITIALIZER]: 'tensor' },
+    node: { [NODE_ATTRIBUTE]: 'attribute' },
+    attribute: { [ATTRIBUTE_T]: 'tensor', [ATTRIBUTE_G]: 'graph', [ATTRIBUTE_TENSORS]: 'tensor', [ATTRIBUTE_GRAPHS]: 'graph' },
+};
+
+/**
+ * the rewritten bytes of a message, a list of chunks so nested messages are copied once
+ */
+class Chunks {
+    readonly parts: Uint8Array[] = [];
+    length = 0;
+    // whether a tensor was stripped
+    changed = false;
+
+    push(part: Uint8Array): void {
+        this.parts.push(part);
+        this.length += part.length;
+    }
+
+    append(other: Chunks): void {
+        for (const part of other.parts) {
+            this.push(part);
+        }
+    }
+
+    concat(): Uint8Array {
+        const result = new Uint8Array(this.length);
+        let position = 0;
+        for (const part of this.parts) {
+            result.set(part, position);
+            position += part.length;
+        }
+        return result;
+    }
+}
+
+class Reader {
+    position: number;
+
+    constructor(readonly data: Uint8Array, start: number, readonly end: number) {
+        this.position = start;
+    }
+
+    varint(): number {
+        let value = 0;
+        let scale = 1;
+        for (;;) {
+            if (this.position >= this.end) {
+                throw new Error('Truncated varint.');
+            }
+            const byte = this.data[this.position++];
+            value += (byte & 0x7f) * scale;
+            if (byte < 0x80) {
+                return value;
+            }
+            scale *= 128;
+        }
+    }
+
+    skip(wireType: number): void {
+        switch (wireType) {
+            case WIRE_VARINT: this.varint(); break;
+            case WIRE_FIXED64: this.position += 8; break;
+            case WIRE_BYTES: {
+                // the length is read before position is, it moves position
+                const length = this.varint();
+                this.position += length;
+                break;
+            }
+            case WIRE_FIXED32: this.position += 4; break;
+            default: throw new Error(`Unsupported wire type ${wireType}.`);
+        }
+        if (this.position > this.end) {
+            throw new Error('Truncated field.');
+        }
+    }
+}
+
+function encodeVarint(value: number): Uint8Array {
+    const bytes: number[] = [];
+    while (value >= 0x80) {
+        bytes.push((value % 128) | 0x80);
+        value = Math.floor(value / 128);
+    }
+    bytes.push(value);
+    return new Uint8Array(bytes);
+}
+
+function encodeBytesField(field: number, content: Uint8Array): Uint8Array[] {
+    return [encodeVarint((field << 3) | WIRE_BYTES), encodeVarint(content.length), content];
+}
+
+function encodeStringEntry(key: string, value: string): Uint8Array[] {
+    const entry = new Chunks();
+    for (const [field, text] of [[1, key], [2, value]] as [number, string][]) {
+        for (const part of encodeBytesField(field, new Uint8Array(Buffer.from(text, 'utf8')))) {
+            entry.push(part);
+        }
+    }
+    return encodeBytesField(TENSOR_EXTERNAL_DATA, entry.concat());
+}
+
+function rewriteTensor(data: Uint8Array, start: number, end: number, threshold: number): Chunks {
+    const result = new Chunks();
+    const reader = new Reader(data, start, end);
+    let raw: { offset: number, length: number } | null = null;
+    while (reader.position < end) {
+        const fieldStart = reader.position;
+        const tag = reader.varint();
+        const field = Math.floor(tag / 8);
+        const wireType = tag % 8;
+        if (field === TENSOR_DATA_LOCATION && wireType === WIRE_VARINT) {
+            if (reader.varint() === DATA_LOCATION_EXTERNAL) {
+                // already external, keep the tensor as it is
+                return rewriteUnchanged(data, start, end);
+            }
+            continue;
+        }
+        if (TENSOR_DATA_FIELDS.includes(field) && wireType === WIRE_BYTES) {
+            const length = reader.varint();
+            if (length >= threshold) {
+                if (raw !== null) {
+                    // values in two fields, not a valid tensor
+                    return rewriteUnchanged(data, start, end);
+                }
+                raw = { offset: reader.position, length: length };
+                reader.position += length;
+                continue;
+            }
+            reader.position += length;
+        } else {
+            reader.skip(wireType);
+        }
+        result.push(data.subarray(fieldStart, reader.position));
+    }
+    if (raw === null) {
+        return rewriteUnchanged(data, start, end);
+    }
+    const entries = [
+        ...encodeStringEntry('location', STRIPPED_LOCATION),
+        ...encodeStringEntry('offset', raw.offset.toString()),
+        ...encodeStringEntry('length', raw.length.toString()),
+        encodeVarint((TENSOR_DATA_LOCATION << 3) | WIRE_VARINT),
+        encodeVarint(DATA_LOCATION_EXTERNAL),
+    ];
+    for (const part of entries) {
+        result.push(part);
+    }
+    result.changed = true;
+    return result;
+}
+
+function rewriteUnchanged(data: Uint8Array, start: number, end: number): Chunks {
+    const result = new Chunks();
+    result.push(data.subarray(start, end));
+    return result;
+}
+
+function rewriteMessage(data: Uint8Array, start: number, end: number, kind: MessageKind, threshold: number): Chunks {
+    if (kind === 'tensor') {
+        return rewriteTensor(data, start, end, threshold);
+    }
+    const children = CHILDREN[kind];
+    const result = new Chunks();
+    const reader = new Reader(data, start, end);
+    // unchanged fields are pushed as one span
+    let spanStart = start;
+    while (reader.position < end) {
+        const fieldStart = reader.position;
+        const tag = reader.varint();
+        const field = Math.floor(tag / 8);
+        const wireType = tag % 8;
+        const child = children[field];
+        if (child === undefined || wireType !== WIRE_BYTES) {
+            reader.skip(wireType);
+            continue;
+        }
+        const length = reader.varint();
+        const childStart = reader.position;
+        reader.position += length;
+        if (reader.position > end) {
+            throw new Error('Truncated message.');
+        }
+        const rewritten = rewriteMessage(data, childStart, reader.position, child, threshold);
+        if (!rewritten.changed) {
+            continue;
+        }
+        if (fieldStart > spanStart) {
+            result.push(data.subarray(spanStart, fieldStart));
+        }
+        result.push(encodeVarint(tag));
+        result.push(encodeVarint(rewritten.length));
+        result.append(rewritten);
+        result.changed = true;
+        spanStart = reader.position;
+    }
+    if (!result.changed) {
+        return rewriteUnchanged(data, start, end);
+    }
+    if (end > spanStart) {
+        result.push(data.subarray(spanStart, end));
+    }
+    return result;
+}
+
+/**
+ * Strip the values of the large tensors of an ONNX model.
+ * @param data the ModelProto bytes
+ * @param threshold the minimum size of the values in bytes to strip
+ * @returns the ModelProto bytes without the tensor values, data itself if nothing was stripped or the model could
+ * not be parsed
+ */
+export function stripModelWeights(data: Uint8Array, threshold: number = STRIP_THRESHOLD): Uint8Array {
+    try {
+        const result = rewriteMessage(data, 0, data.length, 'model', threshold);
+        return result.changed ? result.concat() : data;
+    } catch (err) {
+        return data;
+    }
+}
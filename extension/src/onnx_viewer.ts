@@ -4,6 +4,11 @@ import * as path from 'path';
 import * as os from 'os';
 import * as fs from 'fs';
 import { execFile } from 'child_process';
+import { stripModelWeights, STRIPPED_LOCATION } from './onnx_strip';
+import { LayoutCache } from './layout_cache';
+import { AnalysisJob, AnalysisQueue, AnalysisResult, scriptArgs } from './analysis_queue';
+import { AnalysisCache, defaultResultsDir } from './analysis_cache';
+import { Prewarmer } from './prewarm';
 
 // Shared output channel to avoid creating multiple channels
 let sharedOutputChannel: vscode.OutputChannel | undefined;
@@ -15,17 +20,6 @@ function getOutputChannel(): vscode.OutputChannel {
     return sharedOutputChannel;
 }
 
-/**
- * Ensure the temporary directory exists
- */
-function ensureTempDir(extensionContext: vscode.ExtensionContext): string {
-    const tempDir = extensionContext.asAbsolutePath('tmp');
-    if (!fs.existsSync(tempDir)) {
-        fs.mkdirSync(tempDir, { recursive: true });
-    }
-    return tempDir;
-}
-
 /**
  * Define the document (the data model) used for onnx files.
  * 
@@ -38,16 +32,96 @@ class OnnxDocument implements vscode.CustomDocument {
     static async create(
         uri: vscode.Uri,
         backupId: string | undefined,
-        extensionContext: vscode.ExtensionContext
+        extensionContext: vscode.ExtensionContext,
+        analyses: AnalysisQueue
     ): Promise<OnnxDocument | PromiseLike<OnnxDocument>> {
         // If we have a backup, read that. Otherwise read the resource from the workspace
         const dataFile = typeof backupId === 'string' ? vscode.Uri.parse(backupId) : uri;
-
-        // Try to simplify the ONNX file before loading
-        let fileData: Uint8Array;
         const inputPath = dataFile.fsPath;
-        const tempDir = ensureTempDir(extensionContext);
-        const tempFile = path.join(tempDir, `onnxsim_${Date.now()}_${Math.random().toString(36).slice(2)}.onnx`);
+        const onnxToolResultsPath = vscode.workspace.getConfiguration('qtron').get<string>('onnxToolResultsPath') || '';
+
+        // Use shared output channel
+        const outputChannel = getOutputChannel();
+        outputChannel.appendLine(`[QTron] === Starting ONNX file processing ===`);
+        outputChannel.appendLine(`[QTron] File: ${inputPath}`);
+
+        // The viewer opens on the original model, the analysis hands over the profile and the simplified model later
+        const fileData = await vscode.workspace.fs.readFile(dataFile);
+        outputChannel.appendLine(`[QTron] Loaded original file successfully (${fileData.length} bytes)`);
+        const document = new OnnxDocument(uri, new Uint8Array(fileData), undefined,
+            defaultResultsDir(inputPath, onnxToolResultsPath));
+        document.analyze(inputPath, extensionContext, analyses).catch((err) => {
+            outputChannel.appendLine(`[QTron] [ERROR] ONNX analysis failed: ${err instanceof Error ? err.message : String(err)}`);
+        });
+        return document;
+    }
+
+    // the file uri
+    private readonly _uri: vscode.Uri;
+    // the file data as an Uint8Array, the simplified model once the analysis wrote it
+    private _documentData: Uint8Array;
+    // the QPROF binary profile written by onnx_tool, if profiling ran
+    private _profileData: Uint8Array | undefined;
+    // the file data without the large tensors, sent to the webview
+    private _strippedData: Uint8Array | undefined;
+    // the onnx_tool results directory of the model, the graph layouts are cached there
+    private _resultsDir: string;
+    private _layoutCache: LayoutCache | undefined;
+    // the hash of the opened file content, the layouts of the simplified model are cached under it too
+    private _fileHash: string | undefined;
+    // the running or queued analysis of the model
+    private _analysis: AnalysisJob | undefined;
+    private readonly _onDidChangeModel = new vscode.EventEmitter<void>();
+    private readonly _onDidChangeProfile = new vscode.EventEmitter<void>();
+
+    // the analysis replaced the model with the simplified one
+    public readonly onDidChangeModel = this._onDidChangeModel.event;
+    // the analysis saved the profile
+    public readonly onDidChangeProfile = this._onDidChangeProfile.event;
+
+    /**
+     * the constructor
+     * @param uri the file uri
+     * @param initialContent the file data
+     * @param profileData the binary profile data
+     * @param resultsDir the results directory of the model
+     */
+    private constructor(
+        uri: vscode.Uri,
+        initialContent: Uint8Array,
+        profileData: Uint8Array | undefined,
+        resultsDir: string,
+    ) {
+        this._uri = uri;
+        this._documentData = initialContent;
+        this._profileData = profileData;
+        this._resultsDir = resultsDir;
+    }
+
+    public get uri() { return this._uri; }
+    public get documentData(): Uint8Array { return this._documentData; }
+    public get profileData(): Uint8Array | undefined { return this._profileData; }
+    public get strippedData(): Uint8Array {
+        if (!this._strippedData) {
+            this._strippedData = stripModelWeights(this._documentData);
+        }
+        return this._strippedData;
+    }
+    public get layoutCache(): LayoutCache {
+        if (!this._layoutCache) {
+            const modelName = path.basename(this._uri.fsPath).replace(/\.onnx$/, '');
+            this._fileHash = this._fileHash ?? LayoutCache.hash(this._documentData);
+            this._layoutCache = new LayoutCache(path.join(this._resultsDir, `${modelName}_layout.json`), this._fileHash);
+        }
+        return this._layoutCache;
+    }
+
+    /**
+     * Simplify and profile the model with simplify_onnx.py as a job of the analysis queue. The document takes the
+     * binary profile as soon as it's saved and the simplified model when the job ends, also after a timeout or a
+     * cancel. A model analyzed before, when opened or by pre-warming, takes the cached outputs and runs no job.
+     */
+    private async analyze(inputPath: string, extensionContext: vscode.ExtensionContext, analyses: AnalysisQueue): Promise<void> {
         // Use asAbsolutePath for robust script path resolution
         const simplifyScript = extensionContext.asAbsolutePath(path.join('scripts', 'simplify_onnx.py'));
 
@@ -58,42 +132,53 @@ class OnnxDocument implements vscode.CustomDocument {
         const enableOnnxToolProfiling = config.get<boolean>('enableOnnxToolProfiling') ?? true;
         const onnxToolResultsPath = config.get<string>('onnxToolResultsPath') || '';
         const enableDynamicShapeHandling = config.get<boolean>('enableDynamicShapeHandling') ?? true;
+        const enableStageTracing = config.get<boolean>('enableStageTracing') ?? false;
+        const analysisTimeout = config.get<number>('analysisTimeout') ?? 300;
 
-        // Use shared output channel
         const outputChannel = getOutputChannel();
-        outputChannel.appendLine(`[QTron] === Starting ONNX file processing ===`);
-        outputChannel.appendLine(`[QTron] File: ${inputPath}`);
         outputChannel.appendLine(`[QTron] Simplification enabled: ${enableSimplification}`);
         outputChannel.appendLine(`[QTron] onnx_tool profiling enabled: ${enableOnnxToolProfiling}`);
         if (enableOnnxToolProfiling) {
             outputChannel.appendLine(`[QTron] Dynamic shape handling enabled: ${enableDynamicShapeHandling}`);
         }
-        outputChannel.show();
+        outputChannel.appendLine(`[QTron] Stage tracing enabled: ${enableStageTracing}`);
+        outputChannel.show(true);
 
         // Check if simplification is enabled
         if (!enableSimplification) {
             outputChannel.appendLine(`[QTron] ONNX simplification disabled by user setting`);
-            fileData = await vscode.workspace.fs.readFile(dataFile);
-            outputChannel.appendLine(`[QTron] Loaded original file successfully (${fileData.length} bytes)`);
-            return new OnnxDocument(uri, new Uint8Array(fileData));
+            return;
+        }
+
+        const cache = new AnalysisCache(defaultResultsDir(inputPath, onnxToolResultsPath),
+            path.basename(inputPath).replace(/\.onnx$/, ''));
+        const inputHash = this._fileHash = this._fileHash ?? LayoutCache.hash(this._documentData);
+        const cached = await cache.get(inputHash);
+        if (cached) {
+            outputChannel.appendLine(`[QTron] Using the cached analysis in ${cache.resultsDir}`);
+            if (cached.profilePath) {
+                await this.loadProfile(cached.profilePath);
+            }
+            // simplification may have left the model as it is
+            if (cached.modelPath && cached.modelHash !== inputHash) {
+                await this.loadModel(cached.modelPath);
+            }
+            return;
         }
 
-        outputChannel.appendLine(`[QTron] Temp file: ${tempFile}`);
+        outputChannel.appendLine(`[QTron] Output file: ${cache.modelPath}`);
         outputChannel.appendLine(`[QTron] Script path: ${simplifyScript}`);
         outputChannel.appendLine(`[QTron] Python path: ${pythonPath}`);
 
         // Check if simplifyScript exists
-        let scriptExists = false;
         try {
             await vscode.workspace.fs.stat(vscode.Uri.file(simplifyScript));
-            scriptExists = true;
             outputChannel.appendLine(`[QTron] [Diagnostics] simplify_onnx.py found.`);
         } catch (e) {
             const msg = `ONNX Simplifier script not found at: ${simplifyScript}`;
             outputChannel.appendLine(msg);
             vscode.window.showErrorMessage(msg);
-            // Optionally, fallback to loading the original ONNX file here
-            throw new Error(msg);
+            return;
         }
 
         // Check if pythonPath is executable (best effort)
@@ -124,138 +209,106 @@ class OnnxDocument implements vscode.CustomDocument {
         } catch (e) {
             vscode.window.showErrorMessage(`[QTron] Python interpreter not found or not executable. ONNX simplification will be skipped.`);
         }
+        if (!pythonOk) {
+            outputChannel.appendLine(`[QTron] Skipping simplification (script or python not available)`);
+            return;
+        }
 
-        outputChannel.show(true);
-        
-        // Try ONNX simplification with aggressive fallback
-        let tempFileCreated = false;
+        // Prepare arguments for the script with profiling options
+        const args = scriptArgs(simplifyScript, inputPath, cache.modelPath);
+
+        outputChannel.appendLine(`[QTron] Attempting ONNX simplification: ${inputPath} → ${cache.modelPath} (using ${pythonPath})`);
+        outputChannel.appendLine(`[QTron] Running: ${pythonPath} ${args.join(' ')}`);
+        outputChannel.appendLine(`[QTron] Arguments: [${args.map(arg => `"${arg}"`).join(', ')}]`);
+
+        let profileLoad: Promise<void> | undefined;
+        // the simplified model, loaded as soon as onnx_tool wrote it and before profiling
+        let modelLoad: Promise<void> | undefined;
+        this._analysis = analyses.add(path.basename(inputPath), {
+            pythonPath: pythonPath,
+            args: args,
+            inputPath: inputPath,
+            inputHash: inputHash,
+            cache: cache,
+            timeout: analysisTimeout * 1000,
+        }, {
+            log: (line) => outputChannel.appendLine(`[QTron] ${line}`),
+            model: (simplifiedPath) => modelLoad = this.loadModel(simplifiedPath),
+            profile: (profilePath) => profileLoad = this.loadProfile(profilePath),
+        });
+        let result: AnalysisResult;
         try {
-            if (scriptExists && pythonOk) {
-                outputChannel.appendLine(`[QTron] Attempting ONNX simplification: ${inputPath} → ${tempFile} (using ${pythonPath})`);
-                vscode.window.showInformationMessage(`Attempting ONNX simplification...`);
-                
-                await new Promise<void>((resolve, reject) => {
-                    // Prepare arguments for the script with profiling options
-                    const scriptArgs = [simplifyScript, inputPath, tempFile];
-                    if (enableOnnxToolProfiling) {
-                        scriptArgs.push('true'); // enable_profiling
-                        // Ensure we always pass a valid results_dir - use "DEFAULT" if empty
-                        const resultsDir = onnxToolResultsPath && onnxToolResultsPath.trim() ? onnxToolResultsPath : 'DEFAULT';
-                        scriptArgs.push(resultsDir); // results_dir
-                        scriptArgs.push(enableDynamicShapeHandling ? 'true' : 'false'); // enable_dynamic_shapes
-                    } else {
-                        scriptArgs.push('false'); // disable profiling
-                        // Even when profiling is disabled, we need to maintain argument positions
-                        scriptArgs.push('DEFAULT'); // results_dir placeholder
-                        scriptArgs.push('false'); // disable dynamic shapes
-                    }
-                    
-                    outputChannel.appendLine(`[QTron] Running: ${pythonPath} ${scriptArgs.join(' ')}`);
-                    outputChannel.appendLine(`[QTron] Arguments: [${scriptArgs.map(arg => `"${arg}"`).join(', ')}]`);
-                    
-                    let processCompleted = false;
-                    const child = execFile(
-                        pythonPath,
-                        scriptArgs,
-                        { timeout: 60000 }, // Increased timeout for large models (60 seconds)
-                        (error, stdout, stderr) => {
-                            processCompleted = true;
-                            outputChannel.appendLine(`[QTron] stdout:\n${stdout || '<empty>'}`);
-                            outputChannel.appendLine(`[QTron] stderr:\n${stderr || '<empty>'}`);
-                            
-                            if (error) {
-                                outputChannel.appendLine(`[QTron] ERROR: ${error.message}`);
-                                reject(new Error(stderr || stdout || error.message));
-                            } else {
-                                outputChannel.appendLine(`[QTron] Simplification completed successfully`);
-                                resolve();
-                            }
-                        }
-                    );
-                    
-                    // Fallback: kill process if it doesn't complete within timeout
-                    setTimeout(() => {
-                        if (!processCompleted && !child.killed) {
-                            outputChannel.appendLine(`[QTron] WARNING: ONNX processing timed out, killing process`);
-                            child.kill('SIGTERM');
-                            reject(new Error('ONNX processing (simplification + profiling) timed out'));
-                        }
-                    }, 65000); // Kill after 65 seconds (buffer beyond execFile timeout for profiling)
-                });
-                
-                // If we get here, check if the simplified file exists and read it
-                try {
-                    await vscode.workspace.fs.stat(vscode.Uri.file(tempFile));
-                    tempFileCreated = true;
-                    fileData = await vscode.workspace.fs.readFile(vscode.Uri.file(tempFile));
-                    outputChannel.appendLine(`[QTron] Using simplified ONNX file`);
-                    const message = enableOnnxToolProfiling 
-                        ? 'ONNX simplification and onnx_tool analysis completed successfully.' 
-                        : 'ONNX simplification succeeded. Using simplified model.';
-                    vscode.window.showInformationMessage(message);
-                } catch (statError) {
-                    outputChannel.appendLine(`[QTron] Simplified file not found, falling back to original`);
-                    throw new Error('Simplified file not created');
-                }
-            } else {
-                outputChannel.appendLine(`[QTron] Skipping simplification (script or python not available)`);
-                throw new Error('Simplification prerequisites not met');
-            }
-        } catch (err: any) {
-            // Aggressive fallback: always load original file if simplification fails
-            outputChannel.appendLine(`[QTron] [WARNING] ONNX simplification failed: ${err instanceof Error ? err.message : String(err)}`);
-            outputChannel.appendLine(`[QTron] Loading original ONNX file without simplification`);
-            vscode.window.showWarningMessage('ONNX already simplified.');
-            
-            try {
-                fileData = await vscode.workspace.fs.readFile(dataFile);
-                outputChannel.appendLine(`[QTron] Successfully loaded original file`);
-            } catch (readError) {
-                outputChannel.appendLine(`[QTron] [ERROR] Failed to read original file: ${readError}`);
-                throw readError;
-            }
+            result = await this._analysis.result;
         } finally {
-            // Clean up all files in the tmp directory after processing
-            try {
-                const tmpDirPath = ensureTempDir(extensionContext);
-                const tmpDirUri = vscode.Uri.file(tmpDirPath);
-                const entries = await vscode.workspace.fs.readDirectory(tmpDirUri);
-                for (const [name, type] of entries) {
-                    const fileUri = vscode.Uri.file(path.join(tmpDirPath, name));
-                    try {
-                        await vscode.workspace.fs.delete(fileUri, { recursive: true, useTrash: false });
-                        outputChannel.appendLine(`[QTron] Cleaned up tmp file: ${fileUri.fsPath}`);
-                    } catch (cleanupError) {
-                        outputChannel.appendLine(`[QTron] Could not clean up tmp file: ${fileUri.fsPath} (${cleanupError})`);
-                    }
-                }
-            } catch (err) {
-                outputChannel.appendLine(`[QTron] Could not clean up tmp directory: ${err}`);
-            }
+            this._analysis = undefined;
+        }
+        await profileLoad;
+        await modelLoad;
+
+        const modelPath = result.modelPath;
+        switch (result.status) {
+            case 'completed':
+                outputChannel.appendLine(`[QTron] Simplification completed successfully`);
+                break;
+            case 'failed':
+                outputChannel.appendLine(`[QTron] [WARNING] ONNX simplification failed: ${result.error || 'no output'}`);
+                vscode.window.showWarningMessage('ONNX simplification failed, showing the original model.');
+                break;
+            default:
+                outputChannel.appendLine(`[QTron] [WARNING] ONNX processing ${result.status === 'timeout' ? `timed out after ${analysisTimeout} s` : 'cancelled'}, keeping its results so far`);
+                break;
+        }
+        if (result.profilePath && !profileLoad) {
+            await this.loadProfile(result.profilePath);
+        }
+        if (result.resultsDir && !this._layoutCache) {
+            this._resultsDir = result.resultsDir;
+        }
+        if (modelPath && !modelLoad) {
+            await this.loadModel(modelPath);
+        }
+        if (modelPath && result.status === 'completed') {
+            vscode.window.showInformationMessage(enableOnnxToolProfiling
+                ? 'ONNX simplification and onnx_tool analysis completed successfully.'
+                : 'ONNX simplification succeeded. Using simplified model.');
         }
-        return new OnnxDocument(uri, new Uint8Array(fileData));
     }
 
-    // the file uri
-    private readonly _uri: vscode.Uri;
-    // the file data as an Uint8Array
-    private _documentData: Uint8Array;
+    /**
+     * read the simplified model and show it in place of the original one
+     */
+    private async loadModel(modelPath: string): Promise<void> {
+        const outputChannel = getOutputChannel();
+        try {
+            const data = await vscode.workspace.fs.readFile(vscode.Uri.file(modelPath));
+            outputChannel.appendLine(`[QTron] Using simplified ONNX file (${data.length} bytes)`);
+            this.setModel(new Uint8Array(data));
+        } catch (readError) {
+            outputChannel.appendLine(`[QTron] [WARNING] Could not read simplified model ${modelPath}: ${readError}`);
+        }
+    }
 
     /**
-     * the constructor
-     * @param uri the file uri
-     * @param initialContent the file data
+     * read the binary profile, it lets the viewer overlay MACs/memory/params without parsing them from the model
      */
-    private constructor(
-        uri: vscode.Uri,
-        initialContent: Uint8Array,
-    ) {
-        this._uri = uri;
-        this._documentData = initialContent;
+    private async loadProfile(profilePath: string): Promise<void> {
+        const outputChannel = getOutputChannel();
+        try {
+            this._profileData = await vscode.workspace.fs.readFile(vscode.Uri.file(profilePath));
+            outputChannel.appendLine(`[QTron] Loaded binary profile: ${profilePath} (${this._profileData.length} bytes)`);
+            this._onDidChangeProfile.fire();
+        } catch (readError) {
+            outputChannel.appendLine(`[QTron] [WARNING] Could not read binary profile ${profilePath}: ${readError}`);
+        }
     }
 
-    public get uri() { return this._uri; }
-    public get documentData(): Uint8Array { return this._documentData; }
+    private setModel(data: Uint8Array): void {
+        // the next open starts with the same file, it finds the layouts of both models
+        this._fileHash = this._fileHash ?? LayoutCache.hash(this._documentData);
+        this._documentData = data;
+        this._strippedData = undefined;
+        this._onDidChangeModel.fire();
+    }
 
     /**
      * Called by VS Code when there are no more references to the document.
@@ -263,6 +316,11 @@ class OnnxDocument implements vscode.CustomDocument {
      * This happens when all editors for it have been closed.
      */
     dispose(): void {
+        if (this._analysis) {
+            this._analysis.cancel();
+        }
+        this._onDidChangeModel.dispose();
+        this._onDidChangeProfile.dispose();
     }
 }
 
@@ -280,7 +338,8 @@ export class OnnxViewerProvider implements vscode.CustomReadonlyEditorProvider<O
      */
     public static register(context: vscode.ExtensionContext): vscode.Disposable {
 
-        return vscode.window.registerCustomEditorProvider(OnnxViewerProvider.viewType, new OnnxViewerProvider(context),
+        const provider = new OnnxViewerProvider(context);
+        const editor = vscode.window.registerCustomEditorProvider(OnnxViewerProvider.viewType, provider,
             {
                 // For this extension, we enable `retainContextWhenHidden` which keeps the
                 // webview alive even when it is not visible. You should avoid using this setting
@@ -291,6 +350,8 @@ export class OnnxViewerProvider implements vscode.CustomReadonlyEditorProvider<O
                 },
                 supportsMultipleEditorsPerDocument: false,
             });
+        // the background analyses of the workspace models share the queue of the opened ones
+        return vscode.Disposable.from(editor, new Prewarmer(context, provider.analyses));
     }
 
     // viewType defined in contributes.customEditors of package.json
@@ -299,6 +360,11 @@ export class OnnxViewerProvider implements vscode.CustomReadonlyEditorProvider<O
     // Tracks all known webviews
     private readonly webviews = new WebviewCollection();
 
+    // the simplification and profiling jobs of the opened documents and of pre-warming
+    private readonly analyses = new AnalysisQueue((background) => background
+        ? vscode.workspace.getConfiguration('qtron').get<number>('prewarmConcurrency') ?? 1
+        : vscode.workspace.getConfiguration('qtron').get<number>('maxConcurrentAnalyses') ?? 1);
+
     constructor(
         private readonly _context: vscode.ExtensionContext
     ) { }
@@ -324,7 +390,7 @@ export class OnnxViewerProvider implements vscode.CustomReadonlyEditorProvider<O
         openContext: { backupId?: string },
         _token: vscode.CancellationToken
     ): Promise<OnnxDocument> {
-        const document: OnnxDocument = await OnnxDocument.create(uri, openContext.backupId, this._context);
+        const document: OnnxDocument = await OnnxDocument.create(uri, openContext.backupId, this._context, this.analyses);
         return document;
     }
 
@@ -352,12 +418,28 @@ export class OnnxViewerProvider implements vscode.CustomReadonlyEditorProvider<O
         // Init the html contents
         webviewPanel.webview.html = this.getHtmlForWebview(webviewPanel.webview);
 
+        // The analysis of the document finishes after the viewer opened
+        const subscriptions = [
+            document.onDidChangeProfile(() => {
+                this.postMessage(webviewPanel, 'profile', { profileData: document.profileData });
+            }),
+            document.onDidChangeModel(() => {
+                this.postMessage(webviewPanel, 'model', {
+                    modelData: document.strippedData,
+                    profileData: document.profileData
+                });
+            }),
+        ];
+        webviewPanel.onDidDispose(() => subscriptions.forEach((subscription) => subscription.dispose()));
+
         // Wait for the webview to be properly ready before we init
         webviewPanel.webview.onDidReceiveMessage(e => {
             if (e.type === 'ready') {
+                // the webview fetches the stripped tensors with 'external_tensor' messages when they are shown
                 this.postMessage(webviewPanel, 'init', {
-                    modelData: document.documentData,
-                    modelName: Utils.basename(document.uri)
+                    modelData: document.strippedData,
+                    modelName: Utils.basename(document.uri),
+                    profileData: document.profileData
                 });
             } else if (e.type === 'error') {
                 if (!e.message) {
@@ -365,22 +447,37 @@ export class OnnxViewerProvider implements vscode.CustomReadonlyEditorProvider<O
                 }
             } else if (e.type === 'external_tensor') {
                 let locations = e.external_locations;
+                // the byte range of one tensor, the whole file without a range
+                let offset: number = e.offset ?? 0;
+                let length: number = e.length ?? -1;
 
                 for (let loc of locations) {
-                    let externalURI = Utils.joinPath(Utils.dirname(document.uri), loc);
-                    vscode.workspace.fs.readFile(externalURI).then((data) => {
+                    this.readTensorData(document, loc, offset, length).then((data) => {
                         this.postMessage(webviewPanel, 'external_tensor', {
-                            tensorData: new Uint8Array(data),
-                            location: loc
+                            tensorData: data,
+                            location: loc,
+                            requestId: e.requestId
                         });
                     }, (err)=>{
                         vscode.window.showErrorMessage(err.message);
                         this.postMessage(webviewPanel, 'external_tensor', {
                             tensorData: new Uint8Array(),
-                            location: loc
+                            location: loc,
+                            requestId: e.requestId,
+                            error: err.message
                         });
                     });
                 }
+            } else if (e.type === 'layout_cache_get') {
+                document.layoutCache.get(e.key).then((layout) => {
+                    this.postMessage(webviewPanel, 'layout_cache_get', { layout: layout, requestId: e.requestId });
+                }, () => {
+                    this.postMessage(webviewPanel, 'layout_cache_get', { layout: null, requestId: e.requestId });
+                });
+            } else if (e.type === 'layout_cache_put') {
+                document.layoutCache.put(e.key, e.layout).catch((err) => {
+                    getOutputChannel().appendLine(`[QTron] [WARNING] Could not cache the graph layout in ${document.layoutCache.filePath}: ${err}`);
+                });
             } else if (e.type === 'export') {
                 //the export file name
                 let fileName = e.fileName;
@@ -407,6 +504,35 @@ export class OnnxViewerProvider implements vscode.CustomReadonlyEditorProvider<O
         });
     }
 
+    /**
+     * Read the data of an external tensor: a range of the model for the tensors stripped by stripModelWeights,
+     * otherwise a range of the external data file next to the model.
+     * @param length the number of bytes, -1 reads to the end
+     */
+    private async readTensorData(document: OnnxDocument, location: string, offset: number, length: number): Promise<Uint8Array> {
+        if (location === STRIPPED_LOCATION) {
+            const data = document.documentData;
+            return data.slice(offset, length < 0 ? data.length : offset + length);
+        }
+        const externalURI = Utils.joinPath(Utils.dirname(document.uri), location);
+        if (externalURI.scheme === 'file') {
+            // read only the range, external data files can be larger than the memory of the webview
+            const handle = await fs.promises.open(externalURI.fsPath, 'r');
+            try {
+                if (length < 0) {
+                    length = Math.max((await handle.stat()).size - offset, 0);
+                }
+                const buffer = new Uint8Array(length);
+                const { bytesRead } = await handle.read(buffer, 0, length, offset);
+                return bytesRead === length ? buffer : buffer.slice(0, bytesRead);
+            } finally {
+                await handle.close();
+            }
+        }
+        const data = await vscode.workspace.fs.readFile(externalURI);
+        return data.slice(offset, length < 0 ? data.length : offset + length);
+    }
+
     private postMessage(panel: vscode.WebviewPanel, type: string, body: any): void {
         panel.webview.postMessage({ type, body });
     }
@@ -434,6 +560,12 @@ export class OnnxViewerProvider implements vscode.CustomReadonlyEditorProvider<O
         const pythonScriptUri = webview.asWebviewUri(vscode.Uri.joinPath(
             this._context.extensionUri, 'onnx_view', 'python.js'));
 
+        const graphLayoutScriptUri = webview.asWebviewUri(vscode.Uri.joinPath(
+            this._context.extensionUri, 'onnx_view', 'graphlayout.js'));
+
+        const profileScriptUri = webview.asWebviewUri(vscode.Uri.joinPath(
+            this._context.extensionUri, 'onnx_view', 'profile.js'));
+
         const onnxViewScriptUri = webview.asWebviewUri(vscode.Uri.joinPath(
             this._context.extensionUri, 'onnx_view', 'onnx_view.js'));
 
@@ -452,7 +584,7 @@ export class OnnxViewerProvider implements vscode.CustomReadonlyEditorProvider<O
             <meta charset="utf-8">
             <meta name="viewport"
                 content="width=device-width, initial-scale=1.0, maximum-scale=1.0, user-scalable=no, viewport-fit=cover, shrink-to-fit=no">
-            <meta http-equiv="Content-Security-Policy" content="default-src 'self'; img-src ${webview.cspSource} blob: data:; style-src ${webview.cspSource} 'unsafe-inline'; script-src ${webview.cspSource} 'unsafe-eval';">
+            <meta http-equiv="Content-Security-Policy" content="default-src 'self'; img-src ${webview.cspSource} blob: data:; style-src ${webview.cspSource} 'unsafe-inline'; script-src ${webview.cspSource} 'unsafe-eval'; worker-src blob:;">
             <link rel="shortcut icon" href="#" />
             
             <link rel="stylesheet" href="${styleGrapherUri}" />
@@ -460,9 +592,11 @@ export class OnnxViewerProvider implements vscode.CustomReadonlyEditorProvider<O
             <script type="text/javascript" src="${baseScriptUri}"></script>
             <script type="text/javascript" src="${dagreScriptUri}"></script>
             <script type="text/javascript" src="${grapherScriptUri}"></script>
+            <script type="text/javascript" src="${graphLayoutScriptUri}"></script>
             <script type="text/javascript" src="${hostScriptUri}"></script>
             <script type="text/javascript" src="${onnxModelScriptUri}"></script>
             <script type="text/javascript" src="${pythonScriptUri}"></script>
+            <script type="text/javascript" src="${profileScriptUri}"></script>
             <script type="text/javascript" src="${onnxViewScriptUri}"></script>
             <script type="text/javascript" src="${mainScriptUri}"></script>
         
@@ -537,6 +671,13 @@ export class OnnxViewerProvider implements vscode.CustomReadonlyEditorProvider<O
                 .welcome.spinner .logo-spinner-stroke { stroke: #ececec; }
                 .welcome.spinner .graph { display: flex; opacity: 0; }
                 .welcome .toolbar { display: none; }
+                .heatmap { display: none; position: absolute; bottom: 10px; right: 10px; padding: 6px 8px; background-color: rgba(255, 255, 255, 0.9); border: 1px solid #e5e5e5; border-radius: 6px; font-size: 11px; user-select: none; -webkit-user-select: none; -moz-user-select: none; }
+                .default .heatmap-visible { display: block; }
+                .heatmap-row { display: flex; align-items: center; gap: 6px; margin: 2px 0; }
+                .heatmap-row select { font-size: 11px; }
+                .heatmap-bar { height: 8px; width: 180px; margin-top: 4px; border-radius: 2px; }
+                .heatmap-range { display: flex; justify-content: space-between; width: 180px; color: #777777; }
+                label.heatmap-row .heatmap-range { display: inline; width: auto; }
                 @media (prefers-color-scheme: dark) {
                 :root { color-scheme: dark; }
                 .default { background-color: #404040; }
@@ -558,6 +699,8 @@ export class OnnxViewerProvider implements vscode.CustomReadonlyEditorProvider<O
                 .toolbar-path-back-button:hover { background: #dfdfdf; border-color: #dfdfdf; }
                 .toolbar-path-name-button { background: #aaaaaa ; border-color: #aaaaaa; color: #404040; }
                 .toolbar-path-name-button:hover { background: #dfdfdf; border-color: #dfdfdf; }
+                .heatmap { background-color: rgba(45, 45, 45, 0.9); border-color: #363636; color: #dfdfdf; }
+                .heatmap-range { color: #aaaaaa; }
                 .titlebar { color: #949494; }
                 .welcome body { background-color: #1e1e1e; }
                 .default body { background-color: #404040; }
@@ -733,6 +876,7 @@ export class OnnxViewerProvider implements vscode.CustomReadonlyEditorProvider<O
                     </button>
                 </div>
             </div>
+            <div id="heatmap" class="heatmap"></div>
             <div id="logo" class="center logo">
                 <a href="javascript:;" target="blank_">
                     <svg class="center logo-icon" viewbox="0 0 1024 1024">
@@ -0,0 +1,186 @@
+/**
+ * Pre-warming of the analysis cache.
+ *
+ * With qtron.enablePrewarming the models of the workspace that match qtron.prewarmInclude are simplified and
+ * profiled as background jobs of the analysis queue when the workspace opens, and a file watcher analyzes a model
+ * again when it's created or changed. A model whose cached analysis still matches its content is skipped, opening it
+ * later takes the cached outputs instead of running a job.
+ */
+import * as path from 'path';
+import * as vscode from 'vscode';
+import { AnalysisJob, AnalysisQueue, scriptArgs } from './analysis_queue';
+import { AnalysisCache, defaultResultsDir } from './analysis_cache';
+
+// the settings that restart pre-warming when they change
+const PREWARM_SETTINGS = [
+    'enablePrewarming', 'prewarmInclude', 'prewarmExclude', 'enableSimplification', 'onnxToolResultsPath',
+];
+
+// the milliseconds a changed model must stay unchanged before it's analyzed, a model is often written in many chunks
+const PREWARM_DELAY = 2000;
+
+/**
+ * @param glob a glob pattern with *, **, ? and {a,b}
+ * @returns the regular expression of the paths the pattern matches, the paths use / as separator
+ */
+function globPattern(glob: string): RegExp {
+    let source = '';
+    let group = false;
+    for (let i = 0; i < glob.length; i++) {
+        const c = glob[i];
+        if (c === '*' && glob[i + 1] === '*') {
+            i++;
+            if (glob[i + 1] === '/') {
+                // **/ matches any number of directories, none too
+                i++;
+                source += '(?:.*/)?';
+            } else {
+                source += '.*';
+            }
+        } else if (c === '*') {
+            source += '[^/]*';
+        } else if (c === '?') {
+            source += '[^/]';
+        } else if (c === '{') {
+            group = true;
+            source += '(?:';
+        } else if (c === '}' && group) {
+            group = false;
+            source += ')';
+        } else if (c === ',' && group) {
+            source += '|';
+        } else {
+            source += c.replace(/[.+^$()|[\]\\]/g, '\\$&');
+        }
+    }
+    return new RegExp(`^${source}$`);
+}
+
+export class Prewarmer implements vscode.Disposable {
+
+    private readonly _watchers: vscode.Disposable[] = [];
+    private readonly _timers = new Map<string, NodeJS.Timeout>();
+    // the jobs pre-warming added, cancelled when it stops unless an opened model took them over
+    private readonly _jobs = new Set<AnalysisJob>();
+    private readonly _configuration: vscode.Disposable;
+    private _excluded: RegExp | undefined;
+    // bumped when pre-warming stops, a scan of an older run ends early
+    private _generation = 0;
+
+    constructor(private readonly _context: vscode.ExtensionContext, private readonly _analyses: AnalysisQueue) {
+        this._configuration = vscode.workspace.onDidChangeConfiguration((e) => {
+            if (PREWARM_SETTINGS.some((setting) => e.affectsConfiguration(`qtron.${setting}`))) {
+                this._start();
+            }
+        });
+        this._start();
+    }
+
+    private _start(): void {
+        this._stop();
+        const config = vscode.workspace.getConfiguration('qtron');
+        if (!config.get<boolean>('enablePrewarming') || !(config.get<boolean>('enableSimplification') ?? true)) {
+            return;
+        }
+        const include = config.get<string[]>('prewarmInclude') ?? ['**/*.onnx'];
+        const exclude = config.get<string>('prewarmExclude') || undefined;
+        this._excluded = exclude ? globPattern(exclude) : undefined;
+        for (const pattern of include) {
+            // a deleted model keeps its results, they are of no harm
+            const watcher = vscode.workspace.createFileSystemWatcher(pattern, false, false, true);
+            watcher.onDidCreate((uri) => this._schedule(uri));
+            watcher.onDidChange((uri) => this._schedule(uri));
+            this._watchers.push(watcher);
+        }
+        const generation = this._generation;
+        Promise.all(include.map((pattern) => vscode.workspace.findFiles(pattern, exclude))).then(async (results) => {
+            const files = new Map<string, vscode.Uri>();
+            for (const uri of results.flat()) {
+                files.set(uri.fsPath, uri);
+            }
+            for (const uri of files.values()) {
+                if (generation !== this._generation) {
+                    return;
+                }
+                await this._warm(uri).catch(() => undefined);
+            }
+        });
+    }
+
+    private _stop(): void {
+        this._generation++;
+        for (const watcher of this._watchers.splice(0)) {
+            watcher.dispose();
+        }
+        for (const timer of this._timers.values()) {
+            clearTimeout(timer);
+        }
+        this._timers.clear();
+        for (const job of this._jobs) {
+            if (job.options.background) {
+                job.cancel();
+            }
+        }
+        this._jobs.clear();
+    }
+
+    private _schedule(uri: vscode.Uri): void {
+        const excluded = this._excluded && this._excluded.test(vscode.workspace.asRelativePath(uri, false));
+        if (uri.scheme !== 'file' || excluded) {
+            return;
+        }
+        const timer = this._timers.get(uri.fsPath);
+        if (timer) {
+            clearTimeout(timer);
+        }
+        this._timers.set(uri.fsPath, setTimeout(() => {
+            this._timers.delete(uri.fsPath);
+            this._warm(uri).catch(() => undefined);
+        }, PREWARM_DELAY));
+    }
+
+    /**
+     * add a background job for a model unless its cached analysis matches its content
+     */
+    private async _warm(uri: vscode.Uri): Promise<void> {
+        const inputPath = uri.fsPath;
+        const generation = this._generation;
+        // a job of the model runs, the model is analyzed again when the job ended if the change is newer
+        if (this._analyses.get(inputPath)) {
+            return;
+        }
+        const config = vscode.workspace.getConfiguration('qtron');
+        const onnxToolResultsPath = config.get<string>('onnxToolResultsPath') || '';
+        // the outputs of the jobs are models too
+        if (onnxToolResultsPath && path.resolve(inputPath).startsWith(path.resolve(onnxToolResultsPath) + path.sep)) {
+            return;
+        }
+        const cache = new AnalysisCache(defaultResultsDir(inputPath, onnxToolResultsPath),
+            path.basename(inputPath).replace(/\.onnx$/, ''));
+        if (await cache.stamped(inputPath)) {
+            return;
+        }
+        const inputHash = await AnalysisCache.hashFile(inputPath);
+        if (generation !== this._generation || this._analyses.get(inputPath) || await cache.get(inputHash)) {
+            return;
+        }
+        const simplifyScript = this._context.asAbsolutePath(path.join('scripts', 'simplify_onnx.py'));
+        const job = this._analyses.add(path.basename(inputPath), {
+            pythonPath: config.get<string>('pythonPath') || 'python',
+            args: scriptArgs(simplifyScript, inputPath, cache.modelPath),
+            inputPath: inputPath,
+            inputHash: inputHash,
+            cache: cache,
+            timeout: (config.get<number>('analysisTimeout') ?? 300) * 1000,
+            background: true,
+            threads: config.get<number>('prewarmThreads') ?? 1,
+        }, {});
+        this._jobs.add(job);
+        job.done.then(() => this._jobs.delete(job));
+    }
+
+    dispose(): void {
+        this._stop();
+        this._configuration.dispose();
+    }
+}
@@ -0,0 +1,33 @@
+import numpy as np
+from onnx import TensorProto, helper, numpy_helper
+
+# a model for onnx_strip_test.js: large initializers in raw_data and float_data, a small initializer, a large
+# Constant node attribute tensor and an initializer that is already external
+rng = np.random.default_rng(0)
+large = numpy_helper.from_array(rng.standard_normal((32, 32)).astype(np.float32), "large")
+large_float_data = helper.make_tensor("large_float_data", TensorProto.FLOAT, [16, 32],
+                                      rng.standard_normal(16 * 32).astype(np.float32).tolist())
+small = numpy_helper.from_array(rng.standard_normal(4).astype(np.float32), "small")
+constant = numpy_helper.from_array(rng.standard_normal((20, 20)).astype(np.float32), "constant_value")
+external = TensorProto(name="external", data_type=TensorProto.FLOAT, dims=[32, 32])
+external.data_location = TensorProto.EXTERNAL
+for key, value in (("location", "external_tensor"), ("offset", "0"), ("length", "4096")):
+    entry = external.external_data.add()
+    entry.key = key
+    entry.value = value
+
+nodes = [
+    helper.make_node("Constant", [], ["constant"], name="constant", value=constant),
+    helper.make_node("MatMul", ["x", "large"], ["a"], name="matmul"),
+    helper.make_node("MatMul", ["a", "external"], ["b"], name="matmul_external"),
+    helper.make_node("Add", ["b", "small"], ["c"], name="add"),
+    helper.make_node("MatMul", ["c", "large_float_data"], ["y"], name="matmul_float_data"),
+]
+graph = helper.make_graph(nodes, "strip",
+                          [helper.make_tensor_value_info("x", TensorProto.FLOAT, [1, 32])],
+                          [helper.make_tensor_value_info("y", TensorProto.FLOAT, None),
+                           helper.make_tensor_value_info("constant", TensorProto.FLOAT, None)],
+                          initializer=[large, large_float_data, small, external])
+onnx_model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 17)])
+with open("./data/strip_weights.onnx", "wb") as f:
+    f.write(onnx_model.SerializeToString())
@@ -0,0 +1,82 @@
+const assert = require("assert")
+const fs = require("fs")
+const root = require('../third_party/onnx_proto/onnx_pb_commonjs.js')
+const { stripModelWeights, STRIPPED_LOCATION } = require('../out/onnx_strip')
+
+//run from extension/ after `npm run compile` and `python test/generate_strip_onnx.py`
+var onnxBuffer = fs.readFileSync("./data/strip_weights.onnx")
+let onnxData = new Uint8Array(onnxBuffer)
+
+let stripped = stripModelWeights(onnxData);
+assert.notStrictEqual(stripped, onnxData, "nothing was stripped");
+console.log("model size: %d -> %d", onnxData.length, stripped.length);
+
+//the stripped bytes are still a valid model
+let original = root.onnx.ModelProto.decode(onnxData);
+let model = root.onnx.ModelProto.decode(stripped);
+assert.strictEqual(root.onnx.ModelProto.verify(model), null);
+assert.strictEqual(model.graph.node.length, original.graph.node.length);
+
+//initializers and Constant node attribute tensors by name
+function tensors(graph) {
+    let result = new Map();
+    for (let tensor of graph.initializer) {
+        result.set(tensor.name, tensor);
+    }
+    for (let node of graph.node) {
+        for (let attr of node.attribute) {
+            if (attr.t) {
+                result.set(attr.t.name, attr.t);
+            }
+        }
+    }
+    return result;
+}
+
+function externalData(tensor) {
+    let result = {};
+    for (let entry of tensor.external_data) {
+        result[entry.key] = entry.value;
+    }
+    return result;
+}
+
+//the little-endian bytes of the values, the ones the external data format expects
+function valueBytes(tensor) {
+    if (tensor.raw_data.length > 0) {
+        return new Uint8Array(tensor.raw_data);
+    }
+    return new Uint8Array(Float32Array.from(tensor.float_data).buffer);
+}
+
+let before = tensors(original.graph);
+let after = tensors(model.graph);
+assert.deepStrictEqual([...after.keys()], [...before.keys()]);
+
+//small and already external tensors are kept as they are
+for (let name of ["small", "external"]) {
+    let encoded = root.onnx.TensorProto.encode(after.get(name)).finish();
+    assert.deepStrictEqual(encoded, root.onnx.TensorProto.encode(before.get(name)).finish(), name);
+    console.log("kept: %s", name);
+}
+assert.strictEqual(externalData(after.get("external")).location, "external_tensor");
+
+//each range of a stripped tensor holds its values in the original model
+for (let name of ["large", "large_float_data", "constant_value"]) {
+    let tensor = after.get(name);
+    assert.strictEqual(tensor.data_location, root.onnx.TensorProto.DataLocation.EXTERNAL, name);
+    assert.strictEqual(tensor.raw_data.length, 0, name);
+    assert.strictEqual(tensor.float_data.length, 0, name);
+    let external = externalData(tensor);
+    assert.strictEqual(external.location, STRIPPED_LOCATION, name);
+    let offset = parseInt(external.offset);
+    let length = parseInt(external.length);
+    let values = valueBytes(before.get(name));
+    assert.strictEqual(length, values.length, name);
+    assert.deepStrictEqual(onnxData.subarray(offset, offset + length), values, name);
+    console.log("stripped: %s offset=%d length=%d", name, offset, length);
+}
+
+//a model without large tensors is returned as it is
+assert.strictEqual(stripModelWeights(onnxData, onnxData.length + 1), onnxData);
+console.log("all checks passed");